@@ -12,12 +12,50 @@ import os
 from datetime import datetime
 import requests
 
+# Use the app's JSON codec (orjson/msgspec when installed) when run from the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+try:
+    import json_codec
+except ImportError:
+    json_codec = None
+try:
+    import task_dates
+except ImportError:
+    task_dates = None
+
+def task_labels(task):
+    """TooDone tags as Todoist label names (tags are stored without spaces, so they also work as @labels)"""
+    tags = task.get('tags')
+    if not isinstance(tags, list):
+        return []
+    return ['-'.join(str(tag).strip().lstrip('#@').split()) for tag in tags if str(tag).strip().lstrip('#@')]
+
+def task_priority(task):
+    """Todoist p1-p4 of a task as 1-4 (1 is urgent); tasks without a priority are p4"""
+    priority = task.get('priority')
+    return priority if priority in (1, 2, 3, 4) and type(priority) is int else 4
+
+def parse_due_date(due_date):
+    """Due date as YYYY-MM-DD for Todoist, from the stored YYYY-MM-DD or the older DD-Month-YYYY; raises ValueError"""
+    if task_dates is not None:
+        day = task_dates.parse_due(due_date)
+        if day is None:
+            raise ValueError(due_date)
+        return day.isoformat()
+    try:
+        return datetime.strptime(due_date, '%Y-%m-%d').strftime('%Y-%m-%d')
+    except ValueError:
+        return datetime.strptime(due_date, '%d-%B-%Y').strftime('%Y-%m-%d')
+
 def load_tasks_from_json(json_path):
     """Load tasks from JSON file"""
     try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            return data.get('tasks', [])
+        if json_codec is not None:
+            data = json_codec.load_file(json_path)
+        else:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        return data.get('tasks', [])
     except FileNotFoundError:
         print(f"Error: Tasks file not found at {json_path}")
         sys.exit(1)
@@ -50,17 +88,16 @@ def convert_to_csv(tasks, csv_path):
                 formatted_date = ''
                 if due_date:
                     try:
-                        # Parse from DD-Month-YYYY format
-                        dt = datetime.strptime(due_date, '%d-%B-%Y')
-                        # Convert to YYYY-MM-DD format for Todoist
-                        formatted_date = dt.strftime('%Y-%m-%d')
+                        formatted_date = parse_due_date(due_date)
                     except ValueError:
                         print(f"Warning: Invalid date format for task '{content}': {due_date}")
                 
+                # Todoist's CSV import reads labels from @label in the content
+                labels = ''.join(f" @{label}" for label in task_labels(task))
                 writer.writerow({
                     'TYPE': 'task',
-                    'CONTENT': content,
-                    'PRIORITY': '1',  # Normal priority
+                    'CONTENT': content + labels,
+                    'PRIORITY': str(task_priority(task)),  # 1 = p1 (urgent) ... 4 = p4 (normal)
                     'INDENT': '1',    # Top level
                     'AUTHOR': '',
                     'RESPONSIBLE': '',
@@ -127,13 +164,17 @@ def sync_to_todoist_api(tasks, token):
             'project_id': default_project_id
         }
         
+        labels = task_labels(task)
+        if labels:
+            task_data['labels'] = labels
+        
+        # The REST API counts the other way: 4 is p1 (urgent), 1 is p4 (normal)
+        task_data['priority'] = 5 - task_priority(task)
+        
         # Add due date if present
         if due_date:
             try:
-                # Parse from DD-Month-YYYY format
-                dt = datetime.strptime(due_date, '%d-%B-%Y')
-                # Convert to YYYY-MM-DD format for Todoist
-                task_data['due_date'] = dt.strftime('%Y-%m-%d')
+                task_data['due_date'] = parse_due_date(due_date)
             except ValueError:
                 print(f"Warning: Invalid date format for task '{content}': {due_date}")
         
@@ -16,6 +16,7 @@ from dotenv import load_dotenv, set_key
 from kivy.base import EventLoop
 from kivy.core.window import Window
 from kivy.app import App
+from kivy.uix.widget import Widget
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.floatlayout import FloatLayout
 from kivy.uix.gridlayout import GridLayout
@@ -28,10 +29,11 @@ from kivy.uix.spinner import Spinner
 # Use FileChooserListView for a potentially simpler view, or keep FileChooserIconView
 from kivy.uix.filechooser import FileChooserListView, FileChooserIconView
 from kivy.uix.image import Image
+from kivy.core.text import Label as CoreLabel
 from kivy.clock import Clock
 from kivy.config import Config
 from kivy.properties import ObjectProperty, StringProperty, BooleanProperty, DictProperty
-from kivy.graphics import Color, Rectangle, Line
+from kivy.graphics import Color, Rectangle, Line, Mesh
 from kivy.utils import platform
 from kivy.metrics import dp
 from kivy.logger import Logger # Import Kivy logger
@@ -63,6 +65,30 @@ except ImportError as e:
 # --- Other Imports ---
 import pygame
 import logging
+import task_store
+import task_model
+import task_snapshot
+import task_fragments
+import json_codec
+import task_dates
+import sqlite_store
+import sharded_store
+import search_index
+import quick_switcher
+import retention
+import archive_store
+import gratitude_store
+import backup_store
+import task_import
+import task_export
+import time_log
+import rollups
+import calendar_model
+import task_views
+import tag_index
+import task_deps
+import next_up
+import task_tree
 
 # --- Configuration & Constants ---
 # Use Kivy's logger alongside Python's logging
@@ -342,11 +368,18 @@ class ColorCyclingIcon(Image):
         kwargs.setdefault('allow_stretch', True)
         kwargs.setdefault('keep_ratio', True)
         super().__init__(**kwargs)
-        self.task_ref = task_ref
         self.app_ref = app_ref
         self.icon_key = icon_key
+        with self.canvas.before:
+            self.overlay_color = Color(rgba=(0, 0, 0, 0.5))
+            self.overlay_rect = Rectangle(pos=self.pos, size=self.size)
+        self.set_task_ref(task_ref)
+        self.bind(pos=self.update_rect, size=self.update_rect)
+    def set_task_ref(self, task_ref):
+        """Points the icon at task_ref and shows its saved color (the calendar reuses icons across months)."""
+        self.task_ref = task_ref
         # Determine initial color index
-        initial_color = (task_ref.get(icon_key) if task_ref and icon_key in task_ref else None)
+        initial_color = (task_ref.get(self.icon_key) if task_ref and self.icon_key in task_ref else None)
         if initial_color and isinstance(initial_color, (list, tuple)) and len(initial_color) == 4:
             try:
                 self.color_index = self.colors.index(tuple(initial_color))
@@ -355,10 +388,7 @@ class ColorCyclingIcon(Image):
         else:
             self.color_index = 3 # default black
         self.color = self.colors[self.color_index]
-        with self.canvas.before:
-            self.overlay_color = Color(rgba=(self.color[0], self.color[1], self.color[2], 0.5))  # Set overlay to current color
-            self.overlay_rect = Rectangle(pos=self.pos, size=self.size)
-        self.bind(pos=self.update_rect, size=self.update_rect)
+        self.overlay_color.rgba = (self.color[0], self.color[1], self.color[2], 0.5)  # Set overlay to current color
     def on_touch_down(self, touch):
         if self.collide_point(*touch.pos):
             self.color_index = (self.color_index + 1) % len(self.colors)
@@ -368,7 +398,7 @@ class ColorCyclingIcon(Image):
                 self.task_ref[self.icon_key] = list(self.colors[self.color_index])
                 if self.app_ref:
                     if hasattr(self.app_ref, 'mark_tasks_changed'):
-                        self.app_ref.mark_tasks_changed()
+                        self.app_ref.mark_tasks_changed(self.task_ref)
                     self.app_ref.save_tasks(force=True)
                     # Instantly update both views (task list and calendar)
                     if hasattr(self.app_ref, 'update_task_view'):
@@ -380,6 +410,15 @@ class ColorCyclingIcon(Image):
         self.overlay_rect.size = self.size
 
 class CalendarWidget(GridLayout):
+    """
+    Month grid (Sunday first) with icons for tasks due each day and a heart
+    for gratitude entries. The 7 headers and 42 day cells are created once;
+    showing a month patches them from a calendar_model.MonthModel, which is
+    built on a worker thread and cached, and the months on either side are
+    prefetched so flipping to them is immediate.
+    """
+    title = StringProperty('')
+
     def __init__(self, year, month, tasks_provider, gratitude_provider=None, **kwargs):
         # Set default size_hint to fill available space
         kwargs.setdefault('size_hint', (1, 1))
@@ -388,193 +427,200 @@ class CalendarWidget(GridLayout):
         self.month = month
         self.tasks_provider = tasks_provider
         self.gratitude_provider = gratitude_provider
+        self.models = calendar_model.MonthModels(tasks_provider, gratitude_provider)
         self.global_text_color = (0, 0, 0, 1)  # Default to black
         self.global_date_number_color = (0, 0, 0, 1)  # Default to black
+        self._model = None  # MonthModel the cells show
+        self._building = set()  # (year, month) with a build on a worker thread
+        self._create_cells()
         # Bind to size changes to ensure proper scaling
         self.bind(size=self._update_layout)
         self.populate_calendar()
 
+    def _create_cells(self):
+        app_ref = App.get_running_app()
+        self._headers = [Label(text=day, color=self.global_text_color, size_hint=(1/7, None)) for day in ["Sun", "Mon", "Tue", "Wed", "Thu", "Fri", "Sat"]]
+        for header in self._headers: self.add_widget(header)
+        # --- Left click cycles color, right click creates new task ---
+        def on_day_click(instance, touch):
+            if not instance.date_str or not instance.collide_point(*touch.pos):
+                return False
+            if touch.button == 'left':
+                # Call the label's on_touch_down to cycle color
+                return ColorCyclingLabel.on_touch_down(instance, touch)
+            elif touch.button == 'right':
+                app = App.get_running_app()
+                if hasattr(app, 'prompt_new_task_for_date'):
+                    app.prompt_new_task_for_date(instance.date_str)
+                return True
+            return False
+        self._cells = []
+        for _ in range(42):
+            day_cell = FloatLayout(size_hint=(1/7, None))
+            with day_cell.canvas.before:
+                day_cell.highlight_color = Color(1, 0, 0, 0)  # today's highlight, shown by setting its alpha
+                day_cell.highlight_rect = Rectangle(pos=day_cell.pos, size=day_cell.size)
+            def update_rect(instance, value):
+                instance.highlight_rect.pos = instance.pos
+                instance.highlight_rect.size = instance.size
+            day_cell.bind(pos=update_rect, size=update_rect)
+            day_cell.day_label = ColorCyclingLabel(text='', size_hint=(0.8, 0.3), pos_hint={'top': 0.95, 'center_x': 0.5}, app_ref=app_ref)
+            day_cell.day_label.bind(on_touch_down=on_day_click)
+            day_cell.icons_layout = BoxLayout(orientation='horizontal', spacing=dp(1), size_hint=(0.9, 0.4), pos_hint={'center_y': 0.3, 'center_x': 0.5})
+            day_cell.heart = Label(text="♥", color=(1, 0.4, 0.4, 1), size_hint=(None, None))  # Heart symbol for gratitude
+            day_cell.icons = [ColorCyclingIcon(size_hint=(None, None), app_ref=app_ref) for _ in range(calendar_model.MAX_ICONS)]
+            day_cell.add_widget(day_cell.day_label); day_cell.add_widget(day_cell.icons_layout)
+            self._cells.append(day_cell); self.add_widget(day_cell)
+
     def set_global_text_color(self, header_color, date_number_color=None):
         self.global_text_color = header_color
         if date_number_color is not None:
             self.global_date_number_color = date_number_color
-        self.populate_calendar()
+        for header in self._headers: header.color = header_color
+        if self._model is not None: self._patch(self._model)
 
     def _update_layout(self, *args):
-        # Force recalculation of cell sizes when widget size changes
-        Clock.schedule_once(lambda dt: self.populate_calendar(), 0)
-        
-    def populate_calendar(self):
-        self.clear_widgets()
-        tasks = self.tasks_provider()
-        
-        # Calculate cell size based on available space
+        # Resize the existing cells; nothing is recreated
         cell_width = self.width / 7  # 7 columns
-        num_weeks = 6  # Maximum possible weeks in a month view
-        cell_height = self.height / (num_weeks + 1)  # +1 for header row
-        
-        # Add day headers with proper sizing (Sunday first)
-        day_headers = ["Sun", "Mon", "Tue", "Wed", "Thu", "Fri", "Sat"]
-        for day in day_headers:
-            header = Label(text=day, color=self.global_text_color, size_hint=(1/7, None), height=cell_height/2)
-            self.add_widget(header)
-            
-        try:
-            # Set firstweekday to Sunday (6)
-            cal = calendar.Calendar(firstweekday=6)
-            month_calendar = cal.monthdayscalendar(self.year, self.month)
-            today = datetime.now().date()
-        except ValueError:
-            logging.error(f"Invalid year/month for calendar: {self.year}/{self.month}")
-            self.add_widget(Label(text="Invalid Date"))
-            return
-        
-        # Pre-process tasks to create a date-to-tasks mapping for faster lookups
-        date_to_tasks = {}
-        for task in tasks:
-            if task.get('due_date') and task.get('icon'):  # Check for both due date AND icon
-                try:
-                    # Parse date once per task
-                    due_date_str = task['due_date'].strip()
-                    due_dt = datetime.strptime(due_date_str, '%d-%B-%Y').date()
-                    date_key = due_dt.strftime('%Y-%m-%d')
-                    
-                    # Only add tasks with valid icons
-                    if os.path.exists(task['icon']):
-                        if date_key not in date_to_tasks:
-                            date_to_tasks[date_key] = []
-                        date_to_tasks[date_key].append(task)
-                    else:
-                        logging.debug(f"Icon path '{task['icon']}' for task '{task.get('task')}' not found.")
-                except ValueError:
-                    # Skip invalid dates silently in release mode
-                    pass
-                except Exception as e:
-                    logging.debug(f"Error processing due date {task.get('due_date')}: {e}")
-        
-        # Pre-fetch gratitude entries once
-        gratitude_entries = self.gratitude_provider() if self.gratitude_provider else {}
+        cell_height = self.height / (6 + 1)  # 6 weeks, +1 for header row
+        icon_size_dp = max(10, min(20, cell_width/5))
+        for header in self._headers: header.height = cell_height / 2
+        for day_cell in self._cells:
+            day_cell.height = cell_height; day_cell.day_label.font_size = max(10, min(16, cell_width/5))  # Responsive font size
+            day_cell.heart.font_size = icon_size_dp * 1.2; day_cell.heart.size = (icon_size_dp, icon_size_dp)
+            for icon in day_cell.icons: icon.size = (icon_size_dp, icon_size_dp)
+
+    # --- Navigation ---
+    def show_month(self, year, month):
+        self.year, self.month = year, month
+        self.populate_calendar()
+
+    def next_month(self, *args):
+        self.show_month(*calendar_model.add_months(self.year, self.month, 1))
+
+    def previous_month(self, *args):
+        self.show_month(*calendar_model.add_months(self.year, self.month, -1))
+
+    def show_today(self, *args):
+        today = datetime.now().date(); self.show_month(today.year, today.month)
+
+    def populate_calendar(self):
+        """Shows self.year/self.month: from the cache at once, otherwise once a worker has built it."""
+        import threading
+        try: self.title = datetime(self.year, self.month, 1).strftime('%B %Y')
+        except ValueError: logging.error(f"Invalid year/month for calendar: {self.year}/{self.month}"); return
+        self.models.prepare()
+        model = self.models.get(self.year, self.month)
+        if model is not None: self._patch(model)
+        # Build the shown month first if needed, then the neighbours
+        wanted = [(self.year, self.month), calendar_model.add_months(self.year, self.month, -1), calendar_model.add_months(self.year, self.month, 1)]
+        wanted = [key for key in wanted if key not in self._building and self.models.get(*key) is None]
+        if not wanted: return
+        self._building.update(wanted)
+        def work():
+            for key in wanted:
+                try: built = self.models.build(*key)
+                except Exception as e: logging.error(f"Building calendar month {key} failed: {e}", exc_info=True); built = None
+                Clock.schedule_once(lambda dt, key=key, built=built: self._on_built(key, built), 0)
+        threading.Thread(target=work, daemon=True).start()
+
+    def _on_built(self, key, model):
+        self._building.discard(key)
+        if key != (self.year, self.month): return
+        if model is None: self.populate_calendar()  # invalidated while it was being built
+        elif model is not self._model: self._patch(model)
+
+    def _patch(self, model):
+        """Updates the existing cells to show model."""
+        self._model = model
         app_ref = App.get_running_app()
-        
-        # Add day cells
-        for week in month_calendar:
-            for day in week:
-                if day == 0:
-                    self.add_widget(BoxLayout(size_hint=(1/7, None), height=cell_height))
-                    continue
-                    
-                # Create day cell with proper sizing
-                day_cell = FloatLayout(size_hint=(1/7, None), height=cell_height)
-                
-                try:
-                    day_date = datetime(self.year, self.month, day).date()
-                except ValueError:
-                    self.add_widget(Label(text="X"))
-                    continue
-                    
-                # Day number label with relative sizing
-                date_str = day_date.strftime('%Y-%m-%d')
-                # Pass date_str and app_ref to ColorCyclingLabel
-                day_number_label = ColorCyclingLabel(
-                    text=str(day),
-                    size_hint=(0.8, 0.3),
-                    pos_hint={'top': 0.95, 'center_x': 0.5},
-                    font_size=max(10, min(16, cell_width/5)),  # Responsive font size
-                    date_str=date_str,
-                    app_ref=app_ref
-                )
-                # --- Left click cycles color, right click creates new task ---
-                def on_day_click(instance, touch, the_date=date_str):
-                    if not instance.collide_point(*touch.pos):
-                        return False
-                    if touch.button == 'left':
-                        # Call the label's on_touch_down to cycle color
-                        return ColorCyclingLabel.on_touch_down(instance, touch)
-                    elif touch.button == 'right':
-                        app = App.get_running_app()
-                        if hasattr(app, 'prompt_new_task_for_date'):
-                            app.prompt_new_task_for_date(the_date)
-                        return True
-                    return False
-                day_number_label.bind(on_touch_down=on_day_click)
-
-                # Set label color to per-date override if present
-                if app_ref and hasattr(app_ref, 'date_colors') and date_str in app_ref.date_colors:
-                    day_number_label.color = app_ref.date_colors[date_str]
-                    day_number_label.override = True
-                elif not hasattr(day_number_label, 'color_index') or day_number_label.color_index is None or not getattr(day_number_label, 'override', False):
-                    day_number_label.color = self.global_date_number_color
-                day_cell.add_widget(day_number_label)
-                
-                # Highlight today's date
-                if day_date == today:
-                    with day_cell.canvas.before:
-                        Color(1, 0, 0, 0.25)
-                        day_cell.highlight_rect = Rectangle(pos=day_cell.pos, size=day_cell.size)
-                    def update_rect(instance, value):
-                        if hasattr(instance, 'highlight_rect'):
-                            instance.highlight_rect.pos = instance.pos
-                            instance.highlight_rect.size = instance.size
-                    day_cell.bind(pos=update_rect, size=update_rect)
-                
-                # Get matching tasks from our pre-processed dictionary
-                matching_tasks = date_to_tasks.get(date_str, [])
-                
-                # Check for gratitude entries on this day
-                has_gratitude = date_str in gratitude_entries
-                
-                # Only create layout if we have icons or gratitude to show
-                if matching_tasks or has_gratitude:
-                    # Add task icons and gratitude indicator
-                    icons_layout = BoxLayout(
-                        orientation='horizontal',
-                        spacing=dp(1),
-                        size_hint=(0.9, 0.4),
-                        pos_hint={'center_y': 0.3, 'center_x': 0.5}  # Adjusted position to be more centered in the cell
-                    )
-                    
-                    # Calculate icon size based on cell dimensions
-                    icon_size_dp = max(10, min(20, cell_width/5))
-                    icon_size = (icon_size_dp, icon_size_dp)
-                    
-                    # Add gratitude indicator if present
-                    if has_gratitude:
-                        gratitude_label = Label(
-                            text="♥",  # Heart symbol for gratitude
-                            color=(1, 0.4, 0.4, 1),  # Pinkish-red color
-                            font_size=icon_size_dp * 1.2,
-                            size_hint=(None, None),
-                            size=icon_size
-                        )
-                        icons_layout.add_widget(gratitude_label)
-                    
-                    # Add task icons if any
-                    if matching_tasks:
-                        # Determine how many icons can fit
-                        max_icons = min(3, len(matching_tasks))  # Limit to 3 icons max for readability
-                        for i, t in enumerate(matching_tasks):
-                            if i >= max_icons:
-                                break
-                            icon_path = t['icon']
-                            try:
-                                icon = ColorCyclingIcon(
-                                    source=icon_path,
-                                    size_hint=(None, None),
-                                    size=icon_size,
-                                    task_ref=t,
-                                    app_ref=app_ref
-                                )
-                                # Set color from task dict if present
-                                icon_color = t.get('calendar_icon_color')
-                                if icon_color and isinstance(icon_color, (list, tuple)) and len(icon_color) == 4:
-                                    icon.color = icon_color
-                                icons_layout.add_widget(icon)
-                            except Exception as img_err:
-                                logging.debug(f"Failed to load icon image {icon_path} for calendar: {img_err}")
-                    
-                    day_cell.add_widget(icons_layout)
-                
-                self.add_widget(day_cell)
+        date_colors = app_ref.date_colors if app_ref and hasattr(app_ref, 'date_colors') else {}
+        for day_cell, cell in zip(self._cells, model.cells):
+            label = day_cell.day_label
+            label.text = str(cell.day) if cell.day else ''; label.date_str = cell.date_str
+            # Set label color to per-date override if present
+            label.color_index = 3; label.override = cell.date_str in date_colors
+            label.color = date_colors[cell.date_str] if label.override else self.global_date_number_color
+            # Highlight today's date
+            day_cell.highlight_color.a = 0.25 if cell.is_today else 0
+            day_cell.icons_layout.clear_widgets()
+            if cell.has_gratitude: day_cell.icons_layout.add_widget(day_cell.heart)
+            for icon, (icon_path, _, task) in zip(day_cell.icons, cell.icons):
+                icon.source = icon_path; icon.set_task_ref(task); day_cell.icons_layout.add_widget(icon)
+
+class YearHeatmap(Widget):
+    """
+    GitHub-style heatmap of one year, a column per week and a row per day
+    (Sunday first, like CalendarWidget). The cells are drawn as one Mesh per
+    color level instead of a widget per day. days_provider(first, last)
+    returns (date, seconds, completed) rows, i.e. the report rollups;
+    on_day(date) is called when a day is clicked.
+    """
+    LEVEL_COLORS = [(0.61, 0.91, 0.66, 1), (0.25, 0.77, 0.39, 1), (0.19, 0.63, 0.31, 1), (0.13, 0.43, 0.22, 1)]
+
+    def __init__(self, year, days_provider, on_day=None, metric='seconds', empty_color=(0.85, 0.87, 0.89, 1), text_color=(0, 0, 0, 1), **kwargs):
+        super().__init__(**kwargs)
+        self.year = year; self.days_provider = days_provider; self.on_day = on_day; self.metric = metric
+        self.empty_color = empty_color; self.text_color = text_color
+        self.levels = {}  # date -> 0 (nothing) .. 4
+        self._geometry = None  # (left, top, cell size) of the last draw, for hit testing
+        self.bind(pos=self._redraw, size=self._redraw)
+        self.refresh()
+
+    def _first_sunday(self):
+        first = datetime(self.year, 1, 1).date()
+        return first - timedelta(days=(first.weekday() + 1) % 7)
+
+    def refresh(self):
+        """Re-reads the per-day values of the year and redraws."""
+        first = datetime(self.year, 1, 1).date(); last = datetime(self.year, 12, 31).date()
+        values = {day: seconds if self.metric == 'seconds' else completed for day, seconds, completed in self.days_provider(first, last)}
+        top = max(values.values(), default=0) or 1
+        self.levels = {day: (min(4, 1 + int(4 * value / top)) if value > 0 else 0) for day, value in values.items()}
+        self._redraw()
+
+    def _redraw(self, *args):
+        self.canvas.clear()
+        sunday = self._first_sunday(); columns = (datetime(self.year, 12, 31).date() - sunday).days // 7 + 1
+        cell = min(self.width / (columns + 1), self.height / 8.5)
+        if cell <= 0: return
+        left = self.x + (self.width - columns * cell) / 2; top = self.y + (self.height + 7.5 * cell) / 2 - cell * 1.2
+        self._geometry = (left, top, cell); side = cell * 0.82
+        meshes = [([], []) for _ in range(5)]
+        for day, level in self.levels.items():
+            offset = (day - sunday).days; x = left + (offset // 7) * cell; y = top - (offset % 7 + 1) * cell
+            vertices, indices = meshes[level]; n = len(vertices) // 4
+            vertices.extend((x, y, 0, 0, x + side, y, 1, 0, x + side, y + side, 1, 1, x, y + side, 0, 1))
+            indices.extend((n, n + 1, n + 2, n, n + 2, n + 3))
+        today = datetime.now().date()
+        with self.canvas:
+            for level, (vertices, indices) in enumerate(meshes):
+                if not vertices: continue
+                Color(*(self.empty_color if level == 0 else self.LEVEL_COLORS[level - 1]))
+                Mesh(vertices=vertices, indices=indices, mode='triangles')
+            Color(*self.text_color)
+            for month in range(1, 13):
+                label = CoreLabel(text=calendar.month_abbr[month], font_size=max(8, cell * 0.8)); label.refresh()
+                x = left + ((datetime(self.year, month, 1).date() - sunday).days // 7) * cell
+                Rectangle(texture=label.texture, pos=(x, top + cell * 0.2), size=label.texture.size)
+            if today.year == self.year:
+                offset = (today - sunday).days
+                Color(1, 0, 0, 0.8); Line(rectangle=(left + (offset // 7) * cell, top - (offset % 7 + 1) * cell, side, side), width=1.1)
+
+    def day_at(self, x, y):
+        """The date of the cell at window position (x, y), or None."""
+        if self._geometry is None: return None
+        left, top, cell = self._geometry
+        column = int((x - left) // cell); row = int((top - y) // cell)
+        if column < 0 or not 0 <= row < 7: return None
+        day = self._first_sunday() + timedelta(days=column * 7 + row)
+        return day if day.year == self.year else None
+
+    def on_touch_down(self, touch):
+        if not self.collide_point(*touch.pos): return super().on_touch_down(touch)
+        day = self.day_at(*touch.pos)
+        if day is not None and self.on_day is not None: self.on_day(day); return True
+        return super().on_touch_down(touch)
 
 # --- Main Application Class ---
 class ProductivityApp(App):
@@ -586,6 +632,21 @@ class ProductivityApp(App):
     date_colors = DictProperty({})  # { 'YYYY-MM-DD': [r, g, b, a] }
 
     tasks = ObjectProperty([])
+    _sqlite_store = None  # SQLiteTaskStore when STORAGE_BACKEND=sqlite
+    _sharded_store = None  # ShardedTaskStore when STORAGE_BACKEND=sharded
+    _task_change_listeners = ()  # callables notified by mark_tasks_changed
+    _task_snapshot = None  # task_snapshot.Snapshot the tasks were lazily loaded from
+    _snapshot_stale = False  # tasks.json was saved since the snapshot was written
+    _pending_cold_annotations = ()  # (task id, annotation) moved out by retention, written after the next save
+    _tasks_meta = {}  # tasks.json fields other than tasks/schema_version (colors, user_display_name, ...)
+    _newer_schema_version = None  # schema_version of tasks written by a newer app; they are not saved over
+    search_index = None
+    switcher_index = None
+    task_views = None
+    tag_index = None
+    task_deps = None
+    next_up = None
+    task_tree = None
     selected_index = ObjectProperty(None, allownone=True)
     last_click_time = ObjectProperty(None, allownone=True)
     last_click_index = ObjectProperty(None, allownone=True)
@@ -605,20 +666,37 @@ class ProductivityApp(App):
     _background_spinner = ObjectProperty(None, allownone=True)
     _annotation_popup = ObjectProperty(None, allownone=True)
     _gratitude_popup = ObjectProperty(None, allownone=True)
+    _search_popup = ObjectProperty(None, allownone=True)
+    _switcher_popup = ObjectProperty(None, allownone=True)
     # Removed _icon_selector_popup
 
 
     def build(self):
         Window.bind(on_request_close=self.on_request_close)
+        Window.bind(on_keyboard=self._on_keyboard)
+        self._task_change_listeners = []
         self.setup_directories()
         self.load_app_icon()
+        self._init_storage_backend()
+        self._task_change_listeners.append(self._on_task_changed_store)
+        self._fragment_cache = task_fragments.FragmentCache(); self._task_change_listeners.append(self._fragment_cache.mark)
+        self._init_backups()
         self.tasks = self.load_tasks()
         self.gratitude_entries = self.load_gratitude_entries()
+        self._init_time_log()
         # Load minimize mode color preference
         self._load_minimize_color_preference()
         # Removed: self._load_and_apply_background() # Moved down
         self.check_and_resume_timers()
         self._reschedule_pending_alarms()
+        if getattr(self, '_pending_lazy_validation', False): self._schedule_lazy_task_validation()
+        self._init_task_tree()
+        self._init_search_index()
+        self._init_quick_switcher()
+        self._init_tag_index()
+        self._init_task_deps()
+        self._init_next_up()
+        self._init_task_views()
         self.root = self.create_main_layout() # Create root layout first
         self._load_and_apply_background() # Load and apply background AFTER
         self.apply_theme()
@@ -629,6 +707,11 @@ class ProductivityApp(App):
         Clock.schedule_interval(self.update_timers_and_display, self._timer_update_interval)
         Clock.schedule_interval(self.update_live_time_displays, 2)  # Update time displays less frequently
         Clock.schedule_interval(self.save_tasks_periodically, 300)
+        self._last_input_time = time.time(); self._last_retention_run = 0; self._retention_running = False
+        Window.bind(on_touch_down=self._note_user_input, on_key_down=self._note_user_input)
+        Clock.schedule_interval(self._maybe_run_retention, 60)
+        Clock.schedule_once(lambda dt: self._archive_completed_tasks(), 10)
+        Clock.schedule_interval(lambda dt: self._archive_completed_tasks(), 6 * 3600)
         logging.info("Application built successfully.")
         # Force a window resize event to trigger layout updates (fixes distortion)
         Window.size = Window.size
@@ -674,16 +757,18 @@ class ProductivityApp(App):
 
     def on_stop(self):
         logging.info("Application stopping.")
-        self.save_tasks(force=True)
+        self.save_tasks(force=True); self._write_task_snapshot()
         self.save_gratitude_entries()
+        self._save_rollups()
         try:
             if pygame.mixer.get_init(): pygame.mixer.music.stop()
         except pygame.error as e: logging.warning(f"Pygame error stopping music on exit: {e}")
         pygame.mixer.quit(); logging.info("Tasks saved and Pygame mixer quit.")
+        if self._sqlite_store is not None: self._sqlite_store.close()
 
     def on_request_close(self, *args, **kwargs):
-        self.save_tasks(force=True); 
-        self.save_gratitude_entries();
+        self.save_tasks(force=True); self._write_task_snapshot()
+        self.save_gratitude_entries(); self._save_rollups()
         logging.info("Window close requested, tasks and gratitude entries saved."); 
         return False
 
@@ -707,89 +792,121 @@ class ProductivityApp(App):
         except FileNotFoundError: logging.warning(f"App icon directory not found: {app_icon_dir}")
         except Exception as e: logging.error(f"Error setting app icon: {e}", exc_info=True)
 
+    # --- Storage Backend ---
+    def _init_storage_backend(self):
+        """Opens the SQLite store (STORAGE_BACKEND=sqlite) or the sharded store (sharded), otherwise tasks.json is used."""
+        self._sqlite_store = None; self._sharded_store = None
+        backend = os.getenv('STORAGE_BACKEND', 'json').strip().lower()
+        if backend == 'sharded':
+            try:
+                self._sharded_store = sharded_store.ShardedTaskStore(sharded_store.SHARD_FOLDER)
+                if self._sharded_store.is_empty() and os.path.exists(TASKS_FILE):
+                    logging.info(f"Sharded store is empty, importing {TASKS_FILE}."); self._sharded_store.import_json(TASKS_FILE)
+            except Exception as e:
+                logging.error(f"Failed to open sharded store, falling back to {TASKS_FILE}: {e}", exc_info=True)
+                show_error_popup(f"Could not open the sharded task store.\nUsing {TASKS_FILE} instead.")
+                self._sharded_store = None
+            return
+        if backend != 'sqlite': return
+        try:
+            self._sqlite_store = sqlite_store.SQLiteTaskStore(sqlite_store.DB_FILE)
+            if self._sqlite_store.is_empty() and os.path.exists(TASKS_FILE):
+                logging.info(f"SQLite store is empty, importing {TASKS_FILE}.")
+                self._sqlite_store.import_json(TASKS_FILE, gratitude_entries=gratitude_store.GratitudeJournal().to_dict(), local_time_str=task_dates.local_time_now(PH_TZ))
+        except Exception as e:
+            logging.error(f"Failed to open SQLite store, falling back to {TASKS_FILE}: {e}", exc_info=True)
+            show_error_popup(f"Could not open the SQLite database.\nUsing {TASKS_FILE} instead.")
+            self._sqlite_store = None
+
+    def _storage_location(self):
+        if self._sqlite_store is not None: return self._sqlite_store.path
+        return self._sharded_store.path if self._sharded_store is not None else TASKS_FILE
+
+    def _storage_backend_name(self):
+        if self._sqlite_store is not None: return 'sqlite'
+        return 'sharded' if self._sharded_store is not None else 'json'
+
+    def _switch_storage_backend(self, backend):
+        """Flushes the current backend and copies everything into the newly selected one (through tasks.json)."""
+        backend = backend.lower()
+        if backend == self._storage_backend_name(): return
+        if self._newer_schema_version is not None: show_error_popup("Tasks saved by a newer version of the app cannot be copied to another storage backend."); return
+        self.save_tasks(force=True); self.save_gratitude_entries()
+        gratitude_entries = self.gratitude_entries.to_dict(); leaving_sqlite = self._sqlite_store is not None
+        if self._sqlite_store is not None:
+            self._sqlite_store.export_json(TASKS_FILE)
+            self._sqlite_store.close(); self._sqlite_store = None
+        if self._sharded_store is not None:
+            self._sharded_store.export_json(TASKS_FILE, self.tasks, self._task_to_save); self._sharded_store = None
+        if backend == 'sqlite':
+            store = sqlite_store.SQLiteTaskStore(sqlite_store.DB_FILE)
+            store.import_json(TASKS_FILE, gratitude_entries=gratitude_entries, local_time_str=task_dates.local_time_now(PH_TZ))
+            self._sqlite_store = store; self.gratitude_entries = gratitude_store.GratitudeJournal(None, gratitude_entries)
+        elif backend == 'sharded':
+            store = sharded_store.ShardedTaskStore(sharded_store.SHARD_FOLDER)
+            store.import_json(TASKS_FILE)
+            self._sharded_store = store
+        if leaving_sqlite:
+            journal = gratitude_store.GratitudeJournal(); journal.replace(gratitude_entries); self.gratitude_entries = journal
+        set_key(os.path.join(os.getcwd(), '.env'), 'STORAGE_BACKEND', backend)
+        logging.info(f"Storage backend switched to {self._storage_location()}")
+
+    def _on_task_changed_store(self, task):
+        store = self._sharded_store or self._sqlite_store
+        if store is not None: store.mark_dirty(task)
+
+    def _read_tasks_document(self):
+        """Returns (meta, tasks_data, schema_version) from the active storage backend."""
+        if self._sqlite_store is not None:
+            meta = self._sqlite_store.load_meta()
+            return meta, self._sqlite_store.load_tasks(), int(meta.get('schema_version', task_store.SCHEMA_VERSION))
+        if self._sharded_store is not None:
+            # Shards are migrated (and, when loaded by the process pool, validated) as they are read
+            tasks, needs_save = self._sharded_store.load_tasks(datetime.now().isoformat(), task_dates.local_time_now(PH_TZ))
+            if needs_save: self.mark_tasks_changed()
+            meta = self._sharded_store.load_meta(); version = meta['schema_version']  # only a newer manifest version matters: the shards are migrated already
+            return meta, tasks, version if isinstance(version, int) and version > task_store.SCHEMA_VERSION else task_store.SCHEMA_VERSION
+        data = json_codec.load_file(TASKS_FILE)
+        # Support old format (list of tasks); meta is empty for it
+        return task_store.split_document(data)
+
     def load_tasks(self):
         try:
-            with open(TASKS_FILE, 'r') as file:
-                data = json.load(file)
-                # Support old format (list of tasks)
-                if isinstance(data, list):
-                    tasks_data = data
-                    meta = {}
-                else:
-                    tasks_data = data.get('tasks', [])
-                    meta = data
-                # Load user display name if present
-                self.user_display_name = meta.get('user_display_name', '')
-                # Load global colors
-                self.calendar_text_color = tuple(meta.get('calendar_text_color', (0, 0, 0, 1)))
-                self.calendar_date_number_color = tuple(meta.get('calendar_date_number_color', (0, 0, 0, 1)))
-                self.timer_label_color = tuple(meta.get('timer_label_color', (0, 0, 0, 1)))
-                self.timer_colors = meta.get('timer_colors', {})
-                self.stop_timer_colors = meta.get('stop_timer_colors', {})
-                self.date_colors = meta.get('date_colors', {})
-                # After loading, update calendar widget if it exists
-                if hasattr(self, 'calendar_widget') and self.calendar_widget:
-                    self.calendar_widget.set_global_text_color(self.calendar_text_color, self.calendar_date_number_color)
-                loaded_tasks = []; now_iso = datetime.now().isoformat()
-                for i, task in enumerate(tasks_data):
-                    try:
-                        if 'task' not in task or not str(task['task']).strip():
-                            if 'titleHistory' in task and task['titleHistory'] and isinstance(task['titleHistory'], list) and task['titleHistory'][-1].get('title'): task['task'] = task['titleHistory'][-1]['title']
-                            else: task['task'] = f'Untitled Task {i+1}'; logging.warning(f"Task {i} had missing/empty title, assigned fallback.")
-                        task.setdefault('timer_running', False); task.setdefault('completed', False); task.setdefault('annotations', []); task.setdefault('alarms', []); task.setdefault('timer', 0); task.setdefault('start_time_unix', None); task.setdefault('due_date', None); task.setdefault('icon', None); task.setdefault('localTime', datetime.now(PH_TZ).strftime('%Y-%m-%d %H:%M:%S %Z')); task.setdefault('createdAt', now_iso); task.setdefault('titleHistory', []); task.setdefault('subtasks', []); task.setdefault('subtasks_visible', True)
-                        # Initialize subtasks recursively
-                        self._initialize_subtasks(task)
-                        if not isinstance(task.get('timer'), (int, float)): task['timer'] = 0
-                        if not isinstance(task.get('start_time_unix'), (int, float, type(None))): task['start_time_unix'] = None
-                        if not isinstance(task.get('annotations'), list): task['annotations'] = []
-                        if not isinstance(task.get('alarms'), list): task['alarms'] = []
-                        if not isinstance(task.get('due_date'), (str, type(None))): task['due_date'] = None
-                        if not isinstance(task.get('icon'), (str, type(None))): task['icon'] = None
-                        if not isinstance(task.get('completed'), bool): task['completed'] = False
-                        if not isinstance(task.get('titleHistory'), list): task['titleHistory'] = []
-                        valid_alarms = []
-                        if isinstance(task.get('alarms'), list):
-                            for alarm_index, alarm_entry in enumerate(task['alarms']):
-                                if isinstance(alarm_entry, dict):
-                                    alarm_entry.setdefault('target_timestamp_unix', None); alarm_entry.setdefault('sound_file', None); alarm_entry.setdefault('enabled', False); alarm_entry.setdefault('id', f"{i}_{alarm_index}_{time.time()}_{uuid4().hex[:6]}")
-                                    if alarm_entry.get('target_timestamp_unix') and alarm_entry.get('sound_file'): valid_alarms.append(alarm_entry)
-                                    else: logging.warning(f"Skipping invalid alarm entry in task {i}: {alarm_entry}")
-                        task['alarms'] = valid_alarms
-                        if not task['titleHistory'] or task['titleHistory'][-1].get('title') != task['task']: task['titleHistory'].append({'title': task['task'], 'timestamp': task.get('createdAt', now_iso)})
-                        for entry in task['titleHistory']: entry.setdefault('timestamp', now_iso)
-                        if 'start_time' in task and isinstance(task.get('start_time'), (int, float)):
-                            if task['start_time_unix'] is None: task['start_time_unix'] = task['start_time']
-                            task.pop('start_time', None)
-                        loaded_tasks.append(task)
-                    except Exception as task_err: logging.error(f"Error processing task at index {i}: {task_err}. Skipping task: {task}", exc_info=True)
-                logging.info(f"Loaded {len(loaded_tasks)} tasks from {TASKS_FILE}. user_display_name: {getattr(self, 'user_display_name', None)}"); return loaded_tasks
+            # An up-to-date snapshot loads only the summary fields; heavy fields decode on demand
+            snapshot = task_snapshot.load_snapshot(TASKS_FILE, task_store.SCHEMA_VERSION) if self._storage_backend_name() == 'json' and task_snapshot.snapshot_enabled() else None
+            if snapshot is not None: meta, tasks_data, schema_version = snapshot.meta, None, task_store.SCHEMA_VERSION
+            else:
+                with task_model.gc_paused(): meta, tasks_data, schema_version = self._read_tasks_document()
+            self._tasks_meta = {key: value for key, value in meta.items() if key not in ('tasks', 'schema_version')}
+            if schema_version > task_store.SCHEMA_VERSION:
+                # Saving would stamp the older version and drop what the newer schema added
+                self._newer_schema_version = schema_version
+                show_error_popup(f"Tasks in {self._storage_location()} were saved by a newer version of the app\n(schema {schema_version}, this version supports {task_store.SCHEMA_VERSION}).\nChanges will not be saved; please update the app.")
+            # Load user display name if present
+            self.user_display_name = meta.get('user_display_name', '')
+            # Load global colors
+            self.calendar_text_color = tuple(meta.get('calendar_text_color', (0, 0, 0, 1)))
+            self.calendar_date_number_color = tuple(meta.get('calendar_date_number_color', (0, 0, 0, 1)))
+            self.timer_label_color = tuple(meta.get('timer_label_color', (0, 0, 0, 1)))
+            self.timer_colors = meta.get('timer_colors', {})
+            self.stop_timer_colors = meta.get('stop_timer_colors', {})
+            self.date_colors = meta.get('date_colors', {})
+            # After loading, update calendar widget if it exists
+            if hasattr(self, 'calendar_widget') and self.calendar_widget:
+                self.calendar_widget.set_global_text_color(self.calendar_text_color, self.calendar_date_number_color)
+            if snapshot is not None:
+                self._task_snapshot = snapshot; self._pending_lazy_validation = False  # snapshots are written from validated tasks
+                tasks = snapshot.tasks(); logging.info(f"Loaded {len(tasks)} tasks from {task_snapshot.SNAPSHOT_FILE} (annotations and title history load on demand)."); return tasks
+            # Bring the task list up to the current schema; current-version files take the fast path
+            now_iso = datetime.now().isoformat(); local_time_str = task_dates.local_time_now(PH_TZ)
+            with task_model.gc_paused(): loaded_tasks, migrated = task_store.prepare_tasks(tasks_data, schema_version, now_iso, local_time_str)
+            if migrated: self.mark_tasks_changed(); logging.info(f"Tasks file migrated from schema version {schema_version} to {task_store.SCHEMA_VERSION}.")
+            self._pending_lazy_validation = (schema_version == task_store.SCHEMA_VERSION) and not (self._sharded_store is not None and self._sharded_store.validated)
+            logging.info(f"Loaded {len(loaded_tasks)} tasks from {self._storage_location()}. user_display_name: {getattr(self, 'user_display_name', None)}"); return task_model.tasks_from_json(loaded_tasks)
         except FileNotFoundError: logging.warning(f"{TASKS_FILE} not found. Starting with an empty task list."); return []
         except json.JSONDecodeError as e: logging.error(f"Error decoding {TASKS_FILE}: {e}. Starting empty.", exc_info=True); show_error_popup(f"Error reading tasks file:\n{TASKS_FILE}\nStarting with empty list."); return []
         except Exception as e: logging.error(f"Unexpected error loading tasks: {e}", exc_info=True); show_error_popup(f"Failed to load tasks.\nSee console for details.\nStarting empty list."); return []
 
-    def _initialize_subtasks(self, task):
-        """Recursively initialize subtasks with default values"""
-        if 'subtasks' not in task:
-            task['subtasks'] = []
-        
-        now_iso = datetime.now().isoformat()
-        for subtask in task['subtasks']:
-            subtask.setdefault('timer_running', False)
-            subtask.setdefault('completed', False)
-            subtask.setdefault('annotations', [])
-            subtask.setdefault('alarms', [])
-            subtask.setdefault('timer', 0)
-            subtask.setdefault('start_time_unix', None)
-            subtask.setdefault('due_date', None)
-            subtask.setdefault('icon', None)
-            subtask.setdefault('localTime', datetime.now(PH_TZ).strftime('%Y-%m-%d %H:%M:%S %Z'))
-            subtask.setdefault('createdAt', now_iso)
-            subtask.setdefault('titleHistory', [])
-            subtask.setdefault('subtasks', [])
-            
-            # Recursively initialize nested subtasks
-            self._initialize_subtasks(subtask)
-
     def add_subtask(self, parent_task, subtask_name):
         """Add a subtask to a parent task"""
         if not subtask_name or not subtask_name.strip():
@@ -798,10 +915,11 @@ class ProductivityApp(App):
         
         try:
             now_iso = datetime.now().isoformat()
-            new_subtask = {
+            new_subtask = task_model.Subtask.from_json({
+                'id': task_store.new_task_id(),
                 'task': subtask_name.strip(),
                 'timer': 0,
-                'localTime': datetime.now(PH_TZ).strftime('%Y-%m-%d %H:%M:%S %Z'),
+                'localTime': task_dates.local_time_now(PH_TZ),
                 'createdAt': now_iso,
                 'timer_running': False,
                 'start_time_unix': None,
@@ -812,14 +930,10 @@ class ProductivityApp(App):
                 'annotations': [],
                 'titleHistory': [{'title': subtask_name.strip(), 'timestamp': now_iso}],
                 'subtasks': []
-            }
-            
-            if 'subtasks' not in parent_task:
-                parent_task['subtasks'] = []
+            })
             
-            parent_task['subtasks'].append(new_subtask)
-            self.mark_tasks_changed()
-            self.update_task_view()
+            if not self._edit_subtasks(self.task_tree.add, parent_task, new_subtask):
+                return
             logging.info(f"Added subtask: {subtask_name} to parent task: {parent_task.get('task', 'Unknown')}")
             
         except Exception as e:
@@ -836,18 +950,18 @@ class ProductivityApp(App):
             subtask_to_delete = parent_task['subtasks'][subtask_index]
             subtask_name = subtask_to_delete.get('task', 'Unknown')
             
-            # Cancel any alarms for this subtask
-            for alarm in subtask_to_delete.get('alarms', []):
-                alarm_id = alarm.get('id')
-                if alarm_id:
-                    event = self.scheduled_alarms.pop(alarm_id, None)
-                    if event:
-                        event.cancel()
-                        logging.info(f"Cancelled alarm {alarm_id} for subtask being deleted.")
+            # Cancel any alarms for this subtask and the subtasks below it
+            for node in [subtask_to_delete] + [nested for nested, _ in self.task_tree.walk(subtask_to_delete)]:
+                for alarm in node.get('alarms', []):
+                    alarm_id = alarm.get('id')
+                    if alarm_id:
+                        event = self.scheduled_alarms.pop(alarm_id, None)
+                        if event:
+                            event.cancel()
+                            logging.info(f"Cancelled alarm {alarm_id} for subtask being deleted.")
             
-            del parent_task['subtasks'][subtask_index]
-            self.mark_tasks_changed()
-            self.update_task_view()
+            if not self._edit_subtasks(self.task_tree.remove, subtask_to_delete):
+                return
             logging.info(f"Deleted subtask: {subtask_name}")
             
         except Exception as e:
@@ -858,38 +972,100 @@ class ProductivityApp(App):
         """Toggle completion status of a subtask"""
         try:
             subtask['completed'] = not subtask.get('completed', False)
-            self.mark_tasks_changed()
-            self.update_task_view()
+            self.mark_tasks_changed(subtask)
+            self._refresh_task_rows([self.task_tree.root(subtask)])
             logging.info(f"Toggled subtask completion: {subtask.get('task', 'Unknown')} -> {subtask['completed']}")
         except Exception as e:
             logging.error(f"Error toggling subtask completion: {e}", exc_info=True)
             show_error_popup("Failed to toggle subtask completion.")
 
     def get_subtask_completion_stats(self, task):
-        """Get completion statistics for a task's subtasks"""
-        if 'subtasks' not in task or not task['subtasks']:
-            return 0, 0  # completed, total
-        
-        total = len(task['subtasks'])
-        completed = sum(1 for subtask in task['subtasks'] if subtask.get('completed', False))
-        return completed, total
+        """Get completion statistics for a task's subtasks, at every level"""
+        rollup = self.task_tree.rollup(task)
+        return rollup.completed, rollup.total
+
+    # --- Subtask tree ---
+    def _init_task_tree(self):
+        """Parent pointers and completion/time roll-ups of the subtask trees; mark_tasks_changed keeps them current."""
+        self.task_tree = task_tree.TaskTree(); self.task_tree.sync_tasks(self.tasks)
+        self._task_change_listeners.append(self._on_task_changed_tree)
+    def _on_task_changed_tree(self, task):
+        if task is None or not self.task_tree.mark(task): self.task_tree.sync_tasks(self.tasks)
+    def _edit_subtasks(self, edit, *args):
+        """Runs a task_tree edit, then marks and redraws only the top-level tasks it touched. False if it was refused."""
+        try: touched = edit(*args)
+        except ValueError as e: show_error_popup(str(e)); return False
+        for task in touched: self.mark_tasks_changed(task)
+        self._refresh_task_rows(touched); return True
+    def _refresh_task_rows(self, tasks):
+        """Rebuilds the rows of these top-level tasks in place, leaving the rest of the list alone."""
+        layout = getattr(self, 'task_list_layout', None)
+        if layout is None: return
+        for index, row in list(self.task_widgets.items()):
+            if index >= len(self.tasks) or row.parent is not layout or not any(self.tasks[index] is task for task in tasks): continue
+            new_row = self._create_task_row(index, self.tasks[index]); new_row.idx = index
+            position = layout.children.index(row); layout.remove_widget(row); layout.add_widget(new_row, index=position)
+            self.task_widgets[index] = new_row
+            info_layout = next((w for w in new_row.children if isinstance(w, BoxLayout) and hasattr(w, 'is_info_layout')), None)
+            timer_label = next((w for w in info_layout.children if isinstance(w, Label) and hasattr(w, 'is_timer_label')), None) if info_layout else None
+            if timer_label: self.timer_labels[index] = timer_label
+            button = next((w for w in new_row.children if isinstance(w, Button)), None)
+            if button and index == self.selected_index: self.update_task_row_style(index, new_row, button)
+    def _show_subtask_move_popup(self, subtask):
+        """Reorders a subtask among its siblings, indents or outdents it, or moves it (with its subtasks) to another task."""
+        title = subtask.get('task', 'Subtask')
+        content = BoxLayout(orientation='vertical', spacing=dp(8), padding=dp(10))
+        popup = Popup(title=f'Move {title[:30]}{"..." if len(title) > 30 else ""}', content=content, size_hint=(0.5, None), height=dp(360))
+        def run(edit, *args):
+            popup.dismiss(); self._edit_subtasks(edit, subtask, *args)
+        for text, edit, args in (('Move Up', self.task_tree.shift, (-1,)), ('Move Down', self.task_tree.shift, (1,)),
+                                 ('Indent (under the subtask above)', self.task_tree.demote, ()), ('Outdent (up one level)', self.task_tree.promote, ())):
+            button = Button(text=text, size_hint_y=None, height=dp(40)); button.bind(on_press=lambda b, e=edit, a=args: run(e, *a)); content.add_widget(button)
+        other_button = Button(text='Move to Another Task...', size_hint_y=None, height=dp(40))
+        other_button.bind(on_press=lambda b: (popup.dismiss(), self._show_subtask_target_popup(subtask))); content.add_widget(other_button)
+        cancel_button = Button(text='Cancel', size_hint_y=None, height=dp(40)); cancel_button.bind(on_press=popup.dismiss); content.add_widget(cancel_button)
+        popup.open()
+    def _show_subtask_target_popup(self, subtask):
+        current_root = self.task_tree.root(subtask)
+        content = BoxLayout(orientation='vertical', spacing=dp(8), padding=dp(10))
+        filter_input = TextInput(hint_text='Filter tasks...', multiline=False, size_hint_y=None, height=dp(40))
+        list_scroll = ScrollView(do_scroll_x=False, bar_width=dp(10))
+        list_layout = BoxLayout(orientation='vertical', spacing=dp(3), size_hint_y=None); list_layout.bind(minimum_height=list_layout.setter('height'))
+        list_scroll.add_widget(list_layout)
+        cancel_button = Button(text='Cancel', size_hint_y=None, height=dp(40))
+        content.add_widget(filter_input); content.add_widget(list_scroll); content.add_widget(cancel_button)
+        popup = Popup(title='Move under task', content=content, size_hint=(0.6, 0.8))
+        def show(*args):
+            list_layout.clear_widgets(); needle = filter_input.text.strip().casefold(); shown = 0
+            for task in self.tasks:
+                task_title = str(task.get('task', ''))
+                if task is current_root or (needle and needle not in task_title.casefold()): continue
+                if shown >= 100: list_layout.add_widget(Label(text='Type to narrow the list...', size_hint_y=None, height=dp(30))); break
+                button = Button(text=task_title, size_hint_y=None, height=dp(34), halign='left', valign='middle')
+                button.bind(size=lambda b, size: setattr(b, 'text_size', (size[0] - dp(10), None)))
+                button.bind(on_press=lambda b, target=task: (popup.dismiss(), self._edit_subtasks(self.task_tree.move, subtask, target))); list_layout.add_widget(button); shown += 1
+            if not shown: list_layout.add_widget(Label(text='No other tasks.', size_hint_y=None, height=dp(30)))
+        filter_input.bind(text=show); cancel_button.bind(on_press=popup.dismiss)
+        show(); popup.open()
 
     def _create_subtasks_container(self, parent_index, parent_task):
         """Create UI container for displaying and managing subtasks"""
         container = BoxLayout(orientation='vertical', size_hint_y=None, spacing=dp(1))
         container.bind(minimum_height=container.setter('height'))
         
-        # Add existing subtasks
-        for subtask_index, subtask in enumerate(parent_task.get('subtasks', [])):
-            subtask_row = self._create_subtask_row(parent_index, subtask_index, subtask, parent_task)
+        # Add existing subtasks at every level, indented by depth
+        for subtask, depth in self.task_tree.walk(parent_task):
+            parent = self.task_tree.parent(subtask) or parent_task
+            subtask_index = next(i for i, sibling in enumerate(parent['subtasks']) if sibling is subtask)
+            subtask_row = self._create_subtask_row(parent_index, subtask_index, subtask, parent, depth)
             container.add_widget(subtask_row)
         
         return container
 
-    def _create_subtask_row(self, parent_index, subtask_index, subtask, parent_task):
+    def _create_subtask_row(self, parent_index, subtask_index, subtask, parent_task, depth=1):
         """Create a single subtask row"""
         row = BoxLayout(orientation='horizontal', size_hint_y=None, height=dp(35), spacing=dp(5))
-        row.padding = (dp(30), dp(2), dp(5), dp(2))  # Indent subtasks
+        row.padding = (dp(30) + dp(20) * (depth - 1), dp(2), dp(5), dp(2))  # Indent subtasks
         
         # Completion checkbox
         checkbox = Button(
@@ -907,6 +1083,10 @@ class ProductivityApp(App):
         # Subtask title
         title = subtask.get('task', 'Untitled Subtask')
         title_display = f"[s]{title}[/s]" if subtask.get('completed', False) else title
+        rollup = self.task_tree.rollup(subtask)
+        if rollup.total: title_display += f" ({rollup.completed}/{rollup.total})"
+        tags = tag_index.tags_of(subtask)
+        if tags: title_display += f"[size={int(dp(10))}]{''.join(f'  #{tag}' for tag in tags)}[/size]"
         
         subtask_label = Label(
             text=title_display,
@@ -943,6 +1123,26 @@ class ProductivityApp(App):
         add_nested_btn.bind(on_press=add_nested_subtask_action)
         row.add_widget(add_nested_btn)
         
+        # Tags button
+        tags_btn = Button(
+            text='#',
+            size_hint=(None, None),
+            size=(dp(25), dp(25)),
+            background_color=(0.9, 0.9, 0.7, 1)
+        )
+        tags_btn.bind(on_press=lambda instance: self._show_tags_popup(subtask))
+        row.add_widget(tags_btn)
+        
+        # Move / indent / outdent button
+        move_btn = Button(
+            text='...',
+            size_hint=(None, None),
+            size=(dp(25), dp(25)),
+            background_color=(0.85, 0.85, 0.85, 1)
+        )
+        move_btn.bind(on_press=lambda instance: self._show_subtask_move_popup(subtask))
+        row.add_widget(move_btn)
+        
         return row
 
     def _show_add_subtask_popup(self, parent_task):
@@ -998,102 +1198,271 @@ class ProductivityApp(App):
     def save_tasks(self, force=False):
         # Always save meta (colors, date_colors) and tasks
         if not self.tasks_changed and not force: return
-        tasks_to_save = []
-        for idx, task in enumerate(self.tasks):
-            task_copy = task.copy()
-            # Debug logging for growth-prone fields
-            logging.debug(f"Task {idx}: titleHistory={len(task_copy.get('titleHistory', []))}, annotations={len(task_copy.get('annotations', []))}, alarms={len(task_copy.get('alarms', []))}")
-            if not isinstance(task_copy.get('timer'), (int, float)): task_copy['timer'] = 0
-            if not isinstance(task_copy.get('start_time_unix'), (int, float, type(None))): task_copy['start_time_unix'] = None
-            if not isinstance(task_copy.get('annotations'), list): task_copy['annotations'] = []
-            if not isinstance(task_copy.get('alarms'), list): task_copy['alarms'] = []
-            if not isinstance(task_copy.get('due_date'), (str, type(None))): task_copy['due_date'] = None
-            if not isinstance(task_copy.get('icon'), (str, type(None))): task_copy['icon'] = None
-            if not isinstance(task_copy.get('completed'), bool): task_copy['completed'] = False
-            if not isinstance(task_copy.get('titleHistory'), list): task_copy['titleHistory'] = []
-            tasks_to_save.append(task_copy)
+        if self._newer_schema_version is not None: logging.warning(f"Not saving tasks: {self._storage_location()} has the newer schema_version {self._newer_schema_version}."); return
+        for task in self.tasks:
+            if not task.get('id'): task['id'] = task_store.new_task_id()
+        if self._sharded_store is not None:
+            # Only the shards holding changed tasks are serialized and written
+            try:
+                written = self._sharded_store.save_tasks(self.tasks, self._task_to_save)
+                logging.info(f"Saved tasks to {self._sharded_store.path} ({written} shards rewritten)."); self.tasks_changed = False; self._flush_cold_annotations()
+                self._backup_tasks(dict(self._tasks_meta, schema_version=task_store.SCHEMA_VERSION))
+            except Exception as e: logging.error(f"Error saving task shards: {e}", exc_info=True); show_error_popup(f"Error saving tasks:\n{e}")
+            return
+        if self._sqlite_store is not None:
+            # Only the tasks marked changed are serialized and fingerprinted
+            try:
+                written = self._sqlite_store.save_tasks(self.tasks, self._task_to_save); self._sqlite_store.set_meta('schema_version', task_store.SCHEMA_VERSION)
+                logging.info(f"Saved tasks to {self._sqlite_store.path} ({written} rows written)."); self.tasks_changed = False; self._flush_cold_annotations()
+                self._backup_tasks(dict(self._tasks_meta, schema_version=task_store.SCHEMA_VERSION))
+            except Exception as e: logging.error(f"Error saving tasks to SQLite: {e}", exc_info=True); show_error_popup(f"Error saving tasks:\n{e}")
+            return
         temp_file = TASKS_FILE + '.tmp'
         try:
-            # Load all meta fields from existing file, if present
-            meta = {}
-            if os.path.exists(TASKS_FILE):
-                with open(TASKS_FILE, 'r', encoding='utf-8') as f:
-                    try:
-                        meta = json.load(f)
-                        if isinstance(meta, list): meta = {}
-                    except Exception: meta = {}
-            # Always preserve all meta fields except tasks
-            meta_keys_before = list(meta.keys())
-            meta['tasks'] = tasks_to_save
+            # Meta fields loaded with the tasks are preserved; unchanged tasks are written from their cached fragments
+            meta = dict(self._tasks_meta, schema_version=task_store.SCHEMA_VERSION)
+            pretty = json_codec.pretty_json_enabled(); cache = self._fragment_cache; cache.begin_save(self.tasks)
+            encode = lambda task: task_fragments.encode_task(self._task_to_save(task), pretty)
+            fragments = [cache.fragment(task, ('task', pretty), encode) for task in self.tasks]
             with open(temp_file, 'w', encoding='utf-8') as f:
-                json.dump(meta, f, ensure_ascii=False, indent=2)
+                task_fragments.write_document(f, meta, fragments, pretty)
             if platform == 'win' and os.path.exists(TASKS_FILE):
                 try: os.remove(TASKS_FILE)
                 except OSError as e: logging.error(f"Error removing old tasks file: {e}")
             os.replace(temp_file, TASKS_FILE)
-            logging.info(f"Saved {len(tasks_to_save)} tasks to {TASKS_FILE}. Meta fields preserved: {meta_keys_before}"); self.tasks_changed = False
+            logging.info(f"Saved {len(self.tasks)} tasks to {TASKS_FILE} ({cache.encoded} re-encoded). Meta fields preserved: {list(meta)}"); self.tasks_changed = False; self._flush_cold_annotations()
+            self._snapshot_stale = True; self._backup_tasks(meta, fragments); cache.end_save(self.tasks)
         except Exception as e: logging.error(f"Error saving tasks: {e}", exc_info=True); show_error_popup(f"Error saving tasks:\n{e}");
         if os.path.exists(temp_file):
             try: os.remove(temp_file)
             except OSError: pass
 
+    def _flush_cold_annotations(self):
+        """Appends the annotations retention moved out of the tasks to the cold file, once those tasks are saved."""
+        if not self._pending_cold_annotations: return
+        try: retention.append_cold_annotations(self._pending_cold_annotations); self._pending_cold_annotations = ()
+        except OSError as e: logging.error(f"Writing {retention.COLD_ANNOTATIONS_FILE} failed (retried on the next save): {e}", exc_info=True)
+
+    # --- Backups ---
+    def _init_backups(self):
+        self._backup_store = None
+        if not backup_store.backups_enabled(): return
+        try: self._backup_store = backup_store.BackupStore(backup_store.BACKUP_FOLDER)
+        except OSError as e: logging.error(f"Backups disabled, could not open {backup_store.BACKUP_FOLDER}: {e}", exc_info=True)
+
+    def _backup_tasks(self, meta, fragments=None):
+        """Adds the tasks just saved to the backups; only chunks of changed tasks are written."""
+        if self._backup_store is None: return
+        try:
+            if fragments is None:
+                # SQLite and sharded saves do not encode whole tasks, so encode them here through the fragment cache
+                cache = self._fragment_cache; cache.begin_save(self.tasks)
+                encode = lambda task: task_fragments.encode_task(self._task_to_save(task), False)
+                fragments = [cache.fragment(task, ('task', False), encode) for task in self.tasks]; cache.end_save(self.tasks)
+            self._backup_store.snapshot(meta, zip((task.get('id') for task in self.tasks), fragments))
+        except Exception as e: logging.error(f"Backup failed: {e}", exc_info=True)
+
+    def _restore_backup(self, name):
+        """Replaces the task list with a backup; the current tasks are backed up first, so a restore can be undone."""
+        try: meta, tasks_data = self._backup_store.restore(name)
+        except (OSError, ValueError) as e: logging.error(f"Restoring backup {name} failed: {e}", exc_info=True); show_error_popup(f"Could not restore backup:\n{e}"); return False
+        self.save_tasks(force=True)
+        now_iso = datetime.now().isoformat(); local_time_str = task_dates.local_time_now(PH_TZ)
+        _, _, version = task_store.split_document(meta)  # backups taken before a schema change are migrated
+        restored, _ = task_store.prepare_tasks(tasks_data, version, now_iso, local_time_str)
+        for event in self.scheduled_alarms.values(): event.cancel()
+        self.scheduled_alarms.clear()
+        self.tasks = task_model.tasks_from_json(restored); self.selected_index = None
+        if self._time_log is not None: self._time_log.seed(self.tasks, time.time())
+        self._reschedule_pending_alarms()
+        self.mark_tasks_changed(); self.save_tasks(force=True); self.update_task_view()
+        logging.info(f"Restored {len(self.tasks)} tasks from backup {name}."); return True
+
+    def report_gui(self, instance):
+        """Productivity report from the rollups: time per day or week, per task and per category, completions and subtask progress."""
+        from kivy.uix.progressbar import ProgressBar
+        if self._rollups is None: show_error_popup("The report needs the time-tracking session log, which could not be opened."); return
+        ranges = {'This week': 'week', 'Last 4 weeks': '4weeks', 'This month': 'month', 'This year': 'year'}
+        content = BoxLayout(orientation='vertical', spacing=dp(8), padding=dp(10))
+        range_spinner = Spinner(text='This week', values=list(ranges), size_hint=(None, None), size=(dp(160), dp(40)))
+        report_scroll = ScrollView(do_scroll_x=False, bar_width=dp(10))
+        report_layout = BoxLayout(orientation='vertical', spacing=dp(3), size_hint_y=None); report_layout.bind(minimum_height=report_layout.setter('height'))
+        report_scroll.add_widget(report_layout)
+        close_button = Button(text='Close', size_hint_y=None, height=dp(40))
+        content.add_widget(range_spinner); content.add_widget(report_scroll); content.add_widget(close_button)
+        popup = Popup(title='Productivity Report', content=content, size_hint=(0.7, 0.9))
+
+        def add_row(text, value='', fraction=None, bold=False):
+            row = BoxLayout(size_hint_y=None, height=dp(26), spacing=dp(5))
+            label = Label(text=f"[b]{text}[/b]" if bold else text, markup=bold, halign='left', valign='middle', shorten=True, size_hint_x=0.45)
+            label.bind(size=lambda l, size: setattr(l, 'text_size', size)); row.add_widget(label)
+            row.add_widget(Label(text=value, size_hint_x=0.2))
+            row.add_widget(ProgressBar(max=1, value=fraction, size_hint_x=0.35) if fraction is not None else Label(size_hint_x=0.35))
+            report_layout.add_widget(row)
+
+        def show(range_name):
+            report_layout.clear_widgets(); today = datetime.now().date(); kind = ranges[range_name]
+            if kind == 'week': first, by = rollups.week_start(today), 'day'
+            elif kind == '4weeks': first, by = rollups.week_start(today) - timedelta(weeks=3), 'week'
+            elif kind == 'month': first, by = today.replace(day=1), 'day'
+            else: first, by = today.replace(month=1, day=1), 'week'
+            summary = self._rollups.summary(first, today)
+            # The running timers' current intervals are not sessions yet
+            now_unix = time.time(); tasks_by_id = {task.get('id'): task for task in self.tasks}
+            for task in self.tasks:
+                if task.get('timer_running') and isinstance(task.get('start_time_unix'), (int, float)):
+                    running = max(0.0, now_unix - max(task['start_time_unix'], datetime.combine(first, datetime.min.time()).timestamp()))
+                    summary['seconds'] += running; summary['tasks'][task.get('id')] = summary['tasks'].get(task.get('id'), 0.0) + running
+            subtasks_done, subtasks_total = self.task_tree.subtask_totals()
+            add_row(f"{first.strftime('%d %b %Y')} - {today.strftime('%d %b %Y')}", bold=True)
+            add_row('Tracked time', format_timedelta(summary['seconds'])); add_row('Tasks completed', str(summary['completed']))
+            add_row('Subtasks done (current tasks)', f"{subtasks_done}/{subtasks_total}", subtasks_done / subtasks_total if subtasks_total else None)
+            series = self._rollups.series(first, today, by); longest = max((seconds for _, seconds, _ in series), default=0) or 1
+            add_row('Per day' if by == 'day' else 'Per week', bold=True)
+            for start, seconds, completed in series:
+                label = start.strftime('%a %d %b') if by == 'day' else f"Week of {start.strftime('%d %b')}"
+                add_row(f"{label}  ({completed} completed)", format_timedelta(seconds), seconds / longest)
+            per_task = sorted(summary['tasks'].items(), key=lambda item: -item[1]); longest = per_task[0][1] if per_task else 1
+            add_row('Per task', bold=True)
+            for task_id, seconds in per_task[:20]:
+                title = tasks_by_id[task_id].get('task', '') if task_id in tasks_by_id else self._rollups.names.get(task_id, 'Deleted task')
+                add_row(title, format_timedelta(seconds), seconds / longest)
+            per_category = {}
+            for task_id, seconds in summary['tasks'].items():
+                category = rollups.category_of(tasks_by_id[task_id]) if task_id in tasks_by_id else 'Deleted or archived'
+                per_category[category] = per_category.get(category, 0.0) + seconds
+            add_row('Per category (task icon)', bold=True); longest = max(per_category.values(), default=0) or 1
+            for category, seconds in sorted(per_category.items(), key=lambda item: -item[1]):
+                add_row(category, format_timedelta(seconds), seconds / longest)
+            if not per_task: add_row('No time tracked in this period.')
+
+        range_spinner.bind(text=lambda spinner, text: show(text)); close_button.bind(on_press=popup.dismiss)
+        show(range_spinner.text); popup.open()
+
+    def year_heatmap_gui(self, instance):
+        """Year heatmap of tracked time or completed tasks per day; clicking a day shows its month in the calendar."""
+        if self._rollups is None: show_error_popup("The year view needs the time-tracking session log, which could not be opened."); return
+        metrics = {'Tracked time': 'seconds', 'Completed tasks': 'completed'}
+        content = BoxLayout(orientation='vertical', spacing=dp(8), padding=dp(10))
+        header = BoxLayout(size_hint_y=None, height=dp(40), spacing=dp(5))
+        prev_button = Button(text='<', size_hint_x=None, width=dp(40)); next_button = Button(text='>', size_hint_x=None, width=dp(40))
+        year_label = Label(text=str(datetime.now().year), bold=True)
+        metric_spinner = Spinner(text='Tracked time', values=list(metrics), size_hint_x=None, width=dp(160))
+        for widget in (prev_button, year_label, next_button, metric_spinner): header.add_widget(widget)
+        heatmap = YearHeatmap(datetime.now().year, self._rollups.series, empty_color=(0.3, 0.3, 0.3, 1), text_color=(0.9, 0.9, 0.9, 1))
+        summary_label = Label(size_hint_y=None, height=dp(30))
+        close_button = Button(text='Close', size_hint_y=None, height=dp(40))
+        for widget in (header, heatmap, summary_label, close_button): content.add_widget(widget)
+        popup = Popup(title='Year View', content=content, size_hint=(0.9, 0.6))
+
+        def show(year=None, metric=None):
+            if year is not None: heatmap.year = year
+            if metric is not None: heatmap.metric = metrics[metric]
+            heatmap.refresh(); year_label.text = str(heatmap.year)
+            summary = self._rollups.summary(datetime(heatmap.year, 1, 1).date(), datetime(heatmap.year, 12, 31).date())
+            active = sum(1 for level in heatmap.levels.values() if level)
+            summary_label.text = f"{format_timedelta(summary['seconds'])} tracked, {summary['completed']} tasks completed, {active} active days"
+        def open_day(day):
+            popup.dismiss(); self._show_calendar_month(day.year, day.month)
+        heatmap.on_day = open_day
+        prev_button.bind(on_press=lambda b: show(year=heatmap.year - 1)); next_button.bind(on_press=lambda b: show(year=heatmap.year + 1))
+        metric_spinner.bind(text=lambda spinner, text: show(metric=text)); close_button.bind(on_press=popup.dismiss)
+        show(); popup.open()
+
+    def backups_gui(self, instance):
+        """Restore picker: the kept backups, newest first, each with a Restore button."""
+        if self._backup_store is None: show_error_popup("Backups are turned off (BACKUPS=false in .env)."); return
+        self.save_tasks()  # so the newest backup matches what is on screen
+        content = BoxLayout(orientation='vertical', spacing=dp(8), padding=dp(10))
+        list_scroll = ScrollView(do_scroll_x=False, bar_width=dp(10))
+        list_layout = BoxLayout(orientation='vertical', spacing=dp(3), size_hint_y=None); list_layout.bind(minimum_height=list_layout.setter('height'))
+        list_scroll.add_widget(list_layout)
+        close_button = Button(text='Close', size_hint_y=None, height=dp(40))
+        content.add_widget(list_scroll); content.add_widget(close_button)
+        popup = Popup(title='Backups', content=content, size_hint=(0.6, 0.8))
+        snapshots = self._backup_store.list_snapshots()
+        if not snapshots: list_layout.add_widget(Label(text='No backups yet.', size_hint_y=None, height=dp(30)))
+        for name, created, count in snapshots:
+            row = BoxLayout(size_hint_y=None, height=dp(36), spacing=dp(5))
+            label = Label(text=f"{created.strftime('%a %d %b %Y  %H:%M:%S')}   ({count} tasks)", halign='left', valign='middle', size_hint_x=0.75)
+            label.bind(size=lambda l, size: setattr(l, 'text_size', size))
+            restore_button = Button(text='Restore', size_hint_x=0.25)
+            restore_button.bind(on_press=lambda b, n=name, c=created: restore(n, c))
+            row.add_widget(label); row.add_widget(restore_button); list_layout.add_widget(row)
+        def restore(name, created):
+            if self._restore_backup(name): popup.dismiss(); show_confirmation_popup(f"Tasks restored from the backup of {created.strftime('%d %b %Y %H:%M:%S')}.")
+        close_button.bind(on_press=popup.dismiss)
+        popup.open()
+
+    def _task_to_save(self, task):
+        """JSON-ready copy of a task with the growth-prone and typed fields sanitized."""
+        task_copy = task.to_json() if isinstance(task, task_model.Record) else task.copy()
+        # Debug logging for growth-prone fields
+        logging.debug(f"Task {task_copy.get('id')}: titleHistory={len(task_copy.get('titleHistory', []))}, annotations={len(task_copy.get('annotations', []))}, alarms={len(task_copy.get('alarms', []))}")
+        if not isinstance(task_copy.get('timer'), (int, float)): task_copy['timer'] = 0
+        if not isinstance(task_copy.get('start_time_unix'), (int, float, type(None))): task_copy['start_time_unix'] = None
+        if not isinstance(task_copy.get('annotations'), list): task_copy['annotations'] = []
+        if not isinstance(task_copy.get('alarms'), list): task_copy['alarms'] = []
+        if not isinstance(task_copy.get('due_date'), (str, type(None))): task_copy['due_date'] = None
+        if not isinstance(task_copy.get('icon'), (str, type(None))): task_copy['icon'] = None
+        if not isinstance(task_copy.get('completed'), bool): task_copy['completed'] = False
+        if not isinstance(task_copy.get('titleHistory'), list): task_copy['titleHistory'] = []
+        return task_copy
+
+    def _write_task_snapshot(self):
+        """
+        Refreshes broadcasts/tasks.snapshot so the next start can load lazily.
+        Called when idle and on close rather than after every save; only
+        tasks changed since the last snapshot have their summary re-encoded.
+        """
+        if not self._snapshot_stale or self.tasks_changed or not task_snapshot.snapshot_enabled(): return  # unsaved changes: tasks.json would not match
+        if self._newer_schema_version is not None: return  # a snapshot would pass the file off as the current schema
+        meta = dict(self._tasks_meta, schema_version=task_store.SCHEMA_VERSION)
+        summary = lambda task: self._fragment_cache.fragment(task, 'snapshot', task_snapshot.encode_summary)
+        try: self._task_snapshot = task_snapshot.write_snapshot(self.tasks, meta, task_snapshot.source_stamp(TASKS_FILE), task_store.SCHEMA_VERSION, summary=summary); self._snapshot_stale = False
+        except Exception as e: logging.warning(f"Could not write task snapshot (next start does a full load): {e}", exc_info=True)
+
     def save_tasks_periodically(self, dt): 
         # Performance optimization: only save if data has actually changed
         if self.tasks_changed:
             self.save_tasks(force=False)
-        # Save gratitude entries less frequently to reduce I/O
-        if hasattr(self, '_last_gratitude_save'):
-            if time.time() - self._last_gratitude_save > 600:  # Save every 10 minutes
-                self.save_gratitude_entries()
-                self._last_gratitude_save = time.time()
-        else:
-            self.save_gratitude_entries()
-            self._last_gratitude_save = time.time()
+        else: self._write_task_snapshot()  # idle since the last save
+        # New gratitude entries are already in the journal log; this only folds finished days into month files
+        self.save_gratitude_entries(force=False)
+        self._save_rollups()
         
     # --- Gratitude Journal Methods ---
     def load_gratitude_entries(self):
-        """Load gratitude entries from file"""
-        gratitude_file = os.path.join('broadcasts', 'gratitude.json')
+        """Opens the gratitude journal: only the dates with entries are read now, entry text on demand"""
+        gratitude_folder = gratitude_store.GRATITUDE_FOLDER
         try:
-            if os.path.exists(gratitude_file):
-                with open(gratitude_file, 'r') as file:
-                    entries = json.load(file)
-                    logging.info(f"Loaded {len(entries)} gratitude entries from {gratitude_file}")
-                    return entries
-            else:
-                logging.info(f"{gratitude_file} not found. Starting with empty gratitude journal.")
-                return {}
+            if self._sqlite_store is not None:
+                entries = self._sqlite_store.load_gratitude()
+                logging.info(f"Loaded {len(entries)} gratitude entries from {self._sqlite_store.path}")
+                return gratitude_store.GratitudeJournal(None, entries)
+            journal = gratitude_store.GratitudeJournal(gratitude_folder)
+            logging.info(f"Gratitude journal in {gratitude_folder} has entries on {len(journal)} days.")
+            return journal
         except json.JSONDecodeError as e:
-            logging.error(f"Error decoding {gratitude_file}: {e}. Starting empty.", exc_info=True)
-            show_error_popup(f"Error reading gratitude file:\n{gratitude_file}\nStarting with empty journal.")
-            return {}
+            logging.error(f"Error decoding gratitude journal in {gratitude_folder}: {e}. Starting empty.", exc_info=True)
+            show_error_popup(f"Error reading gratitude journal:\n{gratitude_folder}\nStarting with empty journal.")
+            return gratitude_store.GratitudeJournal(None)
         except Exception as e:
             logging.error(f"Unexpected error loading gratitude entries: {e}", exc_info=True)
             show_error_popup(f"Failed to load gratitude entries.\nSee console for details.\nStarting empty journal.")
-            return {}
+            return gratitude_store.GratitudeJournal(None)
     
-    def save_gratitude_entries(self):
-        """Save gratitude entries to file"""
-        gratitude_file = os.path.join('broadcasts', 'gratitude.json')
+    def save_gratitude_entries(self, force=True):
+        """Writes gratitude changes, if any: logged entries are folded into month files (only finished days unless force)"""
+        journal = self.gratitude_entries
         try:
-            temp_file = gratitude_file + '.tmp'
-            with open(temp_file, 'w') as file:
-                json.dump(self.gratitude_entries, file, indent=4)
-            if platform == 'win' and os.path.exists(gratitude_file):
-                try:
-                    os.remove(gratitude_file)
-                except OSError as e:
-                    logging.error(f"Error removing old gratitude file: {e}")
-            os.replace(temp_file, gratitude_file)
-            logging.info(f"Saved {len(self.gratitude_entries)} gratitude entries to {gratitude_file}.")
+            if self._sqlite_store is not None:
+                if journal.changed: self._sqlite_store.save_gratitude(journal.to_dict()); journal.changed = False
+                return
+            journal.save(force=force)
         except Exception as e:
             logging.error(f"Error saving gratitude entries: {e}", exc_info=True)
             show_error_popup(f"Error saving gratitude entries:\n{e}")
-            if os.path.exists(temp_file):
-                try:
-                    os.remove(temp_file)
-                except OSError:
-                    pass
     
     def add_gratitude_entry(self, text):
         """Add a new gratitude entry for the current day"""
@@ -1106,21 +1475,19 @@ class ProductivityApp(App):
             today = datetime.now().strftime('%Y-%m-%d')
             timestamp = datetime.now().isoformat()
             
-            # Initialize the day's entries if it doesn't exist
-            if today not in self.gratitude_entries:
-                self.gratitude_entries[today] = []
-            
-            # Add the new entry
+            # Add the new entry (appended to the journal log right away)
             entry = {
                 'text': text.strip(),
                 'timestamp': timestamp
             }
             
-            self.gratitude_entries[today].append(entry)
+            self.gratitude_entries.add(today, entry)
+            if self.search_index is not None: self.search_index.index_gratitude_day(today, self.gratitude_entries[today])
             logging.info(f"Added gratitude entry for {today}")
             
             # Update the calendar to show the new entry
             if hasattr(self, 'calendar_widget'):
+                self.calendar_widget.models.invalidate(int(today[:4]), int(today[5:7]))
                 self.calendar_widget.populate_calendar()
                 
             return True
@@ -1128,14 +1495,391 @@ class ProductivityApp(App):
             logging.error(f"Error adding gratitude entry: {e}", exc_info=True)
             show_error_popup(f"Failed to add gratitude entry:\n{e}")
             return False
-    def mark_tasks_changed(self):
+    def _schedule_lazy_task_validation(self):
+        """Validates tasks trusted by the fast load path a batch per frame once the UI is up."""
+        now_iso = datetime.now().isoformat(); local_time_str = task_dates.local_time_now(PH_TZ)
+        validator = task_store.iter_lazy_validation(self.tasks, now_iso, local_time_str)
+        self._lazy_validation_repaired = 0
+        def validate_batch(dt):
+            try: self._lazy_validation_repaired += next(validator)
+            except StopIteration:
+                if self._lazy_validation_repaired: logging.info(f"Deferred validation repaired {self._lazy_validation_repaired} tasks."); self.mark_tasks_changed(); self.update_task_view()
+                return False
+            except Exception as e: logging.error(f"Deferred task validation failed: {e}", exc_info=True); return False
+        Clock.schedule_interval(validate_batch, 0)
+    def mark_tasks_changed(self, task=None):
+        """Flags tasks for saving. task is the task that changed, or None for structural/unknown changes."""
         if not self.tasks_changed: self.tasks_changed = True
+        for listener in self._task_change_listeners: listener(task)
+
+    # --- Search Index ---
+    def _init_search_index(self):
+        """Builds the full-text index a batch per frame; afterwards mark_tasks_changed keeps it current."""
+        self.search_index = search_index.SearchIndex()
+        self._search_resync_trigger = Clock.create_trigger(self._resync_search_index, 0.2); self._search_resync_event = None
+        self._task_change_listeners.append(self._on_task_changed_search)
+        if os.path.exists(retention.COLD_ANNOTATIONS_FILE):
+            import threading
+            def load_cold():
+                try: texts = retention.load_cold_texts()
+                except OSError as e: logging.error(f"Reading cold storage for search failed: {e}"); return
+                Clock.schedule_once(lambda dt: self.search_index.add_cold_texts(texts))
+            threading.Thread(target=load_cold, daemon=True).start()
+        # Lazily loaded tasks are indexed on the first search rather than decoding every annotation at startup
+        self._search_index_deferred = self._task_snapshot is not None
+        if self._search_index_deferred: return
+        def finish():
+            self._index_gratitude_in_background()
+            logging.info(f"Search index ready with {len(self.search_index)} task documents; gratitude months follow.")
+        self._index_tasks_in_batches(self.search_index, finish)
+    def _index_gratitude_in_background(self):
+        """Reads the gratitude month files on a worker thread, newest first, and indexes one month per frame."""
+        import threading
+        journal = self.gratitude_entries; months = journal.months()  # the worker reads month files only, never the journal's own state
+        def apply(month, days):
+            if self.gratitude_entries is not journal: return  # the journal was replaced (backend switch)
+            for date, entries in journal.with_unsaved(month, days).items(): self.search_index.index_gratitude_day(date, entries)
+        def worker():
+            for month in months:
+                try: days = journal.read_month(month)
+                except (OSError, ValueError) as e: logging.error(f"Indexing gratitude month {month} failed: {e}"); continue
+                Clock.schedule_once(lambda dt, month=month, days=days: apply(month, days))
+        threading.Thread(target=worker, daemon=True).start()
+    def _index_tasks_in_batches(self, index, finish, batch_size=200):
+        """Feeds the current tasks to index.index_task a batch per frame, then calls finish(). Returns the Clock event."""
+        batches = [self.tasks[i:i + batch_size] for i in range(0, len(self.tasks), batch_size)]; batches.reverse()
+        def index_batch(dt):
+            if batches:
+                for task in batches.pop(): index.index_task(task)
+                return True
+            finish(); return False
+        return Clock.schedule_interval(index_batch, 0)
+    def _ensure_search_index(self):
+        if not self._search_index_deferred: return
+        self._search_index_deferred = False
+        self.search_index.sync_tasks(self.tasks); self._index_gratitude_in_background()
+        logging.info(f"Search index ready with {len(self.search_index)} task documents; gratitude months follow.")
+    def _on_task_changed_search(self, task):
+        if self._search_index_deferred: return
+        if task is None or not self.search_index.index_node(task): self._search_resync_trigger()
+    def _resync_search_index(self, dt=None):
+        """
+        After a structural change: deleted tasks are dropped right away, the
+        rest is re-checked a batch per frame like the initial build (unchanged
+        tasks are skipped by their signature). A newer resync replaces one still running.
+        """
+        self.search_index.remove_missing(self.tasks)
+        if self._search_resync_event is not None: self._search_resync_event.cancel()
+        def finish(): self._search_resync_event = None
+        self._search_resync_event = self._index_tasks_in_batches(self.search_index, finish)
+    def _init_quick_switcher(self):
+        """Trigram index over task/subtask titles for the Ctrl+K switcher, maintained like the search index."""
+        self.switcher_index = quick_switcher.QuickSwitcherIndex()
+        self._switcher_resync_trigger = Clock.create_trigger(self._resync_switcher_index, 0.2)
+        self._task_change_listeners.append(self._on_task_changed_switcher)
+        def finish(): self._switcher_resync_event = None
+        self._switcher_resync_event = self._index_tasks_in_batches(self.switcher_index, finish)  # a resync replaces it, dropping deleted tasks
+    def _resync_switcher_index(self, dt=None):
+        """Like _resync_search_index: deleted tasks go right away, the rest is re-checked a batch per frame."""
+        self.switcher_index.remove_missing(self.tasks)
+        if self._switcher_resync_event is not None: self._switcher_resync_event.cancel()
+        def finish(): self._switcher_resync_event = None
+        self._switcher_resync_event = self._index_tasks_in_batches(self.switcher_index, finish)
+    def _on_task_changed_switcher(self, task):
+        if task is None or not self.switcher_index.index_node(task): self._switcher_resync_trigger()
+    # --- Tags ---
+    def _init_tag_index(self):
+        """Tag -> task/subtask id index; registered before the task views, whose tag queries read it."""
+        self.tag_index = tag_index.TagIndex(); self.tag_index.sync_tasks(self.tasks)
+        self._task_change_listeners.append(self._on_task_changed_tags)
+    def _on_task_changed_tags(self, task):
+        # Unlike the search index this updates right away: only tags are compared, and views built next read it
+        if task is None: self.tag_index.sync_tasks(self.tasks); return
+        if self.tag_index.index_node(task): return
+        # Not indexed yet: index the tree it belongs to (the task tree, updated first, knows new subtasks)
+        root = self.task_tree.root(task)
+        if root is None and not isinstance(task, task_model.Subtask): root = task
+        if root is not None: self.tag_index.index_task(root)
+    def set_tags_gui(self, instance):
+        if self.selected_index is None: show_error_popup("Select a task first."); return
+        if not (0 <= self.selected_index < len(self.tasks)): return
+        self._show_tags_popup(self.tasks[self.selected_index])
+    def _show_tags_popup(self, node):
+        """Edits the tags of a task or subtask, suggesting tags in use for the one being typed."""
+        title = node.get('task', 'Task')
+        content = BoxLayout(orientation='vertical', spacing=dp(10), padding=dp(10))
+        content.add_widget(Label(text="Tags, separated by spaces or commas:", size_hint_y=None, height=dp(25)))
+        tags_input = TextInput(text=' '.join(tag_index.tags_of(node)), hint_text='work, home, errands', multiline=False, size_hint_y=None, height=dp(40))
+        suggestions = BoxLayout(size_hint_y=None, height=dp(35), spacing=dp(5))
+        button_row = BoxLayout(size_hint_y=None, height=dp(40), spacing=dp(10))
+        save_button = Button(text='Save'); cancel_button = Button(text='Cancel')
+        button_row.add_widget(save_button); button_row.add_widget(cancel_button)
+        content.add_widget(tags_input); content.add_widget(suggestions); content.add_widget(button_row)
+        popup = Popup(title=f'Tags for: {title[:30]}{"..." if len(title) > 30 else ""}', content=content, size_hint=(None, None), size=(dp(450), dp(230)), auto_dismiss=False)
+        def typed():
+            words = tags_input.text.replace(',', ' ').split(' ')
+            return words[:-1], words[-1]
+        def accept(tag):
+            words, _ = typed(); tags_input.text = ' '.join(word for word in words if word) + (' ' if any(words) else '') + tag + ' '
+            tags_input.focus = True
+        def suggest(*args):
+            suggestions.clear_widgets()
+            words, prefix = typed(); entered = set(tag_index.normalize_tags(words))
+            for tag in [tag for tag in self.tag_index.complete(prefix, limit=8) if tag not in entered][:4]:
+                suggestions.add_widget(Button(text=f"#{tag} ({self.tag_index.count(tag)})", on_press=lambda b, t=tag: accept(t)))
+        def save(*args):
+            tags = tag_index.parse_tags(tags_input.text)
+            if tags == tag_index.tags_of(node): popup.dismiss(); return
+            if tags: node['tags'] = tags
+            elif 'tags' in node: del node['tags']
+            self.mark_tasks_changed(node); logging.info(f"Set tags of '{title}' to {tags}")
+            popup.dismiss(); self.update_task_view()
+        tags_input.bind(text=suggest, on_text_validate=save)
+        save_button.bind(on_press=save); cancel_button.bind(on_press=popup.dismiss)
+        suggest(); popup.open(); tags_input.focus = True
+    # --- Dependencies ---
+    def _init_task_deps(self):
+        """Blocked-by graph and ready set; registered before the task views, whose 'ready' filter reads it."""
+        self.task_deps = task_deps.DependencyGraph(); self.task_deps.sync_tasks(self.tasks)
+        self._task_change_listeners.append(self._on_task_changed_deps)
+    def _on_task_changed_deps(self, task):
+        if task is None: self.task_deps.sync_tasks(self.tasks); return
+        if isinstance(task, task_model.Subtask): return  # links are between top-level tasks
+        changed = self.task_deps.update_task(task); changed.discard(task.get('id'))
+        if not changed or self.task_views is None: return
+        # Dependents that became ready or blocked: the Next up queue and views filtering on 'ready' re-key them, and their rows show it
+        for task_id in changed:
+            dependent = self.task_deps.task(task_id)
+            if dependent is None: continue
+            self.task_views.mark(dependent); self._on_task_changed_next_up(dependent)
+        self._view_refresh_trigger()
+    def blocked_by_gui(self, instance):
+        """Picks the tasks the selected task waits for; links that would close a cycle are refused."""
+        if self.selected_index is None: show_error_popup("Select a task first."); return
+        if not (0 <= self.selected_index < len(self.tasks)): return
+        task = self.tasks[self.selected_index]; task_id = task.get('id'); title = task.get('task', 'Task')
+        content = BoxLayout(orientation='vertical', spacing=dp(8), padding=dp(10))
+        filter_input = TextInput(hint_text='Filter tasks...', multiline=False, size_hint_y=None, height=dp(40))
+        list_scroll = ScrollView(do_scroll_x=False, bar_width=dp(10))
+        list_layout = BoxLayout(orientation='vertical', spacing=dp(3), size_hint_y=None); list_layout.bind(minimum_height=list_layout.setter('height'))
+        list_scroll.add_widget(list_layout)
+        close_button = Button(text='Close', size_hint_y=None, height=dp(40))
+        content.add_widget(filter_input); content.add_widget(list_scroll); content.add_widget(close_button)
+        popup = Popup(title=f'{title[:30]}{"..." if len(title) > 30 else ""} is blocked by', content=content, size_hint=(0.6, 0.8))
+        def show(*args):
+            list_layout.clear_widgets(); needle = filter_input.text.strip().casefold(); blockers = task_deps.blockers_of(task); shown = 0
+            # Current blockers first, then the other tasks matching the filter
+            candidates = [other for other in (self.task_deps.task(b) for b in blockers) if other is not None]
+            candidates += [other for other in self.tasks if other.get('id') not in blockers and other is not task]
+            for other in candidates:
+                other_title = str(other.get('task', ''))
+                if needle and needle not in other_title.casefold(): continue
+                if shown >= 100: list_layout.add_widget(Label(text='Type to narrow the list...', size_hint_y=None, height=dp(30))); break
+                linked = other.get('id') in blockers; cycle = not linked and self.task_deps.would_cycle(other.get('id'), task_id)
+                note = ' (waits for this task)' if cycle else (' (done)' if other.get('completed') else '')
+                button = Button(text=f"{'[x]' if linked else '[  ]'} {other_title}{note}", size_hint_y=None, height=dp(34), disabled=cycle, halign='left', valign='middle')
+                button.bind(size=lambda b, size: setattr(b, 'text_size', (size[0] - dp(10), None)))
+                button.bind(on_press=lambda b, o=other: toggle(o)); list_layout.add_widget(button); shown += 1
+            if not shown: list_layout.add_widget(Label(text='No other tasks.', size_hint_y=None, height=dp(30)))
+        def toggle(other):
+            other_id = other.get('id'); blockers = task_deps.blockers_of(task)
+            if other_id in blockers: task['blocked_by'] = [b for b in blockers if b != other_id]
+            else:
+                try: self.task_deps.add_edge(other_id, task_id)
+                except task_deps.CycleError as e: show_error_popup(f"Cannot add that link: {e}."); return
+                task['blocked_by'] = blockers + [other_id]
+            if not task['blocked_by']: del task['blocked_by']
+            self.mark_tasks_changed(task); show(); self.update_task_view()
+        filter_input.bind(text=show); close_button.bind(on_press=popup.dismiss)
+        show(); popup.open()
+    # --- Priorities / Next up ---
+    def _init_next_up(self):
+        """Heap of the open, ready tasks by priority, due date and age; feeds the Next Up popup and the minimized window."""
+        self.next_up = next_up.NextUpQueue(deps=self.task_deps); self.next_up.sync_tasks(self.tasks)
+        self._minimized_refresh_trigger = Clock.create_trigger(lambda dt: self._refresh_minimized_tasks(), 0.2)
+        self._task_change_listeners.append(self._on_task_changed_next_up)
+    def _on_task_changed_next_up(self, task):
+        if task is None: self.next_up.sync_tasks(self.tasks)
+        elif isinstance(task, task_model.Subtask) or not self.next_up.update(task): return
+        if self.minimized: self._minimized_refresh_trigger()
+    def _refresh_minimized_tasks(self):
+        if not self.minimized or getattr(self, '_minimized_tasks_layout', None) is None: return
+        if [task.get('id') for task in self.next_up.top(3)] != self._minimized_task_ids: self._fill_minimized_tasks()
+    def set_priority_gui(self, instance):
+        if self.selected_index is None: show_error_popup("Select a task first."); return
+        if not (0 <= self.selected_index < len(self.tasks)): return
+        task = self.tasks[self.selected_index]; title = task.get('task', 'Task'); current = next_up.priority_of(task)
+        content = BoxLayout(orientation='vertical', spacing=dp(8), padding=dp(10))
+        popup = Popup(title=f'Priority of {title[:30]}{"..." if len(title) > 30 else ""}', content=content, size_hint=(0.5, None), height=dp(300))
+        def choose(priority):
+            if priority == next_up.DEFAULT_PRIORITY: task.pop('priority', None)
+            else: task['priority'] = priority
+            popup.dismiss(); self.mark_tasks_changed(task); self.update_task_view()
+        for priority in next_up.PRIORITIES:
+            button = Button(text=('> ' if priority == current else '') + next_up.PRIORITY_LABELS[priority], size_hint_y=None, height=dp(40))
+            button.bind(on_press=lambda b, p=priority: choose(p)); content.add_widget(button)
+        cancel_button = Button(text='Cancel', size_hint_y=None, height=dp(40)); cancel_button.bind(on_press=popup.dismiss); content.add_widget(cancel_button)
+        popup.open()
+    def next_up_gui(self, instance):
+        """The first NEXT_UP_COUNT open, unblocked tasks by priority, due date and age; pressing one selects it."""
+        content = BoxLayout(orientation='vertical', spacing=dp(5), padding=dp(10))
+        scroll = ScrollView(do_scroll_x=False, bar_width=dp(10))
+        rows = BoxLayout(orientation='vertical', spacing=dp(3), size_hint_y=None); rows.bind(minimum_height=rows.setter('height')); scroll.add_widget(rows)
+        popup = Popup(title='Next Up', content=content, size_hint=(0.6, 0.7))
+        tasks = self.next_up.top(next_up.NEXT_UP_COUNT)
+        for position, task in enumerate(tasks, 1):
+            priority = next_up.priority_of(task); due_date = task.get('due_date')
+            text = f"{position}. P{priority}  {task.get('task', '')}" + (f"  (due {task_dates.format_due(due_date)})" if due_date else '')
+            button = Button(text=text, size_hint_y=None, height=dp(36), halign='left', valign='middle')
+            button.bind(size=lambda b, size: setattr(b, 'text_size', (size[0] - dp(10), None)))
+            button.bind(on_press=lambda b, task_id=task.get('id'): (popup.dismiss(), self._reveal_task(task_id))); rows.add_widget(button)
+        if not tasks: rows.add_widget(Label(text='Nothing to do: every task is completed or blocked.', size_hint_y=None, height=dp(30)))
+        close_button = Button(text='Close', size_hint_y=None, height=dp(40)); close_button.bind(on_press=popup.dismiss)
+        content.add_widget(scroll); content.add_widget(close_button); popup.open()
+    # --- Task views ---
+    def _init_task_views(self):
+        """Saved filter/sort views of the task list; their sorted indexes follow mark_tasks_changed."""
+        self.task_views = task_views.TaskViews(lambda: self.tasks, tags=self.tag_index, deps=self.task_deps)
+        self._view_refresh_trigger = Clock.create_trigger(lambda dt: self.update_task_view(), 0.1)
+        self._task_change_listeners.append(self._on_task_changed_views)
+    def _on_task_changed_views(self, task):
+        # In a filtered or sorted view a change can move a row or hide it (e.g. starting a timer in 'Running')
+        if self.task_views.mark(task) and task is not None and not self.task_views.is_manual(): self._view_refresh_trigger()
+    def _can_reorder(self):
+        """Moving tasks only makes sense where the list shows every task in its own order."""
+        return self.task_views is None or self.task_views.is_manual()
+    def _create_view_bar(self):
+        view_bar = BoxLayout(size_hint_y=None, height=dp(30), spacing=dp(5))
+        self.view_spinner = Spinner(text=self.task_views.active, values=self.task_views.names())
+        self.view_spinner.bind(text=lambda spinner, name: self._set_task_view(name))
+        view_bar.add_widget(self.view_spinner)
+        view_bar.add_widget(Button(text='Views...', size_hint_x=None, width=dp(70), on_press=self.task_views_gui))
+        return view_bar
+    def _set_task_view(self, name):
+        if self.task_views.view(name) is None: return
+        if name != self.task_views.active:
+            try: self.task_views.set_active(name)
+            except OSError as e: logging.error(f"Could not save the active view to {task_views.VIEWS_FILE}: {e}")
+            self.update_task_view()
+        if self.view_spinner.text != name: self.view_spinner.text = name
+    def task_views_gui(self, instance):
+        """Saved views: show or delete one, or save a new filter and sort under a name."""
+        content = BoxLayout(orientation='vertical', spacing=dp(8), padding=dp(10))
+        list_scroll = ScrollView(do_scroll_x=False, bar_width=dp(10))
+        list_layout = BoxLayout(orientation='vertical', spacing=dp(3), size_hint_y=None); list_layout.bind(minimum_height=list_layout.setter('height'))
+        list_scroll.add_widget(list_layout); content.add_widget(list_scroll)
+        form = GridLayout(cols=2, spacing=dp(5), size_hint_y=None, height=dp(216))
+        name_input = TextInput(hint_text='View name', multiline=False)
+        filter_spinner = Spinner(text=task_views.FILTER_LABELS['open'], values=list(task_views.FILTER_LABELS.values()))
+        icons = sorted({task.get('icon') for task in self.tasks if task.get('icon')})
+        icon_names = {os.path.basename(icon): icon for icon in icons}
+        icon_spinner = Spinner(text=next(iter(icon_names), 'No icons in use'), values=list(icon_names))
+        query_input = TextInput(hint_text='(work | home) -done', multiline=False)
+        sort_spinner = Spinner(text=task_views.SORT_LABELS['due'], values=list(task_views.SORT_LABELS.values()))
+        order_spinner = Spinner(text='Ascending', values=('Ascending', 'Descending'))
+        for label, widget in (('Name:', name_input), ('Show:', filter_spinner), ('Icon:', icon_spinner), ('Tag query:', query_input), ('Sort by:', sort_spinner), ('Order:', order_spinner)):
+            form.add_widget(Label(text=label, size_hint_x=0.3)); form.add_widget(widget)
+        content.add_widget(form)
+        button_row = BoxLayout(size_hint_y=None, height=dp(40), spacing=dp(10))
+        save_button = Button(text='Save View'); close_button = Button(text='Close')
+        button_row.add_widget(save_button); button_row.add_widget(close_button); content.add_widget(button_row)
+        popup = Popup(title='Task Views', content=content, size_hint=(0.6, 0.8))
+        def show_list():
+            list_layout.clear_widgets()
+            for view in self.task_views.views:
+                row = BoxLayout(size_hint_y=None, height=dp(36), spacing=dp(5))
+                order = ('descending' if view.descending else 'ascending') if view.sort != 'manual' else ''
+                shown = task_views.FILTER_LABELS[view.filter] + (f" {os.path.basename(view.icon)}" if view.filter == 'icon' and view.icon else '') + (f" {view.query}" if view.filter == 'tags' else '')
+                label = Label(text=f"{'> ' if view.name == self.task_views.active else ''}{view.name}   ({shown}, {task_views.SORT_LABELS[view.sort].lower()} {order})", halign='left', valign='middle', size_hint_x=0.6)
+                label.bind(size=lambda l, size: setattr(l, 'text_size', size))
+                show_button = Button(text='Show', size_hint_x=0.2); show_button.bind(on_press=lambda b, n=view.name: (self._set_task_view(n), popup.dismiss()))
+                delete_button = Button(text='Delete', size_hint_x=0.2, disabled=view.name == task_views.DEFAULT_VIEW.name)
+                delete_button.bind(on_press=lambda b, n=view.name: delete(n))
+                row.add_widget(label); row.add_widget(show_button); row.add_widget(delete_button); list_layout.add_widget(row)
+        def refresh_spinner():
+            self.view_spinner.values = self.task_views.names()
+            if self.view_spinner.text != self.task_views.active: self.view_spinner.text = self.task_views.active
+        def delete(name):
+            was_active = name == self.task_views.active
+            try: self.task_views.remove_view(name)
+            except OSError as e: logging.error(f"Could not save {task_views.VIEWS_FILE}: {e}")
+            refresh_spinner(); show_list()
+            if was_active: self.update_task_view()
+        def save(instance):
+            name = name_input.text.strip()
+            filter_key = next(key for key, label in task_views.FILTER_LABELS.items() if label == filter_spinner.text)
+            sort_key = next(key for key, label in task_views.SORT_LABELS.items() if label == sort_spinner.text)
+            icon = icon_names.get(icon_spinner.text) if filter_key == 'icon' else None
+            if filter_key == 'icon' and icon is None: show_error_popup("No task has an icon to filter by."); return
+            query = query_input.text.strip() if filter_key == 'tags' else None
+            try: self.task_views.add_view(task_views.View(name, filter_key, sort_key, order_spinner.text == 'Descending', icon, query))
+            except ValueError as e: show_error_popup(str(e)); return
+            except OSError as e: logging.error(f"Could not save {task_views.VIEWS_FILE}: {e}")
+            refresh_spinner(); self._set_task_view(name); show_list()
+            if name == self.task_views.active: self.update_task_view()  # a redefined active view
+        save_button.bind(on_press=save); close_button.bind(on_press=popup.dismiss)
+        show_list(); popup.open()
+    # --- Retention ---
+    def _note_user_input(self, *args):
+        self._last_input_time = time.time()
+    def _maybe_run_retention(self, dt):
+        """Runs the retention policy a batch per frame once the user has been idle for a couple of minutes (at most every 6 hours)."""
+        now = time.time()
+        if self._retention_running or now - self._last_input_time < 120 or now - self._last_retention_run < 6 * 3600: return
+        self._retention_running = True; self._last_retention_run = now; cold = []
+        batches = retention.iter_compaction(self.tasks, retention.policy_from_env(), cold); total = retention.CompactionReport()
+        def run_batch(dt):
+            try: total.add(next(batches)); return True
+            except StopIteration: pass
+            except Exception as e: logging.error(f"Retention run failed: {e}", exc_info=True)
+            self._retention_running = False
+            if cold:
+                # Written to the cold file by the next successful save; searchable right away
+                self._pending_cold_annotations = [*self._pending_cold_annotations, *cold]; texts = {}
+                for task_id, annotation in cold:
+                    if task_id and annotation.get('text'): texts.setdefault(task_id, []).append(str(annotation['text']))
+                self.search_index.add_cold_texts(texts)
+            if total:
+                for node in total.changed: self.mark_tasks_changed(node)  # only the compacted tasks are re-indexed and re-encoded
+                logging.info(f"Retention: {total}.")
+            else: logging.info("Retention: nothing to compact.")
+            return False
+        Clock.schedule_interval(run_batch, 0)
+    # --- Archive ---
+    def _archive_completed_tasks(self):
+        """Moves tasks completed more than ARCHIVE_AFTER_DAYS ago out of the live list into broadcasts/archive/."""
+        days = archive_store.archive_after_days()
+        if not days: return
+        now_iso = datetime.now().isoformat(); stamped = 0
+        for task in self.tasks:
+            # Tasks completed before completedAt existed start their archive countdown now
+            if task.get('completed') and not task.get('completedAt'): task['completedAt'] = now_iso; task['completedAtEstimated'] = True; stamped += 1
+        if stamped: self.mark_tasks_changed()
+        archivable = archive_store.select_archivable(self.tasks, days)
+        if not archivable: return
+        try: archive_store.archive_tasks(archivable)
+        except (OSError, ValueError) as e: logging.error(f"Archiving completed tasks failed: {e}", exc_info=True); return
+        selected = self.tasks[self.selected_index] if self.selected_index is not None and 0 <= self.selected_index < len(self.tasks) else None
+        for event in self.scheduled_alarms.values(): event.cancel()
+        self.scheduled_alarms.clear()  # scheduled alarms refer to task indexes, which are about to shift
+        archived = {id(task) for task in archivable}
+        self.tasks[:] = [task for task in self.tasks if id(task) not in archived]
+        self.selected_index = next((i for i, task in enumerate(self.tasks) if task is selected), None)
+        self._reschedule_pending_alarms()
+        self.mark_tasks_changed(); self.save_tasks(force=True); self.update_task_view()
+        logging.info(f"Archived {len(archivable)} tasks completed more than {days} days ago.")
+
+    def _on_keyboard(self, window, key, scancode, codepoint, modifiers):
+        if 'ctrl' in modifiers and codepoint == 'f': self.search_gui(None); return True
+        if 'ctrl' in modifiers and codepoint == 'k': self.quick_switcher_gui(None); return True
+        if self._switcher_popup and key in (273, 274): self._switcher_popup.move_highlight(-1 if key == 273 else 1); return True  # Up/Down
+        return False
     def check_and_resume_timers(self):
         now_unix = time.time(); resumed_count = 0; needs_save = False
         for task in self.tasks:
             if task.get('timer_running') and isinstance(task.get('start_time_unix'), (int, float)):
                 elapsed_since_save = now_unix - task['start_time_unix']
-                if elapsed_since_save > 0: task['timer'] = task.get('timer', 0) + elapsed_since_save; task['start_time_unix'] = now_unix; resumed_count += 1
+                if elapsed_since_save > 0: self._log_session(task, now_unix); task['timer'] = task.get('timer', 0) + elapsed_since_save; task['start_time_unix'] = now_unix; resumed_count += 1
                 else: task['start_time_unix'] = now_unix; logging.warning(f"Corrected start time for '{task.get('task', 'N/A')}' due to potential clock skew.")
                 needs_save = True
             elif task.get('timer_running'): task['timer_running'] = False; task['start_time_unix'] = None; logging.warning(f"Stopped timer for '{task.get('task', 'N/A')}' due to missing start time on load."); needs_save = True
@@ -1197,7 +1941,7 @@ class ProductivityApp(App):
         send_button = Button(text="Send to Groq", size_hint=(1, None), height=dp(40), on_press=self.send_to_groq_api); layout.add_widget(send_button); return layout
     def _create_middle_layout(self):
         layout = BoxLayout(orientation='vertical', size_hint=(0.4, 1), spacing=dp(10))
-        task_container = BoxLayout(orientation='vertical', size_hint=(1, 0.65)); scroll_view = ScrollView(size_hint=(1, 1), do_scroll_x=False, bar_width=dp(10)); self.task_list_layout = BoxLayout(orientation='vertical', spacing=dp(5), size_hint_y=None); self.task_list_layout.bind(minimum_height=self.task_list_layout.setter('height')); scroll_view.add_widget(self.task_list_layout); task_container.add_widget(scroll_view); layout.add_widget(task_container)
+        task_container = BoxLayout(orientation='vertical', size_hint=(1, 0.65)); task_container.add_widget(self._create_view_bar()); scroll_view = ScrollView(size_hint=(1, 1), do_scroll_x=False, bar_width=dp(10)); self.task_scroll_view = scroll_view; self.task_list_layout = BoxLayout(orientation='vertical', spacing=dp(5), size_hint_y=None); self.task_list_layout.bind(minimum_height=self.task_list_layout.setter('height')); scroll_view.add_widget(self.task_list_layout); task_container.add_widget(scroll_view); layout.add_widget(task_container)
         # Improved calendar container with better fullscreen support
         calendar_container = BoxLayout(orientation='vertical', size_hint=(1, 0.35)); now = datetime.now()
         try: 
@@ -1206,8 +1950,16 @@ class ProductivityApp(App):
                 now.year, 
                 now.month, 
                 tasks_provider=lambda: self.tasks,
-                gratitude_provider=lambda: self.gratitude_entries
+                gratitude_provider=lambda: self.gratitude_entries.dates
             )
+            self._task_change_listeners.append(self.calendar_widget.models.mark)
+            nav_bar = BoxLayout(size_hint_y=None, height=dp(30), spacing=dp(5))
+            month_label = Label(text=self.calendar_widget.title, bold=True); self.calendar_widget.bind(title=month_label.setter('text'))
+            nav_bar.add_widget(Button(text='<', size_hint_x=None, width=dp(40), on_press=self.calendar_widget.previous_month))
+            nav_bar.add_widget(month_label)
+            nav_bar.add_widget(Button(text='Today', size_hint_x=None, width=dp(60), on_press=self.calendar_widget.show_today))
+            nav_bar.add_widget(Button(text='>', size_hint_x=None, width=dp(40), on_press=self.calendar_widget.next_month))
+            calendar_container.add_widget(nav_bar)
             calendar_container.add_widget(self.calendar_widget)
             # Set the calendar's colors to the app's current settings
             self.calendar_widget.set_global_text_color(self.calendar_text_color, self.calendar_date_number_color)
@@ -1218,7 +1970,7 @@ class ProductivityApp(App):
     def _create_right_layout(self):
         layout = BoxLayout(orientation='vertical', size_hint=(0.3, 1), spacing=dp(10)); layout.add_widget(self._create_time_display_widgets())
         scroll = ScrollView(size_hint=(1, 1), do_scroll_x=False, bar_width=dp(10)); button_grid = GridLayout(cols=1, spacing=dp(5), size_hint_y=None); button_grid.bind(minimum_height=button_grid.setter('height'))
-        buttons_config = [("Add Task", self.add_task_gui, False, True), ("Move Up", self.move_task_up_gui, False, False), ("Move Down", self.move_task_down_gui, False, False), ("Change Title", self.change_task_title_gui, False, False), ("Mark Completed", self.mark_as_completed_gui, False, False), (None, None, True, False), ("Add Subtask", self.add_subtask_gui, False, False), ("Toggle Subtasks", self.toggle_subtasks_gui, False, False), (None, None, True, False), ("Delete Task", self.delete_task_gui, False, False), ("Set Due Date", self.set_due_date_gui, False, False), ("Set Alarm", self.set_alarm_gui, False, False), ("Annotate Task", self.annotate_task_gui_proxy, False, False), (None, None, True, False), ("Add Gratitude", self.add_gratitude_gui, False, True), (None, None, True, False), ("Start Timer", self.start_timer_gui, False, False), ("Stop Timer", self.stop_timer_gui, False, False), ("Reset Timer", self.reset_timer_gui, False, False), (None, None, True, False), ("Export Tasks", self.export_tasks_gui, False, True), ("Import Tasks", self.import_tasks_gui, False, True), ("Sync to Todoist", self.sync_to_todoist_gui, False, True), (None, None, True, False), ("Customize", self.customize_gui, False, True), ("Setup", self.setup_gui, False, True), (None, None, True, False), ("Minimize", self.minimize_app, False, True)]
+        buttons_config = [("Add Task", self.add_task_gui, False, True), ("Search", self.search_gui, False, True), ("Archive", self.archive_gui, False, True), ("Backups", self.backups_gui, False, True), ("Report", self.report_gui, False, True), ("Next Up", self.next_up_gui, False, True), ("Year View", self.year_heatmap_gui, False, True), ("Move Up", self.move_task_up_gui, False, False), ("Move Down", self.move_task_down_gui, False, False), ("Change Title", self.change_task_title_gui, False, False), ("Mark Completed", self.mark_as_completed_gui, False, False), (None, None, True, False), ("Add Subtask", self.add_subtask_gui, False, False), ("Toggle Subtasks", self.toggle_subtasks_gui, False, False), (None, None, True, False), ("Delete Task", self.delete_task_gui, False, False), ("Set Due Date", self.set_due_date_gui, False, False), ("Set Tags", self.set_tags_gui, False, False), ("Blocked By", self.blocked_by_gui, False, False), ("Set Priority", self.set_priority_gui, False, False), ("Set Alarm", self.set_alarm_gui, False, False), ("Annotate Task", self.annotate_task_gui_proxy, False, False), (None, None, True, False), ("Add Gratitude", self.add_gratitude_gui, False, True), (None, None, True, False), ("Start Timer", self.start_timer_gui, False, False), ("Stop Timer", self.stop_timer_gui, False, False), ("Reset Timer", self.reset_timer_gui, False, False), (None, None, True, False), ("Export Tasks", self.export_tasks_gui, False, True), ("Import Tasks", self.import_tasks_gui, False, True), ("Sync to Todoist", self.sync_to_todoist_gui, False, True), (None, None, True, False), ("Customize", self.customize_gui, False, True), ("Setup", self.setup_gui, False, True), (None, None, True, False), ("Minimize", self.minimize_app, False, True)]
         self.action_buttons = {}
         for text, callback, is_spacer, enabled in buttons_config:
             if is_spacer: button_grid.add_widget(BoxLayout(size_hint_y=None, height=dp(10)))
@@ -1231,7 +1983,8 @@ class ProductivityApp(App):
     def add_task(self, task_name, parent_task=None, parent_index=None):
         if not task_name or not task_name.strip(): show_error_popup("Task name cannot be empty."); return
         try:
-            now_iso = datetime.now().isoformat(); new_task = {'task': task_name.strip(), 'timer': 0, 'localTime': datetime.now(PH_TZ).strftime('%Y-%m-%d %H:%M:%S %Z'), 'createdAt': now_iso, 'timer_running': False, 'start_time_unix': None, 'completed': False, 'due_date': None, 'icon': None, 'alarms': [], 'annotations': [], 'titleHistory': [{'title': task_name.strip(), 'timestamp': now_iso}], 'subtasks': []}
+            now_iso = datetime.now().isoformat(); new_task = {'id': task_store.new_task_id(), 'task': task_name.strip(), 'timer': 0, 'localTime': task_dates.local_time_now(PH_TZ), 'createdAt': now_iso, 'timer_running': False, 'start_time_unix': None, 'completed': False, 'due_date': None, 'icon': None, 'alarms': [], 'annotations': [], 'titleHistory': [{'title': task_name.strip(), 'timestamp': now_iso}], 'subtasks': [], 'subtasks_visible': True}
+            new_task = (task_model.Task if parent_task is None else task_model.Subtask).from_json(new_task)
             
             if parent_task is not None:
                 # Adding as subtask
@@ -1248,7 +2001,7 @@ class ProductivityApp(App):
                     if widget_to_scroll: scroll_view.scroll_to(widget_to_scroll, padding=dp(10), animate=True)
                 logging.info(f"Added main task: {task_name}")
             
-            self.mark_tasks_changed(); self.update_task_view()
+            self.mark_tasks_changed(parent_task if parent_task is not None else new_task); self.update_task_view()
         except Exception as e: logging.error(f"Error adding task '{task_name}': {e}", exc_info=True); show_error_popup("Failed to add the task.")
     def delete_task(self, index):
         if not (0 <= index < len(self.tasks)): logging.warning(f"Invalid index {index} for delete_task."); show_error_popup(f"Cannot delete task at invalid index {index}."); return
@@ -1258,7 +2011,14 @@ class ProductivityApp(App):
             if alarm_id: event = self.scheduled_alarms.pop(alarm_id, None);
             if event: event.cancel(); logging.info(f"Cancelled alarm {alarm_id} for task being deleted.")
         try:
-            deleted_task_name = self.tasks[index]['task']; del self.tasks[index]; self.mark_tasks_changed()
+            deleted_task_name = self.tasks[index]['task']; deleted_id = task_to_delete.get('id')
+            dependents = self.task_deps.dependents(deleted_id) if self.task_deps is not None else []
+            del self.tasks[index]
+            for dependent in dependents:  # drop links to the deleted task
+                dependent['blocked_by'] = [b for b in task_deps.blockers_of(dependent) if b != deleted_id]
+                if not dependent['blocked_by']: del dependent['blocked_by']
+                self.mark_tasks_changed(dependent)
+            self.mark_tasks_changed()
             if self.selected_index == index: self.selected_index = None
             elif self.selected_index is not None and self.selected_index > index: self.selected_index -= 1
             self.task_widgets.clear(); self.timer_labels.clear(); self.update_task_view(); self.update_action_buttons_state(); logging.info(f"Deleted task: {deleted_task_name} at index {index}")
@@ -1291,7 +2051,8 @@ class ProductivityApp(App):
         
         # Create all task rows in a batch to reduce layout recalculations
         new_widgets = []
-        for index, task in enumerate(self.tasks):
+        rows = self.task_views.rows() if self.task_views is not None else enumerate(self.tasks)
+        for index, task in rows:
             try:
                 task_row = self._create_task_row(index, task)
                 task_row.idx = index  # For drag-and-drop
@@ -1310,6 +2071,7 @@ class ProductivityApp(App):
                 error_label = Label(text=f"Error loading task {index}", color=(1,0,0,1), size_hint_y=None, height=dp(60))
                 new_widgets.append((index, error_label))
 
+        if not new_widgets and self.tasks: new_widgets.append((None, Label(text="No tasks in this view.", size_hint_y=None, height=dp(40))))
         # Add all widgets at once to reduce layout recalculations
         for index, widget in new_widgets:
             task_list_layout.add_widget(widget)
@@ -1391,7 +2153,7 @@ class ProductivityApp(App):
                 self.opacity = 1.0
                 
             def on_touch_up(self, touch):
-                if self.dragged and hasattr(self, 'parent') and self.parent:
+                if self.dragged and hasattr(self, 'parent') and self.parent and self.outer_self._can_reorder():
                     # Find the correct insertion position based on drop location
                     drop_position = self._find_drop_position(touch.pos)
                     if drop_position is not None and drop_position != self.idx:
@@ -1440,8 +2202,9 @@ class ProductivityApp(App):
         up_btn = Button(size_hint_y=0.45, size_hint_x=1, height=btn_height, width=btn_width, background_normal='', background_color=(1,1,1,0.01), padding=(0,-dp(7),0,0))
         down_btn = Button(size_hint_y=0.45, size_hint_x=1, height=btn_height, width=btn_width, background_normal='', background_color=(1,1,1,0.01), padding=(0,-dp(3),0,0))
         # Always show the arrows, but only disable if at top or bottom
-        up_btn.disabled = (index == 0)
-        down_btn.disabled = (index == len(self.tasks)-1)
+        can_reorder = self._can_reorder()
+        up_btn.disabled = not can_reorder or index == 0
+        down_btn.disabled = not can_reorder or index == len(self.tasks)-1
         up_img_path = os.path.join('graphics', 'assetts', 'red-arrow-up.png')
         down_img_path = os.path.join('graphics', 'assetts', 'green-arrow-down.png')
         up_img = Image(source=up_img_path, allow_stretch=True, keep_ratio=True, size_hint=(1,1), size=(btn_width, btn_height))
@@ -1461,8 +2224,7 @@ class ProductivityApp(App):
         task_row.add_widget(arrow_box)
 
         timer_str = format_timedelta(task.get('timer', 0)); local_time_str = task.get('localTime', 'N/A')
-        try: created_dt = datetime.strptime(local_time_str.split(' ')[0] + ' ' + local_time_str.split(' ')[1], '%Y-%m-%d %H:%M:%S'); formatted_created_time = created_dt.strftime('%Y-%m-%d %H:%M')
-        except: formatted_created_time = local_time_str
+        formatted_created_time = task_dates.format_created(local_time_str)
 
         # ... (rest of your code for creating task row)
 
@@ -1504,6 +2266,8 @@ class ProductivityApp(App):
             if subtasks_visible:
                 # When subtasks are visible, show completion stats
                 subtask_info = f" ({completed_subtasks}/{total_subtasks})"
+                subtask_seconds = self.task_tree.rollup(task).seconds
+                if subtask_seconds: subtask_info += f" [size={int(dp(11))}]{format_timedelta(subtask_seconds)} in subtasks[/size]"
             else:
                 # When subtasks are hidden, show count with indicator
                 subtask_info = f" [+{total_subtasks} subtasks]"
@@ -1514,7 +2278,12 @@ class ProductivityApp(App):
         # Create main task container to hold both task button and subtasks
         task_container = BoxLayout(orientation='vertical', size_hint_x=0.75, spacing=dp(2))
         
-        display_text = f"[size={int(dp(16))}]{title_display}{subtask_info}[/size]\n[size={int(dp(11))}]Created: {formatted_created_time}[/size]"
+        tags_text = ''.join(f"  #{tag}" for tag in tag_index.tags_of(task))
+        open_blockers = self.task_deps.open_blockers(task.get('id')) if self.task_deps is not None else 0
+        if open_blockers and not is_completed: tags_text = f"  [color=b00000]Blocked by {open_blockers}[/color]" + tags_text
+        priority = next_up.priority_of(task)
+        if priority in next_up.PRIORITY_COLORS: tags_text = f"  [color={next_up.PRIORITY_COLORS[priority]}]P{priority}[/color]" + tags_text
+        display_text = f"[size={int(dp(16))}]{title_display}{subtask_info}[/size]\n[size={int(dp(11))}]Created: {formatted_created_time}{tags_text}[/size]"
         task_button = Button(size_hint_y=None, height=dp(60), markup=True, halign='left', valign='top', text=display_text, padding=(dp(10), dp(8)))
         task_button.bind(size=lambda *args: setattr(task_button, 'text_size', (task_button.width - task_button.padding[0]*2, None)))
         # Add right-click functionality to toggle subtask visibility
@@ -1534,6 +2303,7 @@ class ProductivityApp(App):
         if total_subtasks > 0 and task.get('subtasks_visible', True):
             subtasks_container = self._create_subtasks_container(index, task)
             task_container.add_widget(subtasks_container)
+            task_row.height += len(subtasks_container.children) * (dp(35) + dp(1))  # room for every level of subtask rows
         
         task_row.add_widget(task_container)
         info_layout = BoxLayout(orientation='vertical', size_hint_x=0.25, spacing=dp(2), padding=(0, dp(5), dp(5), dp(5)))
@@ -1541,7 +2311,7 @@ class ProductivityApp(App):
         # Only add the unified timer_label (already created above) to info_layout
         info_layout.add_widget(timer_label)
         due_label_height = dp(18)
-        if task.get('due_date'): due_label = Label(text=f"Due: {task['due_date']}", size_hint_y=None, height=due_label_height, halign='left', valign='top', font_size=dp(10), color=(0.8, 0, 0, 1)); due_label.bind(size=lambda *args: setattr(due_label, 'text_size', (due_label.width, None))); info_layout.add_widget(due_label)
+        if task.get('due_date'): due_label = Label(text=f"Due: {task_dates.format_due(task['due_date'])}", size_hint_y=None, height=due_label_height, halign='left', valign='top', font_size=dp(10), color=(0.8, 0, 0, 1)); due_label.bind(size=lambda *args: setattr(due_label, 'text_size', (due_label.width, None))); info_layout.add_widget(due_label)
         else: info_layout.add_widget(BoxLayout(size_hint_y=None, height=due_label_height))
         icon_height = dp(20)
         if task.get('icon') and os.path.exists(task['icon']):
@@ -1613,7 +2383,7 @@ class ProductivityApp(App):
         def toggle_todone(instance, task_index=index):
             current_state = self.tasks[task_index].get('todone', False)
             self.tasks[task_index]['todone'] = not current_state
-            self.mark_tasks_changed()
+            self.mark_tasks_changed(self.tasks[task_index])
             self.save_tasks(force=True)
             self.update_task_view()  # Refresh to show/hide checkmark
             
@@ -1641,8 +2411,7 @@ class ProductivityApp(App):
 
          # Style the main task button background and text
          task_button.background_normal = ''; title = task.get('task', 'Untitled Task'); local_time_str = task.get('localTime', 'N/A')
-         try: created_dt = datetime.strptime(local_time_str.split(' ')[0] + ' ' + local_time_str.split(' ')[1], '%Y-%m-%d %H:%M:%S'); formatted_created_time = created_dt.strftime('%Y-%m-%d %H:%M')
-         except: formatted_created_time = local_time_str
+         formatted_created_time = task_dates.format_created(local_time_str)
 
          if is_completed:
              task_button.background_color = completed_color; task_button.color = completed_text_color;
@@ -1699,16 +2468,17 @@ class ProductivityApp(App):
              if current_button: self.update_task_row_style(index, current_row, current_button) # Update style to selected
 
         self.last_click_index = index; self.last_click_time = current_time; self.update_action_buttons_state()
+        if self.switcher_index is not None: self.switcher_index.touch(self.tasks[index].get('id'))
         if is_double_click: logging.info(f"Double-click detected on task {index}."); self.annotate_task_gui(index)
 
     def update_action_buttons_state(self):
-        has_selection = self.selected_index is not None and 0 <= self.selected_index < len(self.tasks); can_move_up = has_selection and self.selected_index > 0; can_move_down = has_selection and self.selected_index < len(self.tasks) - 1
-        button_states = {"Move Up": False, "Move Down": False, "Change Title": False, "Mark Completed": False, "Delete Task": False, "Set Due Date": False, "Set Alarm": False, "Annotate Task": False, "Add Subtask": False, "Toggle Subtasks": False, "Start Timer": False, "Stop Timer": False, "Reset Timer": False,}
+        has_selection = self.selected_index is not None and 0 <= self.selected_index < len(self.tasks); can_move_up = has_selection and self._can_reorder() and self.selected_index > 0; can_move_down = has_selection and self._can_reorder() and self.selected_index < len(self.tasks) - 1
+        button_states = {"Move Up": False, "Move Down": False, "Change Title": False, "Mark Completed": False, "Delete Task": False, "Set Due Date": False, "Set Tags": False, "Blocked By": False, "Set Priority": False, "Set Alarm": False, "Annotate Task": False, "Add Subtask": False, "Toggle Subtasks": False, "Start Timer": False, "Stop Timer": False, "Reset Timer": False,}
         mark_complete_text = "Mark Completed"
         if has_selection:
             task = self.tasks[self.selected_index]; is_running = task.get('timer_running', False); has_time = task.get('timer', 0) > 0; is_completed = task.get('completed', False)
             has_subtasks = len(task.get('subtasks', [])) > 0
-            button_states.update({"Move Up": can_move_up, "Move Down": can_move_down, "Change Title": True, "Mark Completed": True, "Delete Task": True, "Set Due Date": True, "Set Alarm": True, "Annotate Task": True, "Add Subtask": True, "Toggle Subtasks": has_subtasks, "Start Timer": not is_running and not is_completed, "Stop Timer": is_running, "Reset Timer": (has_time or is_running) and not is_completed,})
+            button_states.update({"Move Up": can_move_up, "Move Down": can_move_down, "Change Title": True, "Mark Completed": True, "Delete Task": True, "Set Due Date": True, "Set Tags": True, "Blocked By": True, "Set Priority": True, "Set Alarm": True, "Annotate Task": True, "Add Subtask": True, "Toggle Subtasks": has_subtasks, "Start Timer": not is_running and not is_completed, "Stop Timer": is_running, "Reset Timer": (has_time or is_running) and not is_completed,})
             mark_complete_text = "Undo Mark Completed" if is_completed else "Mark Completed"
         for key, button in self.action_buttons.items():
             if key in button_states: button.disabled = not button_states[key];
@@ -1719,7 +2489,7 @@ class ProductivityApp(App):
         if not (0 <= index < len(self.tasks)): return
         task = self.tasks[index];
         if task.get('timer_running') or task.get('completed', False): return
-        try: task['timer_running'] = True; task['start_time_unix'] = time.time(); self.mark_tasks_changed(); self.update_action_buttons_state(); logging.info(f"Started timer for task {index}: {task['task']}")
+        try: task['timer_running'] = True; task['start_time_unix'] = time.time(); self.mark_tasks_changed(task); self.update_action_buttons_state(); logging.info(f"Started timer for task {index}: {task['task']}")
         except Exception as e: logging.error(f"Error starting timer for task {index}: {e}", exc_info=True)
     def stop_timer(self, index):
         if not (0 <= index < len(self.tasks)): return
@@ -1729,16 +2499,46 @@ class ProductivityApp(App):
             final_time = task.get('timer', 0); start_time = task.get('start_time_unix')
             if isinstance(start_time, (int, float)): elapsed = time.time() - start_time;
             if elapsed > 0: final_time += elapsed
-            task['timer'] = final_time; task['timer_running'] = False; task['start_time_unix'] = None; self.mark_tasks_changed(); self.update_timer_label(index, final_time); self.update_action_buttons_state(); logging.info(f"Stopped timer for task {index}: {task['task']}. Total: {format_timedelta(task['timer'])}")
+            self._log_session(task, time.time())
+            task['timer'] = final_time; task['timer_running'] = False; task['start_time_unix'] = None; self.mark_tasks_changed(task); self.update_timer_label(index, final_time); self.update_action_buttons_state(); logging.info(f"Stopped timer for task {index}: {task['task']}. Total: {format_timedelta(task['timer'])}")
         except Exception as e: logging.error(f"Error stopping timer for task {index}: {e}", exc_info=True)
     def reset_timer(self, index):
         if not (0 <= index < len(self.tasks)): return
         task = self.tasks[index];
         if task.get('completed', False): return
         try:
-            was_running = task.get('timer_running', False); task['timer'] = 0; task['timer_running'] = False; task['start_time_unix'] = None; self.mark_tasks_changed(); self.update_timer_label(index, 0); self.update_action_buttons_state(); logging.info(f"Reset timer for task {index}: {task['task']}")
+            was_running = task.get('timer_running', False)
+            if was_running: self._log_session(task, time.time())
+            if self._time_log is not None: self._time_log.reset(task.get('id'), time.time())
+            task['timer'] = 0; task['timer_running'] = False; task['start_time_unix'] = None; self.mark_tasks_changed(task); self.update_timer_label(index, 0); self.update_action_buttons_state(); logging.info(f"Reset timer for task {index}: {task['task']}")
             if was_running: logging.info(f"Timer for task {index} was stopped during reset.")
         except Exception as e: logging.error(f"Error resetting timer for task {index}: {e}", exc_info=True)
+    def _init_time_log(self):
+        self._time_log = None; self._rollups = None
+        try: self._time_log = time_log.SessionLog(time_log.SESSION_FOLDER)
+        except OSError as e: logging.error(f"Time tracking sessions will not be recorded, could not open {time_log.SESSION_FOLDER}: {e}", exc_info=True); return
+        self._time_log.seed(self.tasks, time.time())  # time tracked before the log existed becomes each task's baseline
+        self._rollups = rollups.Rollups.load(self._time_log, self.tasks, archive_store.iter_archived())
+    def _log_session(self, task, end):
+        """Records the running interval of task's timer (start_time_unix to end) as a session."""
+        if self._time_log is None: return
+        try:
+            if self._time_log.record(task.get('id'), task.get('start_time_unix'), end) and self._rollups is not None:
+                self._rollups.add_session(task.get('id'), task['start_time_unix'], end, task.get('task', ''))
+        except OSError as e: logging.error(f"Could not record timer session for '{task.get('task', 'N/A')}': {e}")
+    def _roll_up_completion(self, task, completed):
+        """Counts a completion today, or takes one back from the day the task was completed."""
+        if self._rollups is None: return
+        day = datetime.now().date()
+        if not completed:
+            if task.get('completedAtEstimated'): return  # never counted: the real completion date is unknown
+            try: day = datetime.fromisoformat(task.get('completedAt')).date()
+            except (TypeError, ValueError): pass
+        self._rollups.add_completion(day, 1 if completed else -1)
+    def _save_rollups(self):
+        if self._rollups is None: return
+        try: self._rollups.save()
+        except OSError as e: logging.error(f"Saving {rollups.ROLLUPS_FILE} failed: {e}", exc_info=True)
     def update_timers_and_display(self, dt):
         # Performance optimization: only update if enough time has passed
         now_unix = time.time()
@@ -1846,13 +2646,20 @@ class ProductivityApp(App):
     def reset_timer_gui(self, instance):
         if self.selected_index is not None: self.reset_timer(self.selected_index)
     def export_tasks_gui(self, instance):
+        """Exports the tasks as JSON, NDJSON, CSV or iCalendar on a worker thread, with progress."""
+        import threading
         from kivy.uix.filechooser import FileChooserIconView
+        from kivy.uix.progressbar import ProgressBar
+        format_names = {'JSON': 'json', 'NDJSON': 'ndjson', 'CSV': 'csv', 'iCalendar (.ics)': 'ics'}
         content = BoxLayout(orientation='vertical', spacing=dp(10), padding=dp(10))
-        filechooser = FileChooserIconView(path=os.getcwd(), filters=['*.json'], size_hint_y=0.8)
+        filechooser = FileChooserIconView(path=os.getcwd(), filters=['*.json', '*.ndjson', '*.csv', '*.ics'], size_hint_y=0.8)
         filename_input = TextInput(text='tasks_export.json', size_hint_y=None, height=dp(40))
+        format_spinner = Spinner(text='JSON', values=list(format_names), size_hint=(None, None), size=(dp(160), dp(40)))
+        name_row = BoxLayout(size_hint_y=None, height=dp(40), spacing=dp(10)); name_row.add_widget(filename_input); name_row.add_widget(format_spinner)
+        progress_bar = ProgressBar(max=1, value=0, size_hint_y=None, height=dp(20))
         content.add_widget(filechooser)
         content.add_widget(Label(text='Filename:', size_hint_y=None, height=dp(20)))
-        content.add_widget(filename_input)
+        content.add_widget(name_row); content.add_widget(progress_bar)
         button_layout = BoxLayout(size_hint_y=None, height=dp(40), spacing=dp(10))
         save_button = Button(text='Export')
         cancel_button = Button(text='Cancel')
@@ -1860,28 +2667,57 @@ class ProductivityApp(App):
         button_layout.add_widget(cancel_button)
         content.add_widget(button_layout)
         popup = Popup(title='Export Tasks', content=content, size_hint=(0.8, 0.7), auto_dismiss=False)
+        state = {'done': 0, 'total': 1, 'cancelled': False, 'poll': None}
+
+        def on_format(spinner, text):
+            stem = os.path.splitext(filename_input.text.strip() or 'tasks_export')[0]
+            filename_input.text = stem + task_export.EXTENSIONS[format_names[text]]
+        format_spinner.bind(text=on_format)
+
+        def finished(full_path, fmt, stats, error):
+            state['poll'].cancel(); save_button.disabled = False
+            if state['cancelled']: return
+            if error is not None: show_error_popup(f'Failed to export tasks:\n{error}'); return
+            popup.dismiss()
+            detail = f"\n{stats['rendered']} calendar events updated, {stats['reused']} unchanged." if fmt == 'ics' else ''
+            show_confirmation_popup(f"Exported {stats['tasks']} tasks to:\n{full_path}{detail}")
 
         def do_export(instance):
-            export_path = filechooser.path
-            export_name = filename_input.text.strip() or 'tasks_export.json'
+            export_path = filechooser.path; fmt = format_names[format_spinner.text]
+            export_name = filename_input.text.strip() or 'tasks_export' + task_export.EXTENSIONS[fmt]
             full_path = os.path.join(export_path, export_name)
-            try:
-                with open(full_path, 'w', encoding='utf-8') as f:
-                    import json
-                    json.dump(self.tasks, f, ensure_ascii=False, indent=2)
-                popup.dismiss()
-                show_confirmation_popup(f'Tasks exported to:\n{full_path}')
-            except Exception as e:
-                show_error_popup(f'Failed to export tasks:\n{e}')
+            # The worker encodes a snapshot of the task list one task at a time; the save fragment cache is left to the saves
+            pretty = json_codec.pretty_json_enabled(); image_pretty = task_export.image_is_pretty(fmt, pretty); tasks = list(self.tasks)
+            def progress(done, total): state['done'] = done; state['total'] = max(1, total)
+            def worker():
+                fragments = (task_fragments.encode_task(self._task_to_save(task), image_pretty) for task in tasks)
+                try: stats, error = task_export.export_tasks(fragments, full_path, fmt, pretty, progress, lambda: state['cancelled'], total=len(tasks)), None
+                except Exception as e:
+                    if not state['cancelled']: logging.error(f"Export to {full_path} failed: {e}", exc_info=True)
+                    stats, error = None, e
+                Clock.schedule_once(lambda dt: finished(full_path, fmt, stats, error))
+            def poll(dt): progress_bar.value = state['done'] / state['total']
+            save_button.disabled = True
+            state['poll'] = Clock.schedule_interval(poll, 0.1)
+            threading.Thread(target=worker, daemon=True).start()
+
+        def cancel(instance):
+            state['cancelled'] = True; popup.dismiss()
         save_button.bind(on_press=do_export)
-        cancel_button.bind(on_press=popup.dismiss)
+        cancel_button.bind(on_press=cancel)
         popup.open()
 
     def import_tasks_gui(self, instance):
+        """Imports a tasks file on a worker thread, merging it into the list and skipping tasks already present."""
+        import threading
         from kivy.uix.filechooser import FileChooserIconView
+        from kivy.uix.progressbar import ProgressBar
         content = BoxLayout(orientation='vertical', spacing=dp(10), padding=dp(10))
-        filechooser = FileChooserIconView(path=os.getcwd(), filters=['*.json'], size_hint_y=0.8)
+        filechooser = FileChooserIconView(path=os.getcwd(), filters=['*.json', '*.ndjson', '*.jsonl'], size_hint_y=0.8)
         content.add_widget(filechooser)
+        progress_bar = ProgressBar(max=1, value=0, size_hint_y=None, height=dp(20))
+        status_label = Label(text='Tasks already in the list (same id, or same title, due date and subtasks) are skipped.', size_hint_y=None, height=dp(24))
+        content.add_widget(progress_bar); content.add_widget(status_label)
         button_layout = BoxLayout(size_hint_y=None, height=dp(40), spacing=dp(10))
         import_button = Button(text='Import')
         cancel_button = Button(text='Cancel')
@@ -1889,31 +2725,53 @@ class ProductivityApp(App):
         button_layout.add_widget(cancel_button)
         content.add_widget(button_layout)
         popup = Popup(title='Import Tasks', content=content, size_hint=(0.8, 0.7), auto_dismiss=False)
+        state = {'read': 0, 'total': 1, 'cancelled': False, 'poll': None}
+
+        def apply(new_tasks, stats, import_path):
+            """Appends the imported tasks in one batch: one re-render and one save."""
+            state['poll'].cancel()
+            if state['cancelled']: return
+            records = task_model.tasks_from_json(new_tasks); first_index = len(self.tasks)
+            self.tasks.extend(records)
+            if records: self.mark_tasks_changed()  # one structural change for the whole batch
+            if self._time_log is not None: self._time_log.seed(records, time.time())
+            for task_index, task in enumerate(records, first_index):
+                for alarm_entry in task.get('alarms', []): self._schedule_alarm(task_index, alarm_entry)
+            if records: self.update_task_view(); self.save_tasks()
+            popup.dismiss()
+            show_confirmation_popup(f"Imported {stats['added']} tasks from:\n{import_path}\n\nSkipped {stats['duplicates']} already present and {stats['invalid']} invalid entries.")
+            logging.info(f"Imported {stats['added']} tasks from {import_path} ({stats['duplicates']} duplicates, {stats['invalid']} invalid).")
+
+        def failed(error):
+            state['poll'].cancel(); import_button.disabled = False; progress_bar.value = 0
+            if not state['cancelled']: show_error_popup(f'Failed to import tasks:\n{error}')
 
         def do_import(instance):
             if not filechooser.selection:
                 show_error_popup('Please select a JSON file to import.')
                 return
             import_path = filechooser.selection[0]
-            try:
-                with open(import_path, 'r', encoding='utf-8') as f:
-                    import json
-                    imported_data = json.load(f)
-                # Accept either a list of tasks or a dict with 'tasks' key
-                if isinstance(imported_data, list):
-                    self.tasks = imported_data
-                elif isinstance(imported_data, dict) and isinstance(imported_data.get('tasks'), list):
-                    self.tasks = imported_data['tasks']
-                else:
-                    raise ValueError('Imported file must contain a JSON array of tasks or an object with a "tasks" array.')
-                self.mark_tasks_changed()
-                self.update_task_view()
-                popup.dismiss()
-                show_confirmation_popup(f'Tasks imported from:\n{import_path}')
-            except Exception as e:
-                show_error_popup(f'Failed to import tasks:\n{e}')
+            # Keys of the current tasks are collected here; the worker thread never touches self.tasks
+            existing_ids = task_import.tree_ids(self.tasks); existing_keys = {task_import.content_key(task) for task in self.tasks}
+            now_iso = datetime.now().isoformat(); local_time_str = task_dates.local_time_now(PH_TZ)
+            def progress(read, total): state['read'] = read; state['total'] = max(1, total)
+            def worker():
+                try: result = task_import.import_tasks(import_path, existing_ids, existing_keys, now_iso, local_time_str, progress, lambda: state['cancelled'])
+                except task_import.ImportCancelled: return
+                except Exception as e:
+                    logging.error(f"Import of {import_path} failed: {e}", exc_info=True); Clock.schedule_once(lambda dt, error=e: failed(error)); return
+                Clock.schedule_once(lambda dt: apply(result[0], result[1], import_path))
+            def poll(dt):
+                progress_bar.value = state['read'] / state['total']
+                status_label.text = f"Reading {os.path.basename(import_path)}: {state['read'] / 2**20:.1f} of {state['total'] / 2**20:.1f} MiB"
+            import_button.disabled = True
+            state['poll'] = Clock.schedule_interval(poll, 0.1)
+            threading.Thread(target=worker, daemon=True).start()
+
+        def cancel(instance):
+            state['cancelled'] = True; popup.dismiss()
         import_button.bind(on_press=do_import)
-        cancel_button.bind(on_press=popup.dismiss)
+        cancel_button.bind(on_press=cancel)
         popup.open()
 
     def sync_to_todoist_gui(self, instance):
@@ -1926,6 +2784,11 @@ class ProductivityApp(App):
         script_path = os.path.join(base_dir, "Calendar Converter", "import_todoist.py")
         input_json = os.path.join(base_dir, TASKS_FILE)
         csv_path = os.path.join(base_dir, "Calendar Converter", "todoist_import.csv")
+        if self._sqlite_store is not None:
+            # import_todoist.py reads tasks.json, so refresh it from the database first
+            self.save_tasks(force=True); self._sqlite_store.export_json(input_json)
+        elif self._sharded_store is not None:
+            self.save_tasks(force=True); self._sharded_store.export_json(input_json, self.tasks, self._task_to_save)
         
         # Check if required files/directories exist
         if not os.path.exists(os.path.join(base_dir, "Calendar Converter")):
@@ -1964,8 +2827,7 @@ class ProductivityApp(App):
                 
                 if proc.returncode == 0:
                     # Count tasks that were synced
-                    tasks_data = self.load_tasks()
-                    todoist_tasks = [t for t in tasks_data if t.get('todone', False) and not t.get('completed', False)]
+                    todoist_tasks = [t for t in self.tasks if t.get('todone', False) and not t.get('completed', False)]
                     
                     show_confirmation_popup(f"Successfully synced {len(todoist_tasks)} tasks to Todoist!\n\nCSV file created: {csv_path}")
                 else:
@@ -1983,44 +2845,6 @@ class ProductivityApp(App):
                 
         Clock.schedule_once(run_sync, 0)
 
-        from kivy.uix.filechooser import FileChooserIconView
-        content = BoxLayout(orientation='vertical', spacing=dp(10), padding=dp(10))
-        filechooser = FileChooserIconView(path=os.getcwd(), filters=['*.json'], size_hint_y=0.8)
-        content.add_widget(filechooser)
-        button_layout = BoxLayout(size_hint_y=None, height=dp(40), spacing=dp(10))
-        import_button = Button(text='Import')
-        cancel_button = Button(text='Cancel')
-        button_layout.add_widget(import_button)
-        button_layout.add_widget(cancel_button)
-        content.add_widget(button_layout)
-        popup = Popup(title='Import Tasks', content=content, size_hint=(0.8, 0.7), auto_dismiss=False)
-
-        def do_import(instance):
-            if not filechooser.selection:
-                show_error_popup('Please select a JSON file to import.')
-                return
-            import_path = filechooser.selection[0]
-            try:
-                with open(import_path, 'r', encoding='utf-8') as f:
-                    import json
-                    imported_data = json.load(f)
-                # Accept either a list of tasks or a dict with 'tasks' key
-                if isinstance(imported_data, list):
-                    self.tasks = imported_data
-                elif isinstance(imported_data, dict) and isinstance(imported_data.get('tasks'), list):
-                    self.tasks = imported_data['tasks']
-                else:
-                    raise ValueError('Imported file must contain a JSON array of tasks or an object with a "tasks" array.')
-                self.mark_tasks_changed()
-                self.update_task_view()
-                popup.dismiss()
-                show_confirmation_popup(f'Tasks imported from:\n{import_path}')
-            except Exception as e:
-                show_error_popup(f'Failed to import tasks:\n{e}')
-        import_button.bind(on_press=do_import)
-        cancel_button.bind(on_press=popup.dismiss)
-        popup.open()
-
     
     # --- Gratitude Journal GUI ---
     def add_gratitude_gui(self, instance):
@@ -2136,8 +2960,9 @@ class ProductivityApp(App):
         task_index = self.selected_index; task = self.tasks[task_index]; task_title = task.get('task', 'Task'); current_due_date_str = task.get('due_date')
         now = datetime.now(); current_year, current_month_name, current_day = now.year, calendar.month_name[now.month], now.day
         if current_due_date_str:
-            try: parsed_date = datetime.strptime(current_due_date_str, '%d-%B-%Y'); current_year, current_month_name, current_day = parsed_date.year, calendar.month_name[parsed_date.month], parsed_date.day
-            except (ValueError, TypeError) as e: logging.warning(f"Could not parse due date '{current_due_date_str}': {e}. Defaulting to today.")
+            parsed_date = task_dates.parse_due(current_due_date_str)
+            if parsed_date is not None: current_year, current_month_name, current_day = parsed_date.year, calendar.month_name[parsed_date.month], parsed_date.day
+            else: logging.warning(f"Could not parse due date '{current_due_date_str}'. Defaulting to today.")
         content = BoxLayout(orientation='vertical', spacing=dp(10), padding=dp(10)); content.add_widget(Label(text='Select Due Date:', size_hint_y=None, height=dp(25)))
         date_grid = GridLayout(cols=3, spacing=dp(5), size_hint_y=None, height=dp(40)); year_values = [str(y) for y in range(now.year - 1, now.year + 10)]; year_spinner = Spinner(text=str(current_year), values=year_values, size_hint_x=0.4); month_values = [calendar.month_name[m] for m in range(1, 13)]; month_spinner = Spinner(text=current_month_name, values=month_values, size_hint_x=0.4); day_values = [str(d) for d in range(1, 32)]; day_spinner = Spinner(text=str(current_day), values=day_values, size_hint_x=0.2); date_grid.add_widget(year_spinner); date_grid.add_widget(month_spinner); date_grid.add_widget(day_spinner); content.add_widget(date_grid)
         def update_days(*args):
@@ -2171,16 +2996,16 @@ class ProductivityApp(App):
         try:
             year, month_str, day = int(year_spin.text), month_spin.text, int(day_spin.text); month_list = list(calendar.month_name); month = month_list.index(month_str) if month_str in month_list else 0;
             if month == 0: raise ValueError("Invalid month selected.")
-            selected_date = datetime(year, month, day); due_date_str = selected_date.strftime('%d-%B-%Y')
+            selected_date = datetime(year, month, day); due_date_str = task_dates.due_string(selected_date.date())
             if not (0 <= task_index < len(self.tasks)): raise IndexError("Task index out of bounds.")
-            task = self.tasks[task_index]; task['due_date'] = due_date_str; self.mark_tasks_changed(); logging.info(f"Set due date for task {task_index} to {due_date_str}"); popup_instance.dismiss(); self.update_task_view()
+            task = self.tasks[task_index]; task['due_date'] = due_date_str; self.mark_tasks_changed(task); logging.info(f"Set due date for task {task_index} to {due_date_str}"); popup_instance.dismiss(); self.update_task_view()
         except (ValueError, IndexError, TypeError) as e: show_error_popup(f"Invalid due date setting:\n{e}")
         except Exception as e: logging.error(f"Error saving due date: {e}", exc_info=True); show_error_popup(f"Error setting due date:\n{e}")
     def _clear_due_date(self, task_index, popup_instance):
         try:
             if not (0 <= task_index < len(self.tasks)): raise IndexError("Task index out of bounds.")
             task = self.tasks[task_index];
-            if task.get('due_date') is not None: task['due_date'] = None; self.mark_tasks_changed(); logging.info(f"Cleared due date for task {task_index}")
+            if task.get('due_date') is not None: task['due_date'] = None; self.mark_tasks_changed(task); logging.info(f"Cleared due date for task {task_index}")
             popup_instance.dismiss(); self.update_task_view()
         except IndexError: show_error_popup("Error: Task not found.")
         except Exception as e: logging.error(f"Error clearing due date: {e}", exc_info=True); show_error_popup(f"Error clearing due date:\n{e}")
@@ -2374,10 +3199,11 @@ class ProductivityApp(App):
             return
         try:
             now_iso = datetime.now().isoformat()
-            new_task = {
+            new_task = task_model.Task.from_json({
+                'id': task_store.new_task_id(),
                 'task': task_name.strip(),
                 'timer': 0,
-                'localTime': datetime.now(PH_TZ).strftime('%Y-%m-%d %H:%M:%S %Z'),
+                'localTime': task_dates.local_time_now(PH_TZ),
                 'createdAt': now_iso,
                 'timer_running': False,
                 'start_time_unix': None,
@@ -2386,10 +3212,12 @@ class ProductivityApp(App):
                 'icon': None,
                 'alarms': [],
                 'annotations': [],
-                'titleHistory': [{'title': task_name.strip(), 'timestamp': now_iso}]
-            }
+                'titleHistory': [{'title': task_name.strip(), 'timestamp': now_iso}],
+                'subtasks': [],
+                'subtasks_visible': True
+            })
             self.tasks.append(new_task)
-            self.mark_tasks_changed()
+            self.mark_tasks_changed(new_task)
             self.update_task_view()
             logging.info(f"Added task '{task_name}' with due date {due_date_str}")
             new_index = len(self.tasks) - 1
@@ -2498,6 +3326,11 @@ class ProductivityApp(App):
         content.add_widget(Label(text='Todoist API Token:', size_hint_y=None, height=dp(25)))
         content.add_widget(todoist_row)
 
+        # --- Storage Backend ---
+        storage_spinner = Spinner(text={'sqlite': 'SQLite', 'sharded': 'Sharded'}.get(self._storage_backend_name(), 'JSON'), values=('JSON', 'SQLite', 'Sharded'), size_hint_y=None, height=dp(40))
+        content.add_widget(Label(text='Storage Backend:', size_hint_y=None, height=dp(25)))
+        content.add_widget(storage_spinner)
+
         # Save/Cancel buttons
         action_buttons = BoxLayout(size_hint_y=None, height=dp(40), spacing=dp(10))
         save_button = Button(text='Save Settings')
@@ -2510,11 +3343,11 @@ class ProductivityApp(App):
         popup_width = min(dp(800), Window.width * 0.95)
         self._setup_popup = Popup(title='Application Setup', content=content, size_hint=(None, None), size=(popup_width, popup_height), auto_dismiss=False)
         self._setup_popup.bind(on_dismiss=lambda x: setattr(self, '_setup_popup', None))
-        save_button.bind(on_press=lambda instance: self._save_setup_settings(api_key_input.text, model_input.text, prompt_input.text, self._background_spinner.text, self._setup_popup, display_name_input.text, todoist_token_input.text))
+        save_button.bind(on_press=lambda instance: self._save_setup_settings(api_key_input.text, model_input.text, prompt_input.text, self._background_spinner.text, self._setup_popup, display_name_input.text, todoist_token_input.text, storage_spinner.text))
         cancel_button.bind(on_press=self._setup_popup.dismiss)
         self._setup_popup.open()
 
-    def _save_setup_settings(self, api_key, model_name, prompt, background_image, popup, user_display_name, todoist_token=None):
+    def _save_setup_settings(self, api_key, model_name, prompt, background_image, popup, user_display_name, todoist_token=None, storage_backend=None):
         """
         Save the setup settings, including user display name, to tasks.json in the meta section. Also saves API keys and background to .env.
         """
@@ -2565,30 +3398,26 @@ class ProductivityApp(App):
             logging.error(f"Failed to save settings to .env: {e}")
             show_error_popup(f"Failed to save settings to .env:\n{e}")
             return
-            
-        try:
-            # Load existing data for user display name in tasks.json
-            try:
-                with open(TASKS_FILE, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-            except FileNotFoundError:
-                data = {}
-            except json.JSONDecodeError:
-                data = {}
 
-            # If old format (just a list), convert to dict
-            if isinstance(data, list):
-                data = {"tasks": data}
+        if storage_backend:
+            try: self._switch_storage_backend(storage_backend)
+            except Exception as e:
+                logging.error(f"Failed to switch storage backend: {e}", exc_info=True)
+                show_error_popup(f"Failed to switch storage backend:\n{e}")
+                return
+        if self._sqlite_store is not None or self._sharded_store is not None:
+            (self._sqlite_store or self._sharded_store).set_meta('user_display_name', user_display_name)
+            self.user_display_name = user_display_name
+            if popup: popup.dismiss()
+            show_confirmation_popup("Settings saved successfully!")
+            return
 
-            # Save display name in tasks.json
-            data["user_display_name"] = user_display_name
+        try:
+            # Save display name in the tasks.json meta; save_tasks keeps the loaded meta fields
+            self._tasks_meta = dict(self._tasks_meta, user_display_name=user_display_name)
             self.user_display_name = user_display_name
             logging.info(f"Saving user_display_name to tasks.json: {user_display_name}")
-
-            # Write back to file
-            with open(TASKS_FILE, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            logging.info(f"Wrote data to tasks.json: {list(data.keys())}")
+            self.save_tasks(force=True)
             
             if popup:
                 popup.dismiss()
@@ -2614,7 +3443,7 @@ class ProductivityApp(App):
             if target_timestamp_unix <= time.time(): raise ValueError("Alarm time must be in the future.")
             alarm_id = f"{task_index}_{target_timestamp_unix}_{uuid4().hex[:6]}"; alarm_entry = {"id": alarm_id, "target_timestamp_unix": target_timestamp_unix, "sound_file": sound_file_full, "enabled": True}
             if not (0 <= task_index < len(self.tasks)): raise IndexError("Task index out of bounds.")
-            task = self.tasks[task_index]; task['alarms'].append(alarm_entry); self.mark_tasks_changed()
+            task = self.tasks[task_index]; task['alarms'].append(alarm_entry); self.mark_tasks_changed(task)
             if self._schedule_alarm(task_index, alarm_entry): logging.info(f"Set and scheduled alarm {alarm_id} for task {task_index} at {target_dt}")
             else: logging.error(f"Failed to schedule newly created alarm {alarm_id}")
             popup_instance.dismiss(); Clock.schedule_once(lambda dt: self.set_alarm_gui(None), 0.1)
@@ -2685,7 +3514,7 @@ class ProductivityApp(App):
         if len(task['alarms']) < original_length:
             event = self.scheduled_alarms.pop(alarm_id, None);
             if event: event.cancel(); logging.info(f"Cancelled scheduled Clock event for deleted alarm {alarm_id}.")
-            self.mark_tasks_changed(); logging.info(f"Deleted alarm {alarm_id} from task {task_index}."); return True
+            self.mark_tasks_changed(task); logging.info(f"Deleted alarm {alarm_id} from task {task_index}."); return True
         else: logging.warning(f"Could not find alarm ID {alarm_id} to delete in task {task_index}."); return False
 
     # --- Annotation & Task Icon System Implementation ---
@@ -2742,7 +3571,9 @@ class ProductivityApp(App):
         # --- End New Annotation Input ---
 
         # --- Action Buttons ---
-        button_layout = BoxLayout(size_hint_y=None, height=dp(40), spacing=dp(10)); save_button = Button(text='Save Annotation'); close_button = Button(text='Close'); button_layout.add_widget(save_button); button_layout.add_widget(close_button); content.add_widget(button_layout)
+        button_layout = BoxLayout(size_hint_y=None, height=dp(40), spacing=dp(10)); save_button = Button(text='Save Annotation'); close_button = Button(text='Close'); button_layout.add_widget(save_button); button_layout.add_widget(close_button);
+        if os.path.exists(retention.COLD_ANNOTATIONS_FILE): archived_button = Button(text='Archived'); archived_button.bind(on_press=lambda x: self._show_cold_annotations(task)); button_layout.add_widget(archived_button, index=1)
+        content.add_widget(button_layout)
         # --- End Action Buttons ---
 
         popup_height = min(dp(650), Window.height * 0.85); popup_width = min(dp(500), Window.width * 0.7)
@@ -2752,6 +3583,13 @@ class ProductivityApp(App):
         close_button.bind(on_press=self._annotation_popup.dismiss)
         self._annotation_popup.open(); new_annotation_input.focus = True
 
+    def _show_cold_annotations(self, task):
+        """Lists the annotations the retention policy moved to cold storage for this task."""
+        try: archived = retention.load_cold_annotations(task.get('id'))
+        except OSError as e: logging.error(f"Error reading cold storage: {e}"); show_error_popup(f"Could not read archived annotations:\n{e}"); return
+        lines = [f"{a.get('timestamp', '')[:19].replace('T', ' ')}: {a.get('text', '')}" for a in reversed(archived)]
+        show_confirmation_popup("\n".join(lines) or "No archived annotations for this task.", title='Archived Annotations', size_hint=(0.6, 0.6))
+
     # --- REMOVED _get_available_task_icons ---
     # --- REMOVED _open_icon_selector_popup ---
 
@@ -2833,7 +3671,7 @@ class ProductivityApp(App):
         # Update only if the path is different (or None)
         if current_icon != icon_path:
             task['icon'] = icon_path # Assign the new path (or None)
-            self.mark_tasks_changed()
+            self.mark_tasks_changed(task)
             logging.info(f"Set icon for task {task_index} to: {icon_path}")
 
             # Update preview in the main annotation popup if it's still open
@@ -2869,7 +3707,7 @@ class ProductivityApp(App):
         try:
             task = self.tasks[task_index]; timestamp = datetime.now().isoformat(); annotation_entry = {'text': new_text, 'timestamp': timestamp}
             if 'annotations' not in task or not isinstance(task['annotations'], list): task['annotations'] = []
-            task['annotations'].append(annotation_entry); self.mark_tasks_changed(); logging.info(f"Saved annotation for task {task_index}"); text_input_widget.text = ""
+            task['annotations'].append(annotation_entry); self.mark_tasks_changed(task); logging.info(f"Saved annotation for task {task_index}"); text_input_widget.text = ""
             # Only dismiss and reopen if saving annotation itself, not just icon
             if popup_instance:
                  popup_instance.dismiss();
@@ -2889,9 +3727,139 @@ class ProductivityApp(App):
         task = self.tasks[task_index];
         if 'annotations' not in task or not isinstance(task['annotations'], list): return False
         if not (0 <= annotation_index < len(task['annotations'])): return False
-        try: deleted_annotation = task['annotations'].pop(annotation_index); self.mark_tasks_changed(); logging.info(f"Deleted annotation (index {annotation_index}) from task {task_index}: '{deleted_annotation.get('text', '')[:20]}...'"); return True
+        try: deleted_annotation = task['annotations'].pop(annotation_index); self.mark_tasks_changed(task); logging.info(f"Deleted annotation (index {annotation_index}) from task {task_index}: '{deleted_annotation.get('text', '')[:20]}...'"); return True
         except Exception as e: logging.error(f"Error deleting annotation: {e}", exc_info=True); return False
 
+    # --- Search ---
+    def search_gui(self, instance):
+        """Search-as-you-type popup over tasks, subtasks, annotations, title history and gratitude entries (Ctrl+F)."""
+        if self._search_popup or self.search_index is None: return
+        self._ensure_search_index()
+        content = BoxLayout(orientation='vertical', spacing=dp(8), padding=dp(10))
+        query_input = TextInput(hint_text='Search...   word   prefix*   "exact phrase"', multiline=False, size_hint_y=None, height=dp(40))
+        status_label = Label(text='', size_hint_y=None, height=dp(20))
+        results_scroll = ScrollView(do_scroll_x=False, bar_width=dp(10)); results_layout = BoxLayout(orientation='vertical', spacing=dp(3), size_hint_y=None); results_layout.bind(minimum_height=results_layout.setter('height')); results_scroll.add_widget(results_layout)
+        close_button = Button(text='Close', size_hint_y=None, height=dp(40))
+        content.add_widget(query_input); content.add_widget(status_label); content.add_widget(results_scroll); content.add_widget(close_button)
+        popup = Popup(title='Search', content=content, size_hint=(0.7, 0.8)); self._search_popup = popup
+        kind_labels = {'task': 'Task', 'subtask': 'Subtask', 'gratitude': 'Gratitude'}
+        hits = []
+        def open_hit(hit):
+            popup.dismiss()
+            if hit.kind == 'gratitude': self._reveal_date(hit.label)
+            else: self._reveal_task(hit.root_id, expand_subtasks=hit.kind == 'subtask')
+        def run_query(*args):
+            results_layout.clear_widgets(); hits[:] = self.search_index.search(query_input.text, prefix_last=True) if query_input.text.strip() else []
+            status_label.text = f"{len(hits)} result{'' if len(hits) == 1 else 's'}" if query_input.text.strip() else ''
+            for hit in hits:
+                button = Button(text=f"{kind_labels[hit.kind]}: {hit.label}\n{hit.snippet}", size_hint_y=None, height=dp(52), halign='left', valign='middle')
+                button.bind(size=lambda b, size: setattr(b, 'text_size', (size[0] - dp(10), None)))
+                button.bind(on_press=lambda b, h=hit: open_hit(h))
+                results_layout.add_widget(button)
+        query_input.bind(text=run_query)
+        query_input.bind(on_text_validate=lambda *args: open_hit(hits[0]) if hits else None)
+        close_button.bind(on_press=popup.dismiss)
+        popup.bind(on_dismiss=lambda x: setattr(self, '_search_popup', None))
+        popup.open(); query_input.focus = True
+
+    def quick_switcher_gui(self, instance):
+        """Ctrl+K palette: fuzzy-matches task and subtask titles as you type; Enter jumps to the highlighted one."""
+        if self._switcher_popup or self.switcher_index is None: return
+        content = BoxLayout(orientation='vertical', spacing=dp(6), padding=dp(10))
+        query_input = TextInput(hint_text='Go to task...', multiline=False, size_hint_y=None, height=dp(40))
+        results_scroll = ScrollView(do_scroll_x=False, bar_width=dp(10)); results_layout = BoxLayout(orientation='vertical', spacing=dp(2), size_hint_y=None); results_layout.bind(minimum_height=results_layout.setter('height')); results_scroll.add_widget(results_layout)
+        content.add_widget(query_input); content.add_widget(results_scroll)
+        popup = Popup(title='Quick Switcher', content=content, size_hint=(0.5, 0.6)); self._switcher_popup = popup
+        hits = []; buttons = []; state = {'highlight': 0}
+        def open_hit(hit):
+            popup.dismiss(); self.switcher_index.touch(hit.node_id)
+            self._reveal_task(hit.root_id, expand_subtasks=hit.kind == 'subtask')
+        def set_highlight(position):
+            if not buttons: return
+            state['highlight'] = position % len(buttons)
+            for i, button in enumerate(buttons): button.background_color = (0.4, 0.6, 1, 1) if i == state['highlight'] else (1, 1, 1, 1)
+            results_scroll.scroll_to(buttons[state['highlight']], animate=False)
+        def run_query(*args):
+            results_layout.clear_widgets(); buttons.clear(); hits[:] = self.switcher_index.search(query_input.text)
+            for hit in hits:
+                button = Button(text=hit.title if hit.kind == 'task' else f"    {hit.title}  (subtask)", size_hint_y=None, height=dp(34), halign='left', valign='middle', shorten=True)
+                button.bind(size=lambda b, size: setattr(b, 'text_size', (size[0] - dp(10), size[1])))
+                button.bind(on_press=lambda b, h=hit: open_hit(h))
+                results_layout.add_widget(button); buttons.append(button)
+            set_highlight(0)
+        popup.move_highlight = lambda step: set_highlight(state['highlight'] + step)
+        query_input.bind(text=run_query)
+        query_input.bind(on_text_validate=lambda *args: open_hit(hits[state['highlight']]) if hits else None)
+        popup.bind(on_dismiss=lambda x: setattr(self, '_switcher_popup', None))
+        popup.open(); query_input.focus = True
+
+    def archive_gui(self, instance):
+        """Archive view: browse archived months or search them, and restore tasks with one click."""
+        months = archive_store.list_months()
+        content = BoxLayout(orientation='vertical', spacing=dp(8), padding=dp(10))
+        top_row = BoxLayout(size_hint_y=None, height=dp(40), spacing=dp(8))
+        month_spinner = Spinner(text=months[0] if months else '(empty)', values=months, size_hint_x=0.3)
+        search_input = TextInput(hint_text='Search archive...', multiline=False, size_hint_x=0.5); search_button = Button(text='Search', size_hint_x=0.2)
+        top_row.add_widget(month_spinner); top_row.add_widget(search_input); top_row.add_widget(search_button)
+        results_scroll = ScrollView(do_scroll_x=False, bar_width=dp(10))
+        results_layout = BoxLayout(orientation='vertical', spacing=dp(3), size_hint_y=None); results_layout.bind(minimum_height=results_layout.setter('height'))
+        results_scroll.add_widget(results_layout)
+        close_button = Button(text='Close', size_hint_y=None, height=dp(40))
+        content.add_widget(top_row); content.add_widget(results_scroll); content.add_widget(close_button)
+        popup = Popup(title='Archive', content=content, size_hint=(0.7, 0.8))
+        def show(entries):
+            results_layout.clear_widgets()
+            if not entries: results_layout.add_widget(Label(text='No archived tasks.', size_hint_y=None, height=dp(30))); return
+            for month, archived_task in entries:
+                row = BoxLayout(size_hint_y=None, height=dp(36), spacing=dp(5))
+                label = Label(text=f"{archived_task.get('task', '')}   ({str(archived_task.get('completedAt', ''))[:10]})", halign='left', valign='middle', shorten=True, size_hint_x=0.8)
+                label.bind(size=lambda l, size: setattr(l, 'text_size', size))
+                restore_button = Button(text='Restore', size_hint_x=0.2)
+                restore_button.bind(on_press=lambda b, m=month, t=archived_task, r=row: restore(m, t, r))
+                row.add_widget(label); row.add_widget(restore_button); results_layout.add_widget(row)
+        def restore(month, archived_task, row):
+            try: restored = archive_store.restore_task(month, archived_task.get('id'))
+            except (OSError, ValueError) as e: logging.error(f"Restore from archive failed: {e}", exc_info=True); show_error_popup(f"Could not restore task:\n{e}"); return
+            if restored is None: show_error_popup("Task is no longer in the archive."); return
+            restored['completedAt'] = datetime.now().isoformat(); restored['completedAtEstimated'] = True  # keep it live for another ARCHIVE_AFTER_DAYS
+            task_store.canonicalize_dates(restored)  # archived before due dates were stored as ISO
+            task = task_model.Task.from_json(restored)
+            self.tasks.append(task); self.mark_tasks_changed(task); self.update_task_view(); self.save_tasks()
+            results_layout.remove_widget(row); logging.info(f"Restored '{restored.get('task', '')}' from archive {month}.")
+        def show_month(*args):
+            if month_spinner.text in months: show([(month_spinner.text, t) for t in archive_store.load_month(month_spinner.text)])
+        def run_search(*args):
+            if search_input.text.strip(): show(list(archive_store.search(search_input.text)))
+            else: show_month()
+        month_spinner.bind(text=show_month); search_button.bind(on_press=run_search); search_input.bind(on_text_validate=run_search)
+        close_button.bind(on_press=popup.dismiss)
+        show_month()
+        popup.open()
+
+    def _reveal_task(self, task_id, expand_subtasks=False):
+        """Selects the top-level task with task_id and scrolls the task list to it."""
+        index = next((i for i, task in enumerate(self.tasks) if task.get('id') == task_id), None)
+        if index is None: show_error_popup("That task no longer exists."); return
+        if self.task_views is not None and not self.task_views.contains(self.tasks[index]): self._set_task_view(task_views.DEFAULT_VIEW.name)  # the active view hides it
+        if expand_subtasks and not self.tasks[index].get('subtasks_visible', True): self.toggle_subtask_visibility(index)
+        self.last_click_time = None; self.select_task(index)
+        def scroll(dt):
+            row = self.task_widgets.get(index)
+            if row is not None and row.parent is self.task_list_layout: self.task_scroll_view.scroll_to(row, padding=dp(10), animate=False)
+        Clock.schedule_once(scroll, 0)
+
+    def _show_calendar_month(self, year, month):
+        if hasattr(self, 'calendar_widget') and (self.calendar_widget.year, self.calendar_widget.month) != (year, month):
+            self.calendar_widget.show_month(year, month)
+
+    def _reveal_date(self, date_str):
+        """Shows the month containing date_str in the calendar and lists that day's gratitude entries."""
+        try: day = datetime.strptime(date_str, '%Y-%m-%d')
+        except ValueError: logging.warning(f"Cannot reveal invalid date {date_str}"); return
+        self._show_calendar_month(day.year, day.month)
+        entries = self.gratitude_entries.get(date_str, [])
+        show_confirmation_popup("\n\n".join(entry.get('text', '') for entry in entries) or "No entries.", title=day.strftime('%A, %d %B %Y'), size_hint=(0.6, 0.5))
+
     # --- Other GUI Handlers ---
     def change_task_title_gui(self, instance):
         if self.selected_index is None:
@@ -2968,7 +3936,7 @@ class ProductivityApp(App):
             # Prune titleHistory to last 10 entries (keep most recent)
             if len(task['titleHistory']) > 10:
                 task['titleHistory'] = task['titleHistory'][-10:]
-            self.mark_tasks_changed()
+            self.mark_tasks_changed(task)
             self.update_task_view()
             popup.dismiss()
 
@@ -2987,7 +3955,11 @@ class ProductivityApp(App):
         current_status = task.get('completed', False)
         new_status = not current_status
         task['completed'] = new_status
-        self.mark_tasks_changed()
+        self._roll_up_completion(task, new_status)
+        if new_status: task['completedAt'] = datetime.now().isoformat()
+        else: task.pop('completedAt', None)
+        task.pop('completedAtEstimated', None)
+        self.mark_tasks_changed(task)
         if new_status:
             if task.get('timer_running'):
                 self.stop_timer(task_index)
@@ -3036,8 +4008,8 @@ class ProductivityApp(App):
         current_visibility = task.get('subtasks_visible', True)
         task['subtasks_visible'] = not current_visibility
         
-        self.mark_tasks_changed()
-        self.update_task_view()
+        self.mark_tasks_changed(task)
+        self._refresh_task_rows([task])
         
         visibility_text = "shown" if task['subtasks_visible'] else "hidden"
         logging.info(f"Subtasks for task '{task.get('task', 'Unknown')}' are now {visibility_text}")
@@ -3493,7 +4465,7 @@ class ProductivityApp(App):
             
             # Apply to current minimize mode labels if active
             if self.minimized and hasattr(self, '_minimized_timer_labels'):
-                for idx, label in self._minimized_timer_labels:
+                for _, label in self._minimized_timer_labels:
                     label.color = self._minimize_text_color
                     
                 # Also update other labels in minimize mode
@@ -3573,6 +4545,53 @@ class ProductivityApp(App):
     def update_window_title_display(self):
          try: Window.set_title(self.format_timer_info_for_title())
          except Exception as e: logging.error(f"Error updating window title: {e}")
+    def _fill_minimized_tasks(self):
+        """(Re)builds the minimized window's rows from the head of the Next up queue."""
+        tasks_to_show = self.next_up.top(3) if self.next_up is not None else self.tasks[:3]
+        self._minimized_task_ids = [task.get('id') for task in tasks_to_show]
+        self._minimized_tasks_layout.clear_widgets(); self._minimized_timer_labels = []
+        for idx, task in enumerate(tasks_to_show):
+            row = BoxLayout(orientation='horizontal', spacing=8, size_hint_y=None, height=36)
+            task_name = task.get('task', f'Task {idx+1}')
+            due_date = task.get('due_date', None)
+            due_text = f"Due: {task_dates.format_due(due_date)}" if due_date else ""
+            # Insert line breaks if text is too long
+            def insert_linebreaks(text, maxlen):
+                if len(text) <= maxlen: return text
+                words = text.split()
+                lines = []
+                current = ''
+                for word in words:
+                    if len(current) + len(word) + 1 > maxlen:
+                        if current:
+                            lines.append(current)
+                        current = word
+                    else:
+                        if current:
+                            current += ' '
+                        current += word
+                if current:
+                    lines.append(current)
+                # Indent all but the first line
+                if len(lines) <= 1:
+                    return lines[0] if lines else ''
+                return lines[0] + '\n' + '\n'.join('  ' + l for l in lines[1:])
+            task_name_wrapped = insert_linebreaks(task_name, 20)
+            due_text_wrapped = insert_linebreaks(due_text, 18)
+            name_label = Label(text=task_name_wrapped, size_hint_x=0.45, halign='left', valign='middle', shorten=False, color=self._minimize_text_color)
+            name_label.bind(size=lambda inst, val: setattr(name_label, 'text_size', (name_label.width, None)))
+            name_label.bind(texture_size=lambda inst, val: setattr(inst, 'height', inst.texture_size[1]))
+            due_label = Label(text=due_text_wrapped, size_hint_x=0.25, halign='left', valign='middle', shorten=False, color=self._minimize_text_color)
+            due_label.bind(size=lambda inst, val: setattr(due_label, 'text_size', (due_label.width, None)))
+            due_label.bind(texture_size=lambda inst, val: setattr(inst, 'height', inst.texture_size[1]))
+            # Right-justified timer label
+            timer_label = Label(text='', size_hint_x=0.3, halign='right', valign='middle', color=self._minimize_text_color)
+            timer_label.bind(size=lambda inst, val: setattr(timer_label, 'text_size', (timer_label.width, timer_label.height)))
+            row.add_widget(name_label)
+            row.add_widget(due_label)
+            row.add_widget(timer_label)
+            self._minimized_tasks_layout.add_widget(row)
+            self._minimized_timer_labels.append((task, timer_label))
     def minimize_app(self, instance):
         if not self.minimized:
             self.minimized = True
@@ -3607,55 +4626,12 @@ class ProductivityApp(App):
             from kivy.uix.button import Button
             from kivy.uix.gridlayout import GridLayout
             from kivy.clock import Clock
-            tasks_to_show = self.tasks[:3]
             minimal_layout = BoxLayout(orientation='vertical', spacing=10, padding=10)
-            title_label = Label(text='Top 3 Tasks', size_hint_y=None, height=30, font_size=18, color=self._minimize_text_color)
+            title_label = Label(text='Next Up', size_hint_y=None, height=30, font_size=18, color=self._minimize_text_color)
             minimal_layout.add_widget(title_label)
             tasks_layout = GridLayout(cols=1, spacing=5, size_hint_y=None)
             tasks_layout.bind(minimum_height=tasks_layout.setter('height'))
-            self._minimized_timer_labels = []
-            for idx, task in enumerate(tasks_to_show):
-                row = BoxLayout(orientation='horizontal', spacing=8, size_hint_y=None, height=36)
-                task_name = task.get('task', f'Task {idx+1}')
-                due_date = task.get('due_date', None)
-                due_text = f"Due: {due_date}" if due_date else ""
-                # Insert line breaks if text is too long
-                def insert_linebreaks(text, maxlen):
-                    if len(text) <= maxlen: return text
-                    words = text.split()
-                    lines = []
-                    current = ''
-                    for word in words:
-                        if len(current) + len(word) + 1 > maxlen:
-                            if current:
-                                lines.append(current)
-                            current = word
-                        else:
-                            if current:
-                                current += ' '
-                            current += word
-                    if current:
-                        lines.append(current)
-                    # Indent all but the first line
-                    if len(lines) <= 1:
-                        return lines[0] if lines else ''
-                    return lines[0] + '\n' + '\n'.join('  ' + l for l in lines[1:])
-                task_name_wrapped = insert_linebreaks(task_name, 20)
-                due_text_wrapped = insert_linebreaks(due_text, 18)
-                name_label = Label(text=task_name_wrapped, size_hint_x=0.45, halign='left', valign='middle', shorten=False, color=self._minimize_text_color)
-                name_label.bind(size=lambda inst, val: setattr(name_label, 'text_size', (name_label.width, None)))
-                name_label.bind(texture_size=lambda inst, val: setattr(inst, 'height', inst.texture_size[1]))
-                due_label = Label(text=due_text_wrapped, size_hint_x=0.25, halign='left', valign='middle', shorten=False, color=self._minimize_text_color)
-                due_label.bind(size=lambda inst, val: setattr(due_label, 'text_size', (due_label.width, None)))
-                due_label.bind(texture_size=lambda inst, val: setattr(inst, 'height', inst.texture_size[1]))
-                # Right-justified timer label
-                timer_label = Label(text='', size_hint_x=0.3, halign='right', valign='middle', color=self._minimize_text_color)
-                timer_label.bind(size=lambda inst, val: setattr(timer_label, 'text_size', (timer_label.width, timer_label.height)))
-                row.add_widget(name_label)
-                row.add_widget(due_label)
-                row.add_widget(timer_label)
-                tasks_layout.add_widget(row)
-                self._minimized_timer_labels.append((idx, timer_label))
+            self._minimized_tasks_layout = tasks_layout; self._fill_minimized_tasks()
             minimal_layout.add_widget(tasks_layout)
             
             # Button layout for REVERT and Color Picker
@@ -3678,15 +4654,11 @@ class ProductivityApp(App):
                 self.root.add_widget(minimal_layout)
             # Schedule timer updates
             def update_minimal_timers(dt):
-                for idx, label in self._minimized_timer_labels:
-                    if idx < len(self.tasks):
-                        task = self.tasks[idx]
-                        timer = task.get('timer', 0)
-                        if task.get('timer_running') and isinstance(task.get('start_time_unix'), (int, float)):
-                            timer += time.time() - task['start_time_unix']
-                        label.text = f"Timer: {format_timedelta(timer)}"
-                    else:
-                        label.text = ""
+                for task, label in self._minimized_timer_labels:
+                    timer = task.get('timer', 0)
+                    if task.get('timer_running') and isinstance(task.get('start_time_unix'), (int, float)):
+                        timer += time.time() - task['start_time_unix']
+                    label.text = f"Timer: {format_timedelta(timer)}"
             self._min_timer_ev = Clock.schedule_interval(update_minimal_timers, 1)
             update_minimal_timers(0)
             self.update_window_title_display()
@@ -3701,6 +4673,7 @@ class ProductivityApp(App):
                 elif self._minimal_layout.parent == self.root:
                     self.root.remove_widget(self._minimal_layout)
                 self._minimal_layout = None
+            self._minimized_tasks_layout = None
             # Cancel timer update event
             if hasattr(self, '_min_timer_ev') and self._min_timer_ev:
                 try:
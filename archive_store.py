@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Archive tier for completed tasks.
+
+Tasks completed more than ARCHIVE_AFTER_DAYS days ago leave the live task
+list and are stored in one file per month of completion under
+broadcasts/archive/ (YYYY-MM.json, a plain list in the tasks.json task
+layout). Nothing here is read at startup: the Archive view lists the month
+files by name and only decodes a month when it is opened or searched.
+"""
+
+import os
+import logging
+from datetime import datetime
+
+import json_codec
+
+ARCHIVE_FOLDER = os.path.join('broadcasts', 'archive')
+DEFAULT_ARCHIVE_AFTER_DAYS = 30
+
+
+def archive_after_days():
+    """ARCHIVE_AFTER_DAYS from .env; 0 turns automatic archiving off."""
+    raw = os.getenv('ARCHIVE_AFTER_DAYS', '').strip()
+    try: return max(0, int(raw)) if raw else DEFAULT_ARCHIVE_AFTER_DAYS
+    except ValueError: logging.warning(f"Ignoring invalid ARCHIVE_AFTER_DAYS={raw!r}"); return DEFAULT_ARCHIVE_AFTER_DAYS
+
+
+def _completed_at(task):
+    try: return datetime.fromisoformat(str(task.get('completedAt')))
+    except (TypeError, ValueError): return None
+
+
+def select_archivable(tasks, days, now=None):
+    """Completed top-level tasks whose completedAt is more than days old."""
+    if not days: return []
+    now = now or datetime.now()
+    archivable = []
+    for task in tasks:
+        if not task.get('completed') or task.get('timer_running'): continue
+        completed_at = _completed_at(task)
+        if completed_at is not None and (now - completed_at.replace(tzinfo=None)).days >= days: archivable.append(task)
+    return archivable
+
+
+def _month_path(month, folder):
+    return os.path.join(folder, f'{month}.json')
+
+
+def _read_month(path):
+    if not os.path.exists(path): return []
+    data = json_codec.load_file(path)
+    return data if isinstance(data, list) else []
+
+
+def _write_month(path, tasks):
+    folder = os.path.dirname(path)
+    if folder and not os.path.exists(folder): os.makedirs(folder)
+    if not tasks:
+        if os.path.exists(path): os.remove(path)
+        return
+    json_codec.write_file(path, tasks, json_codec.pretty_json_enabled())
+
+
+def archive_tasks(tasks, folder=ARCHIVE_FOLDER):
+    """Appends tasks (records or dicts) to their completion-month files. Returns the number written."""
+    by_month = {}
+    for task in tasks:
+        completed_at = _completed_at(task)
+        month = completed_at.strftime('%Y-%m') if completed_at else 'undated'
+        by_month.setdefault(month, []).append(task.to_json() if hasattr(task, 'to_json') else dict(task))
+    for month, new_tasks in by_month.items():
+        path = _month_path(month, folder)
+        existing = _read_month(path)
+        known_ids = {t.get('id') for t in new_tasks}
+        _write_month(path, [t for t in existing if t.get('id') not in known_ids] + new_tasks)
+    return sum(len(t) for t in by_month.values())
+
+
+def list_months(folder=ARCHIVE_FOLDER):
+    """Archived months, newest first, from the file names alone."""
+    if not os.path.isdir(folder): return []
+    return sorted((name[:-5] for name in os.listdir(folder) if name.endswith('.json')), reverse=True)
+
+
+def load_month(month, folder=ARCHIVE_FOLDER):
+    return _read_month(_month_path(month, folder))
+
+
+def iter_archived(folder=ARCHIVE_FOLDER):
+    """Yields every archived task (as a dict), loading months one at a time."""
+    for month in list_months(folder): yield from load_month(month, folder)
+
+
+def search(query, folder=ARCHIVE_FOLDER):
+    """Yields (month, task) for archived tasks whose title or annotations contain query, loading months one at a time."""
+    needle = query.strip().lower()
+    if not needle: return
+    for month in list_months(folder):
+        for task in load_month(month, folder):
+            texts = [str(task.get('task', ''))] + [str(a.get('text', '')) for a in task.get('annotations') or [] if isinstance(a, dict)]
+            if any(needle in text.lower() for text in texts): yield month, task
+
+
+def restore_task(month, task_id, folder=ARCHIVE_FOLDER):
+    """Removes a task from the archive and returns it (as a dict), or None if it is not there."""
+    path = _month_path(month, folder)
+    tasks = _read_month(path)
+    restored = next((t for t in tasks if t.get('id') == task_id), None)
+    if restored is not None: _write_month(path, [t for t in tasks if t is not restored])
+    return restored
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+Deduplicated, compressed backups of the task list, taken on every save.
+
+Layout under broadcasts/backups/:
+
+    chunks/ab/<sha256>.z            one top-level task as JSON, zlib-compressed,
+                                    named by the SHA-256 of that JSON
+    snapshots/YYYYMMDD-HHMMSS.json  {"created", "meta", "count", "chunks": [hash, ...]}
+
+A snapshot is the ordered list of its tasks' chunk hashes, so a task that
+did not change is stored once no matter how many snapshots contain it, and
+a save only writes the chunks of the tasks it changed.
+
+Retention keeps the newest snapshot of each of the last BACKUP_KEEP_HOURLY
+hours, BACKUP_KEEP_DAILY days and BACKUP_KEEP_WEEKLY weeks (.env, defaults
+24, 7 and 8) plus the newest one overall. Older snapshots are deleted along
+with the chunks no remaining snapshot refers to. BACKUPS=false turns
+backups off.
+"""
+
+import os
+import zlib
+import hashlib
+import logging
+from datetime import datetime, timedelta
+
+import json_codec
+
+BACKUP_FOLDER = os.path.join('broadcasts', 'backups')
+NAME_FORMAT = '%Y%m%d-%H%M%S'
+DEFAULT_RETENTION = (24, 7, 8)  # hourly, daily, weekly
+
+
+def backups_enabled():
+    return os.getenv('BACKUPS', 'true').strip().lower() not in ('0', 'false', 'no', 'off')
+
+
+def retention_from_env():
+    keep = []
+    for key, default in zip(('BACKUP_KEEP_HOURLY', 'BACKUP_KEEP_DAILY', 'BACKUP_KEEP_WEEKLY'), DEFAULT_RETENTION):
+        raw = os.getenv(key, '').strip()
+        try: keep.append(max(0, int(raw)) if raw else default)
+        except ValueError: logging.warning(f"Ignoring invalid {key}={raw!r}"); keep.append(default)
+    return tuple(keep)
+
+
+def created_of(name):
+    return datetime.strptime(name, NAME_FORMAT)
+
+
+def select_kept(names, now, keep=DEFAULT_RETENTION):
+    """Names of the snapshots the hourly/daily/weekly schedule keeps (always including the newest)."""
+    hourly, daily, weekly = keep
+    tiers = [(timedelta(hours=hourly), lambda t: t.strftime('%Y%m%d%H')),
+             (timedelta(days=daily), lambda t: t.strftime('%Y%m%d')),
+             (timedelta(weeks=weekly), lambda t: t.isocalendar()[:2])]
+    newest = sorted(names, reverse=True)
+    kept = set(newest[:1]); seen = [set() for _ in tiers]
+    for name in newest:
+        created = created_of(name)
+        for (window, bucket), taken in zip(tiers, seen):
+            key = bucket(created)
+            if now - created < window and key not in taken: taken.add(key); kept.add(name)
+    return kept
+
+
+class BackupStore:
+    def __init__(self, folder=BACKUP_FOLDER, keep=None):
+        self.path = folder
+        self.keep = keep or retention_from_env()
+        self._chunk_dir = os.path.join(folder, 'chunks'); self._snapshot_dir = os.path.join(folder, 'snapshots')
+        for path in (self._chunk_dir, self._snapshot_dir):
+            if not os.path.exists(path): os.makedirs(path)
+        self._known = None     # hashes of the stored chunks, listed on first use
+        self._refs = {}        # snapshot name -> set of chunk hashes, read on first prune
+        self._hashes = {}      # task id -> (fragment, hash) from the previous snapshot
+        self._last = None      # (meta, hashes) of the newest snapshot
+
+    def _chunk_path(self, digest):
+        return os.path.join(self._chunk_dir, digest[:2], digest + '.z')
+
+    def _snapshot_path(self, name):
+        return os.path.join(self._snapshot_dir, name + '.json')
+
+    def _read_snapshot(self, name):
+        return json_codec.load_file(self._snapshot_path(name))
+
+    def names(self):
+        """Snapshot names, newest first."""
+        return sorted((name[:-5] for name in os.listdir(self._snapshot_dir) if name.endswith('.json')), reverse=True)
+
+    def _load_state(self):
+        self._known = {name[:-2] for sub in os.listdir(self._chunk_dir) if os.path.isdir(os.path.join(self._chunk_dir, sub))
+                       for name in os.listdir(os.path.join(self._chunk_dir, sub)) if name.endswith('.z')}
+        names = self.names()
+        if names:
+            try: newest = self._read_snapshot(names[0]); self._last = (newest.get('meta'), newest.get('chunks'))
+            except (OSError, ValueError) as e: logging.warning(f"Could not read backup {names[0]}: {e}")
+
+    def snapshot(self, meta, fragments, now=None):
+        """
+        Records a backup of the tasks given as (task id, encoded JSON) pairs,
+        writing only chunks not stored yet, then applies the retention
+        schedule. Returns the snapshot name, or None when nothing changed
+        since the previous snapshot.
+        """
+        now = now or datetime.now()
+        if self._known is None: self._load_state()
+        hashes = []; hash_of = {}; new_chunks = {}
+        for task_id, fragment in fragments:
+            previous = self._hashes.get(task_id)
+            if previous is not None and previous[0] is fragment: digest = previous[1]  # cached fragment, same text as last time
+            else: digest = hashlib.sha256(fragment.encode('utf-8')).hexdigest()
+            hash_of[task_id] = (fragment, digest); hashes.append(digest)
+            if digest not in self._known: new_chunks[digest] = fragment
+        self._hashes = hash_of
+        meta = json_codec.loads(json_codec.dumpb(meta))  # detached copy for the next comparison
+        if self._last == (meta, hashes): return None
+        for digest, fragment in new_chunks.items():
+            path = self._chunk_path(digest)
+            if not os.path.exists(os.path.dirname(path)): os.makedirs(os.path.dirname(path))
+            with open(path + '.tmp', 'wb') as f: f.write(zlib.compress(fragment.encode('utf-8'), 6))
+            os.replace(path + '.tmp', path); self._known.add(digest)
+        name = now.strftime(NAME_FORMAT)
+        json_codec.write_file(self._snapshot_path(name), {'created': now.isoformat(), 'meta': meta, 'count': len(hashes), 'chunks': hashes})
+        self._last = (meta, hashes); self._refs[name] = set(hashes)
+        logging.info(f"Backup {name}: {len(hashes)} tasks, {len(new_chunks)} new chunks.")
+        self.prune(now)
+        return name
+
+    def prune(self, now=None):
+        """Deletes the snapshots the retention schedule drops and the chunks only they used. Returns (snapshots, chunks) deleted."""
+        names = self.names()
+        dropped = [name for name in names if name not in select_kept(names, now or datetime.now(), self.keep)]
+        if not dropped: return 0, 0
+        for name in dropped:
+            os.remove(self._snapshot_path(name)); self._refs.pop(name, None)
+        for name in self.names():
+            if name not in self._refs: self._refs[name] = set(self._read_snapshot(name).get('chunks', []))
+        if self._known is None: self._load_state()
+        live = set().union(*self._refs.values())
+        unused = [digest for digest in self._known if digest not in live]
+        for digest in unused:
+            try: os.remove(self._chunk_path(digest))
+            except FileNotFoundError: pass
+            self._known.discard(digest)
+        return len(dropped), len(unused)
+
+    def list_snapshots(self):
+        """[(name, created datetime, task count)], newest first."""
+        snapshots = []
+        for name in self.names():
+            try: snapshots.append((name, created_of(name), self._read_snapshot(name).get('count', 0)))
+            except (OSError, ValueError) as e: logging.warning(f"Skipping unreadable backup {name}: {e}")
+        return snapshots
+
+    def restore(self, name):
+        """(meta, tasks data) of a snapshot. Raises ValueError for a corrupt chunk."""
+        snapshot = self._read_snapshot(name)
+        tasks = []
+        for digest in snapshot.get('chunks', []):
+            with open(self._chunk_path(digest), 'rb') as f:
+                try: tasks.append(json_codec.loads(zlib.decompress(f.read())))
+                except zlib.error as e: raise ValueError(f"Backup chunk {digest} is corrupt: {e}")
+        return snapshot.get('meta', {}), tasks
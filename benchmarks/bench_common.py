@@ -0,0 +1,35 @@
+"""
+Shared pieces of the benchmarks: synthetic tasks and a best-of timer. Also
+puts the repository on sys.path, so benchmarks import it first.
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import task_store
+
+
+def make_task(i, now_iso):
+    return {
+        'id': task_store.new_task_id(), 'task': f'Synthetic task {i}', 'timer': float(i % 500),
+        'localTime': '2025-04-18 16:35:40 PST', 'createdAt': now_iso, 'timer_running': False,
+        'start_time_unix': None, 'completed': i % 3 == 0, 'due_date': '18-April-2025' if i % 4 == 0 else None,
+        'icon': None, 'subtasks_visible': True,
+        'alarms': [{'id': f'{i}_a', 'target_timestamp_unix': 1745000000.0, 'sound_file': 'alarm/bell.mp3', 'enabled': False}],
+        'annotations': [{'text': f'note {j} for task {i}', 'timestamp': now_iso} for j in range(3)],
+        'titleHistory': [{'title': f'Synthetic task {i}', 'timestamp': now_iso}],
+        'subtasks': [{'id': task_store.new_task_id(), 'task': f'Sub {i}.{j}', 'timer': 0, 'localTime': '2025-04-18 16:35:40 PST',
+                      'createdAt': now_iso, 'timer_running': False, 'start_time_unix': None, 'completed': False,
+                      'due_date': None, 'icon': None, 'alarms': [], 'annotations': [], 'titleHistory': [], 'subtasks': []}
+                     for j in range(2)],
+    }
+
+
+def timed(fn, repeat=1):
+    """(result of the last call, best wall time in seconds) over repeat calls of fn."""
+    best = float('inf'); result = None
+    for _ in range(repeat):
+        start = time.perf_counter(); result = fn(); best = min(best, time.perf_counter() - start)
+    return result, best
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Benchmark: encode and decode time and file size of every installed JSON
+codec backend (see json_codec.py), compact vs pretty, on synthetic tasks and
+gratitude journals.
+
+Usage: python benchmarks/bench_json_codec.py [--tasks 10000] [--days 1000] [--repeat 5]
+"""
+
+import argparse
+from datetime import datetime, timedelta
+
+from bench_common import make_task, timed
+import json_codec
+
+
+def make_gratitude(days):
+    start = datetime(2022, 1, 1)
+    entries = {}
+    for day in range(days):
+        date = start + timedelta(days=day)
+        entries[date.strftime('%Y-%m-%d')] = [{'text': f'Grateful for thing {i} on day {day}: coffee, sunshine, a good call ☕', 'timestamp': date.isoformat()}
+                                              for i in range(3)]
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark JSON codec backends')
+    parser.add_argument('--tasks', type=int, default=10000)
+    parser.add_argument('--days', type=int, default=1000, help='gratitude journal days (3 entries each)')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    now_iso = datetime.now().isoformat()
+    datasets = [(f'{args.tasks} tasks', {'schema_version': 2, 'tasks': [make_task(i, now_iso) for i in range(args.tasks)]}),
+                (f'gratitude, {args.days} days', make_gratitude(args.days))]
+    backends = []
+    for name in json_codec.BACKENDS:
+        try: backends.append((name,) + json_codec._load_backend(name)[:2])
+        except ImportError: print(f"({name} not installed)")
+    print(f"json_codec would use: {json_codec.backend}")
+    for label, data in datasets:
+        print(label)
+        for name, loads, dumpb in backends:
+            for pretty in (False, True):
+                encoded = dumpb(data, pretty)
+                assert loads(encoded) == data, f'{name} did not round-trip'
+                _, encode_time = timed(lambda: dumpb(data, pretty), args.repeat)
+                _, decode_time = timed(lambda: loads(encoded), args.repeat)
+                print(f"  {name:<8} {'pretty ' if pretty else 'compact'}  encode {encode_time*1000:8.1f} ms  "
+                      f"decode {decode_time*1000:8.1f} ms  size {len(encoded) / 2**20:6.2f} MiB")
+
+
+if __name__ == '__main__':
+    main()
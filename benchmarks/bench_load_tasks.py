@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Benchmark: loading tasks.json through the migration pipeline vs the
+current-schema fast path.
+
+Usage: python benchmarks/bench_load_tasks.py [--tasks 10000] [--repeat 5]
+"""
+
+import os
+import json
+import time
+import argparse
+import tempfile
+from datetime import datetime
+
+from bench_common import make_task
+import task_store
+
+
+def time_load(path, repeat):
+    best_total = best_prepare = float('inf')
+    now_iso = datetime.now().isoformat(); local_time_str = '2025-04-18 16:35:40 PST'
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with open(path, 'r') as f: data = json.load(f)
+        parsed = time.perf_counter()
+        meta, tasks_data, version = task_store.split_document(data)
+        task_store.prepare_tasks(tasks_data, version, now_iso, local_time_str)
+        end = time.perf_counter()
+        best_total = min(best_total, end - start); best_prepare = min(best_prepare, end - parsed)
+    return best_total, best_prepare
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark tasks.json loading')
+    parser.add_argument('--tasks', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    now_iso = datetime.now().isoformat()
+    tasks = [make_task(i, now_iso) for i in range(args.tasks)]
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, 'legacy.json'); current_path = os.path.join(tmp, 'current.json')
+        with open(legacy_path, 'w') as f: json.dump({'tasks': tasks}, f)
+        with open(current_path, 'w') as f: json.dump({'schema_version': task_store.SCHEMA_VERSION, 'tasks': tasks}, f)
+        legacy_total, legacy_prepare = time_load(legacy_path, args.repeat)
+        fast_total, fast_prepare = time_load(current_path, args.repeat)
+
+    print(f"{args.tasks} tasks, best of {args.repeat}")
+    print(f"  legacy (migration pipeline): total {legacy_total*1000:8.1f} ms  normalize {legacy_prepare*1000:8.1f} ms")
+    print(f"  current schema (fast path):  total {fast_total*1000:8.1f} ms  normalize {fast_prepare*1000:8.1f} ms")
+    if fast_prepare > 0: print(f"  normalization speedup: {legacy_prepare / fast_prepare:.1f}x, load speedup: {legacy_total / fast_total:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Benchmark: single tasks.json vs the sharded store, for startup load and for
+saving after one task changed.
+
+Usage: python benchmarks/bench_sharded_store.py [--sizes 1000 10000 100000] [--shard-size 1000]
+"""
+
+import os
+import json
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+from bench_common import make_task, timed
+import task_store
+import sharded_store
+
+
+def single_load(path, now_iso):
+    with open(path, 'r', encoding='utf-8') as f: data = json.load(f)
+    _, tasks_data, version = task_store.split_document(data)
+    return task_store.prepare_tasks(tasks_data, version, now_iso, '')[0]
+
+
+def single_save(path, tasks):
+    with open(path + '.tmp', 'w', encoding='utf-8') as f: json.dump({'schema_version': task_store.SCHEMA_VERSION, 'tasks': tasks}, f, ensure_ascii=False, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def run(count, shard_size, tmp):
+    start_day = datetime(2024, 1, 1)
+    tasks = []
+    for i in range(count):
+        task = make_task(i, (start_day + timedelta(days=i * 365 // max(1, count))).isoformat())
+        tasks.append(task)
+    now_iso = datetime.now().isoformat()
+    single_path = os.path.join(tmp, f'tasks_{count}.json'); single_save(single_path, tasks)
+    store = sharded_store.ShardedTaskStore(os.path.join(tmp, f'shards_{count}'), shard_size=shard_size); store.save_tasks(tasks)
+
+    loaded, single_load_time = timed(lambda: single_load(single_path, now_iso))
+    _, serial_load_time = timed(lambda: store.load_tasks(now_iso, parallel=False))
+    (sharded, _), parallel_load_time = timed(lambda: store.load_tasks(now_iso, parallel=True))
+    assert [t['id'] for t in sharded] == [t['id'] for t in loaded], 'sharded load changed the task order'
+
+    sharded[count // 2]['task'] += ' (edited)'; loaded[count // 2]['task'] += ' (edited)'
+    _, single_save_time = timed(lambda: single_save(single_path, loaded))
+    store.mark_dirty(sharded[count // 2]); written, sharded_save_time = timed(lambda: store.save_tasks(sharded))
+    shards = len(os.listdir(store.path)) - 1
+    print(f"{count:>7} tasks  {shards:>4} shards | load: single {single_load_time*1000:8.1f} ms  sharded serial {serial_load_time*1000:8.1f} ms"
+          f"  sharded pool {parallel_load_time*1000:8.1f} ms | save one edit: single {single_save_time*1000:8.1f} ms"
+          f"  sharded {sharded_save_time*1000:6.1f} ms ({written} shard)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark sharded task storage')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--shard-size', type=int, default=sharded_store.DEFAULT_SHARD_SIZE)
+    args = parser.parse_args()
+    print(f"{os.cpu_count()} CPUs, shard size {args.shard_size}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in args.sizes: run(count, args.shard_size, tmp)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Month models for the calendar: what every cell of a month shows, computed
+off the UI thread and kept in a small LRU.
+
+A MonthModel has 42 cells (six Sunday-first weeks), each with its day
+number (0 outside the month), date, today flag, gratitude flag and up to
+three (icon path, icon color, task) for the tasks due that day. Building
+one touches only the tasks due in that month, found through an index of
+month -> tasks that mark() keeps current from mark_tasks_changed, and does
+the icon file checks, so it runs on a worker thread. The calendar widget
+patches its cells from a model and prefetches the months on either side.
+
+Each month has a version that invalidation bumps; a build started before
+an invalidation is dropped instead of cached.
+"""
+
+import os
+import calendar
+import threading
+from datetime import datetime
+from collections import OrderedDict, namedtuple
+
+import task_model
+import task_dates
+
+CACHE_SIZE = 12
+MAX_ICONS = 3
+
+MonthModel = namedtuple('MonthModel', 'year month today cells')
+Cell = namedtuple('Cell', 'day date_str is_today has_gratitude icons')
+
+_EMPTY_CELL = Cell(0, None, False, False, ())
+
+
+def add_months(year, month, delta):
+    index = year * 12 + month - 1 + delta
+    return index // 12, index % 12 + 1
+
+
+class MonthModels:
+    """Index of tasks by due month plus an LRU of built MonthModels; see the module docstring."""
+    def __init__(self, tasks_provider, gratitude_provider=None, capacity=CACHE_SIZE):
+        self.tasks_provider = tasks_provider
+        self.gratitude_provider = gratitude_provider
+        self.capacity = capacity
+        self._cache = OrderedDict()   # (year, month) -> MonthModel, least recently used first
+        self._versions = {}           # (year, month) -> invalidation count
+        self._by_month = {}           # (year, month) -> {id(task): task} of tasks with a due date and an icon
+        self._task_month = {}         # id(task) -> (year, month) it is indexed under
+        self._stale = True            # the index needs a rebuild from tasks_provider
+        self._lock = threading.Lock()
+
+    # --- Index ---
+    def _month_of(self, task):
+        day = task_dates.parse_due(task.get('due_date')) if task.get('icon') else None
+        return (day.year, day.month) if day is not None else None
+
+    def _reindex(self):
+        by_month = {}; task_month = {}
+        for task in self.tasks_provider():
+            month = self._month_of(task)
+            if month is not None: by_month.setdefault(month, {})[id(task)] = task; task_month[id(task)] = month
+        with self._lock:
+            # Structural changes (deletes, moves, imports) usually leave most months as they were
+            for month in set(by_month) | set(self._by_month):
+                if by_month.get(month, {}).keys() != self._by_month.get(month, {}).keys(): self._invalidate(month)
+            self._by_month = by_month; self._task_month = task_month; self._stale = False
+
+    def mark(self, task=None):
+        """Listener for mark_tasks_changed: moves the task between months and invalidates both; None re-indexes on the next prepare()."""
+        if task is None: self._stale = True; return
+        if isinstance(task, task_model.Subtask): return  # subtasks are not drawn on the calendar
+        with self._lock:
+            old = self._task_month.pop(id(task), None); new = self._month_of(task)
+            if old is not None: self._by_month.get(old, {}).pop(id(task), None)
+            if new is not None: self._by_month.setdefault(new, {})[id(task)] = task; self._task_month[id(task)] = new
+            for month in {old, new}:
+                if month is not None: self._invalidate(month)
+
+    def _invalidate(self, month):
+        self._versions[month] = self._versions.get(month, 0) + 1; self._cache.pop(month, None)
+
+    def invalidate(self, year=None, month=None):
+        """Drops one cached month (e.g. after a gratitude entry), or all of them."""
+        with self._lock:
+            if year is None:
+                for key in list(self._cache): self._invalidate(key)
+            else: self._invalidate((year, month))
+
+    # --- Models ---
+    def get(self, year, month):
+        """The cached model of a month, or None if it has to be built (call prepare() first on the UI thread)."""
+        with self._lock:
+            model = None if self._stale else self._cache.get((year, month))
+            if model is None: return None
+            if model.today != datetime.now().date(): self._invalidate((year, month)); return None
+            self._cache.move_to_end((year, month)); return model
+
+    def prepare(self):
+        """Brings the index up to date; run on the UI thread before handing build() to a worker."""
+        if self._stale: self._reindex()
+
+    def build(self, year, month):
+        """Builds and caches a month's model; safe to call from a worker thread. Returns None if the month changed meanwhile."""
+        with self._lock:
+            version = self._versions.get((year, month), 0)
+            due_tasks = list(self._by_month.get((year, month), {}).values())
+        today = datetime.now().date()
+        gratitude_dates = self.gratitude_provider() if self.gratitude_provider else ()
+        icons_by_date = {}
+        for task in due_tasks:
+            icon = task.get('icon')
+            if self._month_of(task) != (year, month): continue  # changed since it was indexed; its mark() rebuilds the month
+            icons = icons_by_date.setdefault(task_dates.parse_due(task.get('due_date')).isoformat(), [])
+            if len(icons) < MAX_ICONS and os.path.exists(icon): icons.append((icon, task.get('calendar_icon_color'), task))
+        cells = []
+        for week in calendar.Calendar(firstweekday=6).monthdayscalendar(year, month):
+            for day in week:
+                if day == 0: cells.append(_EMPTY_CELL); continue
+                date_str = f"{year:04d}-{month:02d}-{day:02d}"
+                cells.append(Cell(day, date_str, (year, month, day) == (today.year, today.month, today.day),
+                                  date_str in gratitude_dates, tuple(icons_by_date.get(date_str, ()))))
+        cells.extend([_EMPTY_CELL] * (42 - len(cells)))
+        model = MonthModel(year, month, today, tuple(cells))
+        with self._lock:
+            if self._versions.get((year, month), 0) != version: return None
+            self._cache[(year, month)] = model; self._cache.move_to_end((year, month))
+            while len(self._cache) > self.capacity: self._cache.popitem(last=False)
+        return model
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+Gratitude journal stored as one file per month plus an append-only log.
+
+Layout under broadcasts/gratitude/:
+
+    YYYY-MM.json    {"YYYY-MM-DD": [{"text": ..., "timestamp": ...}, ...]}
+    index.json      sorted list of the dates that have entries
+    today.log       one JSON line per entry added since the last save
+
+Startup reads index.json and the log, which is all the calendar needs to
+draw its hearts. A month file is only kept in memory once one of its days
+is opened; the search index reads the month files on a worker thread
+(read_month) without keeping them, and adds what is only in memory on the
+UI thread (with_unsaved).
+Adding an entry appends one line to the log; save() folds the log into the
+month files once the day is over (or when forced, e.g. at exit), so the
+journal is never rewritten when nothing changed.
+
+An existing broadcasts/gratitude.json is split into month files on first
+use and kept as gratitude.json.bak.
+"""
+
+import os
+import logging
+from collections.abc import Mapping
+from datetime import datetime
+
+import json_codec
+
+GRATITUDE_FOLDER = os.path.join('broadcasts', 'gratitude')
+LEGACY_FILE = os.path.join('broadcasts', 'gratitude.json')
+INDEX_NAME = 'index.json'
+LOG_NAME = 'today.log'
+
+
+def _month_of(date_str):
+    return date_str[:7]
+
+
+def _merge(day_entries, entry):
+    """Appends entry unless the day already has it (log lines replayed after an interrupted save)."""
+    key = (entry.get('text'), entry.get('timestamp'))
+    if any((e.get('text'), e.get('timestamp')) == key for e in day_entries): return False
+    day_entries.append(entry); return True
+
+
+class GratitudeJournal(Mapping):
+    """
+    Read-only mapping of date -> entries that loads month files on demand.
+    With folder=None the journal lives in memory only (the SQLite backend
+    keeps the entries itself); changed then tells whether it needs saving.
+    """
+    def __init__(self, folder=GRATITUDE_FOLDER, entries=None, legacy_file=LEGACY_FILE):
+        self.path = folder
+        self._months = {}      # 'YYYY-MM' -> {date: [entries]} for the months read so far
+        self._pending = []     # (date, entry) appended to the log and not yet in a month file
+        self.dates = set()     # every date with at least one entry
+        self.changed = False
+        if folder is None:
+            if entries: self._set_all(entries)
+            return
+        if not os.path.exists(folder): os.makedirs(folder)
+        if legacy_file and os.path.exists(legacy_file) and not os.path.exists(self._index_path):
+            self._migrate(legacy_file)
+        if os.path.exists(self._index_path): self.dates.update(json_codec.load_file(self._index_path))
+        self._replay_log()
+
+    @property
+    def _index_path(self):
+        return os.path.join(self.path, INDEX_NAME)
+
+    @property
+    def _log_path(self):
+        return os.path.join(self.path, LOG_NAME)
+
+    def _month_path(self, month):
+        return os.path.join(self.path, f'{month}.json')
+
+    def _migrate(self, legacy_file):
+        entries = json_codec.load_file(legacy_file)
+        self.replace(entries if isinstance(entries, dict) else {})
+        os.replace(legacy_file, legacy_file + '.bak')
+        logging.info(f"Split {legacy_file} into {len({_month_of(d) for d in self.dates})} month files in {self.path}")
+
+    def _replay_log(self):
+        if not os.path.exists(self._log_path): return
+        with open(self._log_path, 'rb') as f:
+            for line in f:
+                try: record = json_codec.loads(line)
+                except ValueError: logging.warning(f"Skipping unreadable line in {self._log_path}"); continue
+                date = record.pop('date', None)
+                if date: self._pending.append((date, record)); self.dates.add(date)
+
+    # --- Mapping ---
+    def _month(self, month):
+        if month not in self._months:
+            days = {}
+            if self.path is not None and os.path.exists(self._month_path(month)): days = json_codec.load_file(self._month_path(month))
+            for date, entry in self._pending:
+                if _month_of(date) == month: _merge(days.setdefault(date, []), entry)
+            self._months[month] = days
+        return self._months[month]
+
+    def __getitem__(self, date):
+        if date not in self.dates: raise KeyError(date)
+        return self._month(_month_of(date)).get(date, [])
+
+    def __contains__(self, date):
+        return date in self.dates
+
+    def __iter__(self):
+        return iter(sorted(self.dates))
+
+    def __len__(self):
+        return len(self.dates)
+
+    def months(self):
+        """Months that have entries, newest first."""
+        return sorted({_month_of(date) for date in self.dates}, reverse=True)
+
+    def read_month(self, month):
+        """
+        {date: entries} of one month file as saved, without keeping it. Only
+        the file is read, so this is safe on a worker thread while entries
+        are added; with_unsaved() completes it.
+        """
+        if self.path is None or not os.path.exists(self._month_path(month)): return {}
+        return json_codec.load_file(self._month_path(month))
+
+    def with_unsaved(self, month, days):
+        """days from read_month() brought up to date: the journal's own copy of a loaded month, else days plus the logged entries not saved yet."""
+        loaded = self._months.get(month)
+        if loaded is not None: return {date: list(entries) for date, entries in loaded.items()}
+        for date, entry in self._pending:
+            if _month_of(date) == month: _merge(days.setdefault(date, []), entry)
+        return days
+
+    def to_dict(self):
+        """Every day's entries; reads all month files."""
+        return {date: list(entries) for date, entries in self.items()}
+
+    # --- Changes ---
+    def add(self, date, entry):
+        entry = dict(entry)
+        _merge(self._month(_month_of(date)).setdefault(date, []), entry); self.dates.add(date)
+        if self.path is None: self.changed = True; return
+        with open(self._log_path, 'ab') as f: f.write(json_codec.dumpb(dict(entry, date=date)) + b'\n')
+        self._pending.append((date, entry))
+
+    def _set_all(self, entries):
+        self._months = {}
+        for date, day_entries in entries.items():
+            if day_entries: self._months.setdefault(_month_of(date), {})[date] = list(day_entries)
+        self.dates = {date for days in self._months.values() for date in days}
+
+    def replace(self, entries):
+        """Replaces the whole journal with a {date: entries} dict (migration, backend switches)."""
+        self._pending = []; self._set_all(entries)
+        if self.path is None: self.changed = True; return
+        pretty = json_codec.pretty_json_enabled()
+        for name in os.listdir(self.path):
+            if name[:7] not in self._months and name.endswith('.json') and name != INDEX_NAME: os.remove(os.path.join(self.path, name))
+        for month, days in self._months.items(): json_codec.write_file(self._month_path(month), days, pretty)
+        json_codec.write_file(self._index_path, sorted(self.dates))
+        if os.path.exists(self._log_path): os.remove(self._log_path)
+
+    def save(self, force=False):
+        """
+        Folds logged entries into their month files, once their day is over or
+        when forced. Returns the number of month files written.
+        """
+        if self.path is None or not self._pending: return 0
+        today = datetime.now().strftime('%Y-%m-%d')
+        if not force and all(date == today for date, _ in self._pending): return 0
+        pretty = json_codec.pretty_json_enabled()
+        months = sorted({_month_of(date) for date, _ in self._pending})
+        for month in months: json_codec.write_file(self._month_path(month), self._month(month), pretty)
+        json_codec.write_file(self._index_path, sorted(self.dates))
+        os.remove(self._log_path); self._pending = []
+        logging.info(f"Saved gratitude entries for {', '.join(months)} to {self.path}")
+        return len(months)
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+JSON encoding and decoding for tasks, gratitude entries and exports.
+
+Uses orjson or msgspec when one is installed and the standard library json
+module otherwise. JSON_CODEC in .env picks a backend (auto, orjson, msgspec,
+json); auto tries them in that order.
+
+Files are written compact by default. PRETTY_JSON=true in .env indents them
+by 2 spaces, laid out like json.dump(indent=2). Whatever the backend, text
+it cannot decode is handed to the standard library, so callers only ever see
+json.JSONDecodeError, and values it cannot encode (very large integers,
+non-string keys it does not support) fall back to the standard library too.
+"""
+
+import os
+import json
+import logging
+
+INDENT = 2
+BACKENDS = ('orjson', 'msgspec', 'json')
+
+
+def pretty_json_enabled():
+    return os.getenv('PRETTY_JSON', 'false').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _to_json(value):
+    """Encodes values the backends do not know natively (task records, tuples in msgspec, ...)."""
+    if hasattr(value, 'to_json'): return value.to_json()
+    if hasattr(value, 'items'): return dict(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _stdlib_dumpb(obj, pretty):
+    if pretty: return json.dumps(obj, ensure_ascii=False, indent=INDENT, default=_to_json).encode('utf-8')
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'), default=_to_json).encode('utf-8')
+
+
+def _load_backend(name):
+    """(loads, dumpb, errors) for a backend; raises ImportError when it is not installed."""
+    if name == 'orjson':
+        import orjson
+        compact, indented = orjson.OPT_NON_STR_KEYS, orjson.OPT_NON_STR_KEYS | orjson.OPT_INDENT_2
+        return orjson.loads, lambda obj, pretty: orjson.dumps(obj, default=_to_json, option=indented if pretty else compact), (orjson.JSONDecodeError, orjson.JSONEncodeError)
+    if name == 'msgspec':
+        import msgspec
+        encoder = msgspec.json.Encoder(enc_hook=_to_json)
+        def dumpb(obj, pretty):
+            data = encoder.encode(obj)
+            return msgspec.json.format(data, indent=INDENT) if pretty else data
+        return msgspec.json.decode, dumpb, (msgspec.DecodeError, msgspec.EncodeError, TypeError, OverflowError)
+    if name == 'json':
+        return json.loads, _stdlib_dumpb, (json.JSONDecodeError,)
+    raise ImportError(f"Unknown JSON codec {name!r}")
+
+
+def _select_backend():
+    requested = os.getenv('JSON_CODEC', 'auto').strip().lower() or 'auto'
+    for name in (BACKENDS if requested == 'auto' else (requested, 'json')):
+        try: return (name,) + _load_backend(name)
+        except ImportError:
+            if requested != 'auto': logging.warning(f"JSON_CODEC={requested!r} is not available; using the json module.")
+    return ('json',) + _load_backend('json')
+
+
+backend, _loads, _dumpb, _errors = _select_backend()
+
+
+def loads(data):
+    """Decodes str or bytes. Raises json.JSONDecodeError for invalid JSON."""
+    try: return _loads(data)
+    except _errors:
+        # The fast backends reject a few things json accepts (NaN, integers beyond 64 bits); let json decide
+        return json.loads(data)
+
+
+def dumpb(obj, pretty=False):
+    """Encodes obj as UTF-8 bytes, compact unless pretty."""
+    try: return _dumpb(obj, pretty)
+    except _errors + (TypeError, OverflowError): return _stdlib_dumpb(obj, pretty)
+
+
+def dumps(obj, pretty=False):
+    return dumpb(obj, pretty).decode('utf-8')
+
+
+def load_file(path):
+    with open(path, 'rb') as f: return loads(f.read())
+
+
+def write_file(path, obj, pretty=False):
+    """Writes obj to path through a temp file, so a crash never leaves it half written."""
+    temp_file = path + '.tmp'
+    with open(temp_file, 'wb') as f: f.write(dumpb(obj, pretty))
+    os.replace(temp_file, path)
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+Task priorities and the "Next up" queue.
+
+A top-level task may carry `priority`, 1 to 4 as in Todoist's p1 (urgent)
+to p4 (normal); tasks without one are p4. Todoist's REST API numbers them
+the other way round (4 is urgent), see api_priority().
+
+The queue holds the open tasks, or only the ready ones when a dependency
+graph is given, in a binary heap ordered by priority, then due date
+(undated last), then creation time, so the task that has waited longest
+comes first among equals. update() (registered with mark_tasks_changed)
+pushes a task's new entry and marks its old one dead instead of searching
+the heap for it; dead entries are dropped when they reach the top, and the
+heap is rebuilt once they outnumber the live ones. top(n) pops the first n
+live entries and pushes them back, O(n log size) rather than sorting the
+whole list.
+"""
+
+import heapq
+import itertools
+from collections.abc import Mapping
+
+import task_dates
+
+PRIORITIES = (1, 2, 3, 4)
+DEFAULT_PRIORITY = 4
+PRIORITY_LABELS = {1: 'P1 (urgent)', 2: 'P2 (high)', 3: 'P3 (medium)', 4: 'P4 (normal)'}
+PRIORITY_COLORS = {1: 'd0021b', 2: 'eb8909', 3: '246fe0'}  # Todoist's flag colors; p4 is not marked
+NEXT_UP_COUNT = 10
+
+
+def priority_of(task):
+    priority = task.get('priority') if isinstance(task, Mapping) else None
+    return priority if priority in PRIORITIES and type(priority) is int else DEFAULT_PRIORITY
+
+
+def normalize_priority(value):
+    """1-4 from an int or 'p1'-style string; None for the default or anything unreadable, so the key is left out."""
+    if isinstance(value, str): value = value.strip().lower().lstrip('p')
+    try: priority = int(value)
+    except (TypeError, ValueError): return None
+    return priority if priority in PRIORITIES and priority != DEFAULT_PRIORITY else None
+
+
+def api_priority(priority):
+    """Todoist REST API priority (4 = urgent) of a p1-p4 priority."""
+    return 5 - priority
+
+
+def sort_key(task):
+    """(priority, due date, created) as the queue orders tasks."""
+    ordinal = task_dates.due_ordinal(task.get('due_date'))
+    return (priority_of(task), ordinal is None, ordinal or 0, str(task.get('createdAt') or ''))
+
+
+class NextUpQueue:
+    def __init__(self, deps=None):
+        self.deps = deps  # task_deps.DependencyGraph; blocked tasks are left out when given
+        self.clear()
+
+    def clear(self):
+        self._heap = []      # [key, sequence, task id, task]; task is None once the entry is dead
+        self._entries = {}   # task id -> its live heap entry
+        self._sequence = itertools.count()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _eligible(self, task):
+        if task.get('completed'): return False
+        return self.deps is None or self.deps.is_ready(task.get('id'))
+
+    def _kill(self, task_id):
+        entry = self._entries.pop(task_id, None)
+        if entry is not None: entry[3] = None
+
+    def update(self, task):
+        """Re-queues a top-level task after a change; True if its place in the queue changed."""
+        task_id = task.get('id')
+        if not task_id: return False
+        key = sort_key(task) if self._eligible(task) else None
+        entry = self._entries.get(task_id)
+        if entry is not None and entry[0] == key and entry[3] is task: return False
+        if entry is None and key is None: return False
+        self._kill(task_id)
+        if key is not None:
+            entry = [key, next(self._sequence), task_id, task]
+            self._entries[task_id] = entry; heapq.heappush(self._heap, entry)
+        if len(self._heap) > 2 * len(self._entries) + 64: self._compact()
+        return True
+
+    def remove(self, task_id):
+        self._kill(task_id)
+
+    def _compact(self):
+        self._heap = list(self._entries.values()); heapq.heapify(self._heap)
+
+    def sync_tasks(self, tasks):
+        """Rebuilds the queue from the task list (after deletes, imports, restores)."""
+        self.clear()
+        for task in tasks:
+            if isinstance(task, Mapping) and task.get('id') and self._eligible(task):
+                self._entries[task['id']] = [sort_key(task), next(self._sequence), task['id'], task]
+        self._compact()
+
+    def top(self, n=NEXT_UP_COUNT):
+        """The first n tasks of the queue, in order."""
+        heap = self._heap; taken = []
+        while heap and len(taken) < n:
+            entry = heapq.heappop(heap)
+            if entry[3] is not None: taken.append(entry)
+        for entry in taken: heapq.heappush(heap, entry)
+        return [entry[3] for entry in taken]
+
+    def contains(self, task_id):
+        return task_id in self._entries
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+Trigram index over task and subtask titles for the Ctrl+K quick switcher.
+
+Titles are lower-cased, padded with spaces and split into 3-character grams.
+A query counts shared grams straight off the postings of its own grams,
+then ranks the best candidates by overlap, substring/prefix bonuses and
+recency, so keystroke latency depends on the number of matches rather than
+the number of tasks. The index is kept up to date per task tree from
+mark_tasks_changed and never walks the task list while typing.
+"""
+
+import time
+import logging
+from heapq import nlargest
+from datetime import datetime
+from itertools import chain
+from collections import Counter, namedtuple
+from collections.abc import Mapping
+
+SwitcherHit = namedtuple('SwitcherHit', 'node_id root_id title kind score')
+
+RECENCY_WEIGHT = 0.3
+RECENCY_HALF_LIFE = 7 * 86400  # seconds
+
+
+def trigrams(text, pad_end=True):
+    """Grams of each word padded as '  word ', so word starts weigh more than word middles."""
+    words = text.lower().split(); grams = set()
+    for n, word in enumerate(words):
+        padded = '  ' + word + (' ' if pad_end or n < len(words) - 1 else '')
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+def _created_unix(node):
+    try: return datetime.fromisoformat(str(node.get('createdAt'))).timestamp()
+    except (TypeError, ValueError): return 0.0
+
+
+class QuickSwitcherIndex:
+    def __init__(self):
+        self._grams = {}        # trigram -> set(node_id)
+        self._entries = {}      # node_id -> (title, lowered, grams, root_id, kind)
+        self._root_nodes = {}   # root_id -> [node_id, ...]
+        self._touched = {}      # node_id -> unix time of last selection/edit
+        self._roots = {}        # root_id -> top-level task dict
+
+    def __len__(self):
+        return len(self._entries)
+
+    # --- Maintenance ---
+    def _add(self, node_id, title, root_id, kind):
+        grams = trigrams(title)
+        for gram in grams: self._grams.setdefault(gram, set()).add(node_id)
+        self._entries[node_id] = (title, title.lower(), grams, root_id, kind)
+
+    def _remove(self, node_id):
+        entry = self._entries.pop(node_id, None)
+        if entry is None: return
+        for gram in entry[2]:
+            posting = self._grams.get(gram)
+            if posting is not None:
+                posting.discard(node_id)
+                if not posting: del self._grams[gram]
+
+    def index_task(self, task):
+        """(Re)indexes a top-level task and its subtasks; titles that did not change are left alone."""
+        root_id = task.get('id')
+        if not root_id: return
+        seen = []
+        stack = [(task, 'task')]
+        while stack:
+            node, kind = stack.pop()
+            node_id = node.get('id')
+            if node_id:
+                title = str(node.get('task', ''))
+                entry = self._entries.get(node_id)
+                if entry is None or entry[0] != title or entry[3] != root_id:
+                    self._remove(node_id); self._add(node_id, title, root_id, kind)
+                    self._touched.setdefault(node_id, _created_unix(node))
+                seen.append(node_id)
+            stack.extend((subtask, 'subtask') for subtask in node.get('subtasks') or [] if isinstance(subtask, Mapping))
+        for node_id in set(self._root_nodes.get(root_id, ())) - set(seen):
+            if self._entries.get(node_id, (None,) * 4)[3] == root_id: self._remove(node_id); self._touched.pop(node_id, None)  # not if it moved to another task
+        self._root_nodes[root_id] = seen
+        self._roots[root_id] = task
+
+    def index_node(self, node):
+        """Re-indexes the tree an already indexed node belongs to. Returns False for unknown nodes."""
+        entry = self._entries.get(node.get('id'))
+        if entry is None or entry[3] not in self._roots: return False
+        self.index_task(self._roots[entry[3]]); self.touch(node.get('id'))
+        return True
+
+    def _remove_root(self, root_id):
+        for node_id in self._root_nodes.pop(root_id, ()): self._remove(node_id); self._touched.pop(node_id, None)
+        self._roots.pop(root_id, None)
+
+    def remove_missing(self, tasks):
+        """Drops the entries of top-level tasks that are no longer in tasks."""
+        live_ids = {task.get('id') for task in tasks if isinstance(task, Mapping)}
+        for root_id in [r for r in self._root_nodes if r not in live_ids]: self._remove_root(root_id)
+
+    def sync_tasks(self, tasks):
+        """Adds new, updates renamed and drops deleted tasks."""
+        self.remove_missing(tasks)
+        for task in tasks:
+            if isinstance(task, Mapping) and task.get('id'): self.index_task(task)
+
+    def touch(self, node_id):
+        if node_id in self._entries: self._touched[node_id] = time.time()
+
+    # --- Queries ---
+    def search(self, query, limit=20):
+        query = ' '.join(query.lower().split())
+        if not query: return []
+        query_grams = trigrams(query, pad_end=False)  # the last word may still be half typed
+        # Count, per title, how many query grams it shares; Counter does the counting in C
+        overlaps = Counter(chain.from_iterable(self._grams.get(gram, ()) for gram in query_grams))
+        needed = max(1, (len(query_grams) + 1) // 2)
+        overlaps = [(overlap, node_id) for node_id, overlap in overlaps.items() if overlap >= needed]
+        if not overlaps: return []
+        entries = self._entries
+        now = time.time(); total = float(len(query_grams))
+        def score(overlap, node_id):
+            title, lowered, grams, root_id, kind = entries[node_id]
+            quality = overlap / total + (0.5 if query in lowered else 0.0) + (0.25 if lowered.startswith(query) else 0.0)
+            age = max(0.0, now - self._touched.get(node_id, 0.0))
+            return quality + RECENCY_WEIGHT * 0.5 ** (age / RECENCY_HALF_LIFE)
+        ranked = nlargest(limit, ((score(overlap, node_id), node_id) for overlap, node_id in nlargest(limit * 5, overlaps)))
+        return [SwitcherHit(node_id, entries[node_id][3], entries[node_id][0], entries[node_id][4], s) for s, node_id in ranked]
+
+
+def build_index(tasks):
+    index = QuickSwitcherIndex()
+    index.sync_tasks(tasks)
+    logging.info(f"Quick switcher index built with {len(index)} titles.")
+    return index
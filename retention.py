@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Retention and compaction for the task fields that only ever grow.
+
+  - titleHistory is capped to the most recent TITLE_HISTORY_MAX entries
+  - alarms that are disabled and whose time passed more than
+    ALARM_RETENTION_DAYS ago are dropped
+  - annotations older than ANNOTATION_COLD_DAYS move to an append-only
+    cold storage file; they can still be viewed from the annotation popup
+    and are still found by the search
+
+Limits come from .env; 0 disables a rule, and cold storage is off unless
+ANNOTATION_COLD_DAYS is set. Work is done in batches by iter_compaction so
+the app can spread it over idle frames, and every batch reports how many
+bytes of tasks.json it reclaimed. Cold annotations are only appended to
+the cold file after the compacted tasks were saved, so a failed save
+cannot leave them in both places.
+"""
+
+import os
+import time
+import logging
+from datetime import datetime
+from collections import namedtuple
+
+import json_codec
+
+COLD_STORAGE_FOLDER = os.path.join('broadcasts', 'cold_storage')
+COLD_ANNOTATIONS_FILE = os.path.join(COLD_STORAGE_FOLDER, 'annotations.jsonl')
+
+RetentionPolicy = namedtuple('RetentionPolicy', 'title_history_max alarm_retention_days annotation_cold_days')
+DEFAULT_POLICY = RetentionPolicy(title_history_max=10, alarm_retention_days=7, annotation_cold_days=0)
+
+
+class CompactionReport:
+    def __init__(self):
+        self.title_history = 0; self.alarms = 0; self.annotations = 0; self.reclaimed_bytes = 0
+        self.changed = []  # the tasks and subtasks that were compacted, for mark_tasks_changed
+
+    def add(self, other):
+        self.title_history += other.title_history; self.alarms += other.alarms; self.annotations += other.annotations; self.reclaimed_bytes += other.reclaimed_bytes
+        self.changed.extend(other.changed)
+
+    def __bool__(self):
+        return bool(self.title_history or self.alarms or self.annotations)
+
+    def __str__(self):
+        return (f"dropped {self.title_history} title history entries and {self.alarms} expired alarms, "
+                f"moved {self.annotations} annotations to cold storage, reclaimed {self.reclaimed_bytes} bytes")
+
+
+def policy_from_env():
+    """Reads TITLE_HISTORY_MAX, ALARM_RETENTION_DAYS and ANNOTATION_COLD_DAYS, falling back to the defaults."""
+    values = {}
+    for field, env_key in (('title_history_max', 'TITLE_HISTORY_MAX'), ('alarm_retention_days', 'ALARM_RETENTION_DAYS'), ('annotation_cold_days', 'ANNOTATION_COLD_DAYS')):
+        raw = os.getenv(env_key, '').strip()
+        try: values[field] = max(0, int(raw)) if raw else getattr(DEFAULT_POLICY, field)
+        except ValueError: logging.warning(f"Ignoring invalid {env_key}={raw!r}"); values[field] = getattr(DEFAULT_POLICY, field)
+    return RetentionPolicy(**values)
+
+
+def _encoded_size(items):
+    if not items: return 0
+    return len(json_codec.dumpb(list(items)))
+
+
+def _timestamp_unix(value):
+    try: return datetime.fromisoformat(str(value)).timestamp()
+    except (TypeError, ValueError): return None
+
+
+def compact_task(task, policy, now, cold_annotations):
+    """
+    Applies the policy to one task and its subtasks in place. Annotations that
+    go cold are appended to cold_annotations as (task_id, annotation).
+    Returns a CompactionReport whose changed lists the nodes it edited.
+    """
+    report = CompactionReport()
+    lazy_source = task.lazy_source() if hasattr(task, 'lazy_source') else None
+    history = task.get('titleHistory')
+    if policy.title_history_max and isinstance(history, list) and len(history) > policy.title_history_max:
+        dropped = history[:-policy.title_history_max]
+        task['titleHistory'] = history[-policy.title_history_max:]
+        report.title_history += len(dropped); report.reclaimed_bytes += _encoded_size(dropped)
+    alarms = task.get('alarms')
+    if policy.alarm_retention_days and isinstance(alarms, list) and alarms:
+        cutoff = now - policy.alarm_retention_days * 86400
+        expired = [a for a in alarms if not a.get('enabled') and isinstance(a.get('target_timestamp_unix'), (int, float)) and a['target_timestamp_unix'] < cutoff]
+        if expired:
+            expired_ids = {id(a) for a in expired}
+            task['alarms'] = [a for a in alarms if id(a) not in expired_ids]
+            report.alarms += len(expired); report.reclaimed_bytes += _encoded_size(expired)
+    annotations = task.get('annotations')
+    if policy.annotation_cold_days and isinstance(annotations, list) and annotations:
+        cutoff = now - policy.annotation_cold_days * 86400
+        cold = [a for a in annotations if (_timestamp_unix(a.get('timestamp')) or now) < cutoff]
+        if cold:
+            cold_ids = {id(a) for a in cold}
+            task['annotations'] = [a for a in annotations if id(a) not in cold_ids]
+            cold_annotations.extend((task.get('id'), a) for a in cold)
+            report.annotations += len(cold); report.reclaimed_bytes += _encoded_size(cold)
+    if report: report.changed.append(task)
+    elif lazy_source is not None: task.set_lazy_source(lazy_source)  # nothing changed: drop the decoded fields again
+    for subtask in task.get('subtasks') or []:
+        report.add(compact_task(subtask, policy, now, cold_annotations))
+    return report
+
+
+def append_cold_annotations(entries, path=COLD_ANNOTATIONS_FILE):
+    if not entries: return
+    folder = os.path.dirname(path)
+    if folder and not os.path.exists(folder): os.makedirs(folder)
+    with open(path, 'ab') as f:
+        for task_id, annotation in entries: f.write(json_codec.dumpb({'task_id': task_id, 'annotation': annotation}) + b'\n')
+
+
+def load_cold_annotations(task_id, path=COLD_ANNOTATIONS_FILE):
+    """Returns the annotations of task_id that were moved to cold storage, oldest first."""
+    if not os.path.exists(path): return []
+    found = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if task_id not in line: continue  # cheap pre-filter before decoding
+            try: record = json_codec.loads(line)
+            except ValueError: continue
+            if record.get('task_id') == task_id: found.append(record.get('annotation', {}))
+    return found
+
+
+def load_cold_texts(path=COLD_ANNOTATIONS_FILE):
+    """{task id: [annotation text, ...]} of everything in cold storage, for the search index."""
+    texts = {}
+    if not os.path.exists(path): return texts
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try: record = json_codec.loads(line)
+            except ValueError: continue
+            text = (record.get('annotation') or {}).get('text')
+            if record.get('task_id') and text: texts.setdefault(record['task_id'], []).append(str(text))
+    return texts
+
+
+def iter_compaction(tasks, policy, cold_annotations, batch_size=200):
+    """
+    Generator applying the policy to tasks a batch at a time; yields the
+    CompactionReport of each batch. Annotations that go cold are collected in
+    cold_annotations as (task_id, annotation), for append_cold_annotations
+    once the compacted tasks have been saved.
+    """
+    now = time.time(); tasks = list(tasks)  # the live list may change between batches
+    for start in range(0, len(tasks), batch_size):
+        report = CompactionReport()
+        for task in tasks[start:start + batch_size]:
+            report.add(compact_task(task, policy, now, cold_annotations))
+        yield report
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Daily and monthly rollups of tracked time and completions, for the
+productivity report.
+
+broadcasts/rollups.json holds one bucket per day and per month:
+
+    {"seconds": tracked seconds, "completed": tasks completed, "tasks": {task id: seconds}}
+
+The tables are updated in place when a timer session is logged or a task
+is completed (or un-completed), so opening a report only adds up buckets:
+a year is twelve month buckets plus the days at its edges, and a week is
+seven day buckets. The file also records how many sessions it has folded
+in. If that does not match the session log (the app stopped before the
+rollups were saved) the tables are rebuilt once from the log and the
+completedAt of the live and archived tasks. A completedAt that only marks
+when the app first saw a legacy completion (completedAtEstimated) is not
+counted.
+
+Days are local calendar days; a session that runs past midnight is split
+between the days it covers.
+"""
+
+import os
+import logging
+import itertools
+from datetime import datetime, timedelta
+
+import json_codec
+
+ROLLUPS_FILE = os.path.join('broadcasts', 'rollups.json')
+ROLLUPS_VERSION = 1
+
+
+def _bucket():
+    return {'seconds': 0.0, 'completed': 0, 'tasks': {}}
+
+
+def _split_by_day(start, end):
+    """Yields (date, seconds) for the local days covered by [start, end)."""
+    while start < end:
+        day = datetime.fromtimestamp(start).date()
+        midnight = datetime.combine(day + timedelta(days=1), datetime.min.time()).timestamp()
+        stop = min(end, midnight); yield day, stop - start; start = stop
+
+
+def week_start(day):
+    """The Monday of day's week."""
+    return day - timedelta(days=day.weekday())
+
+
+class Rollups:
+    """Day and month buckets of tracked time and completions; see the module docstring."""
+    def __init__(self, path=ROLLUPS_FILE):
+        self.path = path
+        self.days = {}      # 'YYYY-MM-DD' -> bucket
+        self.months = {}    # 'YYYY-MM' -> bucket
+        self.names = {}     # task id -> title when its time was last rolled up, for tasks since deleted
+        self.sessions = 0   # sessions folded in, compared with the session log on load
+        self.dirty = False
+
+    @classmethod
+    def load(cls, session_log, tasks, archived=(), path=ROLLUPS_FILE):
+        """
+        The saved rollups, or rollups rebuilt from the session log and tasks if
+        they are missing or behind. archived (an iterable of archived tasks) is
+        only read for a rebuild.
+        """
+        rollups = cls(path)
+        if path is not None and os.path.exists(path):
+            try:
+                data = json_codec.load_file(path)
+                if data.get('version') == ROLLUPS_VERSION and data.get('sessions') == len(session_log):
+                    rollups.days = data.get('days', {}); rollups.months = data.get('months', {})
+                    rollups.names = data.get('names', {}); rollups.sessions = data['sessions']
+                    return rollups
+                logging.info(f"{path} is behind the session log, rebuilding the rollups.")
+            except (OSError, ValueError, KeyError) as e: logging.warning(f"Rebuilding unreadable {path}: {e}")
+        rollups.rebuild(session_log, tasks, archived)
+        return rollups
+
+    def rebuild(self, session_log, tasks, archived=()):
+        self.days = {}; self.months = {}; self.sessions = 0
+        self.names.update({task.get('id'): task.get('task', '') for task in tasks if task.get('id')})
+        for task_id, start, end in session_log.sessions(): self.add_session(task_id, start, end)
+        for task in itertools.chain(tasks, archived):
+            if task.get('completed') and task.get('completedAt') and not task.get('completedAtEstimated'):
+                try: self.add_completion(datetime.fromisoformat(task['completedAt']).date())
+                except (TypeError, ValueError): continue
+        self.dirty = True
+
+    def save(self, force=False):
+        if self.path is None or not (self.dirty or force): return
+        json_codec.write_file(self.path, {'version': ROLLUPS_VERSION, 'sessions': self.sessions, 'names': self.names,
+                                          'days': self.days, 'months': self.months})
+        self.dirty = False
+
+    # --- Updates ---
+    def _buckets(self, day):
+        key = day.isoformat()
+        day_bucket = self.days.get(key) or self.days.setdefault(key, _bucket())
+        month_bucket = self.months.get(key[:7]) or self.months.setdefault(key[:7], _bucket())
+        return day_bucket, month_bucket
+
+    def add_session(self, task_id, start, end, title=None):
+        """Folds one logged session in (call it for every session the log records)."""
+        for day, seconds in _split_by_day(start, end):
+            for bucket in self._buckets(day):
+                bucket['seconds'] += seconds; bucket['tasks'][task_id] = bucket['tasks'].get(task_id, 0.0) + seconds
+        if title is not None: self.names[task_id] = title
+        self.sessions += 1; self.dirty = True
+
+    def add_completion(self, day, count=1):
+        """count=-1 takes back a completion when a task is marked not completed."""
+        for bucket in self._buckets(day): bucket['completed'] = max(0, bucket['completed'] + count)
+        self.dirty = True
+
+    # --- Queries ---
+    def _range_buckets(self, first, last):
+        """Buckets covering the days first..last: whole months from the month table, the edges day by day."""
+        day = first
+        while day <= last:
+            month_end = (day.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+            if day.day == 1 and month_end <= last:
+                bucket = self.months.get(day.strftime('%Y-%m'))
+                day = month_end + timedelta(days=1)
+            else:
+                bucket = self.days.get(day.isoformat()); day += timedelta(days=1)
+            if bucket is not None: yield bucket
+
+    def summary(self, first, last):
+        """Tracked seconds, completions and seconds by task id for the days first..last (dates, inclusive)."""
+        seconds = 0.0; completed = 0; per_task = {}
+        for bucket in self._range_buckets(first, last):
+            seconds += bucket['seconds']; completed += bucket['completed']
+            for task_id, task_seconds in bucket['tasks'].items(): per_task[task_id] = per_task.get(task_id, 0.0) + task_seconds
+        return {'seconds': seconds, 'completed': completed, 'tasks': per_task}
+
+    def series(self, first, last, by='day'):
+        """[(period start date, seconds, completed)] for every day or week (from Monday) in first..last."""
+        rows = []
+        if by == 'week':
+            start = week_start(first)
+            while start <= last:
+                end = start + timedelta(days=6)
+                buckets = list(self._range_buckets(max(start, first), min(end, last)))
+                rows.append((start, sum(b['seconds'] for b in buckets), sum(b['completed'] for b in buckets))); start = end + timedelta(days=1)
+            return rows
+        day = first
+        while day <= last:
+            bucket = self.days.get(day.isoformat())
+            rows.append((day, bucket['seconds'] if bucket else 0.0, bucket['completed'] if bucket else 0)); day += timedelta(days=1)
+        return rows
+
+
+def category_of(task):
+    """Report category of a task: its icon's file name, or 'No icon'."""
+    icon = task.get('icon') if task is not None else None
+    return os.path.splitext(os.path.basename(icon))[0] if icon else 'No icon'
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+In-process full-text index over tasks, subtasks, annotations, title history
+and gratitude entries.
+
+Every task (and every subtask) is one document, every gratitude day is one
+document. The index maps lower-cased word tokens to the documents containing
+them and keeps a sorted vocabulary so prefix terms resolve with a bisect.
+Documents are re-indexed one top-level task at a time, so a mutation only
+costs the size of the task that changed.
+
+Query syntax:
+    invoice            documents containing the word
+    inv*               documents containing a word starting with "inv"
+    "paid invoice"     documents containing the exact phrase
+Terms are ANDed together.
+"""
+
+import re
+import logging
+from bisect import bisect_left, insort
+from itertools import islice
+from collections import namedtuple
+from collections.abc import Mapping
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+QUERY_RE = re.compile(r'"([^"]*)"|(\S+)')
+
+# Field weights used for ranking
+TITLE_WEIGHT = 4
+ANNOTATION_WEIGHT = 2
+GRATITUDE_WEIGHT = 2
+HISTORY_WEIGHT = 1
+
+SearchHit = namedtuple('SearchHit', 'kind key root_id label snippet score')
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower()) if text else []
+
+
+def _task_fields(task, cold_texts=()):
+    """Returns [(weight, text), ...] for a task or subtask; cold_texts are its annotations in cold storage."""
+    title = str(task.get('task', ''))
+    fields = [(TITLE_WEIGHT, title)]
+    for annotation in task.get('annotations') or []:
+        if isinstance(annotation, Mapping) and annotation.get('text'): fields.append((ANNOTATION_WEIGHT, str(annotation['text'])))
+    fields.extend((ANNOTATION_WEIGHT, text) for text in cold_texts)
+    for entry in task.get('titleHistory') or []:
+        if isinstance(entry, Mapping) and entry.get('title') and entry['title'] != title: fields.append((HISTORY_WEIGHT, str(entry['title'])))
+    return fields
+
+
+def _task_signature(task):
+    """
+    Everything index_task takes from a task tree (ids, titles, annotation and
+    title history texts), used to skip unchanged tasks. It holds the task's
+    own strings, not copies. Walked with a stack: trees can be deep.
+    """
+    parts = []; stack = [task]
+    while stack:
+        node = stack.pop()
+        parts.append((node.get('id'), node.get('task'),
+                      tuple(a.get('text') for a in node.get('annotations') or [] if isinstance(a, Mapping)),
+                      tuple(e.get('title') for e in node.get('titleHistory') or [] if isinstance(e, Mapping))))
+        stack.extend(subtask for subtask in node.get('subtasks') or [] if isinstance(subtask, Mapping))
+    return tuple(parts)
+
+
+class SearchIndex:
+    def __init__(self):
+        self._postings = {}     # token -> {doc_key: weight}
+        self._vocab = []        # sorted tokens, for prefix lookups
+        self._doc_tokens = {}   # doc_key -> {token: weight}
+        self._docs = {}         # doc_key -> (kind, root_id, label, fields)
+        self._root_docs = {}    # root_id -> [doc_key, ...]
+        self._root_sigs = {}    # root_id -> _task_signature
+        self._root_tasks = {}   # root_id -> top-level task dict
+        self._cold = {}         # task/subtask id -> annotation texts moved to cold storage (retention.py)
+
+    def __len__(self):
+        return len(self._docs)
+
+    # --- Maintenance ---
+    def _add_doc(self, doc_key, kind, root_id, label, fields):
+        weights = {}
+        for weight, text in fields:
+            for token in tokenize(text):
+                if weights.get(token, 0) < weight: weights[token] = weight
+        for token, weight in weights.items():
+            posting = self._postings.get(token)
+            if posting is None: posting = self._postings[token] = {}; insort(self._vocab, token)
+            posting[doc_key] = weight
+        self._doc_tokens[doc_key] = weights
+        self._docs[doc_key] = (kind, root_id, label, fields)
+
+    def _remove_doc(self, doc_key):
+        for token in self._doc_tokens.pop(doc_key, ()):
+            posting = self._postings.get(token)
+            if posting is None: continue
+            posting.pop(doc_key, None)
+            if not posting:
+                del self._postings[token]
+                i = bisect_left(self._vocab, token)
+                if i < len(self._vocab) and self._vocab[i] == token: del self._vocab[i]
+        self._docs.pop(doc_key, None)
+
+    def _remove_root(self, root_id):
+        for doc_key in self._root_docs.pop(root_id, ()): self._remove_doc(doc_key)
+        self._root_sigs.pop(root_id, None); self._root_tasks.pop(root_id, None)
+
+    def index_task(self, task):
+        """(Re)indexes a top-level task and all of its subtasks. Unchanged tasks are skipped."""
+        root_id = task.get('id')
+        if not root_id: return
+        signature = _task_signature(task)
+        if self._root_sigs.get(root_id) == signature: return
+        self._remove_root(root_id)
+        doc_keys = []
+        stack = [(task, 'task')]
+        while stack:
+            node, kind = stack.pop()
+            doc_key = 'task:' + str(node.get('id') or f"{root_id}/{len(doc_keys)}")
+            self._add_doc(doc_key, kind, root_id, str(node.get('task', '')), _task_fields(node, self._cold.get(node.get('id'), ())))
+            doc_keys.append(doc_key)
+            stack.extend((subtask, 'subtask') for subtask in node.get('subtasks') or [] if isinstance(subtask, Mapping))
+        self._root_docs[root_id] = doc_keys
+        self._root_sigs[root_id] = signature
+        self._root_tasks[root_id] = task
+
+    def index_node(self, node):
+        """
+        Re-indexes the top-level task that an already indexed task or subtask
+        belongs to. Returns False for nodes the index has never seen.
+        """
+        doc = self._docs.get('task:' + str(node.get('id')))
+        if doc is None or doc[1] not in self._root_tasks: return False
+        self.index_task(self._root_tasks[doc[1]])
+        return True
+
+    def add_cold_texts(self, texts_by_id):
+        """Adds annotation texts moved to cold storage ({task/subtask id: [text]}) to their documents."""
+        roots = set()
+        for node_id, texts in texts_by_id.items():
+            self._cold.setdefault(node_id, []).extend(texts)
+            doc = self._docs.get('task:' + str(node_id))
+            if doc is not None: roots.add(doc[1])
+        for root_id in roots:
+            self._root_sigs.pop(root_id, None); self.index_task(self._root_tasks[root_id])
+
+    def remove_task(self, root_id):
+        self._remove_root(root_id)
+
+    def sync_tasks(self, tasks):
+        """Brings the task documents in line with tasks, touching only tasks that changed or disappeared."""
+        for task in tasks:
+            if isinstance(task, Mapping) and task.get('id'): self.index_task(task)
+        self.remove_missing(tasks)
+
+    def remove_missing(self, tasks):
+        """Drops the documents of top-level tasks that are no longer in tasks."""
+        live_ids = {task.get('id') for task in tasks if isinstance(task, Mapping)}
+        for root_id in [r for r in self._root_docs if not r.startswith('gratitude:') and r not in live_ids]: self._remove_root(root_id)
+
+    def index_gratitude_day(self, date_str, entries):
+        root_id = 'gratitude:' + date_str
+        self._remove_root(root_id)
+        fields = [(GRATITUDE_WEIGHT, str(entry.get('text', ''))) for entry in entries or [] if isinstance(entry, Mapping)]
+        if not fields: return
+        self._add_doc(root_id, 'gratitude', root_id, date_str, fields)
+        self._root_docs[root_id] = [root_id]
+
+    def sync_gratitude(self, gratitude_entries):
+        for root_id in [r for r in self._root_docs if r.startswith('gratitude:') and r[len('gratitude:'):] not in gratitude_entries]: self._remove_root(root_id)
+        for date_str, entries in gratitude_entries.items(): self.index_gratitude_day(date_str, entries)
+
+    # --- Queries ---
+    def _term_postings(self, token, prefix):
+        if not prefix: return self._postings.get(token, {})
+        merged = {}
+        i = bisect_left(self._vocab, token)
+        while i < len(self._vocab) and self._vocab[i].startswith(token):
+            for doc_key, weight in self._postings[self._vocab[i]].items():
+                if merged.get(doc_key, 0) < weight: merged[doc_key] = weight
+            i += 1
+        return merged
+
+    def _has_phrase(self, doc_key, phrase_tokens):
+        needle = ' ' + ' '.join(phrase_tokens) + ' '
+        return any(needle in ' ' + ' '.join(tokenize(text)) + ' ' for _, text in self._docs[doc_key][3])
+
+    def search(self, query, limit=50, prefix_last=False):
+        """
+        Returns up to limit SearchHits ranked by field weight. With prefix_last the
+        final bare term is treated as a prefix, for search-as-you-type boxes.
+        """
+        terms = []; phrases = []
+        matches = list(QUERY_RE.finditer(query or ''))
+        for n, match in enumerate(matches):
+            phrase, word = match.groups()
+            if phrase is not None:
+                tokens = tokenize(phrase)
+                if len(tokens) > 1: phrases.append(tokens)
+                terms.extend((token, False) for token in tokens)
+            else:
+                prefix = word.endswith('*') or (prefix_last and n == len(matches) - 1 and not query.endswith(' '))
+                tokens = tokenize(word)
+                terms.extend((token, False) for token in tokens[:-1])
+                if tokens: terms.append((tokens[-1], prefix))
+        if not terms: return []
+        postings = sorted((self._term_postings(token, prefix) for token, prefix in terms), key=len)
+        if not postings[0]: return []
+        scores = dict(postings[0])
+        for posting in postings[1:]:
+            scores = {doc_key: score + posting[doc_key] for doc_key, score in scores.items() if doc_key in posting}
+            if not scores: return []
+        ranked = sorted(scores, key=scores.__getitem__, reverse=True)
+        if phrases: ranked = (doc_key for doc_key in ranked if all(self._has_phrase(doc_key, p) for p in phrases))
+        needles = [token for token, _ in terms]
+        return [self._hit(doc_key, scores[doc_key], needles) for doc_key in islice(ranked, limit)]
+
+    def _hit(self, doc_key, score, needles):
+        kind, root_id, label, fields = self._docs[doc_key]
+        snippet = ''
+        for _, text in fields:
+            lowered = text.lower(); pos = next((p for p in (lowered.find(n) for n in needles) if p >= 0), -1)
+            if pos >= 0:
+                start = max(0, pos - 30); snippet = ('…' if start else '') + text[start:start + 90].replace('\n', ' ')
+                break
+        return SearchHit(kind, doc_key, root_id, label, snippet, score)
+
+
+def build_index(tasks, gratitude_entries=None):
+    index = SearchIndex()
+    index.sync_tasks(tasks)
+    if gratitude_entries: index.sync_gratitude(gratitude_entries)
+    logging.info(f"Search index built with {len(index)} documents.")
+    return index
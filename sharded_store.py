@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+Sharded task storage: tasks split over several JSON files plus a manifest.
+
+Enabled with STORAGE_BACKEND=sharded. Layout under broadcasts/tasks_shards/:
+
+    manifest.json        meta (colors, user_display_name, ...), shard names
+                         and the task order as a list of task ids
+    YYYY-MM-NNN.json     up to SHARD_SIZE top-level tasks created in that
+                         month, in the tasks.json document layout
+
+A task stays in the shard it was first saved to, so reordering only
+rewrites the manifest, and a save only rewrites the shards holding tasks
+that changed. At startup the shards are parsed and normalized in a
+ProcessPoolExecutor when there is enough data to make that worthwhile.
+
+Gratitude entries are kept by gratitude_store in broadcasts/gratitude/.
+
+Usage: python sharded_store.py import|export tasks.json [--folder DIR]
+"""
+
+import os
+import sys
+import logging
+import argparse
+from datetime import datetime
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+
+import task_store
+import json_codec
+from task_fragments import DirtyTracker
+
+SHARD_FOLDER = os.path.join('broadcasts', 'tasks_shards')
+MANIFEST_NAME = 'manifest.json'
+DEFAULT_SHARD_SIZE = 1000
+PARALLEL_MIN_BYTES = 4 * 2**20  # below this, starting worker processes costs more than it saves
+
+
+def shard_size_from_env():
+    raw = os.getenv('SHARD_SIZE', '').strip()
+    try: return max(1, int(raw)) if raw else DEFAULT_SHARD_SIZE
+    except ValueError: logging.warning(f"Ignoring invalid SHARD_SIZE={raw!r}"); return DEFAULT_SHARD_SIZE
+
+
+def _load_shard(path, now_iso, local_time_str, validate):
+    """Worker: parses and migrates one shard file, fully validating it if asked. Returns (tasks, needs_save)."""
+    data = json_codec.load_file(path)
+    _, tasks_data, version = task_store.split_document(data)
+    tasks, migrated = task_store.prepare_tasks(tasks_data, version, now_iso, local_time_str)
+    repaired = 0
+    if validate and version == task_store.SCHEMA_VERSION:
+        # Workers run in parallel, so do the full validation here instead of deferring it to idle frames
+        repaired = sum(task_store.iter_lazy_validation(tasks, now_iso, local_time_str, batch_size=max(1, len(tasks))))
+    return tasks, migrated or repaired > 0
+
+
+def _month_of(task):
+    try: return datetime.fromisoformat(str(task.get('createdAt'))).strftime('%Y-%m')
+    except (TypeError, ValueError): return 'undated'
+
+
+def _default_to_json(task):
+    return task.to_json() if hasattr(task, 'to_json') else dict(task)
+
+
+class ShardedTaskStore:
+    def __init__(self, folder=SHARD_FOLDER, shard_size=None):
+        self.path = folder
+        self.shard_size = shard_size or shard_size_from_env()
+        if not os.path.exists(folder): os.makedirs(folder)
+        self._manifest_path = os.path.join(folder, MANIFEST_NAME)
+        self._manifest = {'schema_version': task_store.SCHEMA_VERSION, 'meta': {}, 'shards': [], 'order': []}
+        if os.path.exists(self._manifest_path):
+            self._manifest.update(json_codec.load_file(self._manifest_path))
+        self._shard_of = {}        # root task id -> shard name
+        self._saved_members = {}   # shard name -> tuple of root ids as last written
+        self._changes = DirtyTracker()  # root tasks changed since the last load/save
+        self.validated = False     # whether the last load_tasks fully validated the tasks
+
+    def _shard_path(self, name):
+        return os.path.join(self.path, f'{name}.json')
+
+    def is_empty(self):
+        return not os.path.exists(self._manifest_path)
+
+    def close(self):
+        pass
+
+    # --- Meta ---
+    def load_meta(self):
+        meta = dict(self._manifest.get('meta', {}))
+        meta['schema_version'] = self._manifest.get('schema_version', task_store.SCHEMA_VERSION)
+        return meta
+
+    def set_meta(self, key, value):
+        self._manifest['meta'][key] = value
+        json_codec.write_file(self._manifest_path, self._manifest, pretty=True)
+
+    # --- Tasks ---
+    def load_tasks(self, now_iso=None, local_time_str='', parallel=None):
+        """
+        Returns (tasks, needs_save) in manifest order. parallel=None uses a
+        process pool only with several CPUs, several shards and PARALLEL_MIN_BYTES
+        of data. Pool workers also run the full validation (see validated).
+        """
+        now_iso = now_iso or datetime.now().isoformat()
+        names = [name for name in self._manifest.get('shards', []) if os.path.exists(self._shard_path(name))]
+        paths = [self._shard_path(name) for name in names]
+        if parallel is None: parallel = (os.cpu_count() or 1) > 1 and len(paths) > 1 and sum(os.path.getsize(p) for p in paths) >= PARALLEL_MIN_BYTES
+        if parallel:
+            with ProcessPoolExecutor(max_workers=min(len(paths), os.cpu_count() or 1)) as pool:
+                results = list(pool.map(_load_shard, paths, repeat(now_iso), repeat(local_time_str), repeat(True)))
+        else: results = [_load_shard(path, now_iso, local_time_str, False) for path in paths]
+        self.validated = bool(parallel)
+        by_id = {}; needs_save = False
+        self._shard_of.clear(); self._saved_members.clear(); self._changes = DirtyTracker()
+        for name, (tasks, shard_needs_save) in zip(names, results):
+            needs_save = needs_save or shard_needs_save
+            self._saved_members[name] = tuple(task['id'] for task in tasks)
+            for task in tasks:
+                by_id[task['id']] = task; self._shard_of[task['id']] = name; self._changes.index(task)
+        ordered = [by_id.pop(task_id) for task_id in self._manifest.get('order', []) if task_id in by_id]
+        ordered.extend(by_id.values())  # saved to a shard but missing from the manifest (interrupted save)
+        self._changes.clear()
+        if needs_save: self._changes.mark(None)
+        logging.info(f"Loaded {len(ordered)} tasks from {len(names)} shards in {self.path}{' (process pool)' if parallel else ''}.")
+        return ordered, needs_save
+
+    def mark_dirty(self, node=None):
+        """Records that node (a task or subtask) changed; None means anything may have changed."""
+        self._changes.mark(node)
+
+    def _assign_new(self, tasks, members):
+        """Puts tasks without a shard into the newest shard of their creation month that still has room."""
+        for task in tasks:
+            month = _month_of(task)
+            parts = sorted(name for name in members if name.rsplit('-', 1)[0] == month)
+            if parts and len(members[parts[-1]]) < self.shard_size: name = parts[-1]
+            else: name = f"{month}-{int(parts[-1].rsplit('-', 1)[1]) + 1 if parts else 0:03d}"
+            members.setdefault(name, []).append(task); self._shard_of[task['id']] = name
+
+    def save_tasks(self, tasks, to_json=_default_to_json):
+        """Writes the shards whose tasks changed and the manifest. Returns the number of shard files written."""
+        dirty = self._changes.resolve(tasks)
+        members = {}; new_tasks = []
+        for task in tasks:
+            name = self._shard_of.get(task['id'])
+            if name is None: new_tasks.append(task)
+            else: members.setdefault(name, []).append(task)
+        self._assign_new(new_tasks, members)
+        written = 0
+        for name, shard_tasks in members.items():
+            ids = tuple(task['id'] for task in shard_tasks)
+            if not (dirty is None or ids != self._saved_members.get(name) or not dirty.isdisjoint(ids)): continue
+            json_codec.write_file(self._shard_path(name), {'schema_version': task_store.SCHEMA_VERSION, 'tasks': [to_json(task) for task in shard_tasks]}, json_codec.pretty_json_enabled())
+            self._saved_members[name] = ids; written += 1
+        for name in [n for n in self._saved_members if n not in members]:
+            try: os.remove(self._shard_path(name))
+            except FileNotFoundError: pass
+            del self._saved_members[name]
+        live_ids = {task['id'] for task in tasks}
+        for task_id in [t for t in self._shard_of if t not in live_ids]: del self._shard_of[task_id]
+        order = [task['id'] for task in tasks]; shard_names = sorted(members)
+        if written or order != self._manifest.get('order') or shard_names != self._manifest.get('shards') or self._manifest.get('schema_version') != task_store.SCHEMA_VERSION:
+            self._manifest.update(schema_version=task_store.SCHEMA_VERSION, shards=shard_names, order=order)
+            json_codec.write_file(self._manifest_path, self._manifest, pretty=True)
+        self._changes.clear(tasks)
+        return written
+
+    # --- Import / export ---
+    def import_json(self, json_path):
+        """Replaces the shards with the contents of a tasks.json document."""
+        data = json_codec.load_file(json_path)
+        meta, tasks_data, version = task_store.split_document(data)
+        tasks, _ = task_store.prepare_tasks(tasks_data, version, datetime.now().isoformat(), '')
+        for task in tasks:
+            if not task.get('id'): task['id'] = task_store.new_task_id()
+        self._manifest['meta'] = {key: value for key, value in meta.items() if key not in ('tasks', 'schema_version')}
+        self._shard_of.clear(); self._changes.mark(None)
+        self.save_tasks(tasks)
+        logging.info(f"Imported {len(tasks)} tasks from {json_path} into {self.path}")
+        return len(tasks)
+
+    def _read_shards(self):
+        """Tasks of the shard files in manifest order, read one shard at a time without touching the store's state."""
+        now_iso = datetime.now().isoformat(); by_id = {}
+        for name in self._manifest.get('shards', []):
+            path = self._shard_path(name)
+            if not os.path.exists(path): continue
+            for task in _load_shard(path, now_iso, '', False)[0]: by_id[task['id']] = task
+        ordered = [by_id.pop(task_id) for task_id in self._manifest.get('order', []) if task_id in by_id]
+        ordered.extend(by_id.values())
+        return ordered
+
+    def export_json(self, json_path, tasks=None, to_json=_default_to_json):
+        """
+        Writes a single tasks.json document from tasks (the app passes its
+        in-memory list) or, without them, from the shard files as saved.
+        Shard assignment and change tracking are left as they are.
+        """
+        if tasks is None: tasks = self._read_shards()
+        document = dict(self._manifest.get('meta', {}))
+        document['schema_version'] = task_store.SCHEMA_VERSION; document['tasks'] = [to_json(task) for task in tasks]
+        json_codec.write_file(json_path, document, json_codec.pretty_json_enabled())
+        logging.info(f"Exported {len(tasks)} tasks from {self.path} to {json_path}")
+        return len(tasks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import/export tasks.json to and from the sharded task store')
+    parser.add_argument('command', choices=['import', 'export'])
+    parser.add_argument('json_file', help='Path to tasks.json')
+    parser.add_argument('--folder', default=SHARD_FOLDER, help='Shard folder')
+    args = parser.parse_args()
+    try:
+        store = ShardedTaskStore(args.folder)
+        count = store.import_json(args.json_file) if args.command == 'import' else store.export_json(args.json_file)
+        print(f"{args.command.title()}ed {count} tasks.")
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}"); sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
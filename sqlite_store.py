@@ -0,0 +1,357 @@
+# -*- coding: utf-8 -*-
+"""
+Optional SQLite storage backend for tasks, alarms, annotations, title history
+and gratitude entries.
+
+Tasks and subtasks live in one normalized ``tasks`` table linked by
+``parent_id``; alarms, annotations and title history hang off the task id.
+Saves only look at the top-level tasks reported changed (mark_dirty, fed
+by mark_tasks_changed like the sharded store); their rows are compared by
+a per-task fingerprint with the last persisted one and only the changed
+ones are written. broadcasts/tasks.json stays the interchange format
+via import_json / export_json (also available from the command line).
+"""
+
+import os
+import sys
+import json
+import sqlite3
+import hashlib
+import logging
+import argparse
+from datetime import datetime
+
+import task_dates
+import task_store
+from task_fragments import DirtyTracker
+
+DB_FILE = os.path.join('broadcasts', 'tasks.db')
+
+# Columns stored natively; every other task key round-trips through `extra`.
+_TASK_COLUMNS = ('task', 'completed', 'timer', 'timer_running', 'start_time_unix', 'due_date', 'icon', 'localTime', 'createdAt', 'subtasks_visible')
+_CHILD_KEYS = ('id', 'subtasks', 'alarms', 'annotations', 'titleHistory')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    id TEXT PRIMARY KEY,
+    parent_id TEXT REFERENCES tasks(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    completed INTEGER NOT NULL DEFAULT 0,
+    timer REAL NOT NULL DEFAULT 0,
+    timer_running INTEGER NOT NULL DEFAULT 0,
+    start_time_unix REAL,
+    due_date TEXT,
+    icon TEXT,
+    local_time TEXT,
+    created_at TEXT,
+    subtasks_visible INTEGER,
+    extra TEXT,
+    fingerprint TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_parent ON tasks(parent_id, position);
+CREATE INDEX IF NOT EXISTS idx_tasks_due_date ON tasks(due_date);
+CREATE INDEX IF NOT EXISTS idx_tasks_completed ON tasks(completed);
+CREATE INDEX IF NOT EXISTS idx_tasks_running ON tasks(timer_running);
+CREATE TABLE IF NOT EXISTS alarms (
+    id TEXT PRIMARY KEY,
+    task_id TEXT NOT NULL REFERENCES tasks(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    target_timestamp_unix REAL,
+    sound_file TEXT,
+    enabled INTEGER NOT NULL DEFAULT 0,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_alarms_task ON alarms(task_id, position);
+CREATE TABLE IF NOT EXISTS annotations (
+    task_id TEXT NOT NULL REFERENCES tasks(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    text TEXT,
+    timestamp TEXT,
+    PRIMARY KEY (task_id, position)
+);
+CREATE TABLE IF NOT EXISTS title_history (
+    task_id TEXT NOT NULL REFERENCES tasks(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    title TEXT,
+    timestamp TEXT,
+    PRIMARY KEY (task_id, position)
+);
+CREATE TABLE IF NOT EXISTS gratitude (
+    date TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    text TEXT,
+    timestamp TEXT,
+    PRIMARY KEY (date, position)
+);
+"""
+
+
+def _row_image(task, parent_id, position):
+    """The exact column values a task (not its subtasks) is stored as, including its child rows."""
+    task_id = task['id']
+    extra = {k: v for k, v in task.items() if k not in _TASK_COLUMNS and k not in _CHILD_KEYS}
+    subtasks_visible = task.get('subtasks_visible')
+    task_row = (task_id, parent_id, position, str(task.get('task', '')), int(bool(task.get('completed'))), float(task.get('timer') or 0), int(bool(task.get('timer_running'))),
+                task.get('start_time_unix'), task.get('due_date'), task.get('icon'), task.get('localTime'), task.get('createdAt'),
+                None if subtasks_visible is None else int(bool(subtasks_visible)), json.dumps(extra, ensure_ascii=False, sort_keys=True) if extra else None)
+    alarm_rows = []
+    for i, a in enumerate(task.get('alarms', [])):
+        alarm_extra = {k: v for k, v in a.items() if k not in ('id', 'target_timestamp_unix', 'sound_file', 'enabled')}
+        alarm_rows.append((a.get('id') or f"{task_id}_{i}", task_id, i, a.get('target_timestamp_unix'), a.get('sound_file'), int(bool(a.get('enabled'))), json.dumps(alarm_extra, ensure_ascii=False, sort_keys=True) if alarm_extra else None))
+    annotation_rows = [(task_id, i, a.get('text'), a.get('timestamp')) for i, a in enumerate(task.get('annotations', []))]
+    history_rows = [(task_id, i, h.get('title'), h.get('timestamp')) for i, h in enumerate(task.get('titleHistory', []))]
+    return task_row, alarm_rows, annotation_rows, history_rows
+
+
+def _fingerprint(image):
+    """Content hash of a row image; the position column is left out so reorders only touch `position`."""
+    if isinstance(image, tuple): image = (image[0][:2] + image[0][3:],) + image[1:]
+    payload = json.dumps(image, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def _flatten(tasks, parent_id=None, start=0):
+    """Yields (task, parent_id, position) for every task and subtask, depth first; positions of tasks count from start."""
+    for position, task in enumerate(tasks, start):
+        yield task, parent_id, position
+        yield from _flatten(task.get('subtasks', []), task['id'])
+
+
+def _default_to_json(task):
+    return task.to_json() if hasattr(task, 'to_json') else dict(task)
+
+
+def _reassign_duplicate_ids(tasks):
+    """Gives every task or subtask whose id is missing or already taken a fresh one (ids are the primary key). Returns how many were changed."""
+    seen = set(); changed = 0; stack = list(reversed(tasks))
+    while stack:
+        task = stack.pop(); task_id = task.get('id')
+        if not task_id or task_id in seen:
+            if task_id: logging.warning(f"Duplicate task id {task_id!r} in import, giving '{task.get('task', '?')}' a new one.")
+            task['id'] = task_id = task_store.new_task_id(); changed += 1
+        seen.add(task_id); stack.extend(reversed(task.get('subtasks', [])))
+    return changed
+
+
+class SQLiteTaskStore:
+    """Normalized SQLite persistence for the task tree and gratitude journal."""
+
+    def __init__(self, path=DB_FILE):
+        self.path = path
+        folder = os.path.dirname(path)
+        if folder and not os.path.exists(folder): os.makedirs(folder)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('PRAGMA foreign_keys=ON')
+        self.conn.executescript(_SCHEMA)
+        self._fingerprints = {}
+        self._positions = {}
+        self._root_nodes = {}      # top-level id -> ids of its task and subtask rows, as last saved
+        self._changes = DirtyTracker()  # top-level tasks changed since the last load/save
+        self._gratitude_fingerprints = {}
+
+    def close(self):
+        try: self.conn.close()
+        except sqlite3.Error as e: logging.warning(f"Error closing {self.path}: {e}")
+
+    def is_empty(self):
+        return self.conn.execute('SELECT 1 FROM tasks LIMIT 1').fetchone() is None and self.conn.execute('SELECT 1 FROM meta LIMIT 1').fetchone() is None
+
+    # --- Meta ---
+    def load_meta(self):
+        return {key: json.loads(value) for key, value in self.conn.execute('SELECT key, value FROM meta')}
+
+    def set_meta(self, key, value):
+        with self.conn: self.conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, json.dumps(value, ensure_ascii=False)))
+
+    # --- Tasks ---
+    def load_tasks(self):
+        """Rebuilds the nested task list (same layout as tasks.json) from the tables."""
+        rows = self.conn.execute('SELECT id, parent_id, position, title, completed, timer, timer_running, start_time_unix, due_date, icon, local_time, created_at, subtasks_visible, extra, fingerprint FROM tasks ORDER BY parent_id IS NOT NULL, position')
+        by_id = {}; children = {}; roots = []
+        for (task_id, parent_id, position, title, completed, timer, timer_running, start_time_unix, due_date, icon, local_time, created_at, subtasks_visible, extra, fingerprint) in rows:
+            task = json.loads(extra) if extra else {}
+            task.update({'id': task_id, 'task': title, 'completed': bool(completed), 'timer': timer, 'timer_running': bool(timer_running), 'start_time_unix': start_time_unix, 'due_date': due_date, 'icon': icon, 'localTime': local_time, 'createdAt': created_at, 'alarms': [], 'annotations': [], 'titleHistory': [], 'subtasks': []})
+            if subtasks_visible is not None: task['subtasks_visible'] = bool(subtasks_visible)
+            by_id[task_id] = task; self._fingerprints[task_id] = fingerprint; self._positions[task_id] = position
+            if parent_id is None: roots.append((position, task))
+            else: children.setdefault(parent_id, []).append((position, task))
+        for parent_id, kids in children.items():
+            parent = by_id.get(parent_id)
+            if parent is not None: parent['subtasks'] = [t for _, t in sorted(kids, key=lambda pair: pair[0])]
+        for alarm_id, task_id, target_ts, sound_file, enabled, extra in self.conn.execute('SELECT id, task_id, target_timestamp_unix, sound_file, enabled, extra FROM alarms ORDER BY task_id, position'):
+            if task_id not in by_id: continue
+            alarm_entry = json.loads(extra) if extra else {}
+            alarm_entry.update({'id': alarm_id, 'target_timestamp_unix': target_ts, 'sound_file': sound_file, 'enabled': bool(enabled)})
+            by_id[task_id]['alarms'].append(alarm_entry)
+        for task_id, text, timestamp in self.conn.execute('SELECT task_id, text, timestamp FROM annotations ORDER BY task_id, position'):
+            if task_id in by_id: by_id[task_id]['annotations'].append({'text': text, 'timestamp': timestamp})
+        for task_id, title, timestamp in self.conn.execute('SELECT task_id, title, timestamp FROM title_history ORDER BY task_id, position'):
+            if task_id in by_id: by_id[task_id]['titleHistory'].append({'title': title, 'timestamp': timestamp})
+        roots = [t for _, t in sorted(roots, key=lambda pair: pair[0])]
+        self._root_nodes = {}; self._changes = DirtyTracker()
+        for root in roots:
+            self._root_nodes[root['id']] = [node['id'] for node, _, _ in _flatten([root])]; self._changes.index(root)
+        self._changes.clear()
+        return roots
+
+    def mark_dirty(self, node=None):
+        """Records that node (a task or subtask) changed; None means anything may have changed."""
+        self._changes.mark(node)
+
+    def save_tasks(self, tasks, to_json=_default_to_json):
+        """
+        Writes the rows of dirty tasks whose fingerprint changed, moves
+        reordered tasks and deletes removed ones; clean tasks are not
+        serialized at all. Returns the number of rows written.
+        """
+        for task in tasks:
+            if not task.get('id'): task['id'] = task_store.new_task_id()
+        dirty = self._changes.resolve(tasks)
+        seen = set(); written = 0; moved = 0
+        with self.conn:
+            for root_position, root in enumerate(tasks):
+                root_id = root['id']
+                if dirty is not None and root_id not in dirty and root_id in self._root_nodes:
+                    seen.update(self._root_nodes[root_id])
+                    if self._positions.get(root_id) != root_position:
+                        self.conn.execute('UPDATE tasks SET position = ? WHERE id = ?', (root_position, root_id)); self._positions[root_id] = root_position; moved += 1
+                    continue
+                node_ids = []
+                for task, parent_id, position in _flatten([to_json(root)], start=root_position):
+                    if not task.get('id'): task['id'] = task_store.new_task_id()
+                    task_id = task['id']; seen.add(task_id); node_ids.append(task_id)
+                    image = _row_image(task, parent_id, position); fingerprint = _fingerprint(image)
+                    if self._fingerprints.get(task_id) == fingerprint:
+                        if self._positions.get(task_id) != position:
+                            self.conn.execute('UPDATE tasks SET position = ? WHERE id = ?', (position, task_id)); self._positions[task_id] = position; moved += 1
+                        continue
+                    self._write_task(image, fingerprint)
+                    self._fingerprints[task_id] = fingerprint; self._positions[task_id] = position; written += 1
+                self._root_nodes[root_id] = node_ids
+            removed = [task_id for task_id in self._fingerprints if task_id not in seen]
+            for task_id in removed:
+                self.conn.execute('DELETE FROM tasks WHERE id = ?', (task_id,))
+                del self._fingerprints[task_id]; self._positions.pop(task_id, None); self._root_nodes.pop(task_id, None)
+        self._changes.clear(tasks)
+        if written or moved or removed: logging.info(f"SQLite save: {written} task rows written, {moved} repositioned, {len(removed)} deleted.")
+        return written
+
+    def _write_task(self, image, fingerprint):
+        task_row, alarm_rows, annotation_rows, history_rows = image
+        self.conn.execute(
+            'INSERT INTO tasks (id, parent_id, position, title, completed, timer, timer_running, start_time_unix, due_date, icon, local_time, created_at, subtasks_visible, extra, fingerprint) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT(id) DO UPDATE SET parent_id=excluded.parent_id, position=excluded.position, title=excluded.title, completed=excluded.completed, timer=excluded.timer, '
+            'timer_running=excluded.timer_running, start_time_unix=excluded.start_time_unix, due_date=excluded.due_date, icon=excluded.icon, local_time=excluded.local_time, '
+            'created_at=excluded.created_at, subtasks_visible=excluded.subtasks_visible, extra=excluded.extra, fingerprint=excluded.fingerprint',
+            task_row + (fingerprint,))
+        task_id = task_row[0]
+        self.conn.execute('DELETE FROM alarms WHERE task_id = ?', (task_id,))
+        self.conn.execute('DELETE FROM annotations WHERE task_id = ?', (task_id,))
+        self.conn.execute('DELETE FROM title_history WHERE task_id = ?', (task_id,))
+        self.conn.executemany('INSERT OR REPLACE INTO alarms (id, task_id, position, target_timestamp_unix, sound_file, enabled, extra) VALUES (?, ?, ?, ?, ?, ?, ?)', alarm_rows)
+        self.conn.executemany('INSERT INTO annotations (task_id, position, text, timestamp) VALUES (?, ?, ?, ?)', annotation_rows)
+        self.conn.executemany('INSERT INTO title_history (task_id, position, title, timestamp) VALUES (?, ?, ?, ?)', history_rows)
+
+    # --- Indexed queries ---
+    def task_ids_due_between(self, start_date, end_date):
+        """Ids of tasks whose due_date string falls in [start_date, end_date] (same format as stored)."""
+        return [row[0] for row in self.conn.execute('SELECT id FROM tasks WHERE due_date BETWEEN ? AND ?', (start_date, end_date))]
+
+    def running_task_ids(self):
+        return [row[0] for row in self.conn.execute('SELECT id FROM tasks WHERE timer_running = 1')]
+
+    def task_ids_by_completion(self, completed=True):
+        return [row[0] for row in self.conn.execute('SELECT id FROM tasks WHERE completed = ?', (int(bool(completed)),))]
+
+    # --- Gratitude ---
+    def load_gratitude(self):
+        entries = {}
+        for date, text, timestamp in self.conn.execute('SELECT date, text, timestamp FROM gratitude ORDER BY date, position'):
+            entries.setdefault(date, []).append({'text': text, 'timestamp': timestamp})
+        for date, day_entries in entries.items():
+            self._gratitude_fingerprints[date] = _fingerprint([date, day_entries])
+        return entries
+
+    def save_gratitude(self, entries):
+        """Rewrites only days whose entries changed."""
+        written = 0
+        with self.conn:
+            for date, day_entries in entries.items():
+                fingerprint = _fingerprint([date, day_entries])
+                if self._gratitude_fingerprints.get(date) == fingerprint: continue
+                self.conn.execute('DELETE FROM gratitude WHERE date = ?', (date,))
+                self.conn.executemany('INSERT INTO gratitude (date, position, text, timestamp) VALUES (?, ?, ?, ?)',
+                                      [(date, i, e.get('text'), e.get('timestamp')) for i, e in enumerate(day_entries)])
+                self._gratitude_fingerprints[date] = fingerprint; written += 1
+            for date in [d for d in self._gratitude_fingerprints if d not in entries]:
+                self.conn.execute('DELETE FROM gratitude WHERE date = ?', (date,)); del self._gratitude_fingerprints[date]
+        return written
+
+    # --- JSON interchange ---
+    def import_json(self, json_path, gratitude_path=None, gratitude_entries=None, local_time_str=None):
+        """
+        Replaces the database contents with a tasks.json document. The
+        gratitude rows are replaced too when gratitude_entries or an existing
+        gratitude_path is given, and kept otherwise. Duplicate ids get fresh ones.
+        """
+        with open(json_path, 'r', encoding='utf-8') as f: data = json.load(f)
+        meta, tasks_data, version = task_store.split_document(data)
+        if local_time_str is None: local_time_str = task_dates.local_time_now()
+        tasks, _ = task_store.prepare_tasks(tasks_data, version, datetime.now().isoformat(), local_time_str)
+        _reassign_duplicate_ids(tasks)
+        if gratitude_entries is None and gratitude_path and os.path.exists(gratitude_path):
+            with open(gratitude_path, 'r', encoding='utf-8') as f: gratitude_entries = json.load(f)
+        with self.conn:
+            self.conn.execute('DELETE FROM tasks'); self.conn.execute('DELETE FROM meta')
+            if gratitude_entries is not None: self.conn.execute('DELETE FROM gratitude'); self._gratitude_fingerprints = {}
+            for key, value in meta.items():
+                if key != 'tasks': self.conn.execute('INSERT INTO meta (key, value) VALUES (?, ?)', (key, json.dumps(value, ensure_ascii=False)))
+            self.conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', ('schema_version', json.dumps(task_store.SCHEMA_VERSION)))
+        self._fingerprints = {}; self._positions = {}; self._root_nodes = {}; self._changes.mark(None)
+        self.save_tasks(tasks)
+        if gratitude_entries is not None: self.save_gratitude(gratitude_entries)
+        logging.info(f"Imported {len(tasks)} tasks from {json_path} into {self.path}")
+        return len(tasks)
+
+    def export_json(self, json_path, gratitude_path=None):
+        """Writes the database contents back out in the tasks.json layout."""
+        document = self.load_meta()
+        document['schema_version'] = task_store.SCHEMA_VERSION
+        document['tasks'] = self.load_tasks()
+        temp_file = json_path + '.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as f: json.dump(document, f, ensure_ascii=False, indent=2)
+        os.replace(temp_file, json_path)
+        if gratitude_path:
+            with open(gratitude_path + '.tmp', 'w', encoding='utf-8') as f: json.dump(self.load_gratitude(), f, indent=4)
+            os.replace(gratitude_path + '.tmp', gratitude_path)
+        logging.info(f"Exported {len(document['tasks'])} tasks from {self.path} to {json_path}")
+        return len(document['tasks'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import/export tasks.json to and from the SQLite task store')
+    parser.add_argument('command', choices=['import', 'export'])
+    parser.add_argument('json_file', help='Path to tasks.json')
+    parser.add_argument('--db', default=DB_FILE, help='Path to the SQLite database')
+    parser.add_argument('--gratitude', help='Path to gratitude.json')
+    args = parser.parse_args()
+    store = SQLiteTaskStore(args.db)
+    try:
+        if args.command == 'import': count = store.import_json(args.json_file, args.gratitude)
+        else: count = store.export_json(args.json_file, args.gratitude)
+        print(f"{args.command.title()}ed {count} tasks.")
+    except (OSError, ValueError, sqlite3.Error) as e:
+        print(f"Error: {e}"); sys.exit(1)
+    finally: store.close()
+
+
+if __name__ == '__main__':
+    main()
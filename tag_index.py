@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+Task tags and the tag -> task id inverted index.
+
+Tasks and subtasks carry an optional `tags` list. Tags are stored
+normalized (see normalize_tag): lower case, no leading '#' or '@', inner
+whitespace turned into '-', so they can be used as Todoist labels as they
+are.
+
+The index maps every tag to the ids of the tasks and subtasks that carry
+it, and keeps a sorted vocabulary for autocomplete and prefix terms. Like
+the search index it is updated one top-level task at a time from
+mark_tasks_changed, skipping trees whose tags did not change. Queries are
+set operations over the postings:
+
+    work urgent        tagged work and urgent
+    work | home        tagged work or home (also: work OR home)
+    -done              not tagged done (also: !done, NOT done)
+    proj*              tagged with anything starting with "proj"
+    (work | home) -done
+"""
+
+import re
+import bisect
+from functools import lru_cache
+from collections.abc import Mapping
+
+QUERY_TOKEN_RE = re.compile(r'\(|\)|\||[^\s()|]+')
+COMPLETE_LIMIT = 8
+
+
+def normalize_tag(text):
+    """Stored form of a tag, or '' if nothing is left of it."""
+    return '-'.join(str(text).strip().lstrip('#@').casefold().split())
+
+
+def parse_tags(text):
+    """Tags typed as 'work, #home errands' -> ['work', 'home', 'errands']."""
+    return normalize_tags(re.split(r'[,\s]+', text or ''))
+
+
+def normalize_tags(tags):
+    """Normalized, de-duplicated tags in their original order."""
+    seen = []
+    for tag in tags or ():
+        tag = normalize_tag(tag)
+        if tag and tag not in seen: seen.append(tag)
+    return seen
+
+
+def tags_of(node):
+    tags = node.get('tags') if isinstance(node, Mapping) else None
+    return tags if isinstance(tags, list) else []
+
+
+# --- Queries ---
+@lru_cache(maxsize=256)
+def parse_query(query):
+    """
+    The query as a tree of ('tag', t), ('prefix', p), ('not', x), ('and', [...]),
+    ('or', [...]); ('all',) for an empty query. Raises ValueError on bad syntax.
+    """
+    tokens = QUERY_TOKEN_RE.findall(query or ''); position = 0
+
+    def peek():
+        return tokens[position] if position < len(tokens) else None
+
+    def take():
+        nonlocal position
+        position += 1; return tokens[position - 1]
+
+    def parse_or():
+        terms = [parse_and()]
+        while peek() in ('|', 'OR'): take(); terms.append(parse_and())
+        return terms[0] if len(terms) == 1 else ('or', tuple(terms))
+
+    def parse_and():
+        terms = [parse_not()]
+        while peek() not in (None, ')', '|', 'OR'):
+            if peek() == 'AND': take()
+            terms.append(parse_not())
+        return terms[0] if len(terms) == 1 else ('and', tuple(terms))
+
+    def parse_not():
+        token = peek()
+        if token == 'NOT': take(); return ('not', parse_not())
+        if token is not None and len(token) > 1 and token[0] in '-!': tokens[position] = token[1:]; return ('not', parse_not())
+        return parse_atom()
+
+    def parse_atom():
+        token = peek()
+        if token is None or token in (')', '|', 'OR', 'AND'): raise ValueError(f"Expected a tag in {query!r}")
+        take()
+        if token == '(':
+            node = parse_or()
+            if peek() != ')': raise ValueError(f"Missing ')' in {query!r}")
+            take(); return node
+        if token.endswith('*') and normalize_tag(token[:-1]): return ('prefix', normalize_tag(token[:-1]))
+        tag = normalize_tag(token)
+        if not tag: raise ValueError(f"Empty tag in {query!r}")
+        return ('tag', tag)
+
+    if not tokens: return ('all',)
+    tree = parse_or()
+    if position != len(tokens): raise ValueError(f"Unexpected {tokens[position]!r} in {query!r}")
+    return tree
+
+
+def matches(tree, tags):
+    """Whether a node with these tags satisfies a parsed query."""
+    kind = tree[0]
+    if kind == 'tag': return tree[1] in tags
+    if kind == 'prefix': return any(tag.startswith(tree[1]) for tag in tags)
+    if kind == 'not': return not matches(tree[1], tags)
+    if kind == 'and': return all(matches(term, tags) for term in tree[1])
+    if kind == 'or': return any(matches(term, tags) for term in tree[1])
+    return True
+
+
+class TagIndex:
+    def __init__(self):
+        self._postings = {}    # tag -> {node id}
+        self._vocab = []       # sorted tags
+        self._node_tags = {}   # node id -> tuple of its tags
+        self._node_root = {}   # node id -> id of its top-level task
+        self._root_nodes = {}  # root id -> [node id, ...]
+        self._root_sigs = {}   # root id -> tags of the whole tree, to skip unchanged tasks
+        self._root_tasks = {}  # root id -> top-level task
+
+    def __len__(self):
+        return len(self._node_tags)
+
+    # --- Maintenance ---
+    def _add_node(self, node_id, root_id, tags):
+        for tag in tags:
+            posting = self._postings.get(tag)
+            if posting is None: posting = self._postings[tag] = set(); bisect.insort(self._vocab, tag)
+            posting.add(node_id)
+        self._node_tags[node_id] = tags; self._node_root[node_id] = root_id
+
+    def _remove_root(self, root_id):
+        for node_id in self._root_nodes.pop(root_id, ()):
+            for tag in self._node_tags.pop(node_id, ()):
+                posting = self._postings.get(tag)
+                if posting is None: continue
+                posting.discard(node_id)
+                if not posting:
+                    del self._postings[tag]
+                    i = bisect.bisect_left(self._vocab, tag)
+                    if i < len(self._vocab) and self._vocab[i] == tag: del self._vocab[i]
+            self._node_root.pop(node_id, None)
+        self._root_sigs.pop(root_id, None); self._root_tasks.pop(root_id, None)
+
+    def index_task(self, task):
+        """(Re)indexes a top-level task and its subtasks. Unchanged trees are skipped."""
+        root_id = task.get('id')
+        if not root_id: return
+        nodes = []; stack = [task]
+        while stack:
+            node = stack.pop()
+            if node.get('id'): nodes.append((node['id'], tuple(tags_of(node))))
+            stack.extend(subtask for subtask in node.get('subtasks') or [] if isinstance(subtask, Mapping))
+        signature = tuple(nodes)
+        if self._root_sigs.get(root_id) == signature: self._root_tasks[root_id] = task; return
+        self._remove_root(root_id)
+        for node_id, tags in nodes: self._add_node(node_id, root_id, tags)
+        self._root_nodes[root_id] = [node_id for node_id, _ in nodes]
+        self._root_sigs[root_id] = signature; self._root_tasks[root_id] = task
+
+    def index_node(self, node):
+        """Re-indexes the tree an indexed task or subtask belongs to; False for nodes the index has never seen."""
+        root_id = self._node_root.get(node.get('id'))
+        if root_id is None or root_id not in self._root_tasks: return False
+        self.index_task(self._root_tasks[root_id])
+        return True
+
+    def sync_tasks(self, tasks):
+        """Brings the index in line with tasks, touching only trees that changed or disappeared."""
+        live_ids = set()
+        for task in tasks:
+            if isinstance(task, Mapping) and task.get('id'): live_ids.add(task['id']); self.index_task(task)
+        for root_id in [r for r in self._root_nodes if r not in live_ids]: self._remove_root(root_id)
+
+    # --- Queries ---
+    def tags(self):
+        """Every tag in use, sorted."""
+        return list(self._vocab)
+
+    def count(self, tag):
+        return len(self._postings.get(tag, ()))
+
+    def complete(self, prefix, limit=COMPLETE_LIMIT):
+        """Tags starting with prefix, most used first."""
+        prefix = normalize_tag(prefix)
+        lo = bisect.bisect_left(self._vocab, prefix); hi = bisect.bisect_left(self._vocab, prefix + '\uffff')
+        return sorted(self._vocab[lo:hi], key=lambda tag: (-len(self._postings[tag]), tag))[:limit]
+
+    def _prefix_ids(self, prefix):
+        lo = bisect.bisect_left(self._vocab, prefix); hi = bisect.bisect_left(self._vocab, prefix + '\uffff')
+        ids = set()
+        for tag in self._vocab[lo:hi]: ids |= self._postings[tag]
+        return ids
+
+    def _evaluate(self, tree):
+        kind = tree[0]
+        if kind == 'tag': return set(self._postings.get(tree[1], ()))
+        if kind == 'prefix': return self._prefix_ids(tree[1])
+        if kind == 'not': return set(self._node_tags) - self._evaluate(tree[1])
+        if kind == 'or':
+            ids = set()
+            for term in tree[1]: ids |= self._evaluate(term)
+            return ids
+        if kind == 'and':
+            # Intersect the positive terms, smallest first, then subtract the negated ones
+            positive = sorted((self._evaluate(term) for term in tree[1] if term[0] != 'not'), key=len)
+            ids = positive[0] if positive else set(self._node_tags)
+            for other in positive[1:]: ids &= other
+            for term in tree[1]:
+                if term[0] == 'not' and ids: ids -= self._evaluate(term[1])
+            return ids
+        return set(self._node_tags)
+
+    def query(self, query):
+        """Ids of the tasks and subtasks matching a tag query. Raises ValueError on bad syntax."""
+        return self._evaluate(parse_query(query))
+
+    def query_tasks(self, query):
+        """Top-level tasks whose own tags match the query."""
+        return [self._root_tasks[node_id] for node_id in self.query(query) if node_id in self._root_tasks]
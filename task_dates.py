@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+Canonical task date fields, with parse and display caches.
+
+Schema version 3 stores:
+
+    due_date    'YYYY-MM-DD'
+    localTime   ISO 8601 Philippines time with its offset, 'YYYY-MM-DDTHH:MM:SS+08:00'
+    createdAt   ISO 8601 local time, as written by datetime.isoformat()
+
+Older files stored due_date as '%d-%B-%Y' ('05-March-2026') and localTime as
+'%Y-%m-%d %H:%M:%S %Z'. Everything here still reads those, and the v3
+migration in task_store rewrites them through canonicalize(). Month names
+are looked up in a fixed English table rather than with strptime's %B,
+which depends on the locale.
+
+Hot paths use due_ordinal() (date.toordinal(), memoized per string), so
+sorting and bucketing by due date compare integers. Display strings are
+memoized too, so rows re-rendered every frame do no date formatting.
+"""
+
+from functools import lru_cache
+from datetime import date, datetime, timedelta, timezone
+
+PH_OFFSET = timezone(timedelta(hours=8))  # Asia/Manila, which has no daylight saving time
+MONTH_NAMES = ('January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October', 'November', 'December')
+_MONTH_NUMBERS = {name.lower(): number for number, name in enumerate(MONTH_NAMES, 1)}
+_CACHE_SIZE = 1 << 16
+
+
+# --- Due dates ---
+@lru_cache(maxsize=_CACHE_SIZE)
+def parse_due(value):
+    """The due date as a date, from 'YYYY-MM-DD' or the legacy 'DD-Month-YYYY'; None if it is neither."""
+    if not isinstance(value, str): return None
+    text = value.strip()
+    try: return date.fromisoformat(text)
+    except ValueError: pass
+    parts = text.split('-')
+    if len(parts) != 3: return None
+    month = _MONTH_NUMBERS.get(parts[1].lower())
+    try: return date(int(parts[2]), month, int(parts[0])) if month else None
+    except ValueError: return None
+
+
+def due_ordinal(value):
+    """date.toordinal() of a due date string, or None; for comparisons and buckets."""
+    day = parse_due(value)
+    return day.toordinal() if day is not None else None
+
+
+def due_string(day):
+    """Stored form of a due date."""
+    return day.isoformat()
+
+
+def canonical_due(value):
+    """value in stored form; unparseable strings are kept as they are rather than dropped."""
+    day = parse_due(value)
+    return day.isoformat() if day is not None else value
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def format_due(value):
+    """Display form of a due date ('05-March-2026', as the app always showed it)."""
+    day = parse_due(value)
+    return f"{day.day:02d}-{MONTH_NAMES[day.month - 1]}-{day.year}" if day is not None else str(value)
+
+
+# --- localTime / createdAt ---
+def local_time_now(tz=PH_OFFSET):
+    """Stored form of the current time for localTime."""
+    return datetime.now(tz).isoformat(timespec='seconds')
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def parse_local_time(value):
+    """localTime as an aware datetime, from ISO 8601 or the legacy '%Y-%m-%d %H:%M:%S %Z'; None if neither."""
+    if not isinstance(value, str): return None
+    try: parsed = datetime.fromisoformat(value.strip())
+    except ValueError:
+        parts = value.split(' ')
+        try: parsed = datetime.fromisoformat(f"{parts[0]}T{parts[1]}")
+        except (IndexError, ValueError): return None
+    return parsed if parsed.tzinfo is not None else parsed.replace(tzinfo=PH_OFFSET)
+
+
+def canonical_local_time(value):
+    parsed = parse_local_time(value)
+    return parsed.isoformat(timespec='seconds') if parsed is not None else value
+
+
+def canonical_created(value):
+    """createdAt in isoformat(); legacy localTime-style strings are converted, anything else kept."""
+    if not isinstance(value, str): return value
+    try: datetime.fromisoformat(value); return value
+    except ValueError:
+        parsed = parse_local_time(value)
+        return parsed.replace(tzinfo=None).isoformat() if parsed is not None else value
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def format_created(value):
+    """'YYYY-MM-DD HH:MM' for the task rows; value itself if it cannot be read."""
+    parsed = parse_local_time(value)
+    return parsed.strftime('%Y-%m-%d %H:%M') if parsed is not None else str(value)
+
+
+def canonicalize(node):
+    """Rewrites a task's or subtask's date fields in stored form. Returns True if anything changed."""
+    changed = False
+    for key, convert in (('due_date', canonical_due), ('localTime', canonical_local_time), ('createdAt', canonical_created)):
+        value = node.get(key)
+        if value is None: continue
+        new_value = convert(value)
+        if new_value != value: node[key] = new_value; changed = True
+    return changed
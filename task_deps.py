@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+Blocked-by links between top-level tasks, and the "ready to work" set.
+
+A task lists the ids of the tasks it waits for in `blocked_by`. The graph
+keeps both directions as adjacency sets (blocker -> dependents and
+dependent -> blockers) and, for every task, how many of its blockers are
+still open. A task is ready when it is not completed and that count is
+zero; completing or reopening a task only adjusts the counts of its direct
+dependents, so the ready set changes in O(affected) rather than by walking
+the graph.
+
+Cycles are refused when an edge is inserted. The graph maintains a
+topological order of the tasks (Pearce and Kelly's dynamic algorithm): an
+edge that agrees with the order costs O(1), otherwise only the tasks
+between the two positions are searched and re-ordered, and reaching the
+blocker from the dependent is a cycle.
+
+Blockers that are not in the graph (deleted or archived tasks, or tasks
+not added yet) do not count. Such links are remembered by blocker id and
+connected when a task with that id is added, so the order in which an
+import marks its tasks does not matter.
+"""
+
+import logging
+from collections.abc import Mapping
+
+
+class CycleError(ValueError):
+    """Adding the link would make a task (indirectly) wait for itself."""
+
+
+def blockers_of(task):
+    blocked_by = task.get('blocked_by') if isinstance(task, Mapping) else None
+    return blocked_by if isinstance(blocked_by, list) else []
+
+
+def normalize_blocked_by(task_id, blocked_by):
+    """Unique string ids other than task_id, in their original order."""
+    ids = []
+    for blocker_id in blocked_by or ():
+        if isinstance(blocker_id, str) and blocker_id and blocker_id != task_id and blocker_id not in ids: ids.append(blocker_id)
+    return ids
+
+
+class DependencyGraph:
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self._tasks = {}        # id -> top-level task
+        self._blockers = {}     # id -> {ids it waits for}
+        self._dependents = {}   # id -> {ids waiting for it}
+        self._open = {}         # id -> number of its blockers that are not completed
+        self._completed = set()
+        self._ready = {}        # ids of open, unblocked tasks, in the order they became ready
+        self._order = {}        # id -> position in a topological order (blockers first)
+        self._pending = {}      # blocker id not in the graph -> {ids of the tasks naming it}
+        self._unknown = {}      # id -> {blocker ids it names that are not in the graph}
+        self._next_order = 0
+
+    def __len__(self):
+        return len(self._tasks)
+
+    # --- Nodes ---
+    def _add_node(self, task, changed=None):
+        """Adds a task and connects the links already waiting for it."""
+        changed = set() if changed is None else changed
+        task_id = task['id']; self._tasks[task_id] = task
+        self._blockers[task_id] = set(); self._dependents.setdefault(task_id, set()); self._open[task_id] = 0
+        self._order[task_id] = self._next_order; self._next_order += 1
+        if task.get('completed'): self._completed.add(task_id)
+        else: self._ready[task_id] = None
+        for dependent_id in self._pending.pop(task_id, ()):
+            self._unknown.get(dependent_id, set()).discard(task_id)
+            try: self.add_edge(task_id, dependent_id, changed)
+            except CycleError as e: logging.warning(f"Ignoring blocked-by link of '{self._title(dependent_id)}': {e}")
+        return changed
+
+    def _set_unknown(self, task_id, blocker_ids):
+        """Records the blockers task_id names that are not in the graph yet."""
+        old = self._unknown.get(task_id, set())
+        for blocker_id in old - blocker_ids:
+            waiting = self._pending.get(blocker_id)
+            if waiting is not None:
+                waiting.discard(task_id)
+                if not waiting: del self._pending[blocker_id]
+        for blocker_id in blocker_ids - old: self._pending.setdefault(blocker_id, set()).add(task_id)
+        if blocker_ids: self._unknown[task_id] = set(blocker_ids)
+        else: self._unknown.pop(task_id, None)
+
+    def _refresh_ready(self, task_id, changed):
+        ready = task_id not in self._completed and self._open[task_id] == 0
+        if ready == (task_id in self._ready): return
+        if ready: self._ready[task_id] = None
+        else: del self._ready[task_id]
+        changed.add(task_id)
+
+    def _set_completed(self, task_id, completed, changed):
+        if completed == (task_id in self._completed): return
+        if completed: self._completed.add(task_id)
+        else: self._completed.discard(task_id)
+        self._refresh_ready(task_id, changed)
+        for dependent_id in self._dependents.get(task_id, ()):
+            self._open[dependent_id] += 1 if not completed else -1
+            self._refresh_ready(dependent_id, changed)
+
+    # --- Edges ---
+    def _reorder(self, blocker_id, dependent_id):
+        """Pearce-Kelly: restores the topological order for a new edge, or raises CycleError."""
+        lower, upper = self._order[dependent_id], self._order[blocker_id]
+        if upper < lower: return
+        forward = []; stack = [dependent_id]; seen = {dependent_id}
+        while stack:
+            node = stack.pop(); forward.append(node)
+            for successor in self._dependents.get(node, ()):
+                if successor == blocker_id: raise CycleError(f"'{self._title(blocker_id)}' already waits for '{self._title(dependent_id)}'")
+                if successor not in seen and self._order[successor] < upper: seen.add(successor); stack.append(successor)
+        backward = []; stack = [blocker_id]; seen = {blocker_id}
+        while stack:
+            node = stack.pop(); backward.append(node)
+            for predecessor in self._blockers.get(node, ()):
+                if predecessor not in seen and self._order[predecessor] > lower: seen.add(predecessor); stack.append(predecessor)
+        # The blocker side moves before the dependent side, each keeping its relative order, within the same positions
+        nodes = sorted(backward, key=self._order.get) + sorted(forward, key=self._order.get)
+        for node, position in zip(nodes, sorted(self._order[node] for node in nodes)): self._order[node] = position
+
+    def _title(self, task_id):
+        task = self._tasks.get(task_id)
+        return task.get('task', task_id) if task is not None else task_id
+
+    def add_edge(self, blocker_id, dependent_id, changed=None):
+        """Makes dependent_id wait for blocker_id. Raises CycleError (and changes nothing) if that closes a cycle."""
+        changed = set() if changed is None else changed
+        if blocker_id not in self._tasks or dependent_id not in self._tasks or blocker_id in self._blockers[dependent_id]: return changed
+        if blocker_id == dependent_id: raise CycleError("A task cannot wait for itself")
+        self._reorder(blocker_id, dependent_id)
+        self._blockers[dependent_id].add(blocker_id); self._dependents[blocker_id].add(dependent_id)
+        if blocker_id not in self._completed: self._open[dependent_id] += 1; self._refresh_ready(dependent_id, changed)
+        return changed
+
+    def remove_edge(self, blocker_id, dependent_id, changed=None):
+        changed = set() if changed is None else changed
+        if blocker_id not in self._blockers.get(dependent_id, ()): return changed
+        self._blockers[dependent_id].discard(blocker_id); self._dependents[blocker_id].discard(dependent_id)
+        if blocker_id not in self._completed: self._open[dependent_id] -= 1; self._refresh_ready(dependent_id, changed)
+        return changed
+
+    def would_cycle(self, blocker_id, dependent_id):
+        """True if dependent_id waiting for blocker_id would close a cycle; no change is made."""
+        if blocker_id == dependent_id: return True
+        if blocker_id not in self._order or dependent_id not in self._order: return False
+        if self._order[blocker_id] < self._order[dependent_id]: return False  # agrees with the topological order
+        upper = self._order[blocker_id]; stack = [dependent_id]; seen = {dependent_id}
+        while stack:
+            for successor in self._dependents.get(stack.pop(), ()):
+                if successor == blocker_id: return True
+                if successor not in seen and self._order[successor] < upper: seen.add(successor); stack.append(successor)
+        return False
+
+    # --- Maintenance ---
+    def update_task(self, task):
+        """
+        Applies one top-level task's blocked_by and completed state (adding
+        tasks it has not seen). Returns the ids whose readiness changed: the
+        task and its direct dependents.
+        """
+        task_id = task.get('id'); changed = set()
+        if not task_id: return changed
+        if task_id not in self._tasks: self._add_node(task, changed); changed.add(task_id)
+        self._tasks[task_id] = task
+        named = {blocker_id for blocker_id in blockers_of(task) if blocker_id != task_id}
+        wanted = {blocker_id for blocker_id in named if blocker_id in self._tasks}
+        self._set_unknown(task_id, named - wanted)
+        current = self._blockers[task_id]
+        for blocker_id in current - wanted: self.remove_edge(blocker_id, task_id, changed)
+        for blocker_id in wanted - current:
+            try: self.add_edge(blocker_id, task_id, changed)
+            except CycleError as e: logging.warning(f"Ignoring blocked-by link of '{task.get('task', task_id)}': {e}")
+        self._set_completed(task_id, bool(task.get('completed')), changed)
+        return changed
+
+    def sync_tasks(self, tasks):
+        """Rebuilds the graph from the task list (after deletes, imports, restores)."""
+        self.clear()
+        for task in tasks:
+            if isinstance(task, Mapping) and task.get('id') and task['id'] not in self._tasks: self._add_node(task)
+        for task in self._tasks.values():
+            self._set_unknown(task['id'], {blocker_id for blocker_id in blockers_of(task) if blocker_id not in self._tasks})
+            for blocker_id in blockers_of(task):
+                if blocker_id == task['id'] or blocker_id not in self._tasks: continue
+                try: self.add_edge(blocker_id, task['id'])
+                except CycleError as e: logging.warning(f"Ignoring blocked-by link of '{task.get('task', task['id'])}': {e}")
+
+    # --- Queries ---
+    def is_ready(self, task_id):
+        return task_id in self._ready
+
+    def ready(self):
+        """Ready tasks, longest ready first."""
+        return [self._tasks[task_id] for task_id in self._ready]
+
+    def open_blockers(self, task_id):
+        """Number of the task's blockers that are not completed."""
+        return self._open.get(task_id, 0)
+
+    def blockers(self, task_id):
+        return [self._tasks[blocker_id] for blocker_id in self._blockers.get(task_id, ())]
+
+    def dependents(self, task_id):
+        return [self._tasks[dependent_id] for dependent_id in self._dependents.get(task_id, ())]
+
+    def task(self, task_id):
+        return self._tasks.get(task_id)
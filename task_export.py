@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming task exporters: JSON, NDJSON, CSV and iCalendar.
+
+The exporters read the tasks' encoded JSON images (task_fragments
+encode_task), which the worker thread an export runs on (see
+export_tasks_gui) encodes one task at a time from a snapshot of the task
+list, so neither the encoding nor the whole set of images is held up front
+on the UI thread. JSON and NDJSON copy the images as they are; CSV and iCalendar decode one top-level task at a time. The
+result is written through a temp file, and progress(done, total) is
+reported after every task.
+
+    json    a tasks.json document ({"schema_version", "tasks": [...]})
+    ndjson  one top-level task (with its subtasks) per line
+    csv     one row per task and subtask, with tracked time and alarms
+    ics     a VEVENT per due date and per enabled alarm
+
+iCalendar exports keep an event cache (broadcasts/ics_cache.json, keyed by
+export path and event UID). Re-exporting only renders the events whose
+source fields changed; unchanged events are copied as they were, so
+calendar clients see the same DTSTAMP and SEQUENCE and do not re-sync them.
+"""
+
+import os
+import csv
+import time
+import hashlib
+import logging
+from datetime import datetime, timezone
+
+import json_codec
+import task_store
+import task_dates
+import tag_index
+import task_deps
+import next_up
+import task_fragments
+
+FORMATS = ('json', 'ndjson', 'csv', 'ics')
+EXTENSIONS = {'json': '.json', 'ndjson': '.ndjson', 'csv': '.csv', 'ics': '.ics'}
+ICS_CACHE_FILE = os.path.join('broadcasts', 'ics_cache.json')
+CSV_FIELDS = ['id', 'parent_id', 'level', 'title', 'completed', 'due_date', 'createdAt', 'completedAt',
+              'tracked_seconds', 'timer_running', 'alarms', 'annotations', 'tags', 'blocked_by', 'priority']
+
+
+def _walk(task, parent_id=None, level=0):
+    """(node, parent id, level) for a task and its subtasks, depth first."""
+    yield task, parent_id, level
+    for subtask in task.get('subtasks') or []:
+        if hasattr(subtask, 'get'): yield from _walk(subtask, task.get('id'), level + 1)
+
+
+def tracked_seconds(node, now=None):
+    """Timer total including the running interval."""
+    seconds = node.get('timer') if isinstance(node.get('timer'), (int, float)) else 0
+    start = node.get('start_time_unix')
+    if node.get('timer_running') and isinstance(start, (int, float)): seconds += max(0, (now or time.time()) - start)
+    return seconds
+
+
+# --- JSON / NDJSON ---
+def _write_json(f, fragments, pretty):
+    """Same layout as task_fragments.write_document, written one task at a time."""
+    pad = ' ' * task_fragments.DOCUMENT_INDENT
+    if pretty: f.write('{\n' + pad + f'"schema_version": {task_store.SCHEMA_VERSION},\n' + pad + '"tasks": [')
+    else: f.write(f'{{"schema_version":{task_store.SCHEMA_VERSION},"tasks":[')
+    first = True
+    for fragment in fragments:
+        if not first: f.write(',')
+        if pretty: f.write('\n' + pad * 2)
+        f.write(fragment); first = False
+        yield
+    f.write((('\n' + pad) if not first else '') + ']\n}' if pretty else ']}')
+
+
+def _write_ndjson(f, fragments):
+    for fragment in fragments:
+        f.write(fragment); f.write('\n')
+        yield
+
+
+# --- CSV ---
+def _alarm_times(node):
+    times = []
+    for alarm in node.get('alarms') or []:
+        if not isinstance(alarm, dict): continue
+        target = alarm.get('target_timestamp_unix')
+        if alarm.get('enabled') and isinstance(target, (int, float)): times.append(datetime.fromtimestamp(target).isoformat(timespec='minutes'))
+    return ';'.join(times)
+
+
+def _write_csv(f, task_data):
+    writer = csv.DictWriter(f, fieldnames=CSV_FIELDS); writer.writeheader(); now = time.time()
+    for data in task_data:
+        for node, parent_id, level in _walk(data):
+            writer.writerow({'id': node.get('id'), 'parent_id': parent_id or '', 'level': level, 'title': node.get('task', ''),
+                             'completed': bool(node.get('completed')), 'due_date': node.get('due_date') or '',
+                             'createdAt': node.get('createdAt') or '', 'completedAt': node.get('completedAt') or '',
+                             'tracked_seconds': round(tracked_seconds(node, now), 1), 'timer_running': bool(node.get('timer_running')),
+                             'alarms': _alarm_times(node), 'annotations': len(node.get('annotations') or []),
+                             'tags': ' '.join(tag_index.tags_of(node)), 'blocked_by': ' '.join(task_deps.blockers_of(node)),
+                             'priority': next_up.priority_of(node)})
+        yield
+
+
+# --- iCalendar ---
+def _ics_escape(text):
+    return str(text).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n')
+
+
+def _ics_fold(line):
+    """Folds a content line at 75 octets (RFC 5545 3.1)."""
+    data = line.encode('utf-8')
+    if len(data) <= 75: return line + '\r\n'
+    parts = []; start = 0; limit = 75
+    while start < len(data):
+        end = min(start + limit, len(data))
+        while end < len(data) and (data[end] & 0xC0) == 0x80: end -= 1  # do not split a UTF-8 sequence
+        parts.append(data[start:end].decode('utf-8')); start = end; limit = 74
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def _ics_events(node):
+    """(uid, properties) of the events for one task or subtask: its due date and its enabled alarms."""
+    title = node.get('task', ''); day = task_dates.parse_due(node.get('due_date'))
+    if day is not None:
+        categories = ','.join(_ics_escape(category) for category in ['Completed' if node.get('completed') else 'Due'] + tag_index.tags_of(node))
+        props = [f"DTSTART;VALUE=DATE:{day.strftime('%Y%m%d')}", f"SUMMARY:{_ics_escape(title)}",
+                 'TRANSP:TRANSPARENT', f"CATEGORIES:{categories}"]
+        yield f"{node.get('id')}-due@toodone", props
+    for alarm in node.get('alarms') or []:
+        if not hasattr(alarm, 'get'): continue
+        target = alarm.get('target_timestamp_unix')
+        if not (alarm.get('enabled') and isinstance(target, (int, float))): continue
+        start = datetime.fromtimestamp(target, timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        props = [f"DTSTART:{start}", f"SUMMARY:{_ics_escape('Alarm: ' + str(title))}",
+                 'BEGIN:VALARM', 'ACTION:DISPLAY', f"DESCRIPTION:{_ics_escape(title)}", 'TRIGGER:PT0S', 'END:VALARM']
+        yield f"{alarm.get('id')}-alarm@toodone", props
+
+
+def load_ics_cache(path, cache_file=ICS_CACHE_FILE):
+    if not os.path.exists(cache_file): return {}
+    try: return json_codec.load_file(cache_file).get(os.path.abspath(path), {})
+    except (OSError, ValueError) as e: logging.warning(f"Ignoring unreadable {cache_file}: {e}"); return {}
+
+
+def save_ics_cache(path, events, cache_file=ICS_CACHE_FILE):
+    caches = {}
+    if os.path.exists(cache_file):
+        try: caches = json_codec.load_file(cache_file)
+        except (OSError, ValueError): caches = {}
+    caches[os.path.abspath(path)] = events
+    json_codec.write_file(cache_file, caches)
+
+
+def _write_ics(f, task_data, cache, stats):
+    """cache maps uid -> [fingerprint, sequence, rendered VEVENT]; it is replaced by the events written."""
+    previous = dict(cache); cache.clear()
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    f.write('BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//TooDone//Tasks//EN\r\nCALSCALE:GREGORIAN\r\nX-WR-CALNAME:TooDone\r\n')
+    for data in task_data:
+        for node, _, _ in _walk(data):
+            for uid, props in _ics_events(node):
+                fingerprint = hashlib.sha1('\n'.join(props).encode('utf-8')).hexdigest()
+                old = previous.get(uid)
+                if old is not None and old[0] == fingerprint: entry = old; stats['reused'] += 1
+                else:
+                    sequence = old[1] + 1 if old is not None else 0
+                    lines = ['BEGIN:VEVENT', f"UID:{uid}", f"DTSTAMP:{stamp}", f"SEQUENCE:{sequence}"] + props + ['END:VEVENT']
+                    entry = [fingerprint, sequence, ''.join(_ics_fold(line) for line in lines)]; stats['rendered'] += 1
+                cache[uid] = entry; f.write(entry[2])
+        yield
+    f.write('END:VCALENDAR\r\n')
+
+
+def image_is_pretty(fmt, pretty):
+    """Whether export_tasks wants pretty-printed images for fmt; only pretty JSON exports do."""
+    return pretty and fmt == 'json'
+
+
+def export_tasks(fragments, path, fmt, pretty=False, progress=None, cancelled=None, cache_file=ICS_CACHE_FILE, total=None):
+    """
+    Writes tasks to path in fmt from their encoded images
+    (task_fragments.encode_task, pretty-printed as image_is_pretty says).
+    fragments may be a generator encoding them as they are written; total
+    is then its length, for progress. Returns stats with the number of tasks
+    written, and for ics the events rendered and reused.
+    """
+    if fmt not in FORMATS: raise ValueError(f"Unknown export format {fmt!r}")
+    if total is None: total = len(fragments)
+    stats = {'tasks': 0, 'rendered': 0, 'reused': 0}
+    task_data = iter(fragments) if fmt in ('json', 'ndjson') else (json_codec.loads(fragment) for fragment in fragments)
+    temp_file = path + '.tmp'; cache = load_ics_cache(path, cache_file) if fmt == 'ics' else None
+    try:
+        with open(temp_file, 'w', encoding='utf-8', newline='' if fmt in ('csv', 'ics') else None) as f:
+            if fmt == 'json': steps = _write_json(f, task_data, pretty)
+            elif fmt == 'ndjson': steps = _write_ndjson(f, task_data)
+            elif fmt == 'csv': steps = _write_csv(f, task_data)
+            else: steps = _write_ics(f, task_data, cache, stats)
+            for _ in steps:
+                stats['tasks'] += 1
+                if cancelled is not None and cancelled(): raise InterruptedError('Export cancelled')
+                if progress is not None: progress(stats['tasks'], total)
+        os.replace(temp_file, path)
+    finally:
+        if os.path.exists(temp_file): os.remove(temp_file)
+    if cache is not None: save_ics_cache(path, cache, cache_file)
+    return stats
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Per-task cache of encoded JSON fragments, so a save only re-encodes the
+top-level tasks that changed since the previous one.
+
+mark_tasks_changed(task) reports the task or subtask that changed; the
+DirtyTracker maps it to its top-level task. Saving then streams the cached
+fragment of every clean task and encodes only the dirty ones. A change
+reported without a task (None) dirties everything. begin_save() drops the
+dirty tasks' fragments of every kind, so other kinds (the snapshot
+summaries) can be taken between saves too.
+
+Fragments are encoded with json_codec. Pretty-printing (PRETTY_JSON in
+.env) lays the document out like json.dump(document, indent=2); compact
+output has no whitespace at all.
+"""
+
+import json_codec
+
+DOCUMENT_INDENT = json_codec.INDENT
+
+
+class DirtyTracker:
+    """Which top-level tasks changed since the last clear(), from task/subtask change notifications."""
+    def __init__(self):
+        self._node_root = {}    # task/subtask id -> top-level task id
+        self._dirty = set()
+        self._unresolved = []   # changed nodes not indexed yet (new tasks/subtasks)
+        self.all_dirty = True   # nothing has been saved yet
+
+    def index(self, task):
+        root_id = task.get('id'); stack = [task]
+        while stack:
+            node = stack.pop()
+            if node.get('id'): self._node_root[node['id']] = root_id
+            stack.extend(subtask for subtask in node.get('subtasks') or [] if hasattr(subtask, 'get'))
+
+    def mark(self, node=None):
+        if node is None or not node.get('id'): self.all_dirty = True; return
+        root_id = self._node_root.get(node['id'])
+        if root_id is None: self._unresolved.append(node)
+        else: self._dirty.add(root_id)
+
+    def resolve(self, tasks):
+        """Indexes tasks if needed and returns the set of dirty top-level ids (None when everything is dirty)."""
+        if self._unresolved:
+            for task in tasks: self.index(task)
+            self._dirty.update(self._node_root[node['id']] for node in self._unresolved if node['id'] in self._node_root)
+            self._unresolved = []
+        return None if self.all_dirty else self._dirty
+
+    def clear(self, tasks=()):
+        """Marks everything clean after tasks were written; the dirty ones are re-indexed so later changes resolve."""
+        for task in tasks:
+            if self.all_dirty or task.get('id') in self._dirty: self.index(task)
+        self._dirty = set(); self._unresolved = []; self.all_dirty = False
+
+
+class FragmentCache:
+    def __init__(self):
+        self.tracker = DirtyTracker()
+        self._fragments = {}    # kind -> {top-level id: encoded str}
+        self.encoded = 0        # fragments encoded during the current save
+
+    def mark(self, node=None):
+        """Listener for mark_tasks_changed."""
+        self.tracker.mark(node)
+
+    def begin_save(self, tasks):
+        """Drops the fragments (of every kind) of dirty and deleted tasks."""
+        dirty = self.tracker.resolve(tasks)
+        if dirty is None: self._fragments = {}
+        else:
+            live_ids = {task.get('id') for task in tasks}
+            for fragments in self._fragments.values():
+                for task_id in [t for t in fragments if t not in live_ids or t in dirty]: del fragments[task_id]
+        self.encoded = 0
+
+    def fragment(self, task, kind, encode):
+        """Cached encode(task) for kind; tasks dirtied since they were cached are encoded again."""
+        fragments = self._fragments.setdefault(kind, {}); task_id = task.get('id')
+        cached = fragments.get(task_id)
+        if cached is not None: return cached
+        encoded = fragments[task_id] = encode(task); self.encoded += 1
+        return encoded
+
+    def end_save(self, tasks):
+        self.tracker.clear(tasks)
+
+
+def encode_task(task_data, pretty):
+    """Fragment for one task in the tasks list of a document."""
+    if not pretty: return json_codec.dumps(task_data)
+    return json_codec.dumps(task_data, pretty=True).replace('\n', '\n' + ' ' * (2 * DOCUMENT_INDENT))
+
+
+def write_document(f, meta, task_fragments, pretty):
+    """Writes {**meta, "tasks": [...]} to f, streaming the already encoded task fragments."""
+    if not pretty:
+        f.write('{')
+        for key, value in meta.items(): f.write(json_codec.dumps(key) + ':' + json_codec.dumps(value) + ',')
+        f.write('"tasks":['); f.write(','.join(task_fragments)); f.write(']}'); return
+    pad = ' ' * DOCUMENT_INDENT
+    f.write('{\n')
+    for key, value in meta.items():
+        f.write(pad + json_codec.dumps(key) + ': ' + json_codec.dumps(value, pretty=True).replace('\n', '\n' + pad) + ',\n')
+    body = (',\n' + pad * 2).join(task_fragments)
+    f.write(pad + '"tasks": [')
+    if body: f.write('\n' + pad * 2); f.write(body); f.write('\n' + pad)
+    f.write(']\n}')
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Merge-aware task import.
+
+iter_records yields the tasks of a file one at a time. Accepted shapes are a
+JSON array of tasks, a tasks.json document ({"tasks": [...], ...}), or
+NDJSON (.ndjson/.jsonl, one task per line). NDJSON is read a line at a
+time; JSON files are decoded whole with json_codec (orjson when installed),
+which is faster than decoding element by element, and each element is
+released once it has been handed out.
+
+import_tasks normalizes every record (task_store.normalize_task), drops the
+ones already present (a known task id, or the same content_key as an
+existing or earlier imported task), gives subtasks whose ids are already
+taken fresh ones (the indexes are keyed by node id) and turns the rest into compact
+task_model records right away, so the decoded dicts of the file do not
+pile up next to the records. It runs off the UI thread; the caller appends
+the returned records in one batch and reports one change.
+"""
+
+import os
+import hashlib
+import logging
+
+import json_codec
+import task_model
+import task_store
+
+NDJSON_EXTENSIONS = ('.ndjson', '.jsonl')
+
+
+class ImportCancelled(Exception):
+    pass
+
+
+def iter_records(path, meta=None):
+    """
+    Yields (record, bytes read so far, total bytes) for every task in the
+    file at path. Top-level fields other than "tasks" of a tasks.json
+    document are put in meta. A malformed NDJSON line is yielded as None;
+    a malformed JSON file raises ValueError.
+    """
+    total = os.path.getsize(path)
+    if path.lower().endswith(NDJSON_EXTENSIONS):
+        bytes_read = 0
+        with open(path, 'rb') as f:
+            for number, line in enumerate(f, 1):
+                bytes_read += len(line)
+                if not line.strip(): continue
+                try: record = json_codec.loads(line)
+                except ValueError as e: logging.warning(f"Skipping line {number} of {path}: {e}"); record = None
+                yield record, bytes_read, total
+        return
+    data = json_codec.load_file(path)
+    if isinstance(data, dict):
+        if meta is not None: meta.update((key, value) for key, value in data.items() if key != 'tasks')
+        data = data.get('tasks', [])
+    if not isinstance(data, list): raise ValueError('Imported file must contain a JSON array of tasks or an object with a "tasks" array.')
+    count = len(data) or 1
+    for i in range(len(data)):
+        record = data[i]; data[i] = None  # the list no longer keeps it alive
+        yield record, total * (i + 1) // count, total
+
+
+def content_key(task):
+    """Hash of what makes two tasks the same for import: title, due date and subtasks (ids, timers, timestamps ignored)."""
+    def shape(node):
+        return [str(node.get('task', '')).strip().casefold(), node.get('due_date'), [shape(s) for s in node.get('subtasks') or [] if hasattr(s, 'get')]]
+    return hashlib.sha1(json_codec.dumpb(shape(task))).hexdigest()
+
+
+def tree_ids(tasks):
+    """Ids of every task and subtask in tasks."""
+    ids = set(); stack = list(tasks)
+    while stack:
+        node = stack.pop()
+        if node.get('id'): ids.add(node['id'])
+        stack.extend(child for child in node.get('subtasks') or [] if hasattr(child, 'get'))
+    return ids
+
+
+def _reassign_taken_ids(task, taken):
+    """Gives the subtasks of task whose ids are in taken (or repeat within task) fresh ones and adds all its ids to taken."""
+    taken.add(task['id']); stack = list(task.get('subtasks') or [])
+    while stack:
+        node = stack.pop()
+        if node['id'] in taken: node['id'] = task_store.new_task_id()
+        taken.add(node['id']); stack.extend(node.get('subtasks') or [])
+
+
+def _stop_timers(node):
+    node['timer_running'] = False; node['start_time_unix'] = None
+    for subtask in node.get('subtasks') or []: _stop_timers(subtask)
+
+
+def import_tasks(path, existing_ids, existing_keys, now_iso, local_time_str, progress=None, cancelled=None):
+    """
+    Reads path and returns (new Task records, stats) with stats counting
+    added, duplicates and invalid records. existing_ids (tree_ids of the
+    current tasks) and existing_keys (content_key of every current task) are
+    extended with what is added.
+    progress(bytes read, total bytes) is called after every record;
+    cancelled() returning True stops the import with ImportCancelled.
+    """
+    stats = {'added': 0, 'duplicates': 0, 'invalid': 0}; new_tasks = []; total = 0
+    for position, (record, bytes_read, total) in enumerate(iter_records(path)):
+        if cancelled is not None and cancelled(): raise ImportCancelled()
+        if progress is not None: progress(bytes_read, total)
+        if not isinstance(record, dict): stats['invalid'] += 1; continue
+        if record.get('id') and record['id'] in existing_ids: stats['duplicates'] += 1; continue
+        try: task = task_store.normalize_task(record, position, now_iso, local_time_str)
+        except Exception as e: logging.warning(f"Skipping task {position} of {path}: {e}"); stats['invalid'] += 1; continue
+        key = content_key(task)
+        if key in existing_keys: stats['duplicates'] += 1; continue
+        _stop_timers(task)  # a running timer in another file would count time since it was exported
+        _reassign_taken_ids(task, existing_ids); existing_keys.add(key)
+        new_tasks.append(task_model.Task.from_json(task)); stats['added'] += 1
+    if progress is not None: progress(total, total)
+    return new_tasks, stats
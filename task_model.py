@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+"""
+Compact in-memory model for tasks, subtasks, alarms, annotations and title
+history.
+
+Each record stores its fields in __slots__ instead of a per-instance dict,
+and repeated strings (sound files, icons, due dates, time zones) are
+interned, which roughly halves the memory of a large task list. Records
+behave like the dicts they replace (task['timer'], task.get('icon'),
+setdefault, 'alarms' in task, ...) so the rest of the app is unchanged,
+but keys outside the schema are reported once in the log instead of
+silently returning a default. Unknown keys read from disk are kept in a
+side dict and written back unchanged.
+
+A field that was never set is absent, exactly like a missing dict key, so
+from_json/to_json round-trip the tasks.json layout.
+
+The heavy fields of a task (LAZY_FIELDS: annotations, title history) are
+not converted when the task is: from_json keeps the decoded lists as they
+are and turns them into records the first time one of those fields is
+touched, and to_json copies lists that were never touched straight back.
+Tasks loaded from a snapshot (task_snapshot.py) go one step further and
+leave those fields undecoded: the record keeps a reference to the bytes
+and decodes them on first touch.
+"""
+
+import gc
+import sys
+import logging
+from contextlib import contextmanager
+from collections.abc import MutableMapping
+
+_reported_keys = set()
+_MISSING = object()
+_NO_RAW = {}
+
+LAZY_FIELDS = frozenset(['annotations', 'titleHistory'])
+
+
+def _report_unknown(cls, key):
+    if (cls.__name__, key) not in _reported_keys:
+        _reported_keys.add((cls.__name__, key))
+        logging.warning(f"{cls.__name__} has no field {key!r}; check for a typo (kept as an extra key).")
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+def _dump(value):
+    """JSON-ready copy of a field value: records become dicts, lists are copied."""
+    if isinstance(value, Record): return value.to_json()
+    if type(value) is list: return [_dump(item) for item in value]
+    return value
+
+
+class Record(MutableMapping):
+    """Dict-compatible base for the slotted model classes."""
+    __slots__ = ('_extra',)
+    _fields = frozenset()
+    _interned = frozenset()
+    _children = {}  # field name -> record class of the list items
+    _deferred = frozenset()  # child lists kept as decoded until first touched (Task)
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Slot readers that raise AttributeError for unset fields without going through __getattr__
+        cls._readers = tuple((key, getattr(cls, key).__get__) for key in cls.__dict__.get('_order', ()))
+        if not cls._readers: cls._readers = cls.__base__._readers
+
+    @classmethod
+    def from_json(cls, data):
+        record = cls.__new__(cls)
+        fields = cls._fields; interned = cls._interned; children = cls._children; setattr_ = object.__setattr__
+        deferred = None
+        for key, value in data.items():
+            if key in fields:
+                if key in interned:
+                    if type(value) is str: value = sys.intern(value)
+                elif key in children and type(value) is list:
+                    if value and key in cls._deferred:
+                        if deferred is None: deferred = {}
+                        deferred[key] = value; continue
+                    child = children[key]
+                    value = [child.from_json(item) if type(item) is dict else item for item in value]
+                setattr_(record, key, value)
+            else:
+                try: record._extra[key] = value
+                except AttributeError: record._extra = {key: value}
+        if deferred is not None: setattr_(record, '_raw', deferred)
+        return record
+
+    def to_json(self, skip=frozenset(), lazy_values=None):
+        """
+        tasks.json layout of the record; fields in skip are left out here and in
+        child records. lazy_values supplies the LAZY_FIELDS of a record that has
+        not decoded them.
+        """
+        data = {}
+        for key, read in self._readers:
+            if key in skip: continue
+            if lazy_values is not None and key in LAZY_FIELDS:
+                if key in lazy_values: data[key] = lazy_values[key]
+                continue
+            try: value = read(self)
+            except AttributeError: continue
+            if type(value) is list: value = [item.to_json(skip) if isinstance(item, Record) else _dump(item) for item in value]
+            data[key] = value
+        extra = getattr(self, '_extra', None)
+        if extra: data.update(extra)
+        return data
+
+    def copy(self):
+        """Shallow copy, like dict.copy()."""
+        return self.__class__.from_json(dict(self.items()))
+
+    # --- Mapping protocol ---
+    def __getitem__(self, key):
+        if key in self._fields:
+            try: return getattr(self, key)
+            except AttributeError: raise KeyError(key) from None
+        try: return self._extra[key]
+        except (AttributeError, KeyError): raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        if key in self._fields: return getattr(self, key, default)
+        extra = getattr(self, '_extra', None)
+        if extra is not None and key in extra: return extra[key]
+        _report_unknown(self.__class__, key)
+        return default
+
+    def __contains__(self, key):
+        if key in self._fields: return hasattr(self, key)
+        try: return key in self._extra
+        except AttributeError: return False
+
+    def __setitem__(self, key, value):
+        if key in self._fields:
+            if key in self._interned: value = _intern(value)
+            object.__setattr__(self, key, value); return
+        _report_unknown(self.__class__, key)
+        try: self._extra[key] = value
+        except AttributeError: self._extra = {key: value}
+
+    def __delitem__(self, key):
+        if key in self._fields:
+            try: object.__delattr__(self, key)
+            except AttributeError: raise KeyError(key) from None
+            return
+        try: del self._extra[key]
+        except (AttributeError, KeyError): raise KeyError(key) from None
+
+    def __iter__(self):
+        for key in self.__class__._order:
+            if hasattr(self, key): yield key
+        try: yield from self._extra
+        except AttributeError: pass
+
+    def __len__(self):
+        count = sum(1 for key in self.__class__._order if hasattr(self, key))
+        try: return count + len(self._extra)
+        except AttributeError: return count
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.to_json()!r})"
+
+
+class Annotation(Record):
+    __slots__ = ('text', 'timestamp')
+    _order = __slots__
+    _fields = frozenset(_order)
+
+
+class TitleEntry(Record):
+    __slots__ = ('title', 'timestamp')
+    _order = __slots__
+    _fields = frozenset(_order)
+
+
+class Alarm(Record):
+    __slots__ = ('id', 'target_timestamp_unix', 'sound_file', 'enabled')
+    _order = __slots__
+    _fields = frozenset(_order)
+    _interned = frozenset(['sound_file'])
+
+
+class Task(Record):
+    __slots__ = ('id', 'task', 'timer', 'localTime', 'createdAt', 'timer_running', 'start_time_unix', 'completed',
+                 'completedAt', 'completedAtEstimated', 'todone', 'due_date', 'icon', 'calendar_icon_color', 'tags', 'blocked_by', 'priority', 'alarms', 'annotations', 'titleHistory',
+                 'subtasks', 'subtasks_visible', '_lazy', '_raw')
+    _order = __slots__[:-2]
+    _fields = frozenset(_order)
+    _interned = frozenset(['localTime', 'due_date', 'icon'])
+    _deferred = LAZY_FIELDS
+
+    # --- Lazy heavy fields ---
+    def __getattr__(self, name):
+        # Only reached when a slot is unset: convert or decode pending heavy fields on first use
+        if name in LAZY_FIELDS and (name in self._pending_raw() or self.lazy_source() is not None):
+            self._hydrate()
+            return object.__getattribute__(self, name)
+        raise AttributeError(name)
+
+    def _pending_raw(self):
+        """{field: decoded list} of heavy fields from_json has not converted yet."""
+        try: return object.__getattribute__(self, '_raw')
+        except AttributeError: return _NO_RAW
+
+    def lazy_source(self):
+        """(snapshot, offset, length) of heavy fields that are not decoded yet, or None."""
+        try: return object.__getattribute__(self, '_lazy')
+        except AttributeError: return None
+
+    def set_lazy_source(self, source):
+        """Points the heavy fields at snapshot bytes; decoded values are dropped (they must match those bytes)."""
+        for key in LAZY_FIELDS:
+            try: object.__delattr__(self, key)
+            except AttributeError: pass
+        if self._pending_raw(): object.__delattr__(self, '_raw')
+        object.__setattr__(self, '_lazy', source)
+
+    def _hydrate(self):
+        values = self._pending_raw()
+        if values: object.__delattr__(self, '_raw')
+        else:
+            snapshot, offset, length = self._lazy
+            object.__delattr__(self, '_lazy'); values = snapshot.read(offset, length)
+        for key, value in values.items():
+            child = self._children.get(key)
+            if child is not None and type(value) is list: value = [child.from_json(item) if type(item) is dict else item for item in value]
+            object.__setattr__(self, key, value)
+
+    def __setitem__(self, key, value):
+        if key in LAZY_FIELDS and (self._pending_raw() or self.lazy_source() is not None): self._hydrate()
+        Record.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        if key in LAZY_FIELDS and (self._pending_raw() or self.lazy_source() is not None): self._hydrate()
+        Record.__delitem__(self, key)
+
+    def heavy_json(self):
+        """{field: tasks.json value} of the LAZY_FIELDS that are set, without converting or decoding pending ones."""
+        source = self.lazy_source()
+        if source is not None: return source[0].read(source[1], source[2])
+        values = {}; raw = self._pending_raw()
+        for key in LAZY_FIELDS:
+            if key in raw: values[key] = [dict(item) if type(item) is dict else _dump(item) for item in raw[key]]; continue
+            try: values[key] = _dump(object.__getattribute__(self, key))
+            except AttributeError: pass
+        return values
+
+    def to_json(self, skip=frozenset()):
+        if LAZY_FIELDS <= skip or (self.lazy_source() is None and not self._pending_raw()): return Record.to_json(self, skip)
+        # Dump the pending fields as they are, leaving the record lazy
+        return Record.to_json(self, skip, self.heavy_json())
+
+
+class Subtask(Task):
+    """Same layout as Task (older files carry subtasks_visible on subtasks too)."""
+    __slots__ = ()
+
+
+Task._children = {'alarms': Alarm, 'annotations': Annotation, 'titleHistory': TitleEntry, 'subtasks': Subtask}
+
+
+@contextmanager
+def gc_paused():
+    """
+    Turns the cyclic garbage collector off for a bulk load or dump. Those
+    build hundreds of thousands of acyclic containers, and every collection
+    triggered on the way walks all the tasks already built, which costs more
+    than the work itself on large lists.
+    """
+    enabled = gc.isenabled(); gc.disable()
+    try: yield
+    finally:
+        if enabled: gc.enable()
+
+
+def tasks_from_json(tasks_data):
+    """Converts a decoded task list into Task records; items that are already records are kept."""
+    with gc_paused(): return [Task.from_json(task) if type(task) is dict else task for task in tasks_data]
+
+
+def tasks_to_json(tasks):
+    """Converts Task records (or plain dicts) back into the tasks.json layout."""
+    with gc_paused(): return [task.to_json() if isinstance(task, Record) else task for task in tasks]
+
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+Memory-mapped task snapshot for fast, lazy startup.
+
+tasks.json stays the file of record; the snapshot is a cache of it, written
+when the app is idle or closing (not after every save). Its layout:
+
+    b'TDSNAP01'                 magic
+    header offset, length       two little-endian uint64
+    body                        one JSON object per node with its heavy fields
+    header                      JSON: source stamp, meta, task summaries and
+                                the (offset, length) of every node's body entry
+
+Summaries are the tasks without their LAZY_FIELDS (annotations, title
+history), so startup only decodes what the task list draws. Nodes keep a
+reference to their body entry and decode it on first access (see
+task_model.Task). Heavy fields that were never decoded are copied byte for
+byte into the next snapshot.
+
+The snapshot is only used when its stamp matches the size and mtime of
+tasks.json, so editing tasks.json by hand simply falls back to a full load.
+"""
+
+import os
+import mmap
+import struct
+import logging
+
+import task_model
+import json_codec
+
+SNAPSHOT_FILE = os.path.join('broadcasts', 'tasks.snapshot')
+MAGIC = b'TDSNAP01'
+_OFFSETS = struct.Struct('<QQ')
+BODY_START = len(MAGIC) + _OFFSETS.size
+
+
+def snapshot_enabled():
+    """TASK_SNAPSHOT from .env (on by default)."""
+    return os.getenv('TASK_SNAPSHOT', 'true').strip().lower() not in ('0', 'false', 'no', 'off')
+
+
+def source_stamp(path):
+    """[size, mtime_ns] of the file a snapshot was taken from."""
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _walk(tasks):
+    """Task records depth first; the order body entries are indexed in."""
+    stack = list(reversed(tasks))
+    while stack:
+        node = stack.pop()
+        if not isinstance(node, task_model.Task): continue
+        yield node
+        stack.extend(reversed(node.get('subtasks') or []))
+
+
+class Snapshot:
+    def __init__(self, path=SNAPSHOT_FILE, load_header=True):
+        self.path = path; self._header = {}
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            if self._map[:len(MAGIC)] != MAGIC: raise ValueError(f"{path} is not a task snapshot")
+            header_offset, header_length = _OFFSETS.unpack_from(self._map, len(MAGIC))
+            if load_header: self._header = json_codec.loads(self._map[header_offset:header_offset + header_length])
+        except Exception:
+            self.close(); raise
+        self.source = self._header.get('source')
+        self.schema_version = self._header.get('schema_version')
+        self.meta = self._header.get('meta', {})
+
+    def read(self, offset, length):
+        """Decodes one body entry: {field: value} of a node's heavy fields."""
+        return json_codec.loads(self._map[BODY_START + offset:BODY_START + offset + length])
+
+    def raw(self, offset, length):
+        return self._map[BODY_START + offset:BODY_START + offset + length]
+
+    def tasks(self):
+        """Task records built from the summaries, with their heavy fields left in the snapshot."""
+        tasks = task_model.tasks_from_json(self._header.get('tasks', []))
+        for node, entry in zip(_walk(tasks), self._header.get('heavy', [])):
+            if entry: node.set_lazy_source((self, entry[0], entry[1]))
+        self._header = {}  # summaries are now owned by the records
+        return tasks
+
+    def close(self):
+        if getattr(self, '_map', None) is not None: self._map.close(); self._map = None
+        if self._file is not None: self._file.close(); self._file = None
+
+
+def _heavy_entry(node, out, position):
+    """Writes node's heavy fields to out; returns ([offset, length] or None, new position)."""
+    source = node.lazy_source()
+    if source is not None: data = source[0].raw(source[1], source[2])
+    else:
+        fields = node.heavy_json()
+        if not fields: return None, position
+        data = json_codec.dumpb(fields)
+    out.write(data)
+    return [position, len(data)], position + len(data)
+
+
+def encode_summary(task):
+    return json_codec.dumps(task.to_json(skip=task_model.LAZY_FIELDS))
+
+
+def write_snapshot(tasks, meta, source, schema_version, path=SNAPSHOT_FILE, summary=encode_summary):
+    """
+    Writes the snapshot atomically and re-points the records that still have
+    undecoded fields at the new file. summary(task) returns the encoded
+    summary of a task (the app passes a cached one). Returns the open Snapshot.
+    """
+    tasks = [task if isinstance(task, task_model.Task) else task_model.Task.from_json(task) for task in tasks]
+    temp_file = path + '.tmp'
+    summaries = []; heavy = []; position = 0
+    with open(temp_file, 'wb') as out:
+        out.write(MAGIC); out.write(_OFFSETS.pack(0, 0))
+        for task in tasks:
+            summaries.append(summary(task))
+            for node in _walk([task]):
+                entry, position = _heavy_entry(node, out, position); heavy.append(entry)
+        header = json_codec.dumps({'source': source, 'schema_version': schema_version, 'meta': meta, 'heavy': heavy})
+        header = (header[:-1] + ',"tasks":[' + ','.join(summaries) + ']}').encode('utf-8')
+        out.write(header)
+        out.seek(len(MAGIC)); out.write(_OFFSETS.pack(BODY_START + position, len(header)))
+    pending = [(node, node.lazy_source()) for node in _walk(tasks) if node.lazy_source() is not None]
+    old_snapshots = {source[0] for _, source in pending}
+    try: os.replace(temp_file, path)
+    except PermissionError:
+        # Windows will not replace a mapped file: unmap it, and map it again if the replace still fails
+        for old in old_snapshots: old.close()
+        try: os.replace(temp_file, path)
+        except OSError:
+            reopened = {old.path: Snapshot(old.path, load_header=False) for old in old_snapshots}
+            for node, (old, offset, length) in pending: node.set_lazy_source((reopened[old.path], offset, length))
+            raise
+    snapshot = Snapshot(path, load_header=False)
+    for node, entry in zip(_walk(tasks), heavy):
+        if node.lazy_source() is not None: node.set_lazy_source((snapshot, entry[0], entry[1]))
+    for old in old_snapshots: old.close()
+    return snapshot
+
+
+def load_snapshot(source_path, schema_version, path=SNAPSHOT_FILE):
+    """Returns the Snapshot if it matches source_path and the schema version, else None."""
+    if not os.path.exists(path) or not os.path.exists(source_path): return None
+    try: snapshot = Snapshot(path)
+    except (OSError, ValueError) as e: logging.warning(f"Ignoring unreadable task snapshot {path}: {e}"); return None
+    if snapshot.source != source_stamp(source_path) or snapshot.schema_version != schema_version:
+        snapshot.close(); return None
+    return snapshot
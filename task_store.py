@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+Schema versioning, migrations and normalization for broadcasts/tasks.json.
+
+Files written by the current version carry ``schema_version`` in their meta
+section and are trusted on load: only tasks that are visibly incomplete get
+normalized up front, everything else is validated lazily in the background.
+Older files run through the migration pipeline once and are re-saved at the
+current version.
+"""
+
+import time
+import logging
+from uuid import uuid4
+from collections.abc import Mapping
+
+import task_dates
+import tag_index
+import task_deps
+import next_up
+
+SCHEMA_VERSION = 3
+
+# Keys every top-level task is expected to carry once normalized.
+TASK_KEYS = frozenset([
+    'id', 'task', 'timer_running', 'completed', 'annotations', 'alarms', 'timer',
+    'start_time_unix', 'due_date', 'icon', 'localTime', 'createdAt', 'titleHistory',
+    'subtasks', 'subtasks_visible',
+])
+SUBTASK_KEYS = TASK_KEYS - {'subtasks_visible'}
+
+
+def new_task_id():
+    """Returns a new stable task id."""
+    return uuid4().hex
+
+
+def _apply_defaults(task, now_iso, local_time_str, top_level):
+    task.setdefault('timer_running', False); task.setdefault('completed', False); task.setdefault('annotations', []); task.setdefault('alarms', []); task.setdefault('timer', 0); task.setdefault('start_time_unix', None); task.setdefault('due_date', None); task.setdefault('icon', None); task.setdefault('localTime', local_time_str); task.setdefault('createdAt', now_iso); task.setdefault('titleHistory', []); task.setdefault('subtasks', [])
+    if top_level: task.setdefault('subtasks_visible', True)
+
+
+def _initialize_subtasks(task, now_iso, local_time_str):
+    """Initialize subtasks at every level with default values (a walk with a stack, so deep trees do not recurse)"""
+    stack = [task]
+    while stack:
+        node = stack.pop()
+        if not isinstance(node.get('subtasks'), list):
+            node['subtasks'] = []
+        for subtask in node['subtasks']:
+            _apply_defaults(subtask, now_iso, local_time_str, top_level=False)
+            if 'tags' in subtask: subtask['tags'] = tag_index.normalize_tags(subtask['tags']) if isinstance(subtask['tags'], list) else []
+            stack.append(subtask)
+
+
+def normalize_task(task, position, now_iso, local_time_str):
+    """
+    Fills in defaults, repairs field types, validates alarms and keeps titleHistory
+    consistent for a single top-level task. Mutates and returns the task.
+    """
+    if 'task' not in task or not str(task['task']).strip():
+        if 'titleHistory' in task and task['titleHistory'] and isinstance(task['titleHistory'], list) and task['titleHistory'][-1].get('title'): task['task'] = task['titleHistory'][-1]['title']
+        else: task['task'] = f'Untitled Task {position+1}'; logging.warning(f"Task {position} had missing/empty title, assigned fallback.")
+    _apply_defaults(task, now_iso, local_time_str, top_level=True)
+    _initialize_subtasks(task, now_iso, local_time_str)
+    if not isinstance(task.get('timer'), (int, float)): task['timer'] = 0
+    if not isinstance(task.get('start_time_unix'), (int, float, type(None))): task['start_time_unix'] = None
+    if not isinstance(task.get('annotations'), list): task['annotations'] = []
+    if not isinstance(task.get('alarms'), list): task['alarms'] = []
+    if not isinstance(task.get('due_date'), (str, type(None))): task['due_date'] = None
+    if not isinstance(task.get('icon'), (str, type(None))): task['icon'] = None
+    if not isinstance(task.get('completed'), bool): task['completed'] = False
+    if not isinstance(task.get('titleHistory'), list): task['titleHistory'] = []
+    if 'tags' in task: task['tags'] = tag_index.normalize_tags(task['tags']) if isinstance(task['tags'], list) else []
+    if 'blocked_by' in task: task['blocked_by'] = task_deps.normalize_blocked_by(task.get('id'), task['blocked_by']) if isinstance(task['blocked_by'], list) else []
+    if 'priority' in task:
+        priority = next_up.normalize_priority(task['priority'])
+        if priority is None: del task['priority']
+        else: task['priority'] = priority
+    valid_alarms = []
+    for alarm_index, alarm_entry in enumerate(task['alarms']):
+        if isinstance(alarm_entry, Mapping):
+            alarm_entry.setdefault('target_timestamp_unix', None); alarm_entry.setdefault('sound_file', None); alarm_entry.setdefault('enabled', False); alarm_entry.setdefault('id', f"{position}_{alarm_index}_{time.time()}_{uuid4().hex[:6]}")
+            if alarm_entry.get('target_timestamp_unix') and alarm_entry.get('sound_file'): valid_alarms.append(alarm_entry)
+            else: logging.warning(f"Skipping invalid alarm entry in task {position}: {alarm_entry}")
+    task['alarms'] = valid_alarms
+    if not task['titleHistory'] or task['titleHistory'][-1].get('title') != task['task']: task['titleHistory'].append({'title': task['task'], 'timestamp': task.get('createdAt', now_iso)})
+    for entry in task['titleHistory']: entry.setdefault('timestamp', now_iso)
+    if 'start_time' in task and isinstance(task.get('start_time'), (int, float)):
+        if task['start_time_unix'] is None: task['start_time_unix'] = task['start_time']
+        task.pop('start_time', None)
+    _assign_ids(task)
+    canonicalize_dates(task)
+    return task
+
+
+def _assign_ids(task):
+    stack = [task]
+    while stack:
+        node = stack.pop()
+        if not node.get('id'): node['id'] = new_task_id()
+        stack.extend(node.get('subtasks', []))
+
+
+def canonicalize_dates(task):
+    """Canonical date fields for a task and its subtasks (task_dates); True if anything changed."""
+    changed = task_dates.canonicalize(task)
+    for subtask in task.get('subtasks', []):
+        if isinstance(subtask, Mapping): changed = canonicalize_dates(subtask) or changed
+    return changed
+
+
+def needs_normalization(task, top_level=True):
+    """Cheap check used to decide whether a trusted task must be normalized after all."""
+    if not isinstance(task, Mapping): return True
+    if not (TASK_KEYS if top_level else SUBTASK_KEYS) <= task.keys(): return True
+    if not isinstance(task['timer'], (int, float)) or not isinstance(task['completed'], bool): return True
+    if not isinstance(task['annotations'], list) or not isinstance(task['alarms'], list) or not isinstance(task['titleHistory'], list): return True
+    if not isinstance(task['due_date'], (str, type(None))) or not isinstance(task['icon'], (str, type(None))): return True
+    if not isinstance(task['start_time_unix'], (int, float, type(None))): return True
+    if not isinstance(task['subtasks'], list): return True
+    if 'tags' in task and not isinstance(task['tags'], list): return True
+    if 'blocked_by' in task and not isinstance(task['blocked_by'], list): return True
+    if 'priority' in task and next_up.normalize_priority(task['priority']) != task['priority']: return True
+    for alarm_entry in task['alarms']:
+        if not isinstance(alarm_entry, Mapping) or not alarm_entry.get('id') or not alarm_entry.get('target_timestamp_unix') or not alarm_entry.get('sound_file'): return True
+    return any(needs_normalization(subtask, top_level=False) for subtask in task['subtasks'])
+
+
+# --- Migrations ---
+# Each step upgrades the raw task list by one schema version.
+def _migrate_to_v1(tasks, now_iso, local_time_str):
+    """Legacy files: full per-task normalization."""
+    migrated = []
+    for i, task in enumerate(tasks):
+        try: migrated.append(normalize_task(task, i, now_iso, local_time_str))
+        except Exception as task_err: logging.error(f"Error processing task at index {i}: {task_err}. Skipping task: {task}", exc_info=True)
+    return migrated
+
+
+def _migrate_to_v2(tasks, now_iso, local_time_str):
+    """Gives every task and subtask a stable id."""
+    for task in tasks: _assign_ids(task)
+    return tasks
+
+
+def _migrate_to_v3(tasks, now_iso, local_time_str):
+    """Stores due_date, localTime and createdAt in canonical ISO form (see task_dates)."""
+    for task in tasks:
+        if isinstance(task, Mapping): canonicalize_dates(task)
+    return tasks
+
+
+MIGRATIONS = [
+    (1, _migrate_to_v1),
+    (2, _migrate_to_v2),
+    (3, _migrate_to_v3),
+]
+
+
+def split_document(data):
+    """Splits a decoded tasks.json document into (meta, tasks, schema_version)."""
+    if isinstance(data, list):  # Old format (list of tasks)
+        return {}, data, 0
+    tasks_data = data.get('tasks', [])
+    try: version = int(data.get('schema_version', 0))
+    except (TypeError, ValueError): version = 0
+    return data, tasks_data, version
+
+
+def prepare_tasks(tasks_data, version, now_iso, local_time_str):
+    """
+    Brings a raw task list up to SCHEMA_VERSION.
+
+    Returns (tasks, migrated) where migrated is True when the data must be
+    re-saved. Current-version files take the fast path: tasks are trusted and
+    only those failing the cheap key/type check are normalized. Files from a
+    newer schema are normalized but must not be saved over: that would stamp
+    them with the older version and drop what the newer schema added.
+    """
+    if not isinstance(tasks_data, list):
+        logging.warning("Tasks entry is not a list, starting empty.")
+        return [], True
+    if version > SCHEMA_VERSION:
+        logging.warning(f"Tasks file schema_version {version} is newer than supported {SCHEMA_VERSION}; loading with full normalization.")
+        return _migrate_to_v1(tasks_data, now_iso, local_time_str), False
+    if version == SCHEMA_VERSION:
+        loaded_tasks = []; repaired = 0
+        for i, task in enumerate(tasks_data):
+            if isinstance(task, Mapping) and TASK_KEYS <= task.keys():
+                loaded_tasks.append(task); continue
+            try: loaded_tasks.append(normalize_task(task, i, now_iso, local_time_str)); repaired += 1
+            except Exception as task_err: logging.error(f"Error processing task at index {i}: {task_err}. Skipping task: {task}", exc_info=True)
+        if repaired: logging.info(f"Normalized {repaired} incomplete tasks on fast load path.")
+        return loaded_tasks, repaired > 0
+    tasks = tasks_data
+    for target_version, migration in MIGRATIONS:
+        if version < target_version:
+            tasks = migration(tasks, now_iso, local_time_str)
+            logging.info(f"Migrated tasks to schema version {target_version}.")
+    return tasks, True
+
+
+def iter_lazy_validation(tasks, now_iso, local_time_str, batch_size=200):
+    """
+    Generator that validates trusted tasks in batches, normalizing the ones that
+    turn out to be malformed. Yields the number of repaired tasks per batch so
+    callers can spread the work over idle frames.
+    """
+    repaired = 0
+    for i, task in enumerate(list(tasks)):
+        if needs_normalization(task):
+            try: normalize_task(task, i, now_iso, local_time_str); repaired += 1
+            except Exception as task_err: logging.error(f"Deferred validation failed for task {i}: {task_err}", exc_info=True)
+        if (i + 1) % batch_size == 0:
+            yield repaired; repaired = 0
+    yield repaired
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+Parent pointers and cached roll-ups for the subtask trees, and the
+structural edits (add, remove, move, promote, demote) that keep them
+current.
+
+For every task and subtask the tree keeps its parent and the roll-up of
+everything below it at any depth: how many descendants there are, how many
+of them are completed, and their tracked seconds (the stored `timer`). A
+change to one node's own completed flag or timer is applied as a delta to
+its ancestors, so it costs O(depth); a node whose subtasks list changed is
+re-read from that node down. mark() (called from mark_tasks_changed) does
+either, so edits made elsewhere are picked up too. The edits here
+mutate the subtasks lists themselves and return the top-level tasks they
+touched, so only those rows have to be redrawn.
+
+Nodes are keyed by identity, like the task views, since subtasks added by
+an import need not have ids yet.
+"""
+
+from collections import namedtuple
+from collections.abc import Mapping
+
+import task_model
+
+RollUp = namedtuple('RollUp', 'completed total seconds')
+_EMPTY = RollUp(0, 0, 0)
+
+
+def _children(node):
+    subtasks = node.get('subtasks')
+    return [child for child in subtasks if isinstance(child, Mapping)] if isinstance(subtasks, list) else []
+
+
+def _seconds(node):
+    seconds = node.get('timer')
+    return seconds if isinstance(seconds, (int, float)) else 0
+
+
+class _Node:
+    __slots__ = ('node', 'parent', 'done', 'seconds', 'children', 'sub_done', 'sub_total', 'sub_seconds')
+
+    def __init__(self, node, parent):
+        self.node = node; self.parent = parent  # parent is the parent's _Node, None for top-level tasks
+        self.done = 1 if node.get('completed') else 0; self.seconds = _seconds(node)
+        self.children = ()  # id() of the subtasks, in order
+        self.sub_done = self.sub_total = self.sub_seconds = 0
+
+    def totals(self):
+        """This node plus everything below it, as its parent counts it."""
+        return self.done + self.sub_done, 1 + self.sub_total, self.seconds + self.sub_seconds
+
+
+class TaskTree:
+    def __init__(self):
+        self._nodes = {}  # id(node) -> _Node
+        self._sub_done = self._sub_total = 0  # over all subtasks of all tasks
+
+    def __len__(self):
+        return len(self._nodes)
+
+    # --- Building ---
+    def _add_subtree(self, node, parent):
+        """Registers node and everything below it (iteratively: trees can be deep) and returns its _Node with roll-ups filled in."""
+        top = _Node(node, parent); self._nodes[id(node)] = top
+        order = [top]; stack = [top]
+        while stack:
+            entry = stack.pop(); children = _children(entry.node)
+            entry.children = tuple(id(child) for child in children)
+            for child in children:
+                child_entry = _Node(child, entry); self._nodes[id(child)] = child_entry
+                order.append(child_entry); stack.append(child_entry)
+        for entry in reversed(order):  # children before their parents
+            if entry.parent is not None and entry is not top:
+                done, total, seconds = entry.totals(); parent_entry = entry.parent
+                parent_entry.sub_done += done; parent_entry.sub_total += total; parent_entry.sub_seconds += seconds
+        if parent is None: self._sub_done += top.sub_done; self._sub_total += top.sub_total
+        return top
+
+    def _drop_subtree(self, entry):
+        stack = [entry]
+        while stack:
+            entry = stack.pop(); self._nodes.pop(id(entry.node), None)
+            stack.extend(self._nodes[child_id] for child_id in entry.children if child_id in self._nodes)
+
+    def _propagate(self, entry, done, total, seconds):
+        if entry is not None: self._sub_done += done; self._sub_total += total  # every chain ends at one top-level task
+        while entry is not None:
+            entry.sub_done += done; entry.sub_total += total; entry.sub_seconds += seconds; entry = entry.parent
+
+    def sync_tasks(self, tasks):
+        """Rebuilds every tree from the task list (after loads, deletes, imports, restores)."""
+        self._nodes = {}; self._sub_done = self._sub_total = 0
+        for task in tasks:
+            if isinstance(task, Mapping): self._add_subtree(task, None)
+
+    # --- Maintenance ---
+    def mark(self, node):
+        """
+        Applies a changed node to the roll-ups: its own completed flag and
+        timer go to its ancestors, and its subtasks are re-read if that list
+        changed. New top-level tasks are added. Returns False for subtasks
+        the tree has never seen.
+        """
+        entry = self._nodes.get(id(node))
+        if entry is None:
+            if isinstance(node, task_model.Subtask): return False
+            self._add_subtree(node, None); return True
+        old = entry.totals()
+        children = _children(node)
+        if tuple(id(child) for child in children) != entry.children:
+            # The subtasks list was edited in place: re-read this node's subtree
+            parent = entry.parent; self._drop_subtree(entry)
+            if parent is None: self._sub_done -= entry.sub_done; self._sub_total -= entry.sub_total  # re-added below
+            entry = self._add_subtree(node, parent)
+        else: entry.done = 1 if node.get('completed') else 0; entry.seconds = _seconds(node)
+        new = entry.totals()
+        if new != old: self._propagate(entry.parent, new[0] - old[0], new[1] - old[1], new[2] - old[2])
+        return True
+
+    # --- Queries ---
+    def rollup(self, node):
+        """RollUp of everything below node: completed and total descendants, and their tracked seconds."""
+        entry = self._nodes.get(id(node))
+        return RollUp(entry.sub_done, entry.sub_total, entry.sub_seconds) if entry is not None else _EMPTY
+
+    def subtask_totals(self):
+        """(completed, total) subtasks at any depth under all tasks, kept current like the roll-ups."""
+        return self._sub_done, self._sub_total
+
+    def parent(self, node):
+        """The task or subtask node belongs to; None for top-level (or unknown) nodes."""
+        entry = self._nodes.get(id(node))
+        return entry.parent.node if entry is not None and entry.parent is not None else None
+
+    def root(self, node):
+        """The top-level task node belongs to (node itself for a top-level task); None if unknown."""
+        entry = self._nodes.get(id(node))
+        if entry is None: return None
+        while entry.parent is not None: entry = entry.parent
+        return entry.node
+
+    def depth(self, node):
+        """0 for top-level tasks, 1 for their subtasks, and so on."""
+        entry = self._nodes.get(id(node)); depth = 0
+        while entry is not None and entry.parent is not None: entry = entry.parent; depth += 1
+        return depth
+
+    def contains(self, node):
+        return id(node) in self._nodes
+
+    def walk(self, node):
+        """[(subtask, depth below node)] of everything under node, in display (pre-)order."""
+        rows = []; stack = [(child, 1) for child in reversed(_children(node))]
+        while stack:
+            child, depth = stack.pop(); rows.append((child, depth))
+            stack.extend((grandchild, depth + 1) for grandchild in reversed(_children(child)))
+        return rows
+
+    # --- Structural edits ---
+    def _entry(self, node):
+        entry = self._nodes.get(id(node))
+        if entry is None: raise ValueError(f"'{node.get('task', '?')}' is not in the task tree")
+        return entry
+
+    def _detach(self, entry):
+        parent = entry.parent
+        if parent is None: raise ValueError("Top-level tasks are moved in the task list, not in the tree")
+        siblings = parent.node['subtasks']; position = next(i for i, child in enumerate(siblings) if child is entry.node)
+        del siblings[position]; parent.children = tuple(id(child) for child in _children(parent.node))
+        done, total, seconds = entry.totals(); self._propagate(parent, -done, -total, -seconds)
+        entry.parent = None
+        return parent, position
+
+    def _attach(self, entry, parent, position=None):
+        siblings = parent.node.get('subtasks')
+        if not isinstance(siblings, list): siblings = parent.node['subtasks'] = []
+        if position is None or position > len(siblings): position = len(siblings)
+        siblings.insert(position, entry.node); parent.children = tuple(id(child) for child in _children(parent.node))
+        entry.parent = parent; done, total, seconds = entry.totals(); self._propagate(parent, done, total, seconds)
+
+    def _root_of(self, entry):
+        while entry.parent is not None: entry = entry.parent
+        return entry.node
+
+    def add(self, parent, subtask, position=None):
+        """Inserts subtask (with anything below it) under parent. Returns the touched top-level tasks."""
+        parent_entry = self._entry(parent)
+        if id(subtask) in self._nodes: raise ValueError(f"'{subtask.get('task', '?')}' is already in the task tree")
+        self._attach(self._add_subtree(subtask, parent_entry), parent_entry, position)
+        return [self._root_of(parent_entry)]
+
+    def remove(self, subtask):
+        """Takes subtask and everything below it out of its parent. Returns the touched top-level tasks."""
+        entry = self._entry(subtask); root = self._root_of(entry)
+        self._detach(entry); self._drop_subtree(entry)
+        return [root]
+
+    def move(self, subtask, new_parent, position=None):
+        """
+        Moves subtask with its subtree under new_parent (possibly in another
+        task) at position, default last. Raises ValueError for a move into its
+        own subtree. Returns the touched top-level tasks.
+        """
+        entry = self._entry(subtask); target = self._entry(new_parent)
+        ancestor = target
+        while ancestor is not None:
+            if ancestor is entry: raise ValueError("A subtask cannot be moved under itself")
+            ancestor = ancestor.parent
+        old_root = self._root_of(entry); old_parent, old_position = self._detach(entry)
+        if target is old_parent and position is not None and position > old_position: position -= 1
+        self._attach(entry, target, position)
+        new_root = self._root_of(target)
+        return [old_root] if new_root is old_root else [old_root, new_root]
+
+    def shift(self, subtask, offset):
+        """Moves subtask offset places among its siblings. Returns the touched top-level tasks ([] if it cannot move)."""
+        entry = self._entry(subtask); parent = entry.parent
+        if parent is None: raise ValueError("Top-level tasks are moved in the task list, not in the tree")
+        siblings = parent.node['subtasks']; position = next(i for i, child in enumerate(siblings) if child is subtask)
+        new_position = position + offset
+        if not 0 <= new_position < len(siblings): return []
+        siblings.insert(new_position, siblings.pop(position)); parent.children = tuple(id(child) for child in _children(parent.node))
+        return [self._root_of(parent)]
+
+    def demote(self, subtask):
+        """Makes subtask the last child of the sibling above it. Returns the touched top-level tasks ([] if it is the first)."""
+        entry = self._entry(subtask); parent = entry.parent
+        if parent is None: raise ValueError("Top-level tasks are moved in the task list, not in the tree")
+        siblings = _children(parent.node); position = next(i for i, child in enumerate(siblings) if child is subtask)
+        if position == 0: return []
+        return self.move(subtask, siblings[position - 1])
+
+    def promote(self, subtask):
+        """
+        Moves subtask up one level, right after its parent. Returns the
+        touched top-level tasks ([] for direct subtasks of a top-level task,
+        which would have to become tasks of their own).
+        """
+        entry = self._entry(subtask); parent = entry.parent
+        if parent is None or parent.parent is None: return []
+        grandparent = parent.parent
+        position = next(i for i, child in enumerate(grandparent.node['subtasks']) if child is parent.node)
+        return self.move(subtask, grandparent.node, position + 1)
@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""
+Saved task list views: a filter plus a sort, backed by sorted indexes.
+
+A View names a filter (all, open, completed, running, ready to work, has
+a due date, one icon, a tag query) and a sort (manual order, due date,
+tracked time, title, created, priority). Each view that has been shown keeps the tasks it matches in a list ordered
+by (sort key, task id), maintained with bisect: mark() (registered with
+mark_tasks_changed) takes a changed task out at its old key and inserts it
+at its new one, so switching to a view or re-rendering it walks only the
+rows it shows. Manual order is keyed by list position, which structural
+changes (deletes, moves, imports) shift, so those indexes are rebuilt when
+they are next shown. A tag view is built from the tag index's set
+operations (tag_index.TagIndex.query_tasks) and kept current by matching
+the changed task's own tags against the parsed query. Readiness comes from
+task_deps.DependencyGraph; its listener re-marks the dependents whose
+readiness a change flipped.
+
+Tracked time sorts by the stored `timer`, which is updated when a timer
+stops or is reset; a running interval is not counted until then.
+
+broadcasts/views.json holds the view definitions and the active view.
+"""
+
+import os
+import bisect
+import logging
+from collections import namedtuple
+
+import json_codec
+import task_model
+import task_dates
+import tag_index
+import next_up
+
+VIEWS_FILE = os.path.join('broadcasts', 'views.json')
+VIEWS_VERSION = 1
+
+View = namedtuple('View', 'name filter sort descending icon query', defaults=(None,))
+
+FILTERS = {
+    'all': lambda task, view: True,
+    'open': lambda task, view: not task.get('completed'),
+    'completed': lambda task, view: bool(task.get('completed')),
+    'running': lambda task, view: bool(task.get('timer_running')),
+    'ready': None,  # from the dependency graph, supplied by TaskViews
+    'due': lambda task, view: task_dates.parse_due(task.get('due_date')) is not None,
+    'icon': lambda task, view: bool(view.icon) and task.get('icon') == view.icon,
+    'tags': lambda task, view: tag_index.matches(tag_index.parse_query(view.query or ''), tag_index.tags_of(task)),
+}
+FILTER_LABELS = {'all': 'All tasks', 'open': 'Not completed', 'completed': 'Completed', 'running': 'Timer running', 'ready': 'Ready to work', 'due': 'Has a due date', 'icon': 'With icon', 'tags': 'Tag query'}
+
+
+def _due_key(task):
+    ordinal = task_dates.due_ordinal(task.get('due_date'))
+    return (ordinal is None, ordinal or 0)  # undated tasks after the dated ones
+
+
+def _tracked_key(task):
+    seconds = task.get('timer')
+    return seconds if isinstance(seconds, (int, float)) else 0
+
+
+SORTS = {
+    'manual': None,  # list position, supplied by TaskViews
+    'due': _due_key,
+    'tracked': _tracked_key,
+    'title': lambda task: str(task.get('task', '')).casefold(),
+    'created': lambda task: str(task.get('createdAt') or ''),
+    'priority': next_up.sort_key,
+}
+SORT_LABELS = {'manual': 'Manual order', 'due': 'Due date', 'tracked': 'Tracked time', 'title': 'Title', 'created': 'Created', 'priority': 'Priority'}
+
+DEFAULT_VIEW = View('All tasks', 'all', 'manual', False, None)
+DEFAULT_VIEWS = (DEFAULT_VIEW,
+                 View('Open', 'open', 'manual', False, None),
+                 View('Open by due date', 'open', 'due', False, None),
+                 View('Ready to work', 'ready', 'manual', False, None),
+                 View('By priority', 'open', 'priority', False, None),
+                 View('Running', 'running', 'tracked', True, None),
+                 View('Most tracked', 'all', 'tracked', True, None))
+
+
+def is_manual(view):
+    """True for views that show every task in list order, where tasks can be moved."""
+    return view.filter == 'all' and view.sort == 'manual'
+
+
+class _Index:
+    """The tasks a view matches, ordered by key; see the module docstring."""
+    __slots__ = ('view', 'key_func', 'match', 'keys', 'tasks', '_key_of')
+
+    def __init__(self, view, key_func, match):
+        self.view = view; self.key_func = key_func; self.match = match
+        self.keys = []; self.tasks = []
+        self._key_of = {}  # id(task) -> its key in keys
+
+    def _key(self, task):
+        return (self.key_func(task), str(task.get('id') or ''), id(task))
+
+    def build(self, tasks):
+        match = self.match
+        entries = sorted(((self._key(task), task) for task in tasks if match(task)), key=lambda entry: entry[0])
+        self.keys = [key for key, _ in entries]; self.tasks = [task for _, task in entries]
+        self._key_of = {id(task): key for key, task in entries}
+
+    def discard(self, task):
+        key = self._key_of.pop(id(task), None)
+        if key is None: return
+        i = bisect.bisect_left(self.keys, key)
+        del self.keys[i]; del self.tasks[i]
+
+    def update(self, task):
+        """Re-keys task; True if it joined, left or moved within the view."""
+        old_key = self._key_of.get(id(task))
+        new_key = self._key(task) if self.match(task) else None
+        if new_key == old_key: return False
+        self.discard(task)
+        if new_key is not None:
+            i = bisect.bisect_left(self.keys, new_key)
+            self.keys.insert(i, new_key); self.tasks.insert(i, task); self._key_of[id(task)] = new_key
+        return True
+
+    def __contains__(self, task):
+        return id(task) in self._key_of
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def rows(self, start=0, stop=None):
+        """Tasks start..stop in display order."""
+        stop = len(self.tasks) if stop is None else min(stop, len(self.tasks))
+        if not self.view.descending: return self.tasks[start:stop]
+        n = len(self.tasks)
+        return self.tasks[n - stop:n - start][::-1]
+
+
+class TaskViews:
+    """Saved views, the active one, and the indexes of the views shown so far."""
+    def __init__(self, tasks_provider, path=VIEWS_FILE, tags=None, deps=None):
+        self.tasks_provider = tasks_provider
+        self.path = path
+        self.tags = tags        # tag_index.TagIndex kept current before mark() runs, for building tag views
+        self.deps = deps        # task_deps.DependencyGraph, likewise, for 'ready'
+        self.views = list(DEFAULT_VIEWS)
+        self.active = DEFAULT_VIEW.name
+        self._indexes = {}      # view name -> _Index
+        self._positions = None  # id(task) -> list position, rebuilt after structural changes
+        if path is not None: self.load()
+
+    # --- Storage ---
+    def load(self):
+        if not os.path.exists(self.path): return
+        try: data = json_codec.load_file(self.path)
+        except (OSError, ValueError) as e: logging.warning(f"Ignoring unreadable {self.path}: {e}"); return
+        if data.get('version') != VIEWS_VERSION: return
+        views = []
+        for entry in data.get('views', []):
+            try:
+                view = View(str(entry['name']), entry['filter'], entry['sort'], bool(entry.get('descending')), entry.get('icon'), entry.get('query'))
+                if view.filter == 'tags': tag_index.parse_query(view.query or '')
+            except (KeyError, TypeError, ValueError): continue
+            if view.filter in FILTERS and view.sort in SORTS and view.name not in (v.name for v in views): views.append(view)
+        if not any(view.name == DEFAULT_VIEW.name for view in views): views.insert(0, DEFAULT_VIEW)
+        self.views = views
+        self.active = data.get('active') if self.view(data.get('active')) is not None else DEFAULT_VIEW.name
+
+    def save(self):
+        if self.path is None: return
+        json_codec.write_file(self.path, {'version': VIEWS_VERSION, 'active': self.active, 'views': [view._asdict() for view in self.views]})
+
+    # --- Definitions ---
+    def view(self, name=None):
+        """The view called name (the active view by default), or None."""
+        name = self.active if name is None else name
+        return next((view for view in self.views if view.name == name), None)
+
+    def names(self):
+        return [view.name for view in self.views]
+
+    def set_active(self, name):
+        if self.view(name) is None: raise ValueError(f"No view named {name!r}")
+        if name != self.active: self.active = name; self.save()
+
+    def add_view(self, view):
+        """Adds view, or replaces the saved view with the same name."""
+        if view.filter not in FILTERS or view.sort not in SORTS: raise ValueError(f"Unknown filter or sort in {view}")
+        if not view.name.strip(): raise ValueError("A view needs a name")
+        if view.name == DEFAULT_VIEW.name: raise ValueError(f"'{DEFAULT_VIEW.name}' cannot be redefined")
+        if view.filter == 'tags': tag_index.parse_query(view.query or '')  # raises ValueError for a bad query
+        position = next((i for i, v in enumerate(self.views) if v.name == view.name), None)
+        if position is None: self.views.append(view)
+        else: self.views[position] = view
+        self._indexes.pop(view.name, None); self.save()
+
+    def remove_view(self, name):
+        if name == DEFAULT_VIEW.name: raise ValueError(f"'{DEFAULT_VIEW.name}' cannot be removed")
+        self.views = [view for view in self.views if view.name != name]; self._indexes.pop(name, None)
+        if self.active == name: self.active = DEFAULT_VIEW.name
+        self.save()
+
+    def is_manual(self, name=None):
+        view = self.view(name)
+        return view is None or is_manual(view)
+
+    # --- Indexes ---
+    def mark(self, task=None):
+        """
+        Listener for mark_tasks_changed: re-keys task in every built index;
+        None drops them all. Returns True if the active view's rows changed.
+        """
+        if task is None: self._indexes.clear(); self._positions = None; return True
+        if isinstance(task, task_model.Subtask): return False  # views list top-level tasks only
+        if self._positions is not None and id(task) not in self._positions:
+            # A task added to the list: positions have shifted
+            self._positions = None
+            for name in [name for name, index in self._indexes.items() if index.view.sort == 'manual']: del self._indexes[name]
+        changed = False
+        for name, index in self._indexes.items(): changed = index.update(task) and name == self.active or changed
+        return changed
+
+    def _position_map(self):
+        if self._positions is None: self._positions = {id(task): i for i, task in enumerate(self.tasks_provider())}
+        return self._positions
+
+    def _index(self, view):
+        index = self._indexes.get(view.name)
+        if index is None:
+            if view.sort == 'manual':
+                positions = self._position_map()
+                key_func = lambda task: positions.get(id(task), -1)
+            else: key_func = SORTS[view.sort]
+            if view.filter == 'ready': match = lambda task: self.deps is not None and self.deps.is_ready(task.get('id'))
+            else: match = lambda task, test=FILTERS[view.filter]: test(task, view)
+            index = self._indexes[view.name] = _Index(view, key_func, match)
+            if view.filter == 'tags' and self.tags is not None: index.build(self.tags.query_tasks(view.query or ''))  # set operations, no list scan
+            else: index.build(self.tasks_provider())
+        return index
+
+    def rows(self, start=0, stop=None):
+        """[(list index, task)] of the active view's rows start..stop, in display order."""
+        tasks = self.tasks_provider(); view = self.view() or DEFAULT_VIEW
+        if is_manual(view):
+            stop = len(tasks) if stop is None else min(stop, len(tasks))
+            return [(i, tasks[i]) for i in range(start, stop)]
+        for _ in range(2):
+            positions = self._position_map(); rows = []
+            for task in self._index(view).rows(start, stop):
+                i = positions.get(id(task))
+                if i is None or i >= len(tasks) or tasks[i] is not task: break
+                rows.append((i, task))
+            else: return rows
+            # The list changed without a structural mark_tasks_changed(); rebuild from it
+            self.mark(None)
+        return rows
+
+    def count(self):
+        """Rows in the active view."""
+        view = self.view() or DEFAULT_VIEW
+        return len(self.tasks_provider()) if is_manual(view) else len(self._index(view))
+
+    def contains(self, task, name=None):
+        view = self.view(name) or DEFAULT_VIEW
+        return is_manual(view) or task in self._index(view)
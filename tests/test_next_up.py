@@ -0,0 +1,71 @@
+import os
+import sys
+import random
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import next_up
+import task_deps
+import task_model
+
+
+def task(task_id, priority=None, due=None, created='2026-01-01T00:00:00', completed=False, blocked_by=()):
+    data = {'id': task_id, 'task': task_id, 'due_date': due, 'createdAt': created, 'completed': completed, 'subtasks': []}
+    if priority is not None: data['priority'] = priority
+    if blocked_by: data['blocked_by'] = list(blocked_by)
+    return data
+
+
+class PriorityTests(unittest.TestCase):
+    def test_normalize_and_api_priority(self):
+        self.assertEqual(next_up.normalize_priority('P1'), 1)
+        self.assertEqual(next_up.normalize_priority(3), 3)
+        self.assertIsNone(next_up.normalize_priority(4))
+        self.assertIsNone(next_up.normalize_priority('urgent'))
+        self.assertEqual(next_up.priority_of({'priority': True}), next_up.DEFAULT_PRIORITY)
+        self.assertEqual(next_up.api_priority(1), 4)
+
+
+class NextUpQueueTests(unittest.TestCase):
+    def test_orders_by_priority_then_due_date_then_age(self):
+        tasks = [task('undated-p1', 1), task('late', 2, '2026-03-01'), task('soon', 2, '2026-02-01'),
+                 task('old', 2, '2026-02-01', created='2025-01-01T00:00:00'), task('p4'), task('done', 1, completed=True)]
+        queue = next_up.NextUpQueue(); queue.sync_tasks(tasks)
+        self.assertEqual([t['id'] for t in queue.top()], ['undated-p1', 'old', 'soon', 'late', 'p4'])
+        self.assertEqual([t['id'] for t in queue.top(2)], ['undated-p1', 'old'])
+        self.assertFalse(queue.contains('done'))
+
+    def test_update_and_remove(self):
+        tasks = [task('a', 3), task('b', 2)]
+        queue = next_up.NextUpQueue(); queue.sync_tasks(tasks)
+        tasks[0]['priority'] = 1
+        self.assertTrue(queue.update(tasks[0])); self.assertFalse(queue.update(tasks[0]))
+        self.assertEqual([t['id'] for t in queue.top()], ['a', 'b'])
+        tasks[0]['completed'] = True; queue.update(tasks[0])
+        self.assertEqual([t['id'] for t in queue.top()], ['b'])
+        queue.remove('b'); self.assertEqual(queue.top(), []); self.assertEqual(len(queue), 0)
+
+    def test_blocked_tasks_are_left_out(self):
+        tasks = task_model.tasks_from_json([task('a', 3), task('b', 1, blocked_by=['a'])])
+        graph = task_deps.DependencyGraph(); graph.sync_tasks(tasks)
+        queue = next_up.NextUpQueue(graph); queue.sync_tasks(tasks)
+        self.assertEqual([t['id'] for t in queue.top()], ['a'])
+
+    def test_random_updates_match_a_sort(self):
+        rng = random.Random(11); tasks = []
+        queue = next_up.NextUpQueue()
+        for i in range(2000):
+            if tasks and rng.random() < 0.6:
+                target = rng.choice(tasks)
+                target['priority'] = rng.choice(next_up.PRIORITIES); target['completed'] = rng.random() < 0.2
+                target['due_date'] = rng.choice([None, '2026-02-01', '2026-03-15', '2026-01-10'])
+                queue.update(target)
+            else:
+                tasks.append(task(f't{i}', rng.choice(next_up.PRIORITIES), created=f'2026-01-01T00:{i // 60 % 60:02d}:{i % 60:02d}')); queue.update(tasks[-1])
+        expected = sorted((t for t in tasks if not t['completed']), key=next_up.sort_key)[:25]
+        self.assertEqual([t['id'] for t in queue.top(25)], [t['id'] for t in expected])
+        self.assertLessEqual(len(queue._heap), 2 * len(queue) + 64)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import os
+import sys
+import random
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import tag_index
+
+
+class ParseQueryTests(unittest.TestCase):
+    def test_operators_and_precedence(self):
+        self.assertEqual(tag_index.parse_query(''), ('all',))
+        self.assertEqual(tag_index.parse_query('Work  #Urgent'), ('and', (('tag', 'work'), ('tag', 'urgent'))))
+        self.assertEqual(tag_index.parse_query('work | home urgent'), ('or', (('tag', 'work'), ('and', (('tag', 'home'), ('tag', 'urgent'))))))
+        self.assertEqual(tag_index.parse_query('work OR home'), tag_index.parse_query('work | home'))
+        self.assertEqual(tag_index.parse_query('(work | home) -done'), ('and', (('or', (('tag', 'work'), ('tag', 'home'))), ('not', ('tag', 'done')))))
+        self.assertEqual(tag_index.parse_query('!done'), tag_index.parse_query('NOT done'))
+        self.assertEqual(tag_index.parse_query('work AND proj*'), ('and', (('tag', 'work'), ('prefix', 'proj'))))
+
+    def test_bad_syntax_raises(self):
+        for query in ('(work', 'work |', '| work', 'work )', 'AND', '#'):
+            with self.assertRaises(ValueError, msg=query): tag_index.parse_query(query)
+
+    def test_tags_are_normalized(self):
+        self.assertEqual(tag_index.parse_tags('Work, #home  @Errands work'), ['work', 'home', 'errands'])
+        self.assertEqual(tag_index.normalize_tag('  Deep  Work '), 'deep-work')
+
+
+class TagIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.sub = {'id': 's', 'task': 'sub', 'tags': ['home', 'urgent'], 'subtasks': []}
+        self.tasks = [{'id': 'a', 'task': 'a', 'tags': ['work', 'project-x'], 'subtasks': [self.sub]},
+                      {'id': 'b', 'task': 'b', 'tags': ['home', 'done'], 'subtasks': []},
+                      {'id': 'c', 'task': 'c', 'subtasks': []}]
+        self.index = tag_index.TagIndex(); self.index.sync_tasks(self.tasks)
+
+    def test_queries(self):
+        self.assertEqual(self.index.query('home'), {'s', 'b'})
+        self.assertEqual(self.index.query('home -done'), {'s'})
+        self.assertEqual(self.index.query('proj* | urgent'), {'a', 's'})
+        self.assertEqual(self.index.query('-home'), {'a', 'c'})
+        self.assertEqual([task['id'] for task in self.index.query_tasks('home')], ['b'])
+        self.assertEqual(self.index.complete('h'), ['home'])
+
+    def test_edits_and_deletes_update_the_postings(self):
+        self.sub['tags'] = ['errands']; self.assertTrue(self.index.index_node(self.sub))
+        self.assertEqual(self.index.query('home'), {'b'})
+        del self.tasks[1]; self.index.sync_tasks(self.tasks)
+        self.assertEqual(self.index.query('home'), set())
+        self.assertNotIn('done', self.index.tags())
+
+    def test_queries_match_a_brute_force_filter(self):
+        rng = random.Random(3); vocab = ['work', 'home', 'done', 'proj-a', 'proj-b', 'urgent']
+        nodes = [{'id': f'n{i}', 'task': str(i), 'tags': rng.sample(vocab, rng.randrange(4)), 'subtasks': []} for i in range(200)]
+        index = tag_index.TagIndex(); index.sync_tasks(nodes)
+        for query in ('work home', 'work | -done', '(proj* | urgent) -home', 'NOT (work OR home)', 'proj-a proj-b | done'):
+            tree = tag_index.parse_query(query)
+            self.assertEqual(index.query(query), {n['id'] for n in nodes if tag_index.matches(tree, n['tags'])}, query)
+
+
+if __name__ == '__main__':
+    unittest.main()
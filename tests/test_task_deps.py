@@ -0,0 +1,112 @@
+import os
+import sys
+import random
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import task_model
+import task_deps
+
+
+def make_tasks(data):
+    return task_model.tasks_from_json(data)
+
+
+def reachable(graph, start, target):
+    """Brute-force: can target be reached from start following blocker -> dependent links?"""
+    stack = [start]; seen = {start}
+    while stack:
+        node = stack.pop()
+        if node == target: return True
+        for dependent in graph.dependents(node):
+            if dependent['id'] not in seen: seen.add(dependent['id']); stack.append(dependent['id'])
+    return False
+
+
+class PendingLinkTests(unittest.TestCase):
+    def test_dependent_marked_before_its_blocker(self):
+        tasks = make_tasks([{'id': 'B', 'task': 'B', 'blocked_by': ['A']}, {'id': 'A', 'task': 'A'}])
+        graph = task_deps.DependencyGraph()
+        changed = set()
+        for task in tasks: changed |= graph.update_task(task)
+        self.assertFalse(graph.is_ready('B'))
+        self.assertEqual(graph.open_blockers('B'), 1)
+        self.assertIn('B', changed)
+        self.assertEqual([task['id'] for task in graph.ready()], ['A'])
+
+    def test_completing_a_late_blocker_readies_the_dependent(self):
+        tasks = make_tasks([{'id': 'B', 'task': 'B', 'blocked_by': ['A']}, {'id': 'A', 'task': 'A'}])
+        graph = task_deps.DependencyGraph()
+        for task in tasks: graph.update_task(task)
+        tasks[1]['completed'] = True
+        self.assertIn('B', graph.update_task(tasks[1]))
+        self.assertTrue(graph.is_ready('B'))
+
+    def test_link_dropped_before_the_blocker_arrives(self):
+        tasks = make_tasks([{'id': 'B', 'task': 'B', 'blocked_by': ['A']}, {'id': 'A', 'task': 'A'}])
+        graph = task_deps.DependencyGraph()
+        graph.update_task(tasks[0])
+        del tasks[0]['blocked_by']; graph.update_task(tasks[0])
+        graph.update_task(tasks[1])
+        self.assertTrue(graph.is_ready('B'))
+        self.assertEqual(graph.blockers('B'), [])
+
+    def test_sync_matches_per_task_updates(self):
+        rng = random.Random(7)
+        data = [{'id': f't{i}', 'task': f'T{i}', 'completed': rng.random() < 0.3,
+                 'blocked_by': [f't{j}' for j in rng.sample(range(i), min(i, rng.randrange(3)))]} for i in range(60)]
+        rng.shuffle(data)
+        tasks = make_tasks(data)
+        synced = task_deps.DependencyGraph(); synced.sync_tasks(tasks)
+        marked = task_deps.DependencyGraph()
+        for task in tasks: marked.update_task(task)
+        self.assertEqual({t['id'] for t in synced.ready()}, {t['id'] for t in marked.ready()})
+        for task in tasks: self.assertEqual(synced.open_blockers(task['id']), marked.open_blockers(task['id']))
+
+
+class CycleTests(unittest.TestCase):
+    def setUp(self):
+        self.tasks = make_tasks([{'id': name, 'task': name} for name in 'ABCD'])
+        self.graph = task_deps.DependencyGraph(); self.graph.sync_tasks(self.tasks)
+
+    def test_self_link_refused(self):
+        self.assertTrue(self.graph.would_cycle('A', 'A'))
+        with self.assertRaises(task_deps.CycleError): self.graph.add_edge('A', 'A')
+
+    def test_two_cycle_refused(self):
+        self.graph.add_edge('A', 'B')
+        self.assertTrue(self.graph.would_cycle('B', 'A'))
+        with self.assertRaises(task_deps.CycleError): self.graph.add_edge('B', 'A')
+        self.assertEqual([t['id'] for t in self.graph.blockers('A')], [])
+
+    def test_cycle_against_topological_order_refused(self):
+        # D -> C -> B -> A runs against the insertion order, so every edge reorders
+        self.graph.add_edge('D', 'C'); self.graph.add_edge('C', 'B'); self.graph.add_edge('B', 'A')
+        with self.assertRaises(task_deps.CycleError): self.graph.add_edge('A', 'D')
+        self.graph.add_edge('D', 'A')  # a shortcut along the existing order is fine
+        self.assertEqual(self.graph.open_blockers('A'), 2)
+
+    def test_random_edges_match_reachability(self):
+        rng = random.Random(3)
+        tasks = make_tasks([{'id': f't{i}', 'task': f'T{i}'} for i in range(40)])
+        graph = task_deps.DependencyGraph(); graph.sync_tasks(tasks)
+        for _ in range(400):
+            a, b = rng.sample(range(40), 2); a, b = f't{a}', f't{b}'
+            expected = reachable(graph, b, a)
+            self.assertEqual(graph.would_cycle(a, b), expected)
+            if expected:
+                with self.assertRaises(task_deps.CycleError): graph.add_edge(a, b)
+            else: graph.add_edge(a, b)
+            # The maintained order stays topological
+            for task in tasks:
+                for dependent in graph.dependents(task['id']): self.assertLess(graph._order[task['id']], graph._order[dependent['id']])
+
+    def test_cyclic_links_in_a_file_are_ignored(self):
+        tasks = make_tasks([{'id': 'A', 'task': 'A', 'blocked_by': ['B']}, {'id': 'B', 'task': 'B', 'blocked_by': ['A']}])
+        graph = task_deps.DependencyGraph()
+        with self.assertLogs(level='WARNING'): graph.sync_tasks(tasks)
+        self.assertEqual(len(graph.ready()), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
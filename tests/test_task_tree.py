@@ -0,0 +1,108 @@
+import os
+import sys
+import random
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import task_model
+import task_tree
+
+
+def node(node_id, completed=False, timer=0, subtasks=()):
+    return {'id': node_id, 'task': node_id, 'completed': completed, 'timer': timer, 'subtasks': list(subtasks)}
+
+
+def brute_rollup(n):
+    """RollUp of everything below n, counted the slow way."""
+    done = total = seconds = 0
+    for child in n.get('subtasks') or []:
+        below = brute_rollup(child)
+        done += (1 if child.get('completed') else 0) + below.completed
+        total += 1 + below.total; seconds += child.get('timer', 0) + below.seconds
+    return task_tree.RollUp(done, total, seconds)
+
+
+def all_nodes(tasks):
+    stack = list(tasks)
+    while stack:
+        n = stack.pop(); yield n
+        stack.extend(n.get('subtasks') or [])
+
+
+class TaskTreeTests(unittest.TestCase):
+    def setUp(self):
+        self.leaf = node('leaf', timer=30)
+        self.mid = node('mid', completed=True, timer=20, subtasks=[self.leaf])
+        self.other = node('other', timer=5)
+        self.task = node('task', timer=100, subtasks=[self.mid, self.other])
+        self.second = node('second', subtasks=[node('s1', completed=True)])
+        self.tasks = [self.task, self.second]
+        self.tree = task_tree.TaskTree(); self.tree.sync_tasks(self.tasks)
+
+    def assertConsistent(self):
+        for n in all_nodes(self.tasks): self.assertEqual(self.tree.rollup(n), brute_rollup(n), n['id'])
+        subtasks = [n for task in self.tasks for n in all_nodes(task.get('subtasks') or [])]
+        self.assertEqual(self.tree.subtask_totals(), (sum(1 for n in subtasks if n.get('completed')), len(subtasks)))
+
+    def test_rollups_cover_every_level(self):
+        self.assertEqual(self.tree.rollup(self.task), task_tree.RollUp(1, 3, 55))
+        self.assertEqual(self.tree.subtask_totals(), (2, 4))
+        self.assertEqual(self.tree.depth(self.leaf), 2)
+        self.assertIs(self.tree.root(self.leaf), self.task)
+        self.assertIs(self.tree.parent(self.leaf), self.mid)
+
+    def test_mark_applies_own_changes_to_ancestors(self):
+        self.leaf['completed'] = True; self.leaf['timer'] = 45
+        self.assertTrue(self.tree.mark(self.leaf))
+        self.assertEqual(self.tree.rollup(self.task), task_tree.RollUp(2, 3, 70))
+        self.assertConsistent()
+
+    def test_mark_rereads_an_edited_subtasks_list(self):
+        self.mid['subtasks'].append(node('new', completed=True, timer=7, subtasks=[node('deeper', timer=1)]))
+        self.tree.mark(self.mid)
+        self.assertConsistent()
+        self.assertFalse(self.tree.mark(task_model.Subtask.from_json(node('unknown'))))
+
+    def test_structural_edits_return_touched_tasks(self):
+        self.assertEqual(self.tree.move(self.leaf, self.second), [self.task, self.second])
+        self.assertConsistent()
+        self.assertEqual(self.tree.demote(self.other), [self.task])
+        self.assertIs(self.tree.parent(self.other), self.mid)
+        self.assertEqual(self.tree.promote(self.other), [self.task])
+        self.assertIs(self.tree.parent(self.other), self.task)
+        self.assertEqual(self.tree.shift(self.other, -1), [self.task])
+        self.assertEqual([n['id'] for n in self.task['subtasks']], ['other', 'mid'])
+        self.assertEqual(self.tree.remove(self.mid), [self.task])
+        self.assertFalse(self.tree.contains(self.mid))
+        self.assertConsistent()
+
+    def test_cannot_move_into_own_subtree(self):
+        with self.assertRaises(ValueError): self.tree.move(self.mid, self.leaf)
+        self.assertConsistent()
+
+    def test_random_edits_match_a_recount(self):
+        rng = random.Random(7); counter = iter(range(10**6))
+        for _ in range(300):
+            subtasks = [n for task in self.tasks for n in all_nodes(task['subtasks'])]
+            parents = list(all_nodes(self.tasks)); action = rng.random()
+            if action < 0.3 or not subtasks:
+                self.tree.add(rng.choice(parents), node(f'n{next(counter)}', rng.random() < 0.5, rng.randrange(60)))
+            elif action < 0.5:
+                target = rng.choice(subtasks); target['completed'] = not target['completed']; target['timer'] += rng.randrange(30)
+                self.tree.mark(target)
+            elif action < 0.7:
+                subtask = rng.choice(subtasks); parent = rng.choice(parents)
+                try: self.tree.move(subtask, parent, rng.randrange(3))
+                except ValueError: pass
+            elif action < 0.8: self.tree.remove(rng.choice(subtasks))
+            elif action < 0.9: self.tree.demote(rng.choice(subtasks))
+            else: self.tree.promote(rng.choice(subtasks))
+            self.assertConsistent()
+        deep = node('deep'); tip = deep
+        for i in range(3000): child = node(f'd{i}', timer=1); tip['subtasks'].append(child); tip = child
+        self.tasks.append(deep); self.tree.mark(deep)
+        self.assertEqual(self.tree.rollup(deep), task_tree.RollUp(0, 3000, 3000))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import os
+import sys
+import random
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import time_log
+
+
+def clipped(sessions, start, end, task_id=None):
+    """Seconds of sessions within [start, end), counted the slow way."""
+    low = float('-inf') if start is None else start; high = float('inf') if end is None else end
+    return sum(max(0.0, min(e, high) - max(s, low)) for t, s, e in sessions if task_id is None or t == task_id)
+
+
+class SessionLogTests(unittest.TestCase):
+    def test_range_totals_clip_sessions_at_the_edges(self):
+        log = time_log.SessionLog(None)
+        log.record('a', 100, 200); log.record('b', 150, 400); log.record('a', 500, 510)
+        self.assertFalse(log.record('a', 600, 600.5))
+        self.assertEqual(log.total(), 360)
+        self.assertEqual(log.total(180, 300), 20 + 120)
+        self.assertEqual(log.total(180, 300, 'a'), 20)
+        self.assertEqual(list(log.sessions(180, 300)), [('a', 180, 200), ('b', 180, 300)])
+        self.assertEqual(log.per_task(0, 505), {'a': 105, 'b': 250})
+
+    def test_timer_total_follows_baseline_and_resets(self):
+        log = time_log.SessionLog(None)
+        log.seed([{'id': 'a', 'timer': 50}, {'id': 'b', 'timer': 0}], when=1000)
+        log.record('a', 1100, 1130)
+        self.assertEqual(log.timer_total('a'), 80)
+        log.reset('a', 1200); log.record('a', 1300, 1310)
+        self.assertEqual(log.timer_total('a'), 10)
+        self.assertEqual(log.total(task_id='a'), 40)  # sessions are kept after a reset
+
+    def test_out_of_order_sessions_reload_sorted(self):
+        tmp = tempfile.mkdtemp(); self.addCleanup(shutil.rmtree, tmp); folder = os.path.join(tmp, 'sessions')
+        log = time_log.SessionLog(folder)
+        log.record('a', 300, 400); log.record('b', 100, 350); log.reset('b', 50)
+        reloaded = time_log.SessionLog(folder)
+        self.assertEqual(list(reloaded.starts), [100, 300])
+        self.assertEqual(list(reloaded.sessions()), [('b', 100, 350), ('a', 300, 400)])
+        self.assertEqual(reloaded.resets, {'b': 50})
+        with open(os.path.join(folder, 'ends.bin'), 'ab') as f: f.write(b'\x00' * 8)  # an interrupted append
+        self.assertEqual(len(time_log.SessionLog(folder)), 2)
+
+    def test_random_ranges_match_a_recount(self):
+        rng = random.Random(5); log = time_log.SessionLog(None); sessions = []
+        for _ in range(400):
+            task_id = rng.choice('abcd'); start = rng.uniform(0, 10000); end = start + rng.uniform(1, rng.choice([10, 2000]))
+            log.record(task_id, start, end); sessions.append((task_id, start, end))
+        for _ in range(100):
+            start = rng.choice([None, rng.uniform(-100, 10000)]); end = rng.choice([None, rng.uniform(0, 12000)])
+            if start is not None and end is not None and end < start: start, end = end, start
+            self.assertAlmostEqual(log.total(start, end), clipped(sessions, start, end), places=6)
+            self.assertAlmostEqual(log.total(start, end, 'b'), clipped(sessions, start, end, 'b'), places=6)
+            per_task = log.per_task(start, end)
+            for task_id in 'abcd': self.assertAlmostEqual(per_task.get(task_id, 0.0), clipped(sessions, start, end, task_id), places=6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+Time-tracking session log.
+
+Every timer run is recorded as a session (task id, start, end) in columnar
+arrays: starts and ends as array('d') of unix times, and the task as an
+array('q') of codes into a list of task ids. Layout under
+broadcasts/sessions/:
+
+    starts.bin, ends.bin, tasks.bin    the columns, appended one session at a time
+    log.json                           {"ids": [...], "baselines": {...}, "resets": {...}}
+
+Loading reads each column file straight into its array. In memory the columns are kept
+sorted by start with a running sum of durations, and every task has its
+own sorted starts and running sums, so range and per-task totals are two
+bisects plus the few sessions that straddle the range edges.
+
+A task's `timer` stays derivable from the log: timer_total(id) is its
+baseline (time tracked before the log existed, or carried over from an
+import) plus the sessions started since its last reset. Resetting a timer
+keeps the sessions, so reports still show when the work happened.
+"""
+
+import os
+import bisect
+import logging
+from array import array
+
+import json_codec
+
+SESSION_FOLDER = os.path.join('broadcasts', 'sessions')
+COLUMNS = (('starts', 'd'), ('ends', 'd'), ('tasks', 'q'))
+META_NAME = 'log.json'
+
+
+class _Index:
+    """Sessions sorted by start, with running sums of their durations and the longest one."""
+    __slots__ = ('starts', 'ends', 'sums', 'longest')
+
+    def __init__(self, starts=None, ends=None):
+        self.starts = starts if starts is not None else array('d'); self.ends = ends if ends is not None else array('d')
+        self.sums = array('d', [0.0]); self.longest = 0.0; total = 0.0
+        for s, e in zip(self.starts, self.ends): total += e - s; self.sums.append(total); self.longest = max(self.longest, e - s)
+
+    def append(self, start, end):
+        self.starts.append(start); self.ends.append(end); self.sums.append(self.sums[-1] + end - start); self.longest = max(self.longest, end - start)
+
+    def insert(self, start, end):
+        """Inserts a session in start order and returns its position."""
+        i = bisect.bisect_right(self.starts, start); duration = end - start
+        self.starts.insert(i, start); self.ends.insert(i, end); self.sums.insert(i + 1, self.sums[i])
+        for j in range(i + 1, len(self.sums)): self.sums[j] += duration  # usually only the new last entry
+        self.longest = max(self.longest, duration)
+        return i
+
+    def bounds(self, start, end):
+        """Rows overlapping [start, end): rows before lo end by start (none is longer than longest), rows from hi on start at or after end."""
+        lo = 0 if start is None else bisect.bisect_left(self.starts, start - self.longest)
+        hi = len(self.starts) if end is None else bisect.bisect_left(self.starts, end)
+        return lo, hi
+
+    def total(self, start=None, end=None):
+        """Seconds within [start, end); the sessions that cross its edges are clipped."""
+        if start is None and end is None: return self.sums[-1]
+        lo, hi = self.bounds(start, end)
+        inner = lo if start is None else bisect.bisect_left(self.starts, start)
+        seconds = self.sums[hi] - self.sums[inner]
+        high = float('inf') if end is None else end
+        for i in range(lo, inner): seconds += max(0.0, min(self.ends[i], high) - start)
+        if end is not None:
+            for i in range(max(inner, bisect.bisect_left(self.starts, end - self.longest)), hi): seconds -= max(0.0, self.ends[i] - end)
+        return seconds
+
+    def since(self, start):
+        """Seconds of the sessions that started at or after start."""
+        return self.sums[-1] - self.sums[bisect.bisect_left(self.starts, start)]
+
+
+class SessionLog:
+    """
+    Sessions of every task, sorted by start. With folder=None the log lives
+    in memory only. Times are unix seconds; ranges are [start, end).
+    """
+    def __init__(self, folder=SESSION_FOLDER):
+        self.path = folder
+        self.tasks = array('q'); self._all = _Index()
+        self.ids = []; self._codes = {}
+        self.baselines = {}    # task id -> seconds tracked before its first logged session
+        self.resets = {}       # task id -> unix time of its last timer reset
+        if folder is not None: self._load()
+        self._reindex()
+
+    # --- Storage ---
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _load(self):
+        if not os.path.exists(self.path): os.makedirs(self.path)
+        meta_file = self._file(META_NAME)
+        if not os.path.exists(meta_file): return
+        try: meta = json_codec.load_file(meta_file)
+        except (OSError, ValueError) as e: logging.error(f"Unreadable {meta_file}, starting an empty session log: {e}"); return
+        self.ids = list(meta.get('ids', [])); self._codes = {task_id: code for code, task_id in enumerate(self.ids)}
+        self.baselines = dict(meta.get('baselines', {})); self.resets = dict(meta.get('resets', {}))
+        columns = []
+        for name, typecode in COLUMNS:
+            column = array(typecode); path = self._file(name + '.bin')
+            if os.path.exists(path):
+                with open(path, 'rb') as f: data = f.read()
+                column.frombytes(data[:len(data) - len(data) % column.itemsize])
+            columns.append(column)
+        count = min(len(column) for column in columns)
+        if any(len(column) != count for column in columns):
+            # An append was interrupted; drop the incomplete session
+            logging.warning(f"Session log columns have different lengths, keeping the first {count} sessions.")
+            for (name, _), column in zip(COLUMNS, columns):
+                del column[count:]
+                with open(self._file(name + '.bin'), 'wb') as f: column.tofile(f)
+        starts, ends, self.tasks = columns
+        if any(starts[i] > starts[i + 1] for i in range(len(starts) - 1)):
+            # Sessions are appended when they end, so overlapping timers can store them out of start order
+            order = sorted(range(len(starts)), key=starts.__getitem__)
+            starts = array('d', (starts[i] for i in order)); ends = array('d', (ends[i] for i in order))
+            self.tasks = array('q', (self.tasks[i] for i in order))
+        self._all = _Index(starts, ends)
+
+    def _save_meta(self):
+        if self.path is None: return
+        json_codec.write_file(self._file(META_NAME), {'ids': self.ids, 'baselines': self.baselines, 'resets': self.resets})
+
+    def _append(self, start, end, code):
+        if self.path is None: return
+        for (name, typecode), value in zip(COLUMNS, (start, end, code)):
+            with open(self._file(name + '.bin'), 'ab') as f: array(typecode, [value]).tofile(f)
+
+    # --- Indexes ---
+    @property
+    def starts(self):
+        return self._all.starts
+
+    @property
+    def ends(self):
+        return self._all.ends
+
+    def _reindex(self):
+        self._by_task = {}
+        for start, end, code in zip(self._all.starts, self._all.ends, self.tasks):
+            index = self._by_task.get(code)
+            if index is None: index = self._by_task[code] = _Index()
+            index.append(start, end)
+
+    def _code(self, task_id):
+        code = self._codes.get(task_id)
+        if code is None: code = self._codes[task_id] = len(self.ids); self.ids.append(task_id); self._save_meta()
+        return code
+
+    # --- Recording ---
+    def __len__(self):
+        return len(self.tasks)
+
+    def record(self, task_id, start, end):
+        """Adds a session; sessions shorter than a second are dropped. Returns True if it was recorded."""
+        if not task_id or not isinstance(start, (int, float)) or end - start < 1: return False
+        code = self._code(task_id)
+        self._append(start, end, code)
+        self.tasks.insert(self._all.insert(start, end), code)
+        index = self._by_task.get(code)
+        if index is None: index = self._by_task[code] = _Index()
+        index.insert(start, end)
+        return True
+
+    def reset(self, task_id, when):
+        """Starts the task's timer total over from zero; its sessions are kept."""
+        self.resets[task_id] = when; self.baselines.pop(task_id, None); self._save_meta()
+
+    def seed(self, tasks, when):
+        """
+        Carries over the `timer` of tasks tracked before the log existed (or
+        imported with time on them) as baselines, so timer_total matches
+        them. Only tasks with no sessions and no reset are seeded.
+        """
+        changed = False
+        for task in tasks:
+            task_id = task.get('id'); seconds = task.get('timer')
+            if not task_id or not isinstance(seconds, (int, float)) or seconds <= 0: continue
+            if task_id in self.baselines or task_id in self.resets or self._codes.get(task_id) in self._by_task: continue
+            running_since = task.get('start_time_unix') if task.get('timer_running') else None
+            # A running timer's current interval is not in `timer` yet; it is logged as a session when it stops
+            self.baselines[task_id] = seconds; self.resets[task_id] = min(when, running_since) if isinstance(running_since, (int, float)) else when; changed = True
+        if changed: self._save_meta()
+        return changed
+
+    # --- Queries ---
+    def timer_total(self, task_id):
+        """The task's `timer`: its baseline plus the sessions started since its last reset."""
+        index = self._by_task.get(self._codes.get(task_id))
+        tracked = index.since(self.resets.get(task_id, float('-inf'))) if index is not None else 0.0
+        return self.baselines.get(task_id, 0.0) + tracked
+
+    def total(self, start=None, end=None, task_id=None):
+        """Tracked seconds within [start, end), of one task or of all of them."""
+        if task_id is None: return self._all.total(start, end)
+        index = self._by_task.get(self._codes.get(task_id))
+        return index.total(start, end) if index is not None else 0.0
+
+    def sessions(self, start=None, end=None, task_id=None):
+        """Yields (task id, start, end) of the sessions overlapping [start, end), clipped to it, by start."""
+        code = None
+        if task_id is not None:
+            code = self._codes.get(task_id)
+            if code is None: return
+        low = float('-inf') if start is None else start; high = float('inf') if end is None else end
+        lo, hi = self._all.bounds(start, end)
+        ids = self.ids; starts = self._all.starts; ends = self._all.ends; tasks = self.tasks
+        for i in range(lo, hi):
+            if code is not None and tasks[i] != code: continue
+            s = max(starts[i], low); e = min(ends[i], high)
+            if e > s: yield ids[tasks[i]], s, e
+
+    def per_task(self, start=None, end=None):
+        """Tracked seconds by task id within [start, end)."""
+        lo, hi = self._all.bounds(start, end)
+        if hi - lo > 8 * len(self._by_task):
+            # A long range: a few bisects per task beat walking every session in it
+            totals = {self.ids[code]: index.total(start, end) for code, index in self._by_task.items()}
+            return {task_id: seconds for task_id, seconds in totals.items() if seconds > 0}
+        totals = {}
+        for task_id, s, e in self.sessions(start, end): totals[task_id] = totals.get(task_id, 0.0) + e - s
+        return totals